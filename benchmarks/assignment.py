@@ -0,0 +1,81 @@
+"""Time of the linear assignment solvers on crowd-size cost matrices.
+
+Compares the solvers of `tracklab.utils.assignment.linear_assignment` on the IoU
+cost matrices of synthetic crowded frames (MOT20-like, a few hundred people of
+similar size), gated at `--cost-limit` as the trackers do, and on dense ReID-like
+cost matrices. The exact solvers must give the same total cost, the greedy one is
+reported with its excess cost.
+
+Usage:
+    python benchmarks/assignment.py --sizes 50 150 300 --repeat 20
+"""
+import argparse
+import timeit
+
+import numpy as np
+
+from tracklab.utils.assignment import SOLVERS, lap, linear_assignment
+
+
+def iou_costs(n, rng):
+    """1 - IoU of n tracks and their n detections in a crowded 1920x1080 frame."""
+    ltwh = np.c_[rng.random((n, 2)) * [1860, 940], rng.normal(1, 0.1, (n, 1)) * [40, 110]]
+    detections = ltwh + rng.normal(size=ltwh.shape) * [6, 6, 2, 4]
+    detections = detections[rng.permutation(n)]
+    ltrb_a = np.c_[ltwh[:, :2], ltwh[:, :2] + ltwh[:, 2:]]
+    ltrb_b = np.c_[detections[:, :2], detections[:, :2] + detections[:, 2:]]
+    lt = np.maximum(ltrb_a[:, None, :2], ltrb_b[None, :, :2])
+    rb = np.minimum(ltrb_a[:, None, 2:], ltrb_b[None, :, 2:])
+    intersection = np.prod(np.clip(rb - lt, 0, None), axis=-1)
+    union = np.prod(ltwh[:, 2:], axis=1)[:, None] + np.prod(detections[:, 2:], axis=1)[None] - intersection
+    return 1 - intersection / union
+
+
+def reid_costs(n, rng):
+    """Cosine distances of n tracks and their n noisy detections."""
+    tracks = rng.normal(size=(n, 128))
+    detections = tracks[rng.permutation(n)] + rng.normal(size=(n, 128)) * 0.8
+    tracks /= np.linalg.norm(tracks, axis=1, keepdims=True)
+    detections /= np.linalg.norm(detections, axis=1, keepdims=True)
+    return 1 - tracks @ detections.T
+
+
+def total_cost(cost_matrix, cost_limit, matches, unmatched_rows, unmatched_cols):
+    """Cost of an assignment, with the unassigned rows and columns at cost_limit / 2."""
+    return (cost_matrix[matches[:, 0], matches[:, 1]].sum()
+            + (len(unmatched_rows) + len(unmatched_cols)) * cost_limit / 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 150, 300])
+    parser.add_argument("--cost-limit", type=float, default=0.8)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    solvers = [solver for solver in SOLVERS if solver != "lapjv" or lap is not None]
+    print(f"{'matrix':>14} {'feasible':>8} " + " ".join(f"{solver:>10}" for solver in solvers)
+          + f" {'greedy excess':>14}")
+    for name, make_costs in [("iou", iou_costs), ("reid", reid_costs)]:
+        for n in args.sizes:
+            cost_matrix = make_costs(n, rng)
+            density = (cost_matrix <= args.cost_limit).mean()
+            costs, times = {}, {}
+            for solver in solvers:
+                assignment = linear_assignment(cost_matrix, args.cost_limit, solver)
+                costs[solver] = total_cost(cost_matrix, args.cost_limit, *assignment)
+                times[solver] = min(timeit.repeat(
+                    lambda: linear_assignment(cost_matrix, args.cost_limit, solver),
+                    number=args.repeat, repeat=3)) / args.repeat
+            optimal = costs["scipy"]
+            for solver in solvers:
+                if solver != "greedy":
+                    assert np.isclose(costs[solver], optimal), f"{solver} is not optimal"
+            print(f"{name:>4} {f'{n}x{n}':>9} {density:8.1%} "
+                  + " ".join(f"{1e3 * times[solver]:8.2f}ms" for solver in solvers)
+                  + f" {costs['greedy'] - optimal:14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Cost of the bbox and keypoints DataFrame accessors.
+
+Compares the vectorized accessors (`detections.bbox.ltrb(...)`, ...), which work on
+the stacked (N, 4) / (N, K, 3) arrays of the detections, with the previous per-row
+path (`detections.bbox_ltwh.map(lambda x: ltwh_to_ltrb(x, ...))`, ...), and checks
+that both give the same results.
+
+Usage:
+    python benchmarks/coordinates.py --dets 20 --repeat 200
+"""
+import argparse
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from tracklab.utils.coordinates import (
+    keypoints_in_bbox_coord, ltwh_to_ltrb, ltwh_to_xywh, sanitize_bbox_ltwh, sanitize_keypoints
+)
+
+IMAGE_SHAPE = (1920, 1080)
+
+
+def make_detections(n, n_keypoints, rng):
+    ltwh = np.concatenate([rng.random((n, 2)) * 2000 - 40, rng.random((n, 2)) * 300], axis=1)
+    keypoints = rng.random((n, n_keypoints, 3)) * [2000, 1100, 1]
+    return pd.DataFrame({
+        "bbox_ltwh": list(ltwh),
+        "bbox_conf": rng.random(n),
+        "keypoints_xyc": list(keypoints),
+        "keypoints_conf": rng.random(n),
+    })
+
+
+def per_row(detections):
+    # previous implementation of the accessors, `.copy()` because the per-row
+    # functions sanitize the arrays of the DataFrame in place
+    bboxes = detections.bbox_ltwh.map(np.copy)
+    keypoints = detections.keypoints_xyc.map(np.copy)
+    return {
+        "bbox.ltwh": lambda: bboxes.map(lambda x: sanitize_bbox_ltwh(x.copy(), IMAGE_SHAPE, True)),
+        "bbox.ltrb": lambda: bboxes.map(lambda x: ltwh_to_ltrb(x.copy(), IMAGE_SHAPE, True)),
+        "bbox.xywh": lambda: bboxes.map(lambda x: ltwh_to_xywh(x.copy(), IMAGE_SHAPE)),
+        "keypoints.xy": lambda: keypoints.map(
+            lambda x: sanitize_keypoints(x.copy(), IMAGE_SHAPE, True)[:, :2]),
+        "keypoints.in_bbox_coord": lambda: keypoints.map(
+            lambda x: keypoints_in_bbox_coord(x, bboxes.iloc[0])),
+    }
+
+
+def vectorized(detections):
+    bbox_ltwh = detections.bbox_ltwh.iloc[0]
+    return {
+        "bbox.ltwh": lambda: detections.bbox.ltwh(IMAGE_SHAPE, rounded=True),
+        "bbox.ltrb": lambda: detections.bbox.ltrb(IMAGE_SHAPE, rounded=True),
+        "bbox.xywh": lambda: detections.bbox.xywh(IMAGE_SHAPE),
+        "keypoints.xy": lambda: detections.keypoints.xy(IMAGE_SHAPE, rounded=True),
+        "keypoints.in_bbox_coord": lambda: detections.keypoints.in_bbox_coord(bbox_ltwh),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dets", type=int, nargs="+", default=[20, 200, 2000])
+    parser.add_argument("--keypoints", type=int, default=17)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'accessor':>24} {'detections':>10} {'per row':>12} {'vectorized':>12} {'speedup':>8}")
+    for n in args.dets:
+        detections = make_detections(n, args.keypoints, rng)
+        old, new = per_row(detections), vectorized(detections)
+        for name in old:
+            expected, result = np.stack(old[name]()), new[name]()
+            assert np.array_equal(expected, result), f"{name} differs from the per-row version"
+            old_time = min(timeit.repeat(old[name], number=args.repeat, repeat=3)) / args.repeat
+            new_time = min(timeit.repeat(new[name], number=args.repeat, repeat=3)) / args.repeat
+            print(f"{name:>24} {n:>10} {1e6 * old_time:10.1f}us {1e6 * new_time:10.1f}us "
+                  f"{old_time / new_time:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Per-batch cost of merging module outputs as the video grows.
+
+Compares `merge_dataframes` (previous behavior of `TrackingEngine.default_step`)
+with the columnar `DetectionStore`, for a detector producing `--dets` detections
+per frame with a batch size of `--batch-size` frames.
+
+Usage:
+    python benchmarks/detection_store.py --frames 3000 --dets 20
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from tracklab.datastruct import DetectionStore
+from tracklab.engine.engine import merge_dataframes
+
+
+def detector_batch(first_frame, batch_size, dets_per_frame, first_id, rng):
+    detections = []
+    for frame in range(first_frame, first_frame + batch_size):
+        for _ in range(dets_per_frame):
+            detections.append(
+                pd.Series(
+                    dict(
+                        image_id=frame,
+                        bbox_ltwh=rng.random(4) * 100,
+                        bbox_conf=rng.random(),
+                        video_id=0,
+                        category_id=1,
+                    ),
+                    name=first_id + len(detections),
+                )
+            )
+    return detections
+
+
+def run(frames, dets_per_frame, batch_size, checkpoints, use_store):
+    rng = np.random.default_rng(0)
+    detections = pd.DataFrame()
+    store = DetectionStore.from_dataframe(detections)
+    timings = {}
+    n_dets = 0
+    for first_frame in range(0, frames, batch_size):
+        batch = detector_batch(first_frame, batch_size, dets_per_frame, n_dets, rng)
+        n_dets += len(batch)
+        start = time.perf_counter()
+        if use_store:
+            store.update(batch)
+        else:
+            detections = merge_dataframes(detections, batch)
+        elapsed = time.perf_counter() - start
+        for checkpoint in checkpoints:
+            if first_frame <= checkpoint < first_frame + batch_size:
+                timings[checkpoint] = elapsed
+    start = time.perf_counter()
+    if use_store:
+        detections = store.to_dataframe()
+    to_dataframe = time.perf_counter() - start
+    return timings, to_dataframe, len(detections)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=1500)
+    parser.add_argument("--dets", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=4)
+    args = parser.parse_args()
+
+    checkpoints = [int(args.frames * f) for f in (0.1, 0.25, 0.5, 0.75, 0.99)]
+    results = {}
+    for name, use_store in [("merge_dataframes", False), ("DetectionStore", True)]:
+        start = time.perf_counter()
+        timings, to_dataframe, n_dets = run(
+            args.frames, args.dets, args.batch_size, checkpoints, use_store
+        )
+        results[name] = (timings, to_dataframe, time.perf_counter() - start, n_dets)
+
+    print(f"{args.frames} frames, {args.dets} detections/frame, batch of {args.batch_size} frames")
+    print(f"{'frame':>8} " + " ".join(f"{name:>18}" for name in results) + "  (ms per batch)")
+    for checkpoint in checkpoints:
+        row = [f"{1000 * r[0][checkpoint]:18.3f}" for r in results.values()]
+        print(f"{checkpoint:>8} " + " ".join(row))
+    for name, (_, to_dataframe, total, n_dets) in results.items():
+        print(f"{name}: total {total:.2f}s for {n_dets} detections "
+              f"(to_dataframe {1000 * to_dataframe:.1f}ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Throughput and accuracy of the YOLOv8 detector and of the BPBReId model in each
+inference precision.
+
+Runs the `tracklab.wrappers.YOLOv8` module on the first `--frames` frames of a fixed
+clip with each `precision` (see `tracklab.utils.precision.InferencePrecision`), in
+the default and the channels last memory formats, and compares its detections to
+the ones in fp32: the fraction of the fp32 detections found again (IoU >= 0.5), the
+fraction of the detections which are also fp32 detections, and the mean difference
+of their confidences.
+
+The `tracklab.wrappers.BPBReId` model of `--reid-config` then embeds the crops of
+the fp32 detections (up to `--reid-crops`) with each of the `--reid-precisions`,
+int8 included, and its embeddings are compared to the ones in fp32 with their
+cosine similarity (mean and minimum over the crops and the parts). Only the
+feature extraction is timed, the model is built without its tracking dataset.
+
+The precisions which aren't available on the device fall back to another one, shown
+in the `runs in` column.
+
+Usage:
+    python benchmarks/inference_precision.py --video clip.mp4 --frames 100 \\
+        --checkpoint yolov8s.pt --precisions fp32 bf16 fp16 --channels-last \\
+        --model-dir pretrained_models --reid-precisions fp32 bf16 fp16 int8
+"""
+import argparse
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import torch
+from omegaconf import OmegaConf
+
+from tracklab.utils.assignment import linear_assignment
+from tracklab.utils.crops import crop_and_resize
+from tracklab.utils.cv2 import cv2_load_image
+from tracklab.wrappers.detect_multiple.yolov8_api import YOLOv8, collate_fn
+from tracklab.wrappers.reid.bpbreid_api import BPBReId
+
+REID_CONFIG = Path(__file__).parents[1] / "tracklab" / "configs" / "modules" / "reid" / "bpbreid.yaml"
+
+
+def detect(module, images, batch_size):
+    """(N, 5) [left, top, width, height, confidence] detections of each image, and
+    the time taken by the model."""
+    detections = []
+    elapsed = 0.
+    for start in range(0, len(images), batch_size):
+        metadatas = pd.DataFrame({"video_id": 0}, index=range(start, min(start + batch_size, len(images))))
+        batch = collate_fn([(i, module.preprocess(images[i], None, metadatas.loc[i])) for i in metadatas.index])[1]
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        begin = time.perf_counter()
+        results = module.process(batch, None, metadatas)
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        elapsed += time.perf_counter() - begin
+        results = pd.DataFrame(results, columns=["image_id", "bbox_ltwh", "bbox_conf"])
+        for i in metadatas.index:
+            rows = results[results.image_id == i]
+            boxes = np.array(rows.bbox_ltwh.tolist(), dtype=float).reshape(-1, 4)
+            detections.append(np.c_[boxes, rows.bbox_conf.to_numpy(dtype=float)])
+    return detections, elapsed
+
+
+def ious(boxes_a, boxes_b):
+    """(N, M) IoU of the ltwh boxes."""
+    lt = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    rb = np.minimum(boxes_a[:, None, :2] + boxes_a[:, None, 2:], boxes_b[None, :, :2] + boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(rb - lt, 0, None), axis=-1)
+    areas_a, areas_b = np.prod(boxes_a[:, 2:], axis=1), np.prod(boxes_b[:, 2:], axis=1)
+    return intersection / (areas_a[:, None] + areas_b[None] - intersection)
+
+
+def compare(reference, detections):
+    """Recall and precision of the detections relative to the reference ones, and
+    the mean absolute difference of the confidences of the matched detections."""
+    matched, conf_diffs = 0, []
+    for ref, det in zip(reference, detections):
+        if len(ref) == 0 or len(det) == 0:
+            continue
+        matches = linear_assignment(1 - ious(ref[:, :4], det[:, :4]), cost_limit=0.5)[0]
+        matched += len(matches)
+        conf_diffs.append(np.abs(ref[matches[:, 0], 4] - det[matches[:, 1], 4]))
+    n_ref, n_det = sum(map(len, reference)), sum(map(len, detections))
+    conf_diff = np.concatenate(conf_diffs).mean() if conf_diffs else 0.
+    return matched / max(n_ref, 1), matched / max(n_det, 1), conf_diff
+
+
+def reid_module(args, precision, channels_last):
+    """The BPBReId module of `--reid-config` and its default dataset config, with a
+    placeholder tracking dataset : only its feature extraction is used."""
+    config = OmegaConf.load(args.reid_config)
+    config.dataset = OmegaConf.load(Path(args.reid_config).parent / "dataset" / "default.yaml")
+    root = OmegaConf.create({"model_dir": args.model_dir, "data_dir": "data", "num_cores": 0})
+    root.reid = config
+    return BPBReId(
+        cfg=root.reid.cfg,
+        tracking_dataset=SimpleNamespace(),
+        dataset=root.reid.dataset,
+        device=args.device,
+        save_path="reid",
+        job_id=0,
+        use_keypoints_visibility_scores_for_reid=False,
+        training_enabled=False,
+        batch_size=args.reid_batch_size,
+        precision=precision,
+        channels_last=channels_last,
+    )
+
+
+def crops_of(images, detections, size, max_crops):
+    """(N, 3, H, W) uint8 crops of the detections, N <= max_crops."""
+    crops = []
+    for image, boxes in zip(images, detections):
+        height, width = image.shape[:2]
+        ltrb = np.round(np.c_[boxes[:, :2], boxes[:, :2] + boxes[:, 2:4]])
+        ltrb = np.clip(ltrb, 0, [width, height, width, height]).astype(int)
+        ltrb = ltrb[(ltrb[:, 2] > ltrb[:, 0]) & (ltrb[:, 3] > ltrb[:, 1])]
+        if len(ltrb):
+            crops.append(crop_and_resize(image, ltrb, size))
+    return torch.cat(crops)[:max_crops]
+
+
+def embed(module, crops, batch_size):
+    """(N, ...) embeddings of the crops, and the time taken by the model."""
+    embeddings = []
+    elapsed = 0.
+    for start in range(0, len(crops), batch_size):
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        begin = time.perf_counter()
+        features = module._extract_features(crops[start:start + batch_size])
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        elapsed += time.perf_counter() - begin
+        embeddings.append(features["embeddings"])
+    return np.concatenate(embeddings), elapsed
+
+
+def cosine_similarities(reference, embeddings):
+    """Cosine similarity of each embedding vector (the last dimension) to the reference
+    one, except the null reference vectors (e.g. of the parts which aren't visible)."""
+    reference_norms = np.linalg.norm(reference, axis=-1)
+    valid = reference_norms > 0
+    dot = (reference * embeddings).sum(axis=-1)[valid]
+    norms = reference_norms[valid] * np.linalg.norm(embeddings, axis=-1)[valid]
+    return dot / np.maximum(norms, 1e-12)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--video", required=True, help="the fixed clip")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--checkpoint", default="yolov8s.pt")
+    parser.add_argument("--min-confidence", type=float, default=0.4)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--precisions", nargs="+", default=["fp32", "bf16", "fp16"])
+    parser.add_argument("--channels-last", action="store_true", help="also run in channels last")
+    parser.add_argument("--no-reid", action="store_true", help="only benchmark the detector")
+    parser.add_argument("--reid-config", default=str(REID_CONFIG))
+    parser.add_argument("--model-dir", default="pretrained_models", help="the `model_dir` of the configs")
+    parser.add_argument("--reid-crops", type=int, default=512)
+    parser.add_argument("--reid-batch-size", type=int, default=64)
+    parser.add_argument("--reid-precisions", nargs="+", default=["fp32", "bf16", "fp16", "int8"])
+    args = parser.parse_args()
+
+    images = [cv2_load_image(f"vid://{args.video}:{i}") for i in range(args.frames)]
+    settings = [(precision, False) for precision in args.precisions]
+    if args.channels_last:
+        settings += [(precision, True) for precision in args.precisions]
+    # the detections in fp32 are the reference
+    settings = [("fp32", False)] + [setting for setting in settings if setting != ("fp32", False)]
+
+    print(f"{'precision':>9} {'channels last':>13} {'runs in':>7} {'images/s':>9} "
+          f"{'recall':>7} {'precision':>9} {'conf diff':>9}")
+    reference_detections = None
+    for precision, channels_last in settings:
+        cfg = OmegaConf.create({
+            "path_to_checkpoint": args.checkpoint,
+            "min_confidence": args.min_confidence,
+            "precision": precision,
+            "channels_last": channels_last,
+        })
+        module = YOLOv8(cfg, args.device, args.batch_size)
+        detect(module, images[:args.batch_size], args.batch_size)  # warm-up
+        detections, elapsed = detect(module, images, args.batch_size)
+        if reference_detections is None:
+            reference_detections = detections
+        recall, det_precision, conf_diff = compare(reference_detections, detections)
+        print(f"{precision:>9} {str(channels_last):>13} {module.inference.precision:>7} "
+              f"{len(images) / elapsed:9.1f} {recall:7.1%} {det_precision:9.1%} {conf_diff:9.4f}")
+    if args.no_reid:
+        return
+
+    settings = [(precision, False) for precision in args.reid_precisions]
+    if args.channels_last:
+        settings += [(precision, True) for precision in args.reid_precisions]
+    settings = [("fp32", False)] + [setting for setting in settings if setting != ("fp32", False)]
+    crops = None
+    print(f"\n{'precision':>9} {'channels last':>13} {'runs in':>7} {'crops/s':>9} "
+          f"{'mean cos':>9} {'min cos':>8}")
+    reference = None
+    for precision, channels_last in settings:
+        module = reid_module(args, precision, channels_last)
+        if crops is None:
+            crops = crops_of(images, reference_detections, module.crop_size, args.reid_crops)
+        embed(module, crops[:args.reid_batch_size], args.reid_batch_size)  # warm-up
+        embeddings, elapsed = embed(module, crops, args.reid_batch_size)
+        if reference is None:
+            reference = embeddings
+        similarities = cosine_similarities(reference, embeddings)
+        print(f"{precision:>9} {str(channels_last):>13} {module.inference.precision:>7} "
+              f"{len(crops) / elapsed:9.1f} {similarities.mean():9.5f} {similarities.min():8.5f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Cost of a Kalman filter step of all the tracks of a tracker.
+
+Compares the shared batched filter (`tracklab.utils.kalman.KalmanStates`, all the
+tracks predicted, updated and gated at once) with the previous per-track filters of
+the DeepSORT-like trackers (one `predict`, `update` and `gating_distance` call per
+track), and checks that both give the same states and distances.
+
+Usage:
+    python benchmarks/kalman.py --tracks 50 200 1000 --repeat 20
+"""
+import argparse
+import timeit
+
+import numpy as np
+import scipy.linalg
+
+from tracklab.utils.kalman import KalmanStates, XYAHKalmanFilter
+
+
+class PerTrackKalmanFilter:
+    """Previous per-track implementation of the DeepSORT filter (ByteTrack, StrongSORT)."""
+
+    def __init__(self):
+        self._motion_mat = np.eye(8)
+        self._motion_mat[:4, 4:] = np.eye(4)
+        self._update_mat = np.eye(4, 8)
+        self._std_weight_position = 1. / 20
+        self._std_weight_velocity = 1. / 160
+
+    def predict(self, mean, covariance):
+        std_pos = [self._std_weight_position * mean[3]] * 2 + [1e-2, self._std_weight_position * mean[3]]
+        std_vel = [self._std_weight_velocity * mean[3]] * 2 + [1e-5, self._std_weight_velocity * mean[3]]
+        motion_cov = np.diag(np.square(np.r_[std_pos, std_vel]))
+        mean = np.dot(self._motion_mat, mean)
+        covariance = np.linalg.multi_dot((self._motion_mat, covariance, self._motion_mat.T)) + motion_cov
+        return mean, covariance
+
+    def project(self, mean, covariance):
+        std = [self._std_weight_position * mean[3]] * 2 + [1e-1, self._std_weight_position * mean[3]]
+        mean = np.dot(self._update_mat, mean)
+        covariance = np.linalg.multi_dot((self._update_mat, covariance, self._update_mat.T))
+        return mean, covariance + np.diag(np.square(std))
+
+    def update(self, mean, covariance, measurement):
+        projected_mean, projected_cov = self.project(mean, covariance)
+        chol_factor, lower = scipy.linalg.cho_factor(projected_cov, lower=True, check_finite=False)
+        kalman_gain = scipy.linalg.cho_solve(
+            (chol_factor, lower), np.dot(covariance, self._update_mat.T).T, check_finite=False).T
+        new_mean = mean + np.dot(measurement - projected_mean, kalman_gain.T)
+        new_covariance = covariance - np.linalg.multi_dot((kalman_gain, projected_cov, kalman_gain.T))
+        return new_mean, new_covariance
+
+    def gating_distance(self, mean, covariance, measurements):
+        mean, covariance = self.project(mean, covariance)
+        cholesky_factor = np.linalg.cholesky(covariance)
+        z = scipy.linalg.solve_triangular(
+            cholesky_factor, (measurements - mean).T, lower=True, check_finite=False)
+        return np.sum(z * z, axis=0)
+
+
+def make_measurements(n, rng):
+    return np.c_[rng.random((n, 2)) * [1920, 1080], rng.random(n) * 0.5 + 0.25, rng.random(n) * 200 + 50]
+
+
+def per_track(kf, tracks, measurements):
+    tracks[:] = [kf.predict(mean, covariance) for mean, covariance in tracks]
+    distances = np.stack([kf.gating_distance(mean, covariance, measurements) for mean, covariance in tracks])
+    tracks[:] = [kf.update(mean, covariance, z) for (mean, covariance), z in zip(tracks, measurements)]
+    return distances
+
+
+def batched(states, slots, measurements):
+    states.predict(slots)
+    distances = states.gating_distance(slots, measurements)
+    states.update(slots, measurements)
+    return distances
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tracks", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'tracks':>8} {'per track':>12} {'batched':>12} {'speedup':>8}")
+    for n in args.tracks:
+        initial = make_measurements(n, rng)
+        measurements = initial + rng.normal(size=initial.shape) * [2, 2, 0.01, 2]
+        old_kf, states = PerTrackKalmanFilter(), KalmanStates(XYAHKalmanFilter())
+        tracks = [states.kf.initiate(z) for z in initial]
+        slots = np.array([states.add(mean, covariance) for mean, covariance in tracks])
+
+        expected, result = per_track(old_kf, tracks, measurements), batched(states, slots, measurements)
+        assert np.allclose(expected, result), "the gating distances differ from the per-track filter"
+        assert np.allclose(np.stack([mean for mean, _ in tracks]), states.mean[slots])
+        assert np.allclose(np.stack([cov for _, cov in tracks]), states.covariance[slots])
+
+        old_time = min(timeit.repeat(lambda: per_track(old_kf, tracks, measurements),
+                                     number=args.repeat, repeat=3)) / args.repeat
+        new_time = min(timeit.repeat(lambda: batched(states, slots, measurements),
+                                     number=args.repeat, repeat=3)) / args.repeat
+        print(f"{n:>8} {1e3 * old_time:10.2f}ms {1e3 * new_time:10.2f}ms {old_time / new_time:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""End-to-end FPS of the offline and pipelined tracking engines.
+
+Runs a synthetic detector -> reid -> tracker pipeline on generated images with both
+engines, checks that they produce identical detections and reports their FPS. The
+detector and reid modules simulate the latency of a GPU model with `time.sleep`
+(which releases the GIL like a CUDA call), the tracker is a small stateful
+nearest-neighbor tracker.
+
+Usage:
+    python benchmarks/pipelined_engine.py --frames 200 --detector-ms 20 --reid-ms 10
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from tracklab.datastruct import TrackerState, TrackingSet
+from tracklab.engine import OfflineTrackingEngine, PipelinedTrackingEngine
+from tracklab.pipeline import DetectionLevelModule, ImageLevelModule, Pipeline
+
+
+def collate_fn(batch):
+    idxs = [b[0] for b in batch]
+    images = [b["image"] for _, b in batch]
+    return idxs, images
+
+
+class SyntheticDetector(ImageLevelModule):
+    collate_fn = collate_fn
+    input_columns = []
+    output_columns = ["image_id", "video_id", "category_id", "bbox_ltwh", "bbox_conf"]
+
+    def __init__(self, batch_size, latency, dets_per_frame):
+        super().__init__(batch_size)
+        self.latency = latency
+        self.dets_per_frame = dets_per_frame
+        self.id = 0
+
+    def preprocess(self, image, detections, metadata):
+        return {"image": image}
+
+    def process(self, batch, detections, metadatas):
+        time.sleep(self.latency * len(batch))
+        outputs = []
+        for image, (image_id, metadata) in zip(batch, metadatas.iterrows()):
+            rng = np.random.default_rng(int(metadata.frame))
+            for k in range(self.dets_per_frame):
+                # rows of 20 boxes, inside the image for up to 240 detections
+                l, t = np.array([20 * (k % 20), 30 * (k // 20)]) + metadata.frame % 10 + rng.random(2)
+                outputs.append(pd.Series(dict(
+                    image_id=image_id, video_id=metadata.video_id, category_id=1,
+                    bbox_ltwh=np.array([l, t, 10., 20.]), bbox_conf=image.mean() / 255,
+                ), name=self.id))
+                self.id += 1
+        return outputs
+
+
+class SyntheticReId(DetectionLevelModule):
+    input_columns = ["bbox_ltwh"]
+    output_columns = ["embeddings"]
+
+    def __init__(self, batch_size, latency):
+        super().__init__(batch_size)
+        self.latency = latency
+
+    def preprocess(self, image, detection, metadata):
+        l, t, w, h = detection.bbox_ltwh.astype(int)
+        return {"img": image[t:t + h, l:l + w].astype(np.float32).mean(axis=(0, 1))}
+
+    def process(self, batch, detections, metadatas):
+        time.sleep(self.latency * len(detections))
+        return pd.DataFrame({"embeddings": list(batch["img"].numpy())}, index=detections.index)
+
+
+class SyntheticTracker(ImageLevelModule):
+    input_columns = ["bbox_ltwh", "embeddings"]
+    output_columns = ["track_id"]
+
+    def __init__(self):
+        super().__init__(batch_size=1)
+        self.reset()
+
+    def reset(self):
+        self.tracks = np.empty((0, 2))
+        self.ids = []
+
+    def preprocess(self, image, detections, metadata):
+        if len(detections) == 0:
+            return {"xy": np.empty((0, 2))}
+        return {"xy": np.stack(detections.bbox_ltwh)[:, :2]}
+
+    def process(self, batch, detections, metadatas):
+        if len(detections) == 0:
+            return []
+        xy = batch["xy"][0].numpy()
+        track_ids = []
+        for point in xy:
+            distances = np.linalg.norm(self.tracks - point, axis=1)
+            if len(distances) and distances.min() < 15:
+                track = int(distances.argmin())
+                self.tracks[track] = point
+            else:
+                track = len(self.tracks)
+                self.tracks = np.vstack([self.tracks, point])
+            track_ids.append(track)
+        return pd.DataFrame({"track_id": track_ids}, index=detections.index)
+
+
+def make_tracking_set(root: Path, n_frames: int):
+    image_metadatas = []
+    for frame in range(n_frames):
+        file_path = root / f"{frame:06d}.jpg"
+        image = np.full((360, 640, 3), frame % 255, dtype=np.uint8)
+        cv2.imwrite(str(file_path), image)
+        image_metadatas.append(dict(id=frame, video_id=0, frame=frame, file_path=str(file_path)))
+    image_metadatas = pd.DataFrame(image_metadatas).set_index("id", drop=False)
+    video_metadatas = pd.DataFrame([dict(id=0, name="synthetic", nframes=n_frames)]).set_index("id")
+    return TrackingSet(video_metadatas, image_metadatas, pd.DataFrame(), pd.DataFrame(columns=["video_id"]))
+
+
+def run(engine_class, tracking_set, args, **engine_kwargs):
+    modules = [
+        SyntheticDetector(args.batch_size, args.detector_ms / 1000, args.dets),
+        SyntheticReId(64, args.reid_ms / 1000 / args.dets),
+        SyntheticTracker(),
+    ]
+    pipeline = Pipeline(modules)
+    tracker_state = TrackerState(tracking_set, pipeline=pipeline)
+    engine = engine_class(
+        modules=pipeline, tracker_state=tracker_state, num_workers=args.num_workers,
+        callbacks={}, **engine_kwargs
+    )
+    start = time.perf_counter()
+    engine.track_dataset()
+    fps = len(tracking_set.image_metadatas) / (time.perf_counter() - start)
+    return tracker_state.detections_pred, fps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--dets", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--detector-ms", type=float, default=20., help="latency per image")
+    parser.add_argument("--reid-ms", type=float, default=10., help="latency per image")
+    parser.add_argument("--num-workers", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        tracking_set = make_tracking_set(Path(root), args.frames)
+        offline, offline_fps = run(OfflineTrackingEngine, tracking_set, args)
+        pipelined, pipelined_fps = run(PipelinedTrackingEngine, tracking_set, args)
+
+    columns = ["image_id", "bbox_conf", "track_id"]
+    identical = (
+        offline.index.equals(pipelined.index)
+        and offline[columns].equals(pipelined[columns])
+        and all(np.array_equal(a, b, equal_nan=True) for a, b in zip(offline.embeddings, pipelined.embeddings))
+    )
+    print(f"{args.frames} frames, {args.dets} detections/frame")
+    print(f"OfflineTrackingEngine   : {offline_fps:7.2f} FPS")
+    print(f"PipelinedTrackingEngine : {pipelined_fps:7.2f} FPS")
+    print(f"Identical outputs       : {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Time of the IoU costs of crowded frames, dense or restricted to the candidate
+pairs given by `tracklab.utils.spatial_grid`.
+
+The tracks and the detections of synthetic crowded frames (MOT20-like, a few hundred
+people of similar size) are matched on `1 - IoU` gated at `--cost-limit`, with the
+IoU of all the pairs (dense cost matrix) or of the pairs of intersecting boxes only
+(sparse cost matrix). Both must give the same matches.
+
+Usage:
+    python benchmarks/spatial_grid.py --sizes 50 150 300 600 --repeat 20
+"""
+import argparse
+import timeit
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from tracklab.utils.assignment import linear_assignment
+from tracklab.utils.spatial_grid import candidate_pairs
+
+
+def crowd(n, rng):
+    """ltrb boxes of n tracks and of their n detections in a crowded 1920x1080 frame."""
+    ltwh = np.c_[rng.random((n, 2)) * [1860, 940], rng.normal(1, 0.1, (n, 1)) * [40, 110]]
+    detections = ltwh + rng.normal(size=ltwh.shape) * [6, 6, 2, 4]
+    detections = detections[rng.permutation(n)]
+    return (np.c_[ltwh[:, :2], ltwh[:, :2] + ltwh[:, 2:]],
+            np.c_[detections[:, :2], detections[:, :2] + detections[:, 2:]])
+
+
+def pair_ious(boxes_a, boxes_b):
+    """IoU of each row of boxes_a and the same row of boxes_b (broadcasted)."""
+    lt = np.maximum(boxes_a[..., :2], boxes_b[..., :2])
+    rb = np.minimum(boxes_a[..., 2:], boxes_b[..., 2:])
+    intersection = np.prod(np.clip(rb - lt, 0, None), axis=-1)
+    area_a = np.prod(boxes_a[..., 2:] - boxes_a[..., :2], axis=-1)
+    area_b = np.prod(boxes_b[..., 2:] - boxes_b[..., :2], axis=-1)
+    return intersection / (area_a + area_b - intersection)
+
+
+def dense_costs(tracks, detections):
+    return 1 - pair_ious(tracks[:, None], detections[None])
+
+
+def sparse_costs(tracks, detections):
+    rows, cols = candidate_pairs(tracks, detections)
+    return csr_matrix((1 - pair_ious(tracks[rows], detections[cols]), (rows, cols)),
+                      shape=(len(tracks), len(detections)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 150, 300, 600])
+    parser.add_argument("--cost-limit", type=float, default=0.8)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'size':>9} {'pairs':>8} {'dense costs':>12} {'grid costs':>11} "
+          f"{'dense total':>12} {'grid total':>11}")
+    for n in args.sizes:
+        tracks, detections = crowd(n, rng)
+        dense = dense_costs(tracks, detections)
+        sparse = sparse_costs(tracks, detections)
+        dense_matches = linear_assignment(dense, args.cost_limit)[0]
+        sparse_matches = linear_assignment(sparse, args.cost_limit)[0]
+        assert np.array_equal(dense_matches, sparse_matches), "the grid changed the matches"
+
+        def time(function):
+            return min(timeit.repeat(function, number=args.repeat, repeat=3)) / args.repeat
+
+        timings = [
+            time(lambda: dense_costs(tracks, detections)),
+            time(lambda: sparse_costs(tracks, detections)),
+            time(lambda: linear_assignment(dense_costs(tracks, detections), args.cost_limit)),
+            time(lambda: linear_assignment(sparse_costs(tracks, detections), args.cost_limit)),
+        ]
+        print(f"{f'{n}x{n}':>9} {sparse.nnz:8d} {1e3 * timings[0]:10.2f}ms {1e3 * timings[1]:9.2f}ms "
+              f"{1e3 * timings[2]:10.2f}ms {1e3 * timings[3]:9.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Peak memory and per-frame cost of the reid outputs of a long video.
+
+Builds the detections of a video with BPBReId-like outputs (`embeddings`,
+`visibility_scores` and `body_masks` for every detection) and saves them as a pickle
+(.pklz format) and in the Arrow format. Each variant then reloads the detections in
+a fresh process (only the columns used by the tracker for the Arrow format) and feeds the tracker inputs of every frame, the way
+`BPBReIDStrongSORT.preprocess` does, reporting the load time, the time spent stacking
+the arrays of each frame and the peak RSS of the process.
+
+Usage:
+    python benchmarks/tensor_columns.py --frames 750 --dets 20
+"""
+import argparse
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from tracklab.datastruct import DetectionStore
+from tracklab.datastruct.arrow_state import ArrowStateFile
+from tracklab.datastruct.tensor_column import stack_column, tensor_column
+
+VARIANTS = {
+    "pickle + np.stack": ("pickle", False),
+    "arrow + stack_column": ("arrow", False),
+    "arrow mmap + stack_column": ("arrow_mmap", True),
+}
+
+
+def make_detections(frames, dets_per_frame, parts, dim, batch_size=64):
+    rng = np.random.default_rng(0)
+    n = frames * dets_per_frame
+    store = DetectionStore.from_dataframe(pd.DataFrame({
+        "image_id": np.repeat(np.arange(frames), dets_per_frame),
+        "video_id": 0,
+        "bbox_ltwh": tensor_column(rng.random((n, 4)) * 100),
+    }))
+    for start in range(0, n, batch_size):  # outputs of the reid model, batch per batch
+        ids = np.arange(start, min(start + batch_size, n))
+        store.update(pd.DataFrame({
+            "embeddings": tensor_column(rng.random((len(ids), parts, dim), dtype=np.float32)),
+            "visibility_scores": tensor_column(rng.random((len(ids), parts), dtype=np.float32)),
+            "body_masks": tensor_column(rng.random((len(ids), parts, 64, 32), dtype=np.float32)),
+        }, index=ids))
+    return store.to_dataframe()
+
+
+def peak_rss_mb():
+    with open("/proc/self/status") as fp:  # Linux only, unlike ru_maxrss it isn't inherited
+        for line in fp:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def run_variant(root: Path, variant: str):
+    storage, zero_copy = VARIANTS[variant]
+    start = time.perf_counter()
+    if storage == "pickle":
+        with open(root / "detections.pkl", "rb") as fp:
+            detections = pickle.load(fp)
+    else:
+        state = ArrowStateFile(root / "state.arrow", mmap_tensors=storage == "arrow_mmap")
+        detections = state.read_dataframe("0.arrow", ["image_id", "embeddings", "visibility_scores"])
+    load = time.perf_counter() - start
+    stack = stack_column if zero_copy or storage == "arrow" else np.stack
+    start = time.perf_counter()
+    total = 0.
+    for _, frame in detections.groupby("image_id", sort=False):
+        reid_features = stack(frame.embeddings)
+        visibility_scores = stack(frame.visibility_scores)
+        total += reid_features[:, 0, 0].sum() + visibility_scores[:, 0].sum()
+    iterate = time.perf_counter() - start
+    peak_rss = peak_rss_mb()
+    print(f"{variant:>26} : load {1000 * load:8.1f}ms, frames {1000 * iterate:8.1f}ms, "
+          f"peak RSS {peak_rss:8.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=750)
+    parser.add_argument("--dets", type=int, default=20)
+    parser.add_argument("--parts", type=int, default=6)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--variant", choices=list(VARIANTS), help=argparse.SUPPRESS)
+    parser.add_argument("--root", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant is not None:
+        run_variant(Path(args.root), args.variant)
+        return
+
+    with tempfile.TemporaryDirectory() as root:
+        root = Path(root)
+        detections = make_detections(args.frames, args.dets, args.parts, args.dim)
+        with open(root / "detections.pkl", "wb") as fp:
+            pickle.dump(detections, fp, protocol=pickle.DEFAULT_PROTOCOL)
+        ArrowStateFile(root / "state.arrow", mode="w").write_dataframe("0.arrow", detections)
+        size = (root / "detections.pkl").stat().st_size / 2 ** 20
+        print(f"{args.frames} frames, {args.dets} detections/frame, {size:.0f}MB of detections")
+        del detections
+        for variant in VARIANTS:
+            subprocess.run(
+                [sys.executable, __file__, "--variant", variant, "--root", str(root)],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
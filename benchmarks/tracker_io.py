@@ -0,0 +1,102 @@
+"""Per-frame overhead of the tracker wrappers around the tracker itself.
+
+Compares the previous per-row preprocessing of the tracker wrappers (`iterrows` and
+`detection.bbox.ltrb()` for each detection, `ltrb_to_ltwh` for each result) with the
+vectorized `tracker_input`/`tracker_output` adapter, and checks that both give the
+same results. The tracker is replaced by a function returning every detection of the
+frame as a track, in the OC-SORT format `[l, t, r, b, track_id, class, conf, idx]`.
+
+Usage:
+    python benchmarks/tracker_io.py --dets 10 50 200 --frames 200
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from tracklab.utils.coordinates import ltrb_to_ltwh
+from tracklab.utils.tracker_io import tracker_input, tracker_output
+
+
+def make_frames(frames, dets, rng):
+    n = frames * dets
+    ltwh = np.concatenate([rng.random((n, 2)) * 1800, rng.random((n, 2)) * 300 + 1], axis=1)
+    detections = pd.DataFrame({
+        "image_id": np.repeat(np.arange(frames), dets),
+        "bbox_ltwh": list(ltwh),
+        "bbox_conf": rng.random(n),
+        "category_id": 1,
+    })
+    return [frame for _, frame in detections.groupby("image_id")]
+
+
+def fake_tracker(inputs):
+    n = len(inputs)
+    return np.column_stack([inputs[:, :4], np.arange(n), inputs[:, 5], inputs[:, 4], inputs[:, 6]])
+
+
+def per_row_input(detections):
+    processed_detections = []
+    for det_id, detection in detections.iterrows():
+        ltrb = detection.bbox.ltrb()
+        conf = detection.bbox.conf()
+        processed_detections.append(
+            np.array([*ltrb, conf, detection.category_id, int(detection.name)])
+        )
+    return np.stack(processed_detections)
+
+
+def per_row_output(results, detections):
+    results = np.asarray(results)
+    track_bbox_ltwh = [ltrb_to_ltwh(x) for x in results[:, :4]]
+    idxs = list(results[:, 7].astype(int))
+    assert set(idxs).issubset(detections.index)
+    results = pd.DataFrame({
+        "track_bbox_ltwh": track_bbox_ltwh,
+        "track_bbox_conf": list(results[:, 6]),
+        "track_id": list(results[:, 4]),
+        "idxs": idxs,
+    })
+    results.set_index("idxs", inplace=True, drop=True)
+    return results
+
+
+def run(frames, to_input, to_output):
+    outputs = []
+    input_time = output_time = 0.
+    for detections in frames:
+        start = time.perf_counter()
+        inputs = to_input(detections)
+        input_time += time.perf_counter() - start
+        results = fake_tracker(inputs)
+        start = time.perf_counter()
+        outputs.append(to_output(results, detections))
+        output_time += time.perf_counter() - start
+    return outputs, input_time / len(frames), output_time / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dets", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'detections':>10} {'variant':>10} {'input':>10} {'output':>10} {'speedup':>8}")
+    for dets in args.dets:
+        frames = make_frames(args.frames, dets, rng)
+        old, old_in, old_out = run(frames, per_row_input, per_row_output)
+        new, new_in, new_out = run(frames, tracker_input, tracker_output)
+        for expected, result in zip(old, new):
+            assert (expected.index == result.index).all()
+            assert np.array_equal(np.stack(expected.track_bbox_ltwh), np.stack(result.track_bbox_ltwh))
+            assert np.array_equal(expected.track_bbox_conf, result.track_bbox_conf)
+            assert np.array_equal(expected.track_id, result.track_id)
+        print(f"{dets:>10} {'per row':>10} {1e3 * old_in:8.2f}ms {1e3 * old_out:8.2f}ms")
+        print(f"{dets:>10} {'adapter':>10} {1e3 * new_in:8.2f}ms {1e3 * new_out:8.2f}ms "
+              f"{(old_in + old_out) / (new_in + new_out):7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Time of the TrackEval evaluation of the tracking predictions.
+
+Compares the evaluation from the MOT Challenge files (the predictions and ground truth
+written by `save_for_eval`, then parsed back by TrackEval) with the in-memory
+evaluation of `TrackEvalEvaluator` (`in_memory: true`), on synthetic videos where the
+predictions are the noisy ground truth with some identity switches and false
+positives, and checks that both give the same metrics.
+
+Usage:
+    python benchmarks/trackeval_in_memory.py --videos 10 --frames 750 --objects 20 --parallel
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from omegaconf import OmegaConf
+
+from tracklab.datastruct import TrackingDataset, TrackingSet
+from tracklab.utils import wandb
+from tracklab.wrappers import TrackEvalEvaluator
+
+
+class SyntheticDataset(TrackingDataset):
+    def __init__(self, tracking_set):
+        super().__init__("", {"val": tracking_set})
+
+
+class State:
+    def __init__(self, tracking_set, detections_pred):
+        self.video_metadatas = tracking_set.video_metadatas
+        self.image_metadatas = tracking_set.image_metadatas
+        self.image_pred = tracking_set.image_metadatas.copy()
+        self.image_gt = tracking_set.image_metadatas.copy()
+        self.detections_gt = tracking_set.detections_gt
+        self.detections_pred = detections_pred
+
+
+def make_state(videos, frames, objects, rng):
+    video_metadatas = pd.DataFrame({"name": [f"video-{v:03d}" for v in range(videos)], "nframes": frames})
+    image_metadatas = pd.DataFrame({
+        "video_id": np.repeat(np.arange(videos), frames),
+        "frame": np.tile(np.arange(frames), videos),
+    })
+    image_ids = np.repeat(np.arange(videos * frames), objects)
+    track_ids = np.tile(np.arange(objects), videos * frames)
+    start = rng.random((videos, objects, 2)) * 1600
+    speed = rng.normal(size=(videos, objects, 2)) * 2
+    t = np.arange(frames)[None, :, None, None]
+    positions = (start[:, None] + speed[:, None] * t).reshape(-1, 2)
+    ltwh = np.concatenate([positions, np.full((len(positions), 2), [40., 100.])], axis=1)
+    detections_gt = pd.DataFrame({
+        "image_id": image_ids,
+        "video_id": image_metadatas.video_id.to_numpy()[image_ids],
+        "track_id": track_ids,
+        "bbox_ltwh": list(ltwh),
+        "bbox_conf": 1.,
+        "category_id": 1,
+    })
+
+    pred = detections_gt.sample(frac=0.9, random_state=0).sort_index()
+    ltwh = np.stack(pred.bbox_ltwh) + rng.normal(size=(len(pred), 4)) * 3
+    switched = rng.random(len(pred)) < 0.02
+    n_fp = len(pred) // 20
+    fp_images = rng.integers(0, len(image_metadatas), n_fp)
+    detections_pred = pd.concat([
+        pred.assign(
+            bbox_ltwh=list(ltwh),
+            track_id=np.where(switched, pred.track_id + objects, pred.track_id),
+            bbox_conf=rng.random(len(pred)),
+        ),
+        pd.DataFrame({
+            "image_id": fp_images,
+            "video_id": image_metadatas.video_id.to_numpy()[fp_images],
+            "track_id": 2 * objects + np.arange(n_fp),
+            "bbox_ltwh": list(np.concatenate([rng.random((n_fp, 2)) * 1600, np.full((n_fp, 2), 50.)], axis=1)),
+            "bbox_conf": rng.random(n_fp),
+            "category_id": 1,
+        }),
+    ], ignore_index=True)
+    tracking_set = TrackingSet(video_metadatas, image_metadatas, detections_gt)
+    return SyntheticDataset(tracking_set), State(tracking_set, detections_pred)
+
+
+def evaluate(dataset, state, folder, in_memory, parallel):
+    cfg = OmegaConf.create({
+        "save_gt": True,
+        "in_memory": in_memory,
+        "bbox_column_for_eval": "bbox_ltwh",
+        "metrics": ["HOTA", "CLEAR", "Identity"],
+        "eval": {"USE_PARALLEL": parallel, "NUM_PARALLEL_CORES": 8, "PRINT_RESULTS": False,
+                 "OUTPUT_SUMMARY": False, "OUTPUT_DETAILED": False, "PLOT_CURVES": False},
+        "dataset": {"dataset_class": "MotChallenge2DBox", "GT_FOLDER": str(folder / "gt"),
+                    "GT_LOC_FORMAT": "{gt_folder}/{seq}.txt", "TRACKERS_FOLDER": str(folder / "pred"),
+                    "TRACKER_SUB_FOLDER": "", "SPLIT_TO_EVAL": "val", "PRINT_CONFIG": False,
+                    "DO_PREPROC": False},
+    })
+    evaluator = TrackEvalEvaluator(cfg, "val", False, "", dataset)
+    start = time.perf_counter()
+    results = evaluator.run(state)
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--videos", type=int, default=10)
+    parser.add_argument("--frames", type=int, default=750)
+    parser.add_argument("--objects", type=int, default=20)
+    parser.add_argument("--parallel", action="store_true")
+    args = parser.parse_args()
+
+    wandb.init(OmegaConf.create({"use_wandb": False}))
+    dataset, state = make_state(args.videos, args.frames, args.objects, np.random.default_rng(0))
+    with tempfile.TemporaryDirectory() as folder:
+        files, files_time = evaluate(dataset, state, Path(folder) / "files", False, args.parallel)
+        memory, memory_time = evaluate(dataset, state, Path(folder) / "memory", True, args.parallel)
+
+    combined_files = files["COMBINED_SEQ"]["pedestrian"]
+    combined_memory = memory["COMBINED_SEQ"]["pedestrian"]
+    for family, metrics in combined_files.items():
+        for name, value in metrics.items():
+            assert np.array_equal(value, combined_memory[family][name]), f"{name} differs in memory"
+    hota = combined_memory["HOTA"]
+    print(f"HOTA {100 * np.mean(hota['HOTA']):.2f}, MOTA {100 * combined_memory['CLEAR']['MOTA']:.2f}, "
+          f"IDF1 {100 * combined_memory['Identity']['IDF1']:.2f}")
+    print(f"{'files':>10} {files_time:8.2f}s")
+    print(f"{'in memory':>10} {memory_time:8.2f}s {files_time / memory_time:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
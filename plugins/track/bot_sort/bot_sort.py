@@ -1,11 +1,13 @@
 import numpy as np
+import torch
 from collections import deque
 
 from . import matching
-from .gmc import GMC
 from .basetrack import BaseTrack, TrackState
 from .kalman_filter import KalmanFilter
 
+from tracklab.utils.feature_cache import cached_rows, content_hash, file_hash
+
 # from fast_reid.fast_reid_interfece import FastReIDInterface
 
 from deep_oc_sort.reid_multibackend import ReIDDetectMultiBackend
@@ -93,18 +95,23 @@ class STrack(BaseTrack):
     @staticmethod
     def multi_gmc(stracks, H=np.eye(2, 3)):
         if len(stracks) > 0:
-            multi_mean = np.asarray([st.mean.copy() for st in stracks])
+            multi_mean = np.asarray([st.mean for st in stracks])
             multi_covariance = np.asarray([st.covariance for st in stracks])
-
-            R = H[:2, :2]
-            R8x8 = np.kron(np.eye(4, dtype=float), R)
-            t = H[:2, 2]
-
+            multi_mean, multi_covariance = STrack.shared_kalman.warp(multi_mean, multi_covariance, H)
             for i, (mean, cov) in enumerate(zip(multi_mean, multi_covariance)):
-                mean = R8x8.dot(mean)
-                mean[:2] += t
-                cov = R8x8.dot(cov).dot(R8x8.transpose())
+                stracks[i].mean = mean
+                stracks[i].covariance = cov
 
+    @staticmethod
+    def multi_update(stracks, new_tracks):
+        """Run the Kalman filter update of the matched `stracks` with their `new_tracks`,
+        all at once, before their `update` or `re_activate`."""
+        if len(stracks) > 0:
+            multi_mean = np.asarray([st.mean for st in stracks])
+            multi_covariance = np.asarray([st.covariance for st in stracks])
+            measurements = np.asarray([STrack.tlwh_to_xywh(t.tlwh) for t in new_tracks])
+            multi_mean, multi_covariance = STrack.shared_kalman.update(multi_mean, multi_covariance, measurements)
+            for i, (mean, cov) in enumerate(zip(multi_mean, multi_covariance)):
                 stracks[i].mean = mean
                 stracks[i].covariance = cov
 
@@ -123,8 +130,7 @@ class STrack(BaseTrack):
         self.start_frame = frame_id
 
     def re_activate(self, new_track, frame_id, new_id=False):
-
-        self.mean, self.covariance = self.kalman_filter.update(self.mean, self.covariance, self.tlwh_to_xywh(new_track.tlwh))
+        # the Kalman filter was updated with new_track by multi_update
         if new_track.curr_feat is not None:
             self.update_features(new_track.curr_feat)
         self.tracklet_len = 0
@@ -150,9 +156,7 @@ class STrack(BaseTrack):
         self.frame_id = frame_id
         self.tracklet_len += 1
 
-        new_tlwh = new_track.tlwh
-
-        self.mean, self.covariance = self.kalman_filter.update(self.mean, self.covariance, self.tlwh_to_xywh(new_tlwh))
+        # the Kalman filter was updated with new_track by multi_update
 
         if new_track.curr_feat is not None:
             self.update_features(new_track.curr_feat)
@@ -243,7 +247,6 @@ class BoTSORT(object):
                 match_thresh:float = 0.8,
                 proximity_thresh:float = 0.5,
                 appearance_thresh:float = 0.25,
-                cmc_method:str = 'sparseOptFlow',
                 frame_rate=30,
                 lambda_=0.985
                 ):
@@ -269,10 +272,22 @@ class BoTSORT(object):
         self.match_thresh = match_thresh
 
         self.model = ReIDDetectMultiBackend(weights=model_weights, device=device, fp16=fp16)
+        # identifies the reid model in the keys of the feature cache
+        self.features_key = content_hash("ReIDDetectMultiBackend", file_hash(model_weights), fp16,
+                                         *self.model.inference.key())
+
+    def camera_update(self, warp):
+        """Apply the camera motion from the previous frame, a 2x3 affine `warp` of the
+        image (see `tracklab.utils.camera_motion.CameraMotion`), to all the tracks."""
+        STrack.multi_gmc(joint_stracks(self.tracked_stracks, self.lost_stracks), warp)
 
-        self.gmc = GMC(method=cmc_method, verbose=[None,False])
+    def update(self, output_results, img, compensate_camera_motion=None):
+        """Track the detections `output_results` of the frame `img`.
 
-    def update(self, output_results, img):
+        If given, `compensate_camera_motion(tracker)` applies the camera motion of the
+        frame to the tracks of the tracker. It is called after extracting the features
+        of the detections, which can overlap with the estimation of the motion.
+        """
         self.frame_id += 1
         activated_starcks = []
         refind_stracks = []
@@ -338,9 +353,8 @@ class BoTSORT(object):
         STrack.multi_predict(strack_pool)
 
         # Fix camera motion
-        warp = self.gmc.apply(img, dets)
-        STrack.multi_gmc(strack_pool, warp)
-        STrack.multi_gmc(unconfirmed, warp)
+        if compensate_camera_motion is not None:
+            compensate_camera_motion(self)
 
         # Associate with high score detection boxes
         raw_emb_dists = matching.embedding_distance(strack_pool, detections)
@@ -368,6 +382,7 @@ class BoTSORT(object):
     
         matches, u_track, u_detection = matching.linear_assignment(dists, thresh=self.match_thresh)
 
+        STrack.multi_update([strack_pool[i] for i, _ in matches], [detections[j] for _, j in matches])
         for itracked, idet in matches:
             track = strack_pool[itracked]
             det = detections[idet]
@@ -400,8 +415,9 @@ class BoTSORT(object):
             detections_second = []
 
         r_tracked_stracks = [strack_pool[i] for i in u_track if strack_pool[i].state == TrackState.Tracked]
-        dists = matching.iou_distance(r_tracked_stracks, detections_second)
+        dists = matching.sparse_iou_distance(r_tracked_stracks, detections_second)
         matches, u_track, u_detection_second = matching.linear_assignment(dists, thresh=0.5)
+        STrack.multi_update([r_tracked_stracks[i] for i, _ in matches], [detections_second[j] for _, j in matches])
         for itracked, idet in matches:
             track = r_tracked_stracks[itracked]
             det = detections_second[idet]
@@ -432,6 +448,7 @@ class BoTSORT(object):
         dists = np.minimum(ious_dists, emb_dists)
     
         matches, u_unconfirmed, u_detection = matching.linear_assignment(dists, thresh=0.7)
+        STrack.multi_update([unconfirmed[i] for i, _ in matches], [detections[j] for _, j in matches])
         for itracked, idet in matches:
             unconfirmed[itracked].update(detections[idet], self.frame_id)
             activated_starcks.append(unconfirmed[itracked])
@@ -499,7 +516,11 @@ class BoTSORT(object):
             im = ori_img[y1:y2, x1:x2]
             im_crops.append(im)
         if im_crops:
-            features = self.model(im_crops)
+            features = torch.from_numpy(cached_rows(
+                len(im_crops),
+                lambda i: content_hash(self.features_key, im_crops[i]),
+                lambda idxs: {"features": self.model([im_crops[i] for i in idxs]).cpu().numpy()},
+            )["features"])
         else:
             features = np.array([])
         return features
@@ -530,8 +551,9 @@ def sub_stracks(tlista, tlistb):
 
 
 def remove_duplicate_stracks(stracksa, stracksb):
-    pdist = matching.iou_distance(stracksa, stracksb)
-    pairs = np.where(pdist < 0.15)
+    pdist = matching.sparse_iou_distance(stracksa, stracksb)
+    duplicate = pdist.data < 0.15
+    pairs = (pdist.row[duplicate], pdist.col[duplicate])
     dupa, dupb = list(), list()
     for p, q in zip(*pairs):
         timep = stracksa[p].frame_id - stracksa[p].start_frame
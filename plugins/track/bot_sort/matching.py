@@ -1,8 +1,9 @@
 import numpy as np
 import scipy
-import lap
 from scipy.spatial.distance import cdist
 
+from tracklab.utils import assignment
+from tracklab.utils.spatial_grid import candidate_pairs
 from . import kalman_filter
 
 
@@ -35,17 +36,7 @@ def _indices_to_matches(cost_matrix, indices, thresh):
 
 
 def linear_assignment(cost_matrix, thresh):
-    if cost_matrix.size == 0:
-        return np.empty((0, 2), dtype=int), tuple(range(cost_matrix.shape[0])), tuple(range(cost_matrix.shape[1]))
-    matches, unmatched_a, unmatched_b = [], [], []
-    cost, x, y = lap.lapjv(cost_matrix, extend_cost=True, cost_limit=thresh)
-    for ix, mx in enumerate(x):
-        if mx >= 0:
-            matches.append([ix, mx])
-    unmatched_a = np.where(x < 0)[0]
-    unmatched_b = np.where(y < 0)[0]
-    matches = np.asarray(matches)
-    return matches, unmatched_a, unmatched_b
+    return assignment.linear_assignment(cost_matrix, cost_limit=thresh)
 
 
 def ious(atlbrs, btlbrs):
@@ -60,10 +51,12 @@ def ious(atlbrs, btlbrs):
     if ious.size == 0:
         return ious
 
-    ious = bbox_ious(
-        np.ascontiguousarray(atlbrs, dtype=np.float32),
-        np.ascontiguousarray(btlbrs, dtype=np.float32)
-    )
+    atlbrs = np.ascontiguousarray(atlbrs, dtype=np.float32)
+    btlbrs = np.ascontiguousarray(btlbrs, dtype=np.float32)
+    # only the pairs of overlapping boxes have a non-zero IoU, the boxes including
+    # their last pixel as in bbox_ious
+    rows, cols = candidate_pairs(atlbrs, btlbrs, margin=1)
+    ious[rows, cols] = pair_ious(atlbrs[rows], btlbrs[cols])
 
     return ious
 
@@ -103,6 +96,33 @@ def iou_distance(atracks, btracks):
     return cost_matrix
 
 
+def sparse_iou_distance(atracks, btracks):
+    """
+    Same as iou_distance, with only the costs of the pairs of overlapping boxes stored
+    in a sparse matrix. The other pairs, which cost 1, are infeasible for
+    linear_assignment with any threshold below 1
+    :type atracks: list[STrack]
+    :type btracks: list[STrack]
+
+    :rtype cost_matrix scipy.sparse.coo_matrix
+    """
+
+    if (len(atracks)>0 and isinstance(atracks[0], np.ndarray)) or (len(btracks) > 0 and isinstance(btracks[0], np.ndarray)):
+        atlbrs = atracks
+        btlbrs = btracks
+    else:
+        atlbrs = [track.tlbr for track in atracks]
+        btlbrs = [track.tlbr for track in btracks]
+    atlbrs = np.ascontiguousarray(atlbrs, dtype=np.float32).reshape(-1, 4)
+    btlbrs = np.ascontiguousarray(btlbrs, dtype=np.float32).reshape(-1, 4)
+    if len(atlbrs) == 0 or len(btlbrs) == 0:
+        rows = cols = np.empty(0, dtype=int)
+    else:
+        rows, cols = candidate_pairs(atlbrs, btlbrs, margin=1)
+    cost = 1 - pair_ious(atlbrs[rows], btlbrs[cols])
+
+    return scipy.sparse.coo_matrix((cost, (rows, cols)), shape=(len(atlbrs), len(btlbrs)))
+
 def v_iou_distance(atracks, btracks):
     """
     Compute cost based on IoU
@@ -149,10 +169,10 @@ def gate_cost_matrix(kf, cost_matrix, tracks, detections, only_position=False):
     gating_threshold = kalman_filter.chi2inv95[gating_dim]
     # measurements = np.asarray([det.to_xyah() for det in detections])
     measurements = np.asarray([det.to_xywh() for det in detections])
-    for row, track in enumerate(tracks):
-        gating_distance = kf.gating_distance(
-            track.mean, track.covariance, measurements, only_position)
-        cost_matrix[row, gating_distance > gating_threshold] = np.inf
+    gating_distance = kf.gating_distance(
+        np.asarray([track.mean for track in tracks]), np.asarray([track.covariance for track in tracks]),
+        measurements, only_position)
+    cost_matrix[gating_distance > gating_threshold] = np.inf
     return cost_matrix
 
 
@@ -163,11 +183,11 @@ def fuse_motion(kf, cost_matrix, tracks, detections, only_position=False, lambda
     gating_threshold = kalman_filter.chi2inv95[gating_dim]
     # measurements = np.asarray([det.to_xyah() for det in detections])
     measurements = np.asarray([det.to_xywh() for det in detections])
-    for row, track in enumerate(tracks):
-        gating_distance = kf.gating_distance(
-            track.mean, track.covariance, measurements, only_position, metric='maha')
-        cost_matrix[row, gating_distance > gating_threshold] = np.inf
-        cost_matrix[row] = lambda_ * cost_matrix[row] + (1 - lambda_) * gating_distance
+    gating_distance = kf.gating_distance(
+        np.asarray([track.mean for track in tracks]), np.asarray([track.covariance for track in tracks]),
+        measurements, only_position, metric='maha')
+    cost_matrix[gating_distance > gating_threshold] = np.inf
+    cost_matrix[:] = lambda_ * cost_matrix + (1 - lambda_) * gating_distance
     return cost_matrix
 
 
@@ -188,6 +208,12 @@ def fuse_iou(cost_matrix, tracks, detections):
 def fuse_score(cost_matrix, detections):
     if cost_matrix.size == 0:
         return cost_matrix
+    if scipy.sparse.issparse(cost_matrix):
+        # the pairs which are not stored stay infeasible
+        cost_matrix = cost_matrix.tocoo()
+        det_scores = np.array([det.score for det in detections])
+        fuse_cost = 1 - (1 - cost_matrix.data) * det_scores[cost_matrix.col]
+        return scipy.sparse.coo_matrix((fuse_cost, (cost_matrix.row, cost_matrix.col)), shape=cost_matrix.shape)
     iou_sim = 1 - cost_matrix
     det_scores = np.array([det.score for det in detections])
     det_scores = np.expand_dims(det_scores, axis=0).repeat(cost_matrix.shape[0], axis=0)
@@ -231,4 +257,36 @@ def bbox_ious(boxes, query_boxes):
                         box_area - iw * ih
                     )
                     overlaps[n, k] = iw * ih / ua
-    return overlaps
\ No newline at end of file
+    return overlaps
+
+
+def pair_ious(boxes, query_boxes):
+    """
+    Same as bbox_ious for pairs of boxes
+    Parameters
+    ----------
+    boxes: (N, 4) ndarray of float
+    query_boxes: (N, 4) ndarray of float
+    Returns
+    -------
+    overlaps: (N,) ndarray of overlap between each box and the same row of query_boxes
+    """
+    # as with the scalars of bbox_ious, the differences of the float32 coordinates
+    # are computed in float32, and the rest in float64
+    iw = (np.minimum(boxes[:, 2], query_boxes[:, 2]) -
+          np.maximum(boxes[:, 0], query_boxes[:, 0])).astype(np.float64) + 1
+    ih = (np.minimum(boxes[:, 3], query_boxes[:, 3]) -
+          np.maximum(boxes[:, 1], query_boxes[:, 1])).astype(np.float64) + 1
+    box_area = (
+        ((query_boxes[:, 2] - query_boxes[:, 0]).astype(np.float64) + 1) *
+        ((query_boxes[:, 3] - query_boxes[:, 1]).astype(np.float64) + 1)
+    )
+    ua = (
+        ((boxes[:, 2] - boxes[:, 0]).astype(np.float64) + 1) *
+        ((boxes[:, 3] - boxes[:, 1]).astype(np.float64) + 1) +
+        box_area - iw * ih
+    )
+    overlaps = np.zeros(len(boxes), dtype=np.float32)
+    overlapping = (iw > 0) & (ih > 0)
+    overlaps[overlapping] = iw[overlapping] * ih[overlapping] / ua[overlapping]
+    return overlaps
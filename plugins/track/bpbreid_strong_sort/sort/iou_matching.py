@@ -1,6 +1,7 @@
 # vim: expandtab:ts=4:sw=4
 from __future__ import absolute_import
 import numpy as np
+from tracklab.utils.spatial_grid import candidate_pairs
 from . import linear_assignment
 
 
@@ -39,6 +40,21 @@ def iou(bbox, candidates):
     return area_intersection / (area_bbox + area_candidates - area_intersection)
 
 
+def pair_iou(bboxes, candidates):
+    """Same as :func:`iou` for pairs of boxes: the intersection over union of each
+    row of `bboxes` and the same row of `candidates`, both in format
+    `(top left x, top left y, width, height)`.
+    """
+    tl = np.maximum(bboxes[:, :2], candidates[:, :2])
+    br = np.minimum(bboxes[:, :2] + bboxes[:, 2:], candidates[:, :2] + candidates[:, 2:])
+    wh = np.maximum(0., br - tl)
+
+    area_intersection = wh.prod(axis=1)
+    area_bboxes = bboxes[:, 2:].prod(axis=1)
+    area_candidates = candidates[:, 2:].prod(axis=1)
+    return area_intersection / (area_bboxes + area_candidates - area_intersection)
+
+
 def iou_cost(tracks, detections, track_indices=None,
              detection_indices=None):
     """An intersection over union distance metric.
@@ -69,10 +85,15 @@ def iou_cost(tracks, detections, track_indices=None,
     if detection_indices is None:
         detection_indices = np.arange(len(detections))
 
-    cost_matrix = np.zeros((len(track_indices), len(detection_indices)))
-    for row, track_idx in enumerate(track_indices):
-        bbox = tracks[track_idx].to_ltwh()
-        candidates = np.asarray(
-            [detections[i].to_ltwh() for i in detection_indices])
-        cost_matrix[row, :] = 1. - iou(bbox, candidates)
+    cost_matrix = np.ones((len(track_indices), len(detection_indices)))
+    if len(track_indices) == 0 or len(detection_indices) == 0:
+        return cost_matrix
+    bboxes = np.asarray([tracks[i].to_ltwh() for i in track_indices], dtype=float).reshape(-1, 4)
+    candidates = np.asarray(
+        [detections[i].to_ltwh() for i in detection_indices], dtype=float).reshape(-1, 4)
+    # only the pairs of intersecting boxes have a non-zero IoU
+    rows, cols = candidate_pairs(
+        np.c_[bboxes[:, :2], bboxes[:, :2] + bboxes[:, 2:]],
+        np.c_[candidates[:, :2], candidates[:, :2] + candidates[:, 2:]])
+    cost_matrix[rows, cols] = 1. - pair_iou(bboxes[rows], candidates[cols])
     return cost_matrix
@@ -93,53 +93,53 @@ def _nn_cosine_distance(x, y):
     return distances.min(axis=0)
 
 
-def _nn_part_based(y, x, normalize_features=True):
-    """ Helper function for nearest neighbor distance metric (cosine).
+def _nn_part_based_batched(x_features, x_visibility_scores, y):
+    """ Part-based distance (cosine) of T targets to M detections at once.
 
     Parameters
     ----------
-    x : ndarray
-        A matrix of N row-vectors (sample points).
-    y : ndarray
-        A matrix of M row-vectors (query points).
+    x_features : ndarray
+        A (T, P, D) array of the normalized part-based features of one sample of
+        each target.
+    x_visibility_scores : ndarray
+        A (T, P) array of the visibility scores of these samples.
+    y : Dict[str, ndarray]
+        The 'reid_features' and 'visibility_scores' of the M detections.
 
     Returns
     -------
     ndarray
-        A vector of length M that contains for each entry in `y` the
-        smallest cosine distance to a sample in `x`.
+        A (T, M) matrix of the distances of each target to each detection.
 
     """
-    x_features = torch.from_numpy(x['reid_features'])
-    x_visibility_scores = torch.from_numpy(x['visibility_scores'])
-    y_features = torch.from_numpy(y[-1]['reid_features'])
-    y_visibility_scores = torch.from_numpy(y[-1]['visibility_scores'])
-    if normalize_features:
-        """Features are normalized here, which is not the most efficient since a given tracklet features will be normalized multiple times.
-        It is not done before because we want to do the exponential moving average (EMA) aggregation of tracklets features on the un-normalized features
-        and then normalize after. If normalization was done before EMA, the averaged features would not be normalized 
-        anymore and we would therefore pass un-normalized features to 'compute_distance_matrix_using_bp_features'."""
-        x_features = F.normalize(x_features, p=2, dim=-1)
-        y_features = F.normalize(y_features, p=2, dim=-1)
-    distances = compute_distance_matrix_using_bp_features(y_features.unsqueeze(0),
-                                                          x_features,
-                                                          y_visibility_scores.unsqueeze(0),
-                                                          x_visibility_scores,
+    y_features = F.normalize(torch.from_numpy(y['reid_features']), p=2, dim=-1)
+    distances = compute_distance_matrix_using_bp_features(torch.from_numpy(x_features),
+                                                          y_features,
+                                                          torch.from_numpy(x_visibility_scores),
+                                                          torch.from_numpy(y['visibility_scores']),
                                                           use_gpu=False,
                                                           )
-    distances = distances[0] / 2    # When feature are normalized, the above function returns distances within [0, 2]
-    # TODO handle invalid distances
-    return distances.mean(axis=0)
+    # When feature are normalized, the above function returns distances within [0, 2]
+    distances = distances[0].numpy() / 2
+    # the invalid distances (e.g. without any part visible in both) are never matched
+    distances[~np.isfinite(distances)] = np.inf
+    return distances
 
 
 class NearestNeighborDistanceMetric(object):
     """
     A nearest neighbor distance metric that, for each target, returns
     the closest distance to any sample that has been observed so far.
+
+    The samples are kept in a gallery of preallocated arrays, with a ring buffer
+    of `budget` samples per target and the write head of each target : adding
+    the samples of a frame and computing the part-based distance of all the
+    targets to all the detections are single array operations. The part-based
+    features are normalized once, when they are added to the gallery.
     Parameters
     ----------
     metric : str
-        Either "euclidean" or "cosine".
+        Either "euclidean", "cosine" or "part_based".
     matching_threshold: float
         The matching threshold. Samples with larger distance are considered an
         invalid match.
@@ -154,18 +154,43 @@ class NearestNeighborDistanceMetric(object):
     """
 
     def __init__(self, metric, matching_threshold, budget=None):
+        # the part-based distance is computed for all the targets at once, see distance
+        self._part_based = metric == "part_based"
         if metric == "euclidean":
             self._metric = _nn_euclidean_distance
         elif metric == "cosine":
             self._metric = _nn_cosine_distance
-        elif metric == "part_based":
-            self._metric = _nn_part_based
-        else:
+        elif not self._part_based:
             raise ValueError(
-                "Invalid metric; must be either 'euclidean' or 'cosine'")
+                "Invalid metric; must be either 'euclidean', 'cosine' or 'part_based'")
         self.matching_threshold = matching_threshold
         self.budget = budget
-        self.samples = {}
+        self._gallery = None  # feature name -> (rows, samples, ...) array, None for the plain features
+        self._rows = {}  # target -> row of the gallery
+        self._heads = np.zeros(0, dtype=int)  # slot of the next sample of each row
+        self._counts = np.zeros(0, dtype=int)  # number of samples of each row
+        self._free = []  # rows of the removed targets
+
+    @property
+    def samples(self):
+        samples = {}
+        for target, row in self._rows.items():
+            slots = self._slots(row)
+            if None in self._gallery:
+                samples[target] = list(self._gallery[None][row, slots])
+            else:
+                samples[target] = [{name: array[row, slot] for name, array in self._gallery.items()}
+                                   for slot in slots]
+        return samples
+
+    def _slots(self, row):
+        """Slots of the samples of a row, from the oldest to the most recent."""
+        count, head = self._counts[row], self._heads[row]
+        size = self._gallery_size()[1]
+        return (head - count + np.arange(count)) % size
+
+    def _gallery_size(self):
+        return next(iter(self._gallery.values())).shape[:2]
 
     def partial_fit(self, features, targets, active_targets):
         """Update the distance metric with new data.
@@ -179,11 +204,79 @@ class NearestNeighborDistanceMetric(object):
         active_targets : List[int]
             A list of targets that are currently present in the scene, i.e. confirmed tracks.
         """
-        for feature, target in zip(features, targets):
-            self.samples.setdefault(target, []).append(feature)  # in our case, only one feature per track
-            if self.budget is not None:
-                self.samples[target] = self.samples[target][-self.budget:]  # for each track, keep only the last 'budget' reid features
-        self.samples = {k: self.samples[k] for k in active_targets}  # keep only confirmed tracks
+        # keep only confirmed tracks, their rows are reused by the new ones
+        active_targets = set(active_targets)
+        for target in [target for target in self._rows if target not in active_targets]:
+            row = self._rows.pop(target)
+            self._counts[row] = self._heads[row] = 0
+            self._free.append(row)
+        targets = np.asarray(targets)
+        active = np.array([target in active_targets for target in targets], dtype=bool)
+        if not active.any():
+            return
+        features = {name: array[active] for name, array in self._stack_features(features).items()}
+        targets = targets[active]
+        if self._part_based:
+            features["reid_features"] = F.normalize(
+                torch.from_numpy(features["reid_features"]), p=2, dim=-1).numpy()
+
+        # in our case, only one feature per track : for each track, keep only the last 'budget' reid features
+        order = np.argsort(targets, kind="stable")
+        targets_sorted = targets[order]
+        first = np.r_[0, np.flatnonzero(targets_sorted[1:] != targets_sorted[:-1]) + 1]
+        group_sizes = np.diff(np.r_[first, len(targets)])
+        group = np.repeat(np.arange(len(first)), group_sizes)
+        occurrence = np.arange(len(targets)) - first[group]
+        skipped = np.maximum(group_sizes - (self.budget or len(targets)), 0)
+        kept = occurrence >= skipped[group]
+        order, group = order[kept], group[kept]
+        occurrence = occurrence[kept] - skipped[group]
+        new_samples = group_sizes - skipped
+
+        rows = np.array([self._row(target) for target in targets_sorted[first]], dtype=int)
+        self._allocate(features, rows.max() + 1)
+        if self.budget is None:
+            self._allocate(features, rows.max() + 1, (self._counts[rows] + new_samples).max())
+        size = self._gallery_size()[1]
+        sample_rows = rows[group]
+        slots = (self._heads[sample_rows] + occurrence) % size
+        for name, array in self._gallery.items():
+            array[sample_rows, slots] = features[name][order]
+        self._heads[rows] = (self._heads[rows] + new_samples) % size
+        self._counts[rows] = np.minimum(self._counts[rows] + new_samples, size)
+
+    @staticmethod
+    def _stack_features(features):
+        """Features as a dict of (N, ...) arrays, with the None key for the plain features."""
+        if len(features) > 0 and isinstance(features[0], dict):
+            return {name: np.stack([feature[name] for feature in features]) for name in features[0]}
+        return {None: np.asarray(features)}
+
+    def _row(self, target):
+        if target not in self._rows:
+            self._rows[target] = self._free.pop() if self._free else len(self._rows)
+        return self._rows[target]
+
+    def _allocate(self, features, n_rows, n_samples=0):
+        """Grows the gallery to have at least `n_rows` rows, and room for `n_samples` samples
+        in each row if there is no budget."""
+        if self._gallery is None:
+            self._gallery = {name: np.zeros((0, self.budget or 1, *array.shape[1:]), dtype=array.dtype)
+                             for name, array in features.items()}
+        rows, size = self._gallery_size()
+        new_size = max(size, n_samples)
+        if n_rows <= rows and new_size == size:
+            return
+        new_rows = rows if n_rows <= rows else max(2 * rows, n_rows, 16)
+        new_size = new_size if new_size == size else max(2 * size, new_size)
+        slots = [self._slots(row) for row in range(rows)]
+        for name, array in self._gallery.items():
+            grown = np.zeros((new_rows, new_size, *array.shape[2:]), dtype=array.dtype)
+            for row in range(rows):  # the samples of each row are moved to its first slots
+                grown[row, :len(slots[row])] = array[row, slots[row]]
+            self._gallery[name] = grown
+        self._heads = np.r_[self._counts[:rows] % new_size, np.zeros(new_rows - rows, dtype=int)]
+        self._counts = np.r_[self._counts[:rows], np.zeros(new_rows - rows, dtype=int)]
 
     def distance(self, features, targets):
         """Compute distance between features and targets.
@@ -201,6 +294,19 @@ class NearestNeighborDistanceMetric(object):
             `targets[i]` and `features[j]`.
         """
         cost_matrix = np.zeros((len(targets), len(features['reid_features'])))
+        if len(targets) == 0 or cost_matrix.shape[1] == 0:
+            return cost_matrix
+        rows = np.array([self._rows[target] for target in targets], dtype=int)
+        if self._part_based:
+            # only the most recent sample of each target is compared to the detections
+            last = (self._heads[rows] - 1) % self._gallery_size()[1]
+            cost_matrix[:] = _nn_part_based_batched(
+                self._gallery["reid_features"][rows, last],
+                self._gallery["visibility_scores"][rows, last],
+                features,
+            )
+            return cost_matrix
+        samples = self.samples
         for i, target in enumerate(targets):
-            cost_matrix[i, :] = self._metric(self.samples[target], features)
+            cost_matrix[i, :] = self._metric(samples[target], features)
         return cost_matrix
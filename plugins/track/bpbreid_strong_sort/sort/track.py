@@ -113,14 +113,6 @@ class Track:
         ret[2:] = ret[:2] + ret[2:]
         return ret
 
-    def camera_update(self, matrix):
-        x1, y1, x2, y2 = self.to_tlbr()
-        x1_, y1_, _ = matrix @ np.array([x1, y1, 1]).T
-        x2_, y2_, _ = matrix @ np.array([x2, y2, 1]).T
-        w, h = x2_ - x1_, y2_ - y1_
-        cx, cy = x1_ + w / 2, y1_ + h / 2
-        self.mean[:4] = [cx, cy, w/h, h]
-
     def increment_age(self):
         self.age += 1
         self.time_since_update += 1
@@ -8,8 +8,6 @@ from . import oks_matching
 from .track import Track
 import logging
 
-from plugins.track.bpbreid_strong_sort.ecc import ECC, get_matrix
-
 log = logging.getLogger(__name__)
 
 
@@ -38,6 +36,10 @@ class Tracker:
         A Kalman filter to filter target trajectories in image space.
     tracks : List[Track]
         The list of active tracks at the current time step.
+    diagnostics : str
+        The costs between each detection and the tracks kept for visualization
+        in `detection.costs`: "off" (none), "compact" (the `diagnostics_top_k`
+        closest tracks of each detection) or "full" (all the tracks).
     """
 
     def __init__(
@@ -58,7 +60,13 @@ class Tracker:
         w_st=1,
         only_position_for_kf_gating=False,
         max_kalman_prediction_without_update=7,
+        diagnostics="full",
+        diagnostics_top_k=5,
     ):
+        if diagnostics not in ("off", "compact", "full"):
+            raise ValueError(
+                "diagnostics should be either 'off', 'compact' or 'full', but got {}".format(diagnostics)
+            )
         self.metric = metric
         if motion_criterium == "iou":
             self.motion_cost = iou_matching.iou_cost
@@ -88,14 +96,25 @@ class Tracker:
         self.predict_done = False
         self.only_position = only_position_for_kf_gating
         self.max_kalman_prediction_without_update = max_kalman_prediction_without_update
+        self.kf = kalman_filter.KalmanFilter()
+        self.diagnostics = diagnostics
+        self.diagnostics_top_k = diagnostics_top_k
+        self._all_costs = {}  # cost matrices between all the tracks and detections of the current frame
 
     def predict(self):
         """Propagate track state distributions one time step forward.
 
         This function should be called once every time step, before `update`.
         """
+        # same as track.predict() for each track, with a single Kalman filter step
+        tracks = [t for t in self.tracks if t.time_since_update < t.max_kalman_prediction_without_update]
+        if len(tracks) > 0:
+            means, covariances = self.kf.predict(
+                np.asarray([t.mean for t in tracks]), np.asarray([t.covariance for t in tracks]))
+            for track, mean, covariance in zip(tracks, means, covariances):
+                track.mean, track.covariance = mean, covariance
         for track in self.tracks:
-            track.predict()
+            track.increment_age()
         self.predict_done = True
 
     def increment_ages(self):
@@ -103,22 +122,21 @@ class Tracker:
             track.increment_age()
             track.mark_missed()
 
-    def camera_update(self, previous_img, current_img):
-        # ECC call was previously done inside each track in track.py, which is not efficient.
-        # Moved it here to be computed once per new incoming frame.
-        warp_matrix, src_aligned = ECC(previous_img, current_img)
-        if warp_matrix is None and src_aligned is None:
-            return None
-
-        [a,b] = warp_matrix
-        warp_matrix=np.array([a,b,[0,0,1]])
-        warp_matrix = warp_matrix.tolist()
-        matrix = get_matrix(warp_matrix)
-
-        for track in self.tracks:
-            track.camera_update(matrix)
+    def camera_update(self, warp):
+        """Moves the states of all the tracks to the coordinates of the current frame.
 
-        return matrix
+        Parameters
+        ----------
+        warp : ndarray
+            The (2, 3) affine warp of the image from the previous frame to the current
+            one, see `tracklab.utils.camera_motion.CameraMotion`.
+        """
+        if len(self.tracks) == 0:
+            return
+        means, covariances = self.kf.warp(
+            np.asarray([t.mean for t in self.tracks]), np.asarray([t.covariance for t in self.tracks]), warp)
+        for track, mean, covariance in zip(self.tracks, means, covariances):
+            track.mean, track.covariance = mean, covariance
 
     def update(self, detections, classes, confidences):
         """Perform measurement update and track management.
@@ -135,6 +153,7 @@ class Tracker:
             matches, unmatched_tracks, unmatched_detections = self.bot_sort_matching(detections)
         else:
             raise NotImplementedError
+        self._all_costs = {}
 
         # Update track set.
         for track_idx, detection_idx in matches:
@@ -183,45 +202,24 @@ class Tracker:
         # TODO add rules to switch from oks to reid when too old tracklets, or implement cascade matching
 
         # Compute First the Position-based Cost Matrix
-        pos_cost = np.empty([len(track_indices), len(detection_indices)])
-        msrs = np.asarray([dets[i].to_xyah() for i in detection_indices])
-        for row, track_idx in enumerate(track_indices):
-            track = tracks[track_idx]
-            pos_cost[row, :] = (
-                np.sqrt(
-                    track.kf.gating_distance(
-                        track.mean,
-                        track.covariance,
-                        msrs,
-                        self.only_position,
-                    )
-                )
-                / (GATING_THRESHOLD * self.gating_thres_factor)
-            )
+        pos_cost = (
+            np.sqrt(self._cost_matrix("K", dets, track_indices, detection_indices))
+            / (GATING_THRESHOLD * self.gating_thres_factor)
+        )
         if self.w_kfgd > 0:
             pos_gate = pos_cost > 1.0
         else:
             pos_gate = np.zeros_like(pos_cost)
 
         # Now Compute the Appearance-based Cost Matrix
-        features = {
-            "reid_features": np.array(
-                [dets[i].feature["reid_features"] for i in detection_indices]
-            ),
-            "visibility_scores": np.array(
-                [dets[i].feature["visibility_scores"] for i in detection_indices]
-            ),
-        }
-        targets = np.array([tracks[i].track_id for i in track_indices])
-        app_cost = self.metric.distance(features, targets)  # NO thresholding until here -> ONLY REID DISTANCE
+        app_cost = self._cost_matrix("R", dets, track_indices, detection_indices)  # NO thresholding until here -> ONLY REID DISTANCE
         if self.w_reid > 0:
             app_gate = app_cost > self.metric.matching_threshold
         else:
             app_gate = np.zeros_like(app_cost)
 
         # Now compute spatio-temporal (IOU/OKS/...) based cost matrix
-        st_cost = self.motion_cost(  # return cost matrix gated by KM (too big IOU set to INF)
-            tracks, dets, track_indices, detection_indices)
+        st_cost = self._cost_matrix("S", dets, track_indices, detection_indices)
         if self.w_st > 0:
             st_gate = st_cost > self.motion_max_distance
         else:
@@ -266,19 +264,10 @@ class Tracker:
         self.compute_all_costs_matrix(detections)
 
         def gated_metric(tracks, dets, track_indices, detection_indices):
-            features = {
-                "reid_features": np.array(
-                    [dets[i].feature["reid_features"] for i in detection_indices]
-                ),
-                "visibility_scores": np.array(
-                    [dets[i].feature["visibility_scores"] for i in detection_indices]
-                ),
-            }
-
-            targets = np.array([tracks[i].track_id for i in track_indices])
-            cost_matrix_reid = self.metric.distance(features, targets)  # NO thresholding until here -> ONLY REID DISTANCE
+            cost_matrix_reid = self._cost_matrix("R", dets, track_indices, detection_indices)  # NO thresholding until here -> ONLY REID DISTANCE
             cost_matrix = linear_assignment.gate_cost_matrix(  # KF gating applied, too big values are set to INFTY
-                cost_matrix_reid, tracks, dets, track_indices, detection_indices, only_position=self.only_position, mc_lambda=self.mc_lambda
+                cost_matrix_reid, tracks, dets, track_indices, detection_indices, only_position=self.only_position, mc_lambda=self.mc_lambda,
+                gating_distance=self._cost_matrix("K", dets, track_indices, detection_indices),
             )
 
             return cost_matrix
@@ -317,7 +306,8 @@ class Tracker:
             unmatched_detections_b,
             st_cost_matrix
         ) = linear_assignment.min_cost_matching(
-            self.motion_cost,
+            lambda tracks, dets, track_indices, detection_indices: self._cost_matrix(
+                "S", dets, track_indices, detection_indices),
             self.motion_max_distance,
             self.tracks,
             detections,
@@ -364,47 +354,75 @@ class Tracker:
 
     def compute_all_costs_matrix(self, detections):
         """Compute reid/spatio-temporal/kf_gating distance from each detection to each track and update each
-        detection with the resulting information. This is used for visualization purposes. No gated/thresholding is
-        applied here to display the original information"""
-        # reid cost matrix
-        features = {
-            "reid_features": np.array(
-                [detection.feature["reid_features"] for detection in detections]
-            ),
-            "visibility_scores": np.array(
-                [detection.feature["visibility_scores"] for detection in detections]
-            ),
-        }
-        targets = np.array([track.track_id for track in self.tracks])
-        cost_matrix_reid = self.metric.distance(features, targets)
-
-        # spatio-temporal cost matrix (iou/oks)
-        cost_matrix_st = self.motion_cost(  # return cost matrix gated by KM (too big IOU set to INF)
-            self.tracks, detections, list(range(len(self.tracks))), list(range(len(detections))))
-
-        # kf gating cost matrix
-        only_position = self.only_position
-        gating_dim = 2 if only_position else 4
-        gating_threshold = kalman_filter.chi2inv95[gating_dim]
+        detection with the resulting information, as set by `diagnostics`. This is used for visualization purposes.
+        No gated/thresholding is applied here to display the original information. The matching then reuses these
+        matrices instead of computing its own."""
+        self._all_costs = {}
+        if self.diagnostics == "off":
+            return
         track_indices = list(range(len(self.tracks)))
         detection_indices = list(range(len(detections)))
-        measurements = np.asarray(
-            [detections[i].to_xyah() for i in detection_indices])
-        cost_matrix_kf_gating = np.zeros((len(self.tracks), len(detections)))
-        for row, track_idx in enumerate(track_indices):
-            track = self.tracks[track_idx]
-            gating_distance = track.kf.gating_distance(track.mean, track.covariance, measurements, only_position)
-            cost_matrix_kf_gating[row] = gating_distance
+        self._all_costs = {
+            name: self._cost_matrix(name, detections, track_indices, detection_indices)
+            for name in ["R", "S", "K"]  # reid, spatio-temporal (iou/oks) and kf gating cost matrices
+        }
+        gating_dim = 2 if self.only_position else 4
+        thresholds = {
+            "R": self.metric.matching_threshold,
+            "S": self.motion_max_distance,
+            "K": kalman_filter.chi2inv95[gating_dim],
+        }
 
         # update each detection with costs to each track
+        track_ids = np.array([track.track_id for track in self.tracks], dtype=int)
+        if self.diagnostics == "compact":
+            # (k, 2) arrays of the track ids and costs of the k closest tracks of each detection
+            k = min(self.diagnostics_top_k, len(self.tracks))
+            closest = {
+                name: np.argsort(cost_matrix, axis=0, kind="stable")[:k]
+                for name, cost_matrix in self._all_costs.items()
+            }
         for i, det in enumerate(detections):
             det.costs = {}
-            det.costs["R"] = {track.track_id: cost_matrix_reid[j, i] for j, track in enumerate(self.tracks)}
-            det.costs["Rt"] = self.metric.matching_threshold
-            det.costs["S"] = {track.track_id: cost_matrix_st[j, i] for j, track in enumerate(self.tracks)}
-            det.costs["St"] = self.motion_max_distance
-            det.costs["K"] = {track.track_id: cost_matrix_kf_gating[j, i] for j, track in enumerate(self.tracks)}
-            det.costs["Kt"] = gating_threshold
+            for name, cost_matrix in self._all_costs.items():
+                if self.diagnostics == "full":
+                    det.costs[name] = dict(zip(track_ids.tolist(), cost_matrix[:, i]))
+                else:
+                    rows = closest[name][:, i]
+                    det.costs[name] = np.stack([track_ids[rows], cost_matrix[rows, i]], axis=1)
+                det.costs[name + "t"] = thresholds[name]
+
+    def _cost_matrix(self, name, detections, track_indices, detection_indices):
+        """Cost matrix between the given tracks and detections: "R" for the reid distance, "S" for the
+        spatio-temporal (iou/oks) distance and "K" for the kf gating distance. It is read from the matrices
+        of `compute_all_costs_matrix` if they were computed for the current frame."""
+        if name in self._all_costs:
+            return self._all_costs[name][
+                np.ix_(np.asarray(track_indices, dtype=int), np.asarray(detection_indices, dtype=int))
+            ]
+        if name == "R":
+            features = {
+                "reid_features": np.array(
+                    [detections[i].feature["reid_features"] for i in detection_indices]
+                ),
+                "visibility_scores": np.array(
+                    [detections[i].feature["visibility_scores"] for i in detection_indices]
+                ),
+            }
+            targets = np.array([self.tracks[i].track_id for i in track_indices])
+            return self.metric.distance(features, targets)
+        if name == "S":
+            # return cost matrix gated by KM (too big IOU set to INF)
+            return self.motion_cost(self.tracks, detections, track_indices, detection_indices)
+        cost_matrix = np.zeros((len(track_indices), len(detection_indices)))
+        if len(track_indices) > 0 and len(detection_indices) > 0:
+            cost_matrix[:] = self.kf.gating_distance(
+                np.asarray([self.tracks[i].mean for i in track_indices]),
+                np.asarray([self.tracks[i].covariance for i in track_indices]),
+                np.asarray([detections[i].to_xyah() for i in detection_indices]),
+                self.only_position,
+            )
+        return cost_matrix
 
     def add_matching_information(self, detections, tracks, name, track_candidates, detections_candidates, matches, cost_matrix):
         if cost_matrix is None:
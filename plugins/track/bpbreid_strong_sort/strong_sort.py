@@ -28,6 +28,8 @@ class StrongSORT(object):
         w_kfgd=1,
         w_reid=1,
         w_st=1,
+        diagnostics="full",
+        diagnostics_top_k=5,
     ):
         self.max_dist = max_dist
         self.min_bbox_confidence = min_bbox_confidence
@@ -48,6 +50,8 @@ class StrongSORT(object):
             w_kfgd=w_kfgd,
             w_reid=w_reid,
             w_st=w_st,
+            diagnostics=diagnostics,
+            diagnostics_top_k=diagnostics_top_k,
         )
 
     def update(
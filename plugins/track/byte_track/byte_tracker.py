@@ -42,6 +42,30 @@ class STrack(BaseTrack):
                 stracks[i].mean = mean
                 stracks[i].covariance = cov
 
+    @staticmethod
+    def multi_gmc(stracks, H=np.eye(2, 3)):
+        """Apply the camera motion `H`, a 2x3 affine warp of the image, to the `stracks`."""
+        if len(stracks) > 0:
+            multi_mean = np.asarray([st.mean for st in stracks])
+            multi_covariance = np.asarray([st.covariance for st in stracks])
+            multi_mean, multi_covariance = STrack.shared_kalman.warp(multi_mean, multi_covariance, H)
+            for i, (mean, cov) in enumerate(zip(multi_mean, multi_covariance)):
+                stracks[i].mean = mean
+                stracks[i].covariance = cov
+
+    @staticmethod
+    def multi_update(stracks, new_tracks):
+        """Run the Kalman filter update of the matched `stracks` with their `new_tracks`,
+        all at once, before their `update` or `re_activate`."""
+        if len(stracks) > 0:
+            multi_mean = np.asarray([st.mean for st in stracks])
+            multi_covariance = np.asarray([st.covariance for st in stracks])
+            measurements = np.asarray([STrack.tlwh_to_xyah(t.tlwh) for t in new_tracks])
+            multi_mean, multi_covariance = STrack.shared_kalman.update(multi_mean, multi_covariance, measurements)
+            for i, (mean, cov) in enumerate(zip(multi_mean, multi_covariance)):
+                stracks[i].mean = mean
+                stracks[i].covariance = cov
+
     def activate(self, kalman_filter, frame_id):
         """Start a new tracklet"""
         self.kalman_filter = kalman_filter
@@ -57,9 +81,7 @@ class STrack(BaseTrack):
         self.start_frame = frame_id
 
     def re_activate(self, new_track, frame_id, new_id=False):
-        self.mean, self.covariance = self.kalman_filter.update(
-            self.mean, self.covariance, self.tlwh_to_xyah(new_track.tlwh)
-        )
+        # the Kalman filter was updated with new_track by multi_update
         self.tracklet_len = 0
         self.state = TrackState.Tracked
         self.is_activated = True
@@ -83,9 +105,7 @@ class STrack(BaseTrack):
         self.tracklet_len += 1
         # self.cls = cls
 
-        new_tlwh = new_track.tlwh
-        self.mean, self.covariance = self.kalman_filter.update(
-            self.mean, self.covariance, self.tlwh_to_xyah(new_tlwh))
+        # the Kalman filter was updated with new_track by multi_update
         self.state = TrackState.Tracked
         self.is_activated = True
 
@@ -164,6 +184,11 @@ class BYTETracker(object):
         self.max_time_lost = self.buffer_size
         self.kalman_filter = KalmanFilter()
 
+    def camera_update(self, warp):
+        """Apply the camera motion from the previous frame, a 2x3 affine `warp` of the
+        image (see `tracklab.utils.camera_motion.CameraMotion`), to all the tracks."""
+        STrack.multi_gmc(joint_stracks(self.tracked_stracks, self.lost_stracks), warp)
+
     def update(self, dets, _):
         self.frame_id += 1
         activated_starcks = []
@@ -221,11 +246,12 @@ class BYTETracker(object):
         strack_pool = joint_stracks(tracked_stracks, self.lost_stracks)
         # Predict the current location with KF
         STrack.multi_predict(strack_pool)
-        dists = matching.iou_distance(strack_pool, detections)
+        dists = matching.sparse_iou_distance(strack_pool, detections)
         #if not self.args.mot20:
         dists = matching.fuse_score(dists, detections)
         matches, u_track, u_detection = matching.linear_assignment(dists, thresh=self.match_thresh)
 
+        STrack.multi_update([strack_pool[i] for i, _ in matches], [detections[j] for _, j in matches])
         for itracked, idet in matches:
             track = strack_pool[itracked]
             det = detections[idet]
@@ -245,8 +271,9 @@ class BYTETracker(object):
         else:
             detections_second = []
         r_tracked_stracks = [strack_pool[i] for i in u_track if strack_pool[i].state == TrackState.Tracked]
-        dists = matching.iou_distance(r_tracked_stracks, detections_second)
+        dists = matching.sparse_iou_distance(r_tracked_stracks, detections_second)
         matches, u_track, u_detection_second = matching.linear_assignment(dists, thresh=0.5)
+        STrack.multi_update([r_tracked_stracks[i] for i, _ in matches], [detections_second[j] for _, j in matches])
         for itracked, idet in matches:
             track = r_tracked_stracks[itracked]
             det = detections_second[idet]
@@ -265,10 +292,11 @@ class BYTETracker(object):
 
         '''Deal with unconfirmed tracks, usually tracks with only one beginning frame'''
         detections = [detections[i] for i in u_detection]
-        dists = matching.iou_distance(unconfirmed, detections)
+        dists = matching.sparse_iou_distance(unconfirmed, detections)
         #if not self.args.mot20:
         dists = matching.fuse_score(dists, detections)
         matches, u_unconfirmed, u_detection = matching.linear_assignment(dists, thresh=0.7)
+        STrack.multi_update([unconfirmed[i] for i, _ in matches], [detections[j] for _, j in matches])
         for itracked, idet in matches:
             unconfirmed[itracked].update(detections[idet], self.frame_id)
             activated_starcks.append(unconfirmed[itracked])
@@ -346,8 +374,9 @@ def sub_stracks(tlista, tlistb):
 
 
 def remove_duplicate_stracks(stracksa, stracksb):
-    pdist = matching.iou_distance(stracksa, stracksb)
-    pairs = np.where(pdist < 0.15)
+    pdist = matching.sparse_iou_distance(stracksa, stracksb)
+    duplicate = pdist.data < 0.15
+    pairs = (pdist.row[duplicate], pdist.col[duplicate])
     dupa, dupb = list(), list()
     for p, q in zip(*pairs):
         timep = stracksa[p].frame_id - stracksa[p].start_frame
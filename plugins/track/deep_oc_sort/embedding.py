@@ -1,13 +1,12 @@
 import pdb
 from collections import OrderedDict
-import os
-import pickle
 
 import torch
 import cv2
 import torchvision
 import numpy as np
 
+from tracklab.utils.feature_cache import cached_rows, content_hash
 
 
 class EmbeddingComputer:
@@ -15,34 +14,8 @@ class EmbeddingComputer:
         self.model = None
         self.dataset = dataset
         self.crop_size = (128, 384)
-        os.makedirs("./cache/embeddings/", exist_ok=True)
-        self.cache_path = "./cache/embeddings/{}_embedding.pkl"
-        self.cache = {}
-        self.cache_name = ""
-
-    def load_cache(self, path):
-        self.cache_name = path
-        cache_path = self.cache_path.format(path)
-        if os.path.exists(cache_path):
-            with open(cache_path, "rb") as fp:
-                self.cache = pickle.load(fp)
-
-    def compute_embedding(self, img, bbox, tag, is_numpy=True):
-        if self.cache_name != tag.split(":")[0]:
-            self.load_cache(tag.split(":")[0])
-
-        if tag in self.cache:
-            embs = self.cache[tag]
-            if embs.shape[0] != bbox.shape[0]:
-                raise RuntimeError(
-                    "ERROR: The number of cached embeddings don't match the "
-                    "number of detections.\nWas the detector model changed? Delete cache if so."
-                )
-            return embs
-
-        if self.model is None:
-            self.initialize_model()
 
+    def compute_embedding(self, img, bbox, tag=None, is_numpy=True):
         # Make sure bbox is within image frame
         if is_numpy:
             h, w = img.shape[:2]
@@ -70,6 +43,15 @@ class EmbeddingComputer:
             crops.append(crop)
 
         crops = torch.cat(crops, dim=0)
+        return cached_rows(
+            len(crops),
+            lambda i: content_hash(type(self).__name__, self.dataset, self.crop_size, crops[i]),
+            lambda idxs: {"embeddings": self._embed(crops[torch.as_tensor(idxs)])},
+        )["embeddings"]
+
+    def _embed(self, crops):
+        if self.model is None:
+            self.initialize_model()
 
         # Create embeddings and l2 normalize them
         with torch.no_grad():
@@ -77,10 +59,7 @@ class EmbeddingComputer:
             crops = crops.half()
             embs = self.model(crops)
         embs = torch.nn.functional.normalize(embs)
-        embs = embs.cpu().numpy()
-
-        self.cache[tag] = embs
-        return embs
+        return embs.cpu().numpy()
 
     def initialize_model(self):
         """
@@ -109,8 +88,3 @@ class EmbeddingComputer:
         model.cuda()
         model.half()
         self.model = model
-
-    def dump_cache(self):
-        if self.cache_name:
-            with open(self.cache_path.format(self.cache_name), "wb") as fp:
-                pickle.dump(self.cache, fp)
@@ -13,8 +13,10 @@ import torchvision
 import numpy as np
 from .association import *
 from .embedding import EmbeddingComputer
-from .cmc import CMCComputer
+from .kalmanfilter import XYSRKalmanFilter, XYWHKalmanFilter
 from .reid_multibackend import ReIDDetectMultiBackend
+from tracklab.utils.feature_cache import cached_rows, content_hash, file_hash
+from tracklab.utils.kalman import ObservationCentricStates
 from ultralytics.yolo.utils.ops import xyxy2xywh
 
 
@@ -79,20 +81,6 @@ def speed_direction(bbox1, bbox2):
     return speed / norm
 
 
-def new_kf_process_noise(w, h, p=1 / 20, v=1 / 160):
-    Q = np.diag(
-        ((p * w) ** 2, (p * h) ** 2, (p * w) ** 2, (p * h) ** 2, (v * w) ** 2, (v * h) ** 2, (v * w) ** 2, (v * h) ** 2)
-    )
-    return Q
-
-
-def new_kf_measurement_noise(w, h, m=1 / 20):
-    w_var = (m * w) ** 2
-    h_var = (m * h) ** 2
-    R = np.diag((w_var, h_var, w_var, h_var))
-    return R
-
-
 class KalmanBoxTracker(object):
     """
     This class represents the internal state of individual tracked objects observed as bbox.
@@ -100,80 +88,26 @@ class KalmanBoxTracker(object):
 
     count = 0
 
-    def __init__(self, bbox, cls, delta_t=3, orig=False, emb=None, alpha=0, new_kf=False, tracklab_id=None):
+    def __init__(self, bbox, cls, states, delta_t=3, emb=None, alpha=0, new_kf=False, tracklab_id=None):
         """
         Initialises a tracker using initial bounding box.
 
+        The state of its (constant velocity) Kalman filter is kept in `states`,
+        shared by all the trackers, to run the filter of all of them at once : an
+        `XYWHKalmanFilter` if `new_kf`, an `XYSRKalmanFilter` otherwise.
         """
-        # define constant velocity model
-        if not orig:
-            from .kalmanfilter import KalmanFilterNew as KalmanFilter
-        else:
-            from filterpy.kalman import KalmanFilter
         self.cls = cls
         self.conf = bbox[-1]
         self.new_kf = new_kf
         if new_kf:
-            self.kf = KalmanFilter(dim_x=8, dim_z=4)
-            self.kf.F = np.array(
-                [
-                    # x y w h x' y' w' h'
-                    [1, 0, 0, 0, 1, 0, 0, 0],
-                    [0, 1, 0, 0, 0, 1, 0, 0],
-                    [0, 0, 1, 0, 0, 0, 1, 0],
-                    [0, 0, 0, 1, 0, 0, 0, 1],
-                    [0, 0, 0, 0, 1, 0, 0, 0],
-                    [0, 0, 0, 0, 0, 1, 0, 0],
-                    [0, 0, 0, 0, 0, 0, 1, 0],
-                    [0, 0, 0, 0, 0, 0, 0, 1],
-                ]
-            )
-            self.kf.H = np.array(
-                [
-                    [1, 0, 0, 0, 0, 0, 0, 0],
-                    [0, 1, 0, 0, 0, 0, 0, 0],
-                    [0, 0, 1, 0, 0, 0, 0, 0],
-                    [0, 0, 0, 1, 0, 0, 0, 0],
-                ]
-            )
-            _, _, w, h = convert_bbox_to_z_new(bbox).reshape(-1)
-            self.kf.P = new_kf_process_noise(w, h)
-            self.kf.P[:4, :4] *= 4
-            self.kf.P[4:, 4:] *= 100
-            # Process and measurement uncertainty happen in functions
             self.bbox_to_z_func = convert_bbox_to_z_new
             self.x_to_bbox_func = convert_x_to_bbox_new
         else:
-            self.kf = KalmanFilter(dim_x=7, dim_z=4)
-            self.kf.F = np.array(
-                [
-                    # x  y  s  r  x' y' s'
-                    [1, 0, 0, 0, 1, 0, 0],
-                    [0, 1, 0, 0, 0, 1, 0],
-                    [0, 0, 1, 0, 0, 0, 1],
-                    [0, 0, 0, 1, 0, 0, 0],
-                    [0, 0, 0, 0, 1, 0, 0],
-                    [0, 0, 0, 0, 0, 1, 0],
-                    [0, 0, 0, 0, 0, 0, 1],
-                ]
-            )
-            self.kf.H = np.array(
-                [
-                    [1, 0, 0, 0, 0, 0, 0],
-                    [0, 1, 0, 0, 0, 0, 0],
-                    [0, 0, 1, 0, 0, 0, 0],
-                    [0, 0, 0, 1, 0, 0, 0],
-                ]
-            )
-            self.kf.R[2:, 2:] *= 10.0
-            self.kf.P[4:, 4:] *= 1000.0  # give high uncertainty to the unobservable initial velocities
-            self.kf.P *= 10.0
-            self.kf.Q[-1, -1] *= 0.01
-            self.kf.Q[4:, 4:] *= 0.01
             self.bbox_to_z_func = convert_bbox_to_z
             self.x_to_bbox_func = convert_x_to_bbox
-
-        self.kf.x[:4] = self.bbox_to_z_func(bbox)
+        self.states = states
+        self.slot = states.initiate(self.bbox_to_z_func(bbox)[:, 0])
+        self.z = None  # observation of the current frame, given to the filter by multi_update
 
         self.time_since_update = 0
         self.id = KalmanBoxTracker.count
@@ -233,13 +167,9 @@ class KalmanBoxTracker(object):
             self.history = []
             self.hits += 1
             self.hit_streak += 1
-            if self.new_kf:
-                R = new_kf_measurement_noise(self.kf.x[2, 0], self.kf.x[3, 0])
-                self.kf.update(self.bbox_to_z_func(bbox), R=R)
-            else:
-                self.kf.update(self.bbox_to_z_func(bbox))
+            self.z = self.bbox_to_z_func(bbox)[:, 0]
         else:
-            self.kf.update(bbox)
+            self.z = np.full(4, np.nan)
             self.frozen = True
 
         if tracklab_id is not None:
@@ -252,62 +182,61 @@ class KalmanBoxTracker(object):
     def get_emb(self):
         return self.emb.cpu()
 
-    def apply_affine_correction(self, affine):
-        m = affine[:, :2]
-        t = affine[:, 2].reshape(2, 1)
-        # For OCR
-        if self.last_observation.sum() > 0:
-            ps = self.last_observation[:4].reshape(2, 2).T
-            ps = m @ ps + t
-            self.last_observation[:4] = ps.T.reshape(-1)
-
-        # Apply to each box in the range of velocity computation
-        for dt in range(self.delta_t, -1, -1):
-            if self.age - dt in self.observations:
-                ps = self.observations[self.age - dt][:4].reshape(2, 2).T
-                ps = m @ ps + t
-                self.observations[self.age - dt][:4] = ps.T.reshape(-1)
-
-        # Also need to change kf state, but might be frozen
-        self.kf.apply_affine_correction(m, t, self.new_kf)
-
-    def predict(self):
+    @staticmethod
+    def multi_predict(trackers, states):
         """
-        Advances the state vector and returns the predicted bounding box estimate.
+        Advances the state vectors of all the trackers at once.
         """
+        slots = np.array([trk.slot for trk in trackers], dtype=int)
+        if len(slots) == 0:
+            return
+        x = states.mean
         # Don't allow negative bounding boxes
-        if self.new_kf:
-            if self.kf.x[2] + self.kf.x[6] <= 0:
-                self.kf.x[6] = 0
-            if self.kf.x[3] + self.kf.x[7] <= 0:
-                self.kf.x[7] = 0
-
-            # Stop velocity, will update in kf during OOS
-            if self.frozen:
-                self.kf.x[6] = self.kf.x[7] = 0
-            Q = new_kf_process_noise(self.kf.x[2, 0], self.kf.x[3, 0])
-        else:
-            if (self.kf.x[6] + self.kf.x[2]) <= 0:
-                self.kf.x[6] *= 0.0
-            Q = None
+        vanishing = slots[(x[slots, 6] + x[slots, 2]) <= 0]
+        x[vanishing, 6] = 0
+        if not trackers[0].new_kf:
+            states.predict(slots)
+            return
+        x[slots[(x[slots, 7] + x[slots, 3]) <= 0], 7] = 0
+        # Stop velocity, will update in kf during OOS
+        frozen = slots[[trk.frozen for trk in trackers]]
+        x[frozen, 6] = x[frozen, 7] = 0
+        states.predict(slots, motion_noise=states.kf.size_process_noise(x[slots]))
+
+    @staticmethod
+    def multi_update(trackers, states):
+        """
+        Updates the state vectors of all the trackers at once with the observations given
+        to their `update` on the current frame.
+        """
+        trackers = [trk for trk in trackers if trk.z is not None]
+        if len(trackers) == 0:
+            return
+        slots = np.array([trk.slot for trk in trackers], dtype=int)
+        kwargs = {}
+        if trackers[0].new_kf:
+            # noise of the predicted box, before the re-update of the frozen trackers
+            kwargs["measurement_noise"] = states.kf.size_measurement_noise(states.mean[slots])
+        states.update(slots, np.stack([trk.z for trk in trackers]), **kwargs)
+        for trk in trackers:
+            trk.z = None
 
-        self.kf.predict(Q=Q)
+    def predict(self):
+        """
+        Returns the predicted bounding box estimate, after `multi_predict`.
+        """
         self.age += 1
         if self.time_since_update > 0:
             self.hit_streak = 0
         self.time_since_update += 1
-        self.history.append(self.x_to_bbox_func(self.kf.x))
+        self.history.append(self.get_state())
         return self.history[-1]
 
     def get_state(self):
         """
         Returns the current bounding box estimate.
         """
-        return self.x_to_bbox_func(self.kf.x)
-
-    def mahalanobis(self, bbox):
-        """Should be run after a predict() call for accuracy."""
-        return self.kf.md_for_measurement(self.bbox_to_z_func(bbox))
+        return self.x_to_bbox_func(self.states.mean[self.slot])
 
 
 """
@@ -342,9 +271,10 @@ class OCSort(object):
         alpha_fixed_emb=0.95,
         aw_param=0.5,
         embedding_off=False,
-        cmc_off=False,
         aw_off=False,
         new_kf_off=False,
+        precision=None,
+        channels_last=False,
         **kwargs
     ):
         """
@@ -364,17 +294,44 @@ class OCSort(object):
         self.aw_param = aw_param
         KalmanBoxTracker.count = 0
 
-        self.embedder = ReIDDetectMultiBackend(weights=model_weights, device=device, fp16=fp16)
-        self.cmc = CMCComputer()
+        self.embedder = ReIDDetectMultiBackend(weights=model_weights, device=device, fp16=fp16,
+                                               precision=precision, channels_last=channels_last)
+        # identifies the reid model in the keys of the feature cache
+        self.features_key = content_hash("ReIDDetectMultiBackend", file_hash(model_weights), fp16,
+                                         *self.embedder.inference.key())
         self.embedding_off = embedding_off
-        self.cmc_off = cmc_off
         self.aw_off = aw_off
         self.new_kf_off = new_kf_off
+        self.states = ObservationCentricStates(XYSRKalmanFilter() if new_kf_off else XYWHKalmanFilter())
 
-    def update(self, dets, img_numpy, tag='blub'):
+    def camera_update(self, affine):
+        """
+        Applies the camera motion from the previous frame, a 2x3 affine warp of the image,
+        to the states of all the trackers (including the states saved for the online
+        smoothing) and to their observations used for OCR and the velocity direction.
+        """
+        self.states.warp([trk.slot for trk in self.trackers], affine)
+        boxes = {}  # the last observation is also in the observations
+        for trk in self.trackers:
+            recent = [trk.observations.get(trk.age - dt) for dt in range(self.delta_t + 1)]
+            if trk.last_observation.sum() > 0:
+                boxes[id(trk.last_observation)] = trk.last_observation
+            for box in recent:
+                if box is not None:
+                    boxes[id(box)] = box
+        if len(boxes) == 0:
+            return
+        corners = np.stack([box[:4] for box in boxes.values()]).reshape(-1, 2)
+        corners = (corners @ affine[:, :2].T + affine[:, 2]).reshape(-1, 4)
+        for box, corner in zip(boxes.values(), corners):
+            box[:4] = corner
+
+    def update(self, dets, img_numpy, tag='blub', compensate_camera_motion=None):
         """
         Params:
           dets - a numpy array of detections in the format [[x1,y1,x2,y2,score],[x1,y1,x2,y2,score],...]
+          compensate_camera_motion - if given, called with the tracker after the embeddings
+            of the detections to apply the camera motion of the frame (with camera_update)
         Requires: this method must be called once for each frame even with empty detections (use np.empty((0, 5)) for frames without detections).
         Returns the a similar array, where the last column is the object ID.
         NOTE: The number of objects returned may differ from the number of detections provided.
@@ -407,10 +364,8 @@ class OCSort(object):
             dets_embs = self._get_features(dets[:, :4], img_numpy)
 
         # CMC
-        if not self.cmc_off:
-            transform = self.cmc.compute_affine(img_numpy, dets[:, :4], tag)
-            for trk in self.trackers:
-                trk.apply_affine_correction(transform)
+        if compensate_camera_motion is not None:
+            compensate_camera_motion(self)
 
         trust = (dets[:, 4] - self.det_thresh) / (1 - self.det_thresh)
         af = self.alpha_fixed_emb
@@ -422,6 +377,7 @@ class OCSort(object):
         trk_embs = []
         to_del = []
         ret = []
+        KalmanBoxTracker.multi_predict(self.trackers, self.states)
         for t, trk in enumerate(trks):
             pos = self.trackers[t].predict()[0]
             trk[:] = [pos[0], pos[1], pos[2], pos[3], 0]
@@ -437,7 +393,7 @@ class OCSort(object):
             trk_embs = np.array(trk_embs)
 
         for t in reversed(to_del):
-            self.trackers.pop(t)
+            self.states.remove(self.trackers.pop(t).slot)
 
         velocities = np.array([trk.velocity if trk.velocity is not None else np.array((0, 0)) for trk in self.trackers])
         last_boxes = np.array([trk.last_observation for trk in self.trackers])
@@ -504,12 +460,13 @@ class OCSort(object):
 
         for m in unmatched_trks:
             self.trackers[m].update(None, None)
+        KalmanBoxTracker.multi_update(self.trackers, self.states)
 
         # create and initialise new trackers for unmatched detections
         for i in unmatched_dets:
             trk = KalmanBoxTracker(
-                dets[i, :5], dets[i, 5], delta_t=self.delta_t, emb=dets_embs[i], alpha=dets_alpha[i], new_kf=not self.new_kf_off,
-                tracklab_id=dets[i, 6]
+                dets[i, :5], dets[i, 5], self.states, delta_t=self.delta_t, emb=dets_embs[i], alpha=dets_alpha[i],
+                new_kf=not self.new_kf_off, tracklab_id=dets[i, 6]
             )
             self.trackers.append(trk)
         i = len(self.trackers)
@@ -528,7 +485,7 @@ class OCSort(object):
             i -= 1
             # remove dead tracklet
             if trk.time_since_update > self.max_age:
-                self.trackers.pop(i)
+                self.states.remove(self.trackers.pop(i).slot)
         if len(ret) > 0:
             return np.concatenate(ret)
         return np.empty((0, 8))
@@ -548,7 +505,11 @@ class OCSort(object):
             im = ori_img[y1:y2, x1:x2]
             im_crops.append(im)
         if im_crops:
-            features = self.embedder(im_crops).cpu()
+            features = torch.from_numpy(cached_rows(
+                len(im_crops),
+                lambda i: content_hash(self.features_key, im_crops[i]),
+                lambda idxs: {"features": self.embedder([im_crops[i] for i in idxs]).cpu().numpy()},
+            )["features"])
         else:
             features = np.array([])
         
@@ -569,6 +530,7 @@ class OCSort(object):
         trks = np.zeros((len(self.trackers), 5))
         to_del = []
         ret = []
+        KalmanBoxTracker.multi_predict(self.trackers, self.states)
         for t, trk in enumerate(trks):
             pos = self.trackers[t].predict()[0]
             cat = self.trackers[t].cate
@@ -577,7 +539,7 @@ class OCSort(object):
                 to_del.append(t)
         trks = np.ma.compress_rows(np.ma.masked_invalid(trks))
         for t in reversed(to_del):
-            self.trackers.pop(t)
+            self.states.remove(self.trackers.pop(t).slot)
 
         velocities = np.array([trk.velocity if trk.velocity is not None else np.array((0, 0)) for trk in self.trackers])
         last_boxes = np.array([trk.last_observation for trk in self.trackers])
@@ -636,9 +598,10 @@ class OCSort(object):
                     to_remove_trk_indices.append(trk_ind)
                 unmatched_dets = np.setdiff1d(unmatched_dets, np.array(to_remove_det_indices))
                 unmatched_trks = np.setdiff1d(unmatched_trks, np.array(to_remove_trk_indices))
+        KalmanBoxTracker.multi_update(self.trackers, self.states)
 
         for i in unmatched_dets:
-            trk = KalmanBoxTracker(dets[i])
+            trk = KalmanBoxTracker(dets[i], None, self.states, new_kf=not self.new_kf_off)
             trk.cate = cates[i]
             self.trackers.append(trk)
         i = len(self.trackers)
@@ -670,12 +633,8 @@ class OCSort(object):
                         )
             i -= 1
             if trk.time_since_update > self.max_age:
-                self.trackers.pop(i)
+                self.states.remove(self.trackers.pop(i).slot)
 
         if len(ret) > 0:
             return np.concatenate(ret)
         return np.empty((0, 7))
-
-    def dump_cache(self):
-        self.cmc.dump_cache()
-        self.embedder.dump_cache()
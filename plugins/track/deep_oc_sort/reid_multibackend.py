@@ -17,6 +17,7 @@ from ultralytics.yolo.utils import LOGGER
 from strong_sort.deep.reid_model_factory import (show_downloadeable_models, get_model_url, get_model_name,
                                                    download_url, load_pretrained_weights)
 from strong_sort.deep.models import build_model
+from tracklab.utils.precision import InferencePrecision, to_float32
 
 
 def check_suffix(file='yolov5s.pt', suffix=('.pt',), msg=''):
@@ -32,13 +33,21 @@ def check_suffix(file='yolov5s.pt', suffix=('.pt',), msg=''):
 
 class ReIDDetectMultiBackend(nn.Module):
     # ReID models MultiBackend class for python inference on various backends
-    def __init__(self, weights='osnet_x0_25_msmt17.pt', device=torch.device('cpu'), fp16=False):
+    # The PyTorch models run in the `precision` of `tracklab.utils.precision.InferencePrecision`
+    # ("fp16" if None and `fp16`, "fp32" otherwise), the other backends in half precision
+    # with `fp16`.
+    def __init__(self, weights='osnet_x0_25_msmt17.pt', device=torch.device('cpu'), fp16=False,
+                 precision=None, channels_last=False):
         super().__init__()
 
         w = weights[0] if isinstance(weights, list) else weights
         self.pt, self.jit, self.onnx, self.xml, self.engine, self.tflite = self.model_type(w)  # get backend
+        if precision is None:
+            precision = "fp16" if fp16 else "fp32"
+        self.inference = InferencePrecision(precision if self.pt else "fp32", device,
+                                            channels_last and self.pt)
         self.fp16 = fp16
-        self.fp16 &= self.pt or self.jit or self.engine  # FP16
+        self.fp16 &= self.jit or self.engine  # FP16, the PyTorch models run in self.inference
 
         # Build transform functions
         self.device = device
@@ -79,7 +88,7 @@ class ReIDDetectMultiBackend(nn.Module):
                 load_pretrained_weights(self.model, w)
                 
             self.model.to(device).eval()
-            self.model.half() if self.fp16 else  self.model.float()
+            self.model = self.inference.prepare(self.model.float())
         elif self.jit:
             LOGGER.info(f'Loading {w} for TorchScript inference...')
             self.model = torch.jit.load(w)
@@ -207,7 +216,8 @@ class ReIDDetectMultiBackend(nn.Module):
         # batch processing
         features = []
         if self.pt:
-            features = self.model(im_batch)
+            with self.inference.autocast():
+                features = to_float32(self.model(self.inference.inputs(im_batch)))
         elif self.jit:  # TorchScript
             features = self.model(im_batch)
         elif self.onnx:  # ONNX Runtime
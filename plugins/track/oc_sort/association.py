@@ -1,6 +1,8 @@
 import os
 import numpy as np
 
+from tracklab.utils import assignment
+
 
 def iou_batch(bboxes1, bboxes2):
     """
@@ -185,14 +187,7 @@ def speed_direction_batch(dets, tracks):
 
 
 def linear_assignment(cost_matrix):
-    try:
-        import lap
-        _, x, y = lap.lapjv(cost_matrix, extend_cost=True)
-        return np.array([[y[i],i] for i in x if i >= 0]) #
-    except ImportError:
-        from scipy.optimize import linear_sum_assignment
-        x, y = linear_sum_assignment(cost_matrix)
-        return np.array(list(zip(x, y)))
+    return assignment.linear_assignment(cost_matrix)[0]
 
 
 def associate_detections_to_trackers(detections,trackers, iou_threshold = 0.3):
@@ -5,6 +5,7 @@ from __future__ import print_function
 
 import numpy as np
 from .association import *
+from tracklab.utils.kalman import ObservationCentricStates, XYSRKalmanFilter
 from ultralytics.yolo.utils.ops import xywh2xyxy
 
 
@@ -61,30 +62,17 @@ class KalmanBoxTracker(object):
     """
     count = 0
 
-    def __init__(self, bbox, cls, delta_t=3, orig=False, tracklab_id=None):
+    def __init__(self, bbox, cls, states, delta_t=3, tracklab_id=None):
         """
         Initialises a tracker using initial bounding box.
 
+        The state of its (constant velocity) Kalman filter is kept in `states`,
+        shared by all the trackers, to run the filter of all of them at once.
         """
-        # define constant velocity model
-        if not orig:
-          from .kalmanfilter import KalmanFilterNew as KalmanFilter
-          self.kf = KalmanFilter(dim_x=7, dim_z=4)
-        else:
-          from filterpy.kalman import KalmanFilter
-          self.kf = KalmanFilter(dim_x=7, dim_z=4)
-        self.kf.F = np.array([[1, 0, 0, 0, 1, 0, 0], [0, 1, 0, 0, 0, 1, 0], [0, 0, 1, 0, 0, 0, 1], [
-                            0, 0, 0, 1, 0, 0, 0],  [0, 0, 0, 0, 1, 0, 0], [0, 0, 0, 0, 0, 1, 0], [0, 0, 0, 0, 0, 0, 1]])
-        self.kf.H = np.array([[1, 0, 0, 0, 0, 0, 0], [0, 1, 0, 0, 0, 0, 0],
-                            [0, 0, 1, 0, 0, 0, 0], [0, 0, 0, 1, 0, 0, 0]])
-
-        self.kf.R[2:, 2:] *= 10.
-        self.kf.P[4:, 4:] *= 1000.  # give high uncertainty to the unobservable initial velocities
-        self.kf.P *= 10.
-        self.kf.Q[-1, -1] *= 0.01
-        self.kf.Q[4:, 4:] *= 0.01
-
-        self.kf.x[:4] = convert_bbox_to_z(bbox)
+        self.states = states
+        self.slot = states.initiate(convert_bbox_to_z(bbox)[:, 0])
+        self.z = None  # observation of the current frame, given to the filter by OCSort.update
+
         self.time_since_update = 0
         self.id = KalmanBoxTracker.count
         KalmanBoxTracker.count += 1
@@ -141,33 +129,55 @@ class KalmanBoxTracker(object):
             self.history = []
             self.hits += 1
             self.hit_streak += 1
-            self.kf.update(convert_bbox_to_z(bbox))
+            self.z = convert_bbox_to_z(bbox)[:, 0]
         else:
-            self.kf.update(bbox)
+            self.z = np.full(4, np.nan)
 
         if tracklab_id is not None:
             self.tracklab_id = tracklab_id
 
-    def predict(self):
+    @staticmethod
+    def multi_predict(trackers, states):
         """
-        Advances the state vector and returns the predicted bounding box estimate.
+        Advances the state vectors of all the trackers at once.
         """
-        if((self.kf.x[6]+self.kf.x[2]) <= 0):
-            self.kf.x[6] *= 0.0
+        slots = np.array([trk.slot for trk in trackers], dtype=int)
+        if len(slots) == 0:
+            return
+        x = states.mean
+        vanishing = slots[(x[slots, 6] + x[slots, 2]) <= 0]
+        x[vanishing, 6] *= 0.0
+        states.predict(slots)
+
+    @staticmethod
+    def multi_update(trackers, states):
+        """
+        Updates the state vectors of all the trackers at once with the observations given
+        to their `update` on the current frame.
+        """
+        trackers = [trk for trk in trackers if trk.z is not None]
+        if len(trackers) == 0:
+            return
+        states.update([trk.slot for trk in trackers], np.stack([trk.z for trk in trackers]))
+        for trk in trackers:
+            trk.z = None
 
-        self.kf.predict()
+    def predict(self):
+        """
+        Returns the predicted bounding box estimate, after `multi_predict`.
+        """
         self.age += 1
         if(self.time_since_update > 0):
             self.hit_streak = 0
         self.time_since_update += 1
-        self.history.append(convert_x_to_bbox(self.kf.x))
+        self.history.append(self.get_state())
         return self.history[-1]
 
     def get_state(self):
         """
         Returns the current bounding box estimate.
         """
-        return convert_x_to_bbox(self.kf.x)
+        return convert_x_to_bbox(self.states.mean[self.slot])
 
 
 """
@@ -199,8 +209,29 @@ class OCSort(object):
         self.asso_func = ASSO_FUNCS[asso_func]
         self.inertia = inertia
         self.use_byte = use_byte
+        self.states = ObservationCentricStates(XYSRKalmanFilter())
         KalmanBoxTracker.count = 0
 
+    def camera_update(self, warp):
+        """
+        Applies the camera motion from the previous frame, a 2x3 affine `warp` of the image
+        (see tracklab.utils.camera_motion.CameraMotion), to the states of all the trackers
+        and to their observations used for the velocity direction.
+        """
+        self.states.warp([trk.slot for trk in self.trackers], warp)
+        boxes = {}  # the last observation is also in the observations
+        for trk in self.trackers:
+            recent = [trk.observations.get(trk.age - dt) for dt in range(self.delta_t + 1)]
+            for box in [trk.last_observation] + recent:
+                if box is not None and box.sum() >= 0:
+                    boxes[id(box)] = box
+        if len(boxes) == 0:
+            return
+        corners = np.stack([box[:4] for box in boxes.values()]).reshape(-1, 2)
+        corners = (corners @ warp[:, :2].T + warp[:, 2]).reshape(-1, 4)
+        for box, corner in zip(boxes.values(), corners):
+            box[:4] = corner
+
     def update(self, dets, _):
         """
         Params:
@@ -235,6 +266,7 @@ class OCSort(object):
         trks = np.zeros((len(self.trackers), 5))
         to_del = []
         ret = []
+        KalmanBoxTracker.multi_predict(self.trackers, self.states)
         for t, trk in enumerate(trks):
             pos = self.trackers[t].predict()[0]
             trk[:] = [pos[0], pos[1], pos[2], pos[3], 0]
@@ -242,7 +274,7 @@ class OCSort(object):
                 to_del.append(t)
         trks = np.ma.compress_rows(np.ma.masked_invalid(trks))
         for t in reversed(to_del):
-            self.trackers.pop(t)
+            self.states.remove(self.trackers.pop(t).slot)
 
         velocities = np.array(
             [trk.velocity if trk.velocity is not None else np.array((0, 0)) for trk in self.trackers])
@@ -308,10 +340,11 @@ class OCSort(object):
 
         for m in unmatched_trks:
             self.trackers[m].update(None, None)
+        KalmanBoxTracker.multi_update(self.trackers, self.states)
 
         # create and initialise new trackers for unmatched detections
         for i in unmatched_dets:
-            trk = KalmanBoxTracker(dets[i, :5], dets[i, 5], delta_t=self.delta_t, tracklab_id=dets[i, 6])
+            trk = KalmanBoxTracker(dets[i, :5], dets[i, 5], self.states, delta_t=self.delta_t, tracklab_id=dets[i, 6])
             self.trackers.append(trk)
         i = len(self.trackers)
         for trk in reversed(self.trackers):
@@ -329,7 +362,7 @@ class OCSort(object):
             i -= 1
             # remove dead tracklet
             if(trk.time_since_update > self.max_age):
-                self.trackers.pop(i)
+                self.states.remove(self.trackers.pop(i).slot)
         if(len(ret) > 0):
             return np.concatenate(ret)
         return np.empty((0, 7))
@@ -1,7 +1,7 @@
 # vim: expandtab:ts=4:sw=4
 from __future__ import absolute_import
 import numpy as np
-from scipy.optimize import linear_sum_assignment
+from tracklab.utils import assignment
 from . import kalman_filter
 
 
@@ -51,24 +51,11 @@ def min_cost_matching(
 
     cost_matrix = distance_metric(
         tracks, detections, track_indices, detection_indices)
-    cost_matrix[cost_matrix > max_distance] = max_distance + 1e-5
-    row_indices, col_indices = linear_sum_assignment(cost_matrix)
-
-    matches, unmatched_tracks, unmatched_detections = [], [], []
-    for col, detection_idx in enumerate(detection_indices):
-        if col not in col_indices:
-            unmatched_detections.append(detection_idx)
-    for row, track_idx in enumerate(track_indices):
-        if row not in row_indices:
-            unmatched_tracks.append(track_idx)
-    for row, col in zip(row_indices, col_indices):
-        track_idx = track_indices[row]
-        detection_idx = detection_indices[col]
-        if cost_matrix[row, col] > max_distance:
-            unmatched_tracks.append(track_idx)
-            unmatched_detections.append(detection_idx)
-        else:
-            matches.append((track_idx, detection_idx))
+    # the associations with a cost larger than max_distance are disregarded
+    matched, unmatched_rows, unmatched_cols = assignment.linear_assignment(cost_matrix, cost_limit=max_distance)
+    matches = [(track_indices[row], detection_indices[col]) for row, col in matched]
+    unmatched_tracks = [track_indices[row] for row in unmatched_rows]
+    unmatched_detections = [detection_indices[col] for col in unmatched_cols]
     return matches, unmatched_tracks, unmatched_detections
 
 
@@ -164,11 +151,14 @@ def gate_cost_matrix(
     """
     gating_dim = 2 if only_position else 4
     gating_threshold = kalman_filter.chi2inv95[gating_dim]
+    if len(track_indices) == 0:
+        return cost_matrix
     measurements = np.asarray(
         [detections[i].to_xyah() for i in detection_indices])
-    for row, track_idx in enumerate(track_indices):
-        track = tracks[track_idx]
-        gating_distance = track.kf.gating_distance(track.mean, track.covariance, measurements, only_position)
-        cost_matrix[row, gating_distance > gating_threshold] = gated_cost
-        cost_matrix[row] = mc_lambda * cost_matrix[row] + (1 - mc_lambda) *  gating_distance
+    # the tracks share their Kalman states, which are gated all at once
+    states = tracks[track_indices[0]].states
+    gating_distance = states.gating_distance(
+        [tracks[i].slot for i in track_indices], measurements, only_position)
+    cost_matrix[gating_distance > gating_threshold] = gated_cost
+    cost_matrix[:] = mc_lambda * cost_matrix + (1 - mc_lambda) * gating_distance
     return cost_matrix
@@ -141,7 +141,7 @@ class NearestNeighborDistanceMetric(object):
                 self.samples[target] = self.samples[target][-self.budget:]
         self.samples = {k: self.samples[k] for k in active_targets}
 
-    def distance(self, features, targets):
+    def distance(self, features, targets, candidates=None):
         """Compute distance between features and targets.
         Parameters
         ----------
@@ -149,6 +149,10 @@ class NearestNeighborDistanceMetric(object):
             An NxM matrix of N features of dimensionality M.
         targets : List[int]
             A list of targets to match the given `features` against.
+        candidates : Optional[ndarray]
+            A len(targets) x N boolean mask of the pairs to compute, e.g. the
+            pairs within the motion gate. The other pairs are set to infinity.
+            Defaults to all the pairs.
         Returns
         -------
         ndarray
@@ -156,7 +160,14 @@ class NearestNeighborDistanceMetric(object):
             element (i, j) contains the closest squared distance between
             `targets[i]` and `features[j]`.
         """
-        cost_matrix = np.zeros((len(targets), len(features)))
+        if candidates is None:
+            cost_matrix = np.zeros((len(targets), len(features)))
+            for i, target in enumerate(targets):
+                cost_matrix[i, :] = self._metric(self.samples[target], features)
+            return cost_matrix
+        cost_matrix = np.full((len(targets), len(features)), np.inf)
         for i, target in enumerate(targets):
-            cost_matrix[i, :] = self._metric(self.samples[target], features)
+            columns = np.flatnonzero(candidates[i])
+            if len(columns) > 0:
+                cost_matrix[i, columns] = self._metric(self.samples[target], features[columns])
         return cost_matrix
\ No newline at end of file
@@ -1,7 +1,5 @@
 # vim: expandtab:ts=4:sw=4
-import cv2
 import numpy as np
-from .kalman_filter import KalmanFilter
 from collections import deque
 
 
@@ -28,10 +26,10 @@ class Track:
 
     Parameters
     ----------
-    mean : ndarray
-        Mean vector of the initial state distribution.
-    covariance : ndarray
-        Covariance matrix of the initial state distribution.
+    detection : ndarray
+        Measurement `(x, y, a, h)` the track originates from.
+    states : tracklab.utils.kalman.KalmanStates
+        Kalman states of the tracker, in which the state of the track is stored.
     track_id : int
         A unique track identifier.
     n_init : int
@@ -48,9 +46,11 @@ class Track:
     Attributes
     ----------
     mean : ndarray
-        Mean vector of the initial state distribution.
+        Mean vector of the state distribution, a view on its row of `states`.
     covariance : ndarray
-        Covariance matrix of the initial state distribution.
+        Covariance matrix of the state distribution, a view on its row of `states`.
+    slot : int
+        Row of the state of the track in `states`.
     track_id : int
         A unique track identifier.
     hits : int
@@ -67,7 +67,7 @@ class Track:
 
     """
 
-    def __init__(self, detection, track_id, class_id, conf, n_init, max_age, ema_alpha,
+    def __init__(self, detection, states, track_id, class_id, conf, n_init, max_age, ema_alpha,
                  feature=None, tracklab_id=None):
         self.track_id = track_id
         self.class_id = int(class_id)
@@ -88,14 +88,31 @@ class Track:
         self._n_init = n_init
         self._max_age = max_age
 
-        self.kf = KalmanFilter()
-        self.mean, self.covariance = self.kf.initiate(detection)
-        
+        self.states = states
+        self.kf = states.kf
+        self.slot = states.initiate(detection)
+
         # Initializing trajectory queue
         self.q = deque(maxlen=25)
 
         self.tracklab_id = tracklab_id
 
+    @property
+    def mean(self):
+        return self.states.mean[self.slot]
+
+    @mean.setter
+    def mean(self, mean):
+        self.states.mean[self.slot] = mean
+
+    @property
+    def covariance(self):
+        return self.states.covariance[self.slot]
+
+    @covariance.setter
+    def covariance(self, covariance):
+        self.states.covariance[self.slot] = covariance
+
     def to_tlwh(self):
         """Get current position in bounding box format `(top left x, top left y,
         width, height)`.
@@ -126,123 +143,6 @@ class Track:
         return ret
 
 
-    def ECC(self, src, dst, warp_mode = cv2.MOTION_EUCLIDEAN, eps = 1e-5,
-        max_iter = 100, scale = 0.1, align = False):
-        """Compute the warp matrix from src to dst.
-        Parameters
-        ----------
-        src : ndarray 
-            An NxM matrix of source img(BGR or Gray), it must be the same format as dst.
-        dst : ndarray
-            An NxM matrix of target img(BGR or Gray).
-        warp_mode: flags of opencv
-            translation: cv2.MOTION_TRANSLATION
-            rotated and shifted: cv2.MOTION_EUCLIDEAN
-            affine(shift,rotated,shear): cv2.MOTION_AFFINE
-            homography(3d): cv2.MOTION_HOMOGRAPHY
-        eps: float
-            the threshold of the increment in the correlation coefficient between two iterations
-        max_iter: int
-            the number of iterations.
-        scale: float or [int, int]
-            scale_ratio: float
-            scale_size: [W, H]
-        align: bool
-            whether to warp affine or perspective transforms to the source image
-        Returns
-        -------
-        warp matrix : ndarray
-            Returns the warp matrix from src to dst.
-            if motion models is homography, the warp matrix will be 3x3, otherwise 2x3
-        src_aligned: ndarray
-            aligned source image of gray
-        """
-
-        # BGR2GRAY
-        if src.ndim == 3:
-            # Convert images to grayscale
-            src = cv2.cvtColor(src, cv2.COLOR_BGR2GRAY)
-            dst = cv2.cvtColor(dst, cv2.COLOR_BGR2GRAY)
-
-        # make the imgs smaller to speed up
-        if scale is not None:
-            if isinstance(scale, float) or isinstance(scale, int):
-                if scale != 1:
-                    src_r = cv2.resize(src, (0, 0), fx = scale, fy = scale,interpolation =  cv2.INTER_LINEAR)
-                    dst_r = cv2.resize(dst, (0, 0), fx = scale, fy = scale,interpolation =  cv2.INTER_LINEAR)
-                    scale = [scale, scale]
-                else:
-                    src_r, dst_r = src, dst
-                    scale = None
-            else:
-                if scale[0] != src.shape[1] and scale[1] != src.shape[0]:
-                    src_r = cv2.resize(src, (scale[0], scale[1]), interpolation = cv2.INTER_LINEAR)
-                    dst_r = cv2.resize(dst, (scale[0], scale[1]), interpolation=cv2.INTER_LINEAR)
-                    scale = [scale[0] / src.shape[1], scale[1] / src.shape[0]]
-                else:
-                    src_r, dst_r = src, dst
-                    scale = None
-        else:
-            src_r, dst_r = src, dst
-
-        # Define 2x3 or 3x3 matrices and initialize the matrix to identity
-        if warp_mode == cv2.MOTION_HOMOGRAPHY :
-            warp_matrix = np.eye(3, 3, dtype=np.float32)
-        else :
-            warp_matrix = np.eye(2, 3, dtype=np.float32)
-
-        # Define termination criteria
-        criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, max_iter, eps)
-
-        # Run the ECC algorithm. The results are stored in warp_matrix.
-        try:
-            (cc, warp_matrix) = cv2.findTransformECC (src_r, dst_r, warp_matrix, warp_mode, criteria, None, 1)
-        except cv2.error as e:
-            print('ecc transform failed')
-            return None, None
-        
-        if scale is not None:
-            warp_matrix[0, 2] = warp_matrix[0, 2] / scale[0]
-            warp_matrix[1, 2] = warp_matrix[1, 2] / scale[1]
-
-        if align:
-            sz = src.shape
-            if warp_mode == cv2.MOTION_HOMOGRAPHY:
-                # Use warpPerspective for Homography
-                src_aligned = cv2.warpPerspective(src, warp_matrix, (sz[1],sz[0]), flags=cv2.INTER_LINEAR)
-            else :
-                # Use warpAffine for Translation, Euclidean and Affine
-                src_aligned = cv2.warpAffine(src, warp_matrix, (sz[1],sz[0]), flags=cv2.INTER_LINEAR)
-            return warp_matrix, src_aligned
-        else:
-            return warp_matrix, None
-
-
-    def get_matrix(self, matrix):
-        eye = np.eye(3)
-        dist = np.linalg.norm(eye - matrix)
-        if dist < 100:
-            return matrix
-        else:
-            return eye
-
-    def camera_update(self, previous_frame, next_frame):
-        warp_matrix, src_aligned = self.ECC(previous_frame, next_frame)
-        if warp_matrix is None and src_aligned is None:
-            return
-        [a,b] = warp_matrix
-        warp_matrix=np.array([a,b,[0,0,1]])
-        warp_matrix = warp_matrix.tolist()
-        matrix = self.get_matrix(warp_matrix)
-
-        x1, y1, x2, y2 = self.to_tlbr()
-        x1_, y1_, _ = matrix @ np.array([x1, y1, 1]).T
-        x2_, y2_, _ = matrix @ np.array([x2, y2, 1]).T
-        w, h = x2_ - x1_, y2_ - y1_
-        cx, cy = x1_ + w / 2, y1_ + h / 2
-        self.mean[:4] = [cx, cy, w / h, h]
-
-
     def increment_age(self):
         self.age += 1
         self.time_since_update += 1
@@ -257,13 +157,18 @@ class Track:
             The Kalman filter.
 
         """
-        self.mean, self.covariance = self.kf.predict(self.mean, self.covariance)
-        self.age += 1
-        self.time_since_update += 1
-        
+        self.states.predict([self.slot])
+        self.increment_age()
+
     def update_kf(self, bbox, confidence=0.5):
+        self.states.update([self.slot], [bbox], confidence=[confidence])
+        self.mark_updated_wo_assignment()
+
+    def mark_updated_wo_assignment(self):
+        """Bookkeeping of an update with the predicted state of the track, whose Kalman
+        filter step was already run (see `Tracker.update`).
+        """
         self.updates_wo_assignment = self.updates_wo_assignment + 1
-        self.mean, self.covariance = self.kf.update(self.mean, self.covariance, bbox, confidence)
         tlbr = self.to_tlbr()
         x_c = int((tlbr[0] + tlbr[2]) / 2)
         y_c = int((tlbr[1] + tlbr[3]) / 2)
@@ -277,9 +182,15 @@ class Track:
         detection : Detection
             The associated detection.
         """
+        self.states.update([self.slot], [detection.to_xyah()], confidence=[detection.confidence])
+        self.mark_hit(detection, class_id, conf, tracklab_id)
+
+    def mark_hit(self, detection, class_id, conf, tracklab_id=None):
+        """Update the feature cache and the track state after an association with
+        `detection`, whose Kalman filter step was already run (see `Tracker.update`).
+        """
         self.conf = conf
         self.class_id = int(class_id)
-        self.mean, self.covariance = self.kf.update(self.mean, self.covariance, detection.to_xyah(), detection.confidence)
 
         feature = detection.feature / np.linalg.norm(detection.feature)
 
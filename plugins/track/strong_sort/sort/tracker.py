@@ -1,6 +1,8 @@
 # vim: expandtab:ts=4:sw=4
 from __future__ import absolute_import
 import numpy as np
+from tracklab.utils.kalman import KalmanStates
+from tracklab.utils.spatial_grid import candidate_pairs
 from . import kalman_filter
 from . import linear_assignment
 from . import iou_matching
@@ -31,12 +33,18 @@ class Tracker:
         Number of frames that a track remains in initialization phase.
     kf : kalman_filter.KalmanFilter
         A Kalman filter to filter target trajectories in image space.
+    states : tracklab.utils.kalman.KalmanStates
+        The Kalman states of all the tracks, filtered all at once.
     tracks : List[Track]
         The list of active tracks at the current time step.
+    spatial_gating : bool
+        If True, the appearance distances are only computed for the detections
+        whose center is within the bounding box of the motion gate of a track,
+        the other pairs being gated anyway.
     """
     GATING_THRESHOLD = np.sqrt(kalman_filter.chi2inv95[4])
 
-    def __init__(self, metric, max_iou_dist=0.9, max_age=30, max_unmatched_preds=7, n_init=3, _lambda=0, ema_alpha=0.9, mc_lambda=0.995):
+    def __init__(self, metric, max_iou_dist=0.9, max_age=30, max_unmatched_preds=7, n_init=3, _lambda=0, ema_alpha=0.9, mc_lambda=0.995, spatial_gating=True):
         self.metric = metric
         self.max_iou_dist = max_iou_dist
         self.max_age = max_age
@@ -45,8 +53,10 @@ class Tracker:
         self.ema_alpha = ema_alpha
         self.mc_lambda = mc_lambda
         self.max_unmatched_preds = max_unmatched_preds
+        self.spatial_gating = spatial_gating
         
         self.kf = kalman_filter.KalmanFilter()
+        self.states = KalmanStates(self.kf)
         self.tracks = []
         self._next_id = 1
 
@@ -55,27 +65,40 @@ class Tracker:
 
         This function should be called once every time step, before `update`.
         """
+        self.states.predict([track.slot for track in self.tracks])
         for track in self.tracks:
-            track.predict(self.kf)
+            track.increment_age()
 
     def increment_ages(self):
         for track in self.tracks:
             track.increment_age()
             track.mark_missed()
 
-    def camera_update(self, previous_img, current_img):
-        for track in self.tracks:
-            track.camera_update(previous_img, current_img)
+    def camera_update(self, warp):
+        """Apply the camera motion from the previous frame, a 2x3 affine `warp` of the
+        image (see `tracklab.utils.camera_motion.CameraMotion`), to all the tracks."""
+        self.states.warp([track.slot for track in self.tracks], warp)
             
     def pred_n_update_all_tracks(self):
         """Perform predictions and updates for all tracks by its own predicted state.
 
         """
         self.predict()
-        for t in self.tracks:
-            if self.max_unmatched_preds != 0 and t.updates_wo_assignment < t.max_num_updates_wo_assignment:
-                bbox = t.to_tlwh()
-                t.update_kf(detection.to_xyah_ext(bbox))
+        self._update_with_predictions(self.tracks)
+
+    def _update_with_predictions(self, tracks):
+        """Update the tracks allowed to, i.e. which were not updated without assignment
+        too many times, with their own predicted state."""
+        if self.max_unmatched_preds == 0:
+            return
+        tracks = [t for t in tracks if t.updates_wo_assignment < t.max_num_updates_wo_assignment]
+        self.states.update(
+            [t.slot for t in tracks],
+            [detection.to_xyah_ext(t.to_tlwh()) for t in tracks],
+            confidence=np.full(len(tracks), 0.5),
+        )
+        for t in tracks:
+            t.mark_updated_wo_assignment()
 
     def update(self, detections, classes, confidences, tracklab_ids):
         """Perform measurement update and track management.
@@ -90,18 +113,24 @@ class Tracker:
         matches, unmatched_tracks, unmatched_detections = \
             self._match(detections)
 
-        # Update track set.
+        # Update track set, with a single Kalman filter step for all the matched tracks.
+        self.states.update(
+            [self.tracks[track_idx].slot for track_idx, _ in matches],
+            [detections[detection_idx].to_xyah() for _, detection_idx in matches],
+            confidence=np.array([detections[detection_idx].confidence for _, detection_idx in matches]),
+        )
         for track_idx, detection_idx in matches:
-            self.tracks[track_idx].update(
+            self.tracks[track_idx].mark_hit(
                 detections[detection_idx], classes[detection_idx], confidences[detection_idx], tracklab_ids[detection_idx])
         for track_idx in unmatched_tracks:
             self.tracks[track_idx].mark_missed()
-            if self.max_unmatched_preds != 0 and self.tracks[track_idx].updates_wo_assignment < self.tracks[track_idx].max_num_updates_wo_assignment:
-                bbox = self.tracks[track_idx].to_tlwh()
-                self.tracks[track_idx].update_kf(detection.to_xyah_ext(bbox))
+        self._update_with_predictions([self.tracks[track_idx] for track_idx in unmatched_tracks])
         for detection_idx in unmatched_detections:
             self._initiate_track(detections[detection_idx], classes[detection_idx].item(), confidences[detection_idx].item(),
                                  tracklab_ids[detection_idx].item())
+        for t in self.tracks:
+            if t.is_deleted():
+                self.states.remove(t.slot)
         self.tracks = [t for t in self.tracks if not t.is_deleted()]
 
         # Update distance metric.
@@ -127,14 +156,10 @@ class Tracker:
         is more intuitive in terms of values.
         """
         # Compute First the Position-based Cost Matrix
-        pos_cost = np.empty([len(track_indices), len(detection_indices)])
         msrs = np.asarray([dets[i].to_xyah() for i in detection_indices])
-        for row, track_idx in enumerate(track_indices):
-            pos_cost[row, :] = np.sqrt(
-                self.kf.gating_distance(
-                    tracks[track_idx].mean, tracks[track_idx].covariance, msrs, False
-                )
-            ) / self.GATING_THRESHOLD
+        pos_cost = np.sqrt(
+            self.states.gating_distance([tracks[i].slot for i in track_indices], msrs, False)
+        ) / self.GATING_THRESHOLD
         pos_gate = pos_cost > 1.0
         # Now Compute the Appearance-based Cost Matrix
         app_cost = self.metric.distance(
@@ -148,12 +173,26 @@ class Tracker:
         # Return Matrix
         return cost_matrix
 
+    def _gate_candidates(self, tracks, dets, track_indices, detection_indices):
+        """Mask of the pairs of tracks and detections which can be within the motion
+        gate of `linear_assignment.gate_cost_matrix`, found with a spatial grid of the
+        centers of the detections."""
+        centers = np.asarray([dets[i].to_xyah()[:2] for i in detection_indices]).reshape(-1, 2)
+        gate_boxes = self.states.gate_boxes(
+            [tracks[i].slot for i in track_indices], kalman_filter.chi2inv95[4])
+        rows, cols = candidate_pairs(gate_boxes, np.concatenate([centers, centers], axis=1))
+        candidates = np.zeros((len(track_indices), len(detection_indices)), dtype=bool)
+        candidates[rows, cols] = True
+        return candidates
+
     def _match(self, detections):
 
         def gated_metric(tracks, dets, track_indices, detection_indices):
             features = np.array([dets[i].feature for i in detection_indices])
             targets = np.array([tracks[i].track_id for i in track_indices])
-            cost_matrix = self.metric.distance(features, targets)
+            candidates = self._gate_candidates(tracks, dets, track_indices, detection_indices) \
+                if self.spatial_gating else None
+            cost_matrix = self.metric.distance(features, targets, candidates)
             cost_matrix = linear_assignment.gate_cost_matrix(cost_matrix, tracks, dets, track_indices, detection_indices, self.mc_lambda)
 
             return cost_matrix
@@ -188,6 +227,6 @@ class Tracker:
 
     def _initiate_track(self, detection, class_id, conf, tracklab_id=None):
         self.tracks.append(Track(
-            detection.to_xyah(), self._next_id, class_id, conf, self.n_init, self.max_age, self.ema_alpha,
+            detection.to_xyah(), self.states, self._next_id, class_id, conf, self.n_init, self.max_age, self.ema_alpha,
             detection.feature, tracklab_id=tracklab_id))
         self._next_id += 1
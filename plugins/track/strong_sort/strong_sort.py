@@ -11,6 +11,7 @@ from .sort.detection import Detection
 from .sort.tracker import Tracker
 
 from .reid_multibackend import ReIDDetectMultiBackend
+from tracklab.utils.feature_cache import cached_rows, content_hash, file_hash
 
 from ultralytics.yolo.utils.ops import xyxy2xywh
 
@@ -27,19 +28,29 @@ class StrongSORT(object):
                  n_init=3,
                  nn_budget=100,
                  mc_lambda=0.995,
-                 ema_alpha=0.9
+                 ema_alpha=0.9,
+                 spatial_gating=True
                 ):
 
         self.model = ReIDDetectMultiBackend(weights=model_weights, device=device, fp16=fp16)
+        # identifies the reid model in the keys of the feature cache
+        self.features_key = content_hash("ReIDDetectMultiBackend", file_hash(model_weights), fp16)
         
         self.max_dist = max_dist
         metric = NearestNeighborDistanceMetric(
             "cosine", self.max_dist, nn_budget)
         self.tracker = Tracker(
-            metric, max_iou_dist=max_iou_dist, max_age=max_age, n_init=n_init, max_unmatched_preds=max_unmatched_preds, mc_lambda=mc_lambda, ema_alpha=ema_alpha)
+            metric, max_iou_dist=max_iou_dist, max_age=max_age, n_init=n_init, max_unmatched_preds=max_unmatched_preds, mc_lambda=mc_lambda, ema_alpha=ema_alpha,
+            spatial_gating=spatial_gating)
+
+    def update(self, dets, ori_img, compensate_camera_motion=None):
+        """Track the detections `dets` of the frame `ori_img`.
+
+        If given, `compensate_camera_motion(tracker)` applies the camera motion of the
+        frame to the tracks of the tracker. It is called after extracting the features
+        of the detections, which can overlap with the estimation of the motion.
+        """
 
-    def update(self, dets,  ori_img):
-        
         xyxys = dets[:, 0:4]
         confs = dets[:, 4]
         clss = dets[:, 5]
@@ -62,6 +73,8 @@ class StrongSORT(object):
         scores = np.array([d.confidence for d in detections])
 
         # update tracker
+        if compensate_camera_motion is not None:
+            compensate_camera_motion(self.tracker)
         self.tracker.predict()
         self.tracker.update(detections, classes, confs, tracklab_ids)
 
@@ -139,7 +152,11 @@ class StrongSORT(object):
             im = ori_img[y1:y2, x1:x2]
             im_crops.append(im)
         if im_crops:
-            features = self.model(im_crops)
+            features = torch.from_numpy(cached_rows(
+                len(im_crops),
+                lambda i: content_hash(self.features_key, im_crops[i]),
+                lambda idxs: {"features": self.model([im_crops[i] for i in idxs]).cpu().numpy()},
+            )["features"])
         else:
             features = np.array([])
         return features
@@ -1,4 +1,8 @@
 from .callback import Callback
 from .progress import Progressbar, RichProgressbar
 from .handle_regions import IgnoredRegions
-from .timer import Timer
\ No newline at end of file
+from .timer import Timer
+from .frame_cache import FrameCache
+from .profiler import Profiler
+from .feature_cache import FeatureCache
+from .evaluate import IncrementalEvaluate
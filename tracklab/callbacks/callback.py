@@ -73,4 +73,6 @@ class Callback:
     def on_module_step_end(
         self, engine: "TrackingEngine", task: str, batch: Any, detections: pd.DataFrame
     ):
+        """Called after each batch of a module, with the `detections` output by the
+        module for this batch (not all the detections of the video)."""
         pass
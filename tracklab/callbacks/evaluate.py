@@ -1,6 +1,16 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import torch
+from omegaconf import OmegaConf
+
 from tracklab.core import Evaluator
 from tracklab.callbacks import Callback
+from tracklab.datastruct import TrackingDataset
 from tracklab.engine import TrackingEngine
+from tracklab.utils import wandb
 
 import logging
 
@@ -18,4 +28,125 @@ class Evaluate(Callback):
         else:
             log.warning(
                 "Skipping evaluation because there's no ground truth detection."
-            )
\ No newline at end of file
+            )
+
+
+class IncrementalEvaluate(Callback):
+    """Evaluates each video with TrackEval as soon as it is tracked, and logs the
+    metrics of all the videos tracked so far.
+
+    The HOTA, CLEAR, Identity... sufficient statistics of each video are computed in a
+    pool of `workers` processes while the next videos are tracked, and combined like
+    TrackEval combines the sequences : the combined metrics of the last video are the
+    ones of the whole dataset, available (in `combined`) as soon as the tracking ends.
+    Only the MOT Challenge datasets (`MotChallenge2DBox`) are supported. The ground
+    truth is the one of the TrackEval evaluator : taken from the tracker state with
+    `save_gt`, read from the files of the dataset otherwise.
+
+    Args:
+        cfg: config of the TrackEval evaluator, e.g. `${eval.cfg}`
+        eval_set: evaluated split of the dataset
+        dataset_path: path of the ground truth files of the evaluator, e.g.
+            `${eval.dataset_path}`, required without `save_gt`
+        workers: number of evaluation processes
+        log_metrics: metrics logged after each video
+    """
+
+    def __init__(self, cfg, eval_set: str, dataset_path: Optional[str] = None, workers: int = 2,
+                 log_metrics=("HOTA", "DetA", "AssA", "MOTA", "IDF1"), **kwargs):
+        self.cfg = cfg
+        self.eval_set = eval_set
+        self.dataset_path = dataset_path
+        self.workers = workers
+        self.log_metrics = list(log_metrics)
+        self.results = {}
+        self.combined = None
+        self._executor = None
+        self._pending = {}
+
+    def on_dataset_track_start(self, engine: TrackingEngine):
+        dataset_class = self.cfg.dataset.dataset_class
+        if dataset_class != "MotChallenge2DBox":
+            log.warning(f"{dataset_class} can't be evaluated incrementally, "
+                        f"only the MotChallenge2DBox datasets can")
+            return
+        if not self.cfg.save_gt and self.dataset_path is None:
+            log.warning("The ground truth files can't be evaluated incrementally without their "
+                        "dataset_path, e.g. ${eval.dataset_path}")
+            return
+        from tracklab.wrappers.eval.trackeval_evaluator import trackeval_dataset_config
+        # the sequences are given to each evaluation
+        dataset_config = trackeval_dataset_config(self.cfg, self.dataset_path, seq_info={})
+        self._dataset_config = OmegaConf.to_container(
+            OmegaConf.create(dict(dataset_config, PRINT_CONFIG=False)), resolve=True)
+        self._metrics_config = {"METRICS": list(self.cfg.metrics), "PRINT_CONFIG": False, "THRESHOLD": 0.5}
+        self.results = {}
+        self.combined = None
+        # spawn is required by CUDA, the tracking goes on in this process
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=torch.multiprocessing.get_context("spawn"))
+
+    def on_video_loop_end(
+        self,
+        engine: TrackingEngine,
+        video_metadata: pd.Series,
+        video_idx: int,
+        detections: pd.DataFrame,
+        image_pred: pd.DataFrame,
+    ):
+        if self._executor is None:
+            return
+        from tracklab.wrappers.eval.trackeval_dataset import evaluate_sequence
+        tracker_state = engine.tracker_state
+        video_metadatas = engine.video_metadatas.loc[[video_idx]]
+        predictions = TrackingDataset.mot_sequences(
+            detections, image_pred.copy(), video_metadatas, self.cfg.bbox_column_for_eval)
+        seq = video_metadata["name"]
+        gt = None  # read from its file, as by the evaluator
+        if self.cfg.save_gt:
+            detections_gt = tracker_state.detections_gt
+            image_gt = tracker_state.image_gt
+            gt = TrackingDataset.mot_sequences(
+                detections_gt[detections_gt.video_id == video_idx],
+                image_gt[image_gt.video_id == video_idx].copy(),
+                video_metadatas,
+                self.cfg.bbox_column_for_eval,
+            )[seq]
+        future = self._executor.submit(
+            evaluate_sequence, self._dataset_config, self._metrics_config, list(self.cfg.metrics),
+            seq, int(video_metadata["nframes"]), predictions[seq], gt,
+        )
+        self._pending[seq] = future
+        if self._collect(wait=False):
+            self._log("Running")
+
+    def on_dataset_track_end(self, engine: TrackingEngine):
+        if self._executor is None:
+            return
+        self._collect(wait=True)
+        self._executor.shutdown()
+        self._executor = None
+        if self.results:
+            self._log("Final")
+
+    def _collect(self, wait: bool) -> bool:
+        """Gathers the results of the evaluated videos and combines them, returns
+        whether there are new ones."""
+        from tracklab.wrappers.eval.trackeval_dataset import combine_sequences
+        done = [seq for seq, future in self._pending.items() if wait or future.done()]
+        for seq in done:
+            self.results[seq] = self._pending.pop(seq).result()
+        if done:
+            self.combined = combine_sequences(list(self.cfg.metrics), self._metrics_config, self.results)
+        return len(done) > 0
+
+    def _log(self, title):
+        summary = {}
+        for metrics in self.combined.values():
+            for family in metrics.values():
+                for name in self.log_metrics:
+                    if name in family:
+                        summary[name] = float(np.mean(family[name]))
+        log.info(f"{title} metrics on {len(self.results)} videos : "
+                 + ", ".join(f"{name}={100 * value:.2f}" for name, value in summary.items()))
+        wandb.log({f"incremental/{name}": value for name, value in summary.items()})
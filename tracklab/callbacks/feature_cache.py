@@ -0,0 +1,64 @@
+import logging
+
+import pandas as pd
+
+from tracklab.callbacks import Callback
+from tracklab.engine import TrackingEngine
+from tracklab.utils.feature_cache import FeatureStore, set_feature_cache
+
+log = logging.getLogger(__name__)
+
+
+class FeatureCache(Callback):
+    """Keeps the features computed by the modules (detections, reid embeddings, camera
+    motion...) in an on-disk store shared by all the runs, so that the runs with the
+    same upstream modules don't compute them again, e.g. in a sweep over the
+    hyperparameters of a tracker.
+
+    The features are addressed by the content they are computed from and the model
+    computing them, e.g. the pixels of a detection and the weights of the reid model :
+    changing a model or its inputs gives new features, there is no need to clear the
+    store. The store is opened when the tracking starts and its hits and misses are
+    logged at the end of each video (and kept in `stats`).
+
+    Args:
+        path: directory of the store
+        max_bytes: maximum size of the store on disk, in bytes
+    """
+
+    def __init__(self, path: str, max_bytes: int = 16 * 2**30, **kwargs):
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self.store = None
+        self.stats = {}
+
+    def on_dataset_track_start(self, engine: TrackingEngine):
+        self.store = FeatureStore(self.path, self.max_bytes)
+        set_feature_cache(self.store)
+
+    def on_dataset_track_end(self, engine: TrackingEngine):
+        set_feature_cache(None)
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def on_video_loop_start(
+        self, engine: TrackingEngine, video_metadata: pd.Series, video_idx: int, index: int
+    ):
+        self.store.reset_stats()
+
+    def on_video_loop_end(
+        self,
+        engine: TrackingEngine,
+        video_metadata: pd.Series,
+        video_idx: int,
+        detections: pd.DataFrame,
+        image_pred: pd.DataFrame,
+    ):
+        stats = self.store.stats
+        self.stats[video_idx] = stats
+        log.info(
+            f"Feature cache of video {video_idx} : {stats['hits']} hits, "
+            f"{stats['misses']} misses ({100 * stats['hit_rate']:.1f}% hit rate), "
+            f"{stats['writes']} writes, {stats['evictions']} evictions"
+        )
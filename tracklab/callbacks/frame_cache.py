@@ -0,0 +1,62 @@
+import logging
+
+import pandas as pd
+
+from tracklab.callbacks import Callback
+from tracklab.engine import TrackingEngine
+from tracklab.utils.frame_cache import SharedFrameCache, set_frame_cache
+
+log = logging.getLogger(__name__)
+
+
+class FrameCache(Callback):
+    """Shares the decoded frames of a video between the modules, their DataLoader
+    workers and the visualization, so that each frame is decoded once per video pass
+    instead of once per module.
+
+    The cache is created in the main process when the tracking starts and is inherited
+    by the processes forked afterwards. It is emptied at the start of each video and its
+    hits and misses are logged at the end of the video (and kept in `stats`). This
+    callback is called after the tracker state is saved, like the visualization, and
+    should be declared after it to count its hits.
+
+    Args:
+        byte_budget: maximum size of the decoded frames kept in memory, in bytes
+    """
+    after_saved_state = True
+
+    def __init__(self, byte_budget: int = 2 * 2**30, **kwargs):
+        self.byte_budget = int(byte_budget)
+        self.cache = None
+        self.stats = {}
+
+    def on_dataset_track_start(self, engine: TrackingEngine):
+        self.cache = SharedFrameCache(self.byte_budget)
+        set_frame_cache(self.cache)
+
+    def on_dataset_track_end(self, engine: TrackingEngine):
+        set_frame_cache(None)
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    def on_video_loop_start(
+        self, engine: TrackingEngine, video_metadata: pd.Series, video_idx: int, index: int
+    ):
+        self.cache.clear()
+
+    def on_video_loop_end(
+        self,
+        engine: TrackingEngine,
+        video_metadata: pd.Series,
+        video_idx: int,
+        detections: pd.DataFrame,
+        image_pred: pd.DataFrame,
+    ):
+        stats = self.cache.stats
+        self.stats[video_idx] = stats
+        log.info(
+            f"Frame cache of video {video_idx} : {stats['hits']} hits, "
+            f"{stats['misses']} misses ({100 * stats['hit_rate']:.1f}% hit rate), "
+            f"{stats['evictions']} evictions"
+        )
@@ -18,62 +18,83 @@ class IgnoredRegions(Callback):
         image_metadatas = engine.img_metadatas[
             engine.img_metadatas.video_id == video_idx
         ]
-        """
-        detections.insert(-1, "ignored", detections.apply(
-            lambda x: self.mark_ignored(x, image_metadatas), axis=1
-        ))
-        """
         if len(detections):
-            detections["ignored"] = detections.apply(
-                lambda x: self.mark_ignored(x, image_metadatas), axis=1
-            )
+            detections["ignored"] = self.mark_ignored(detections, image_metadatas)
         else:
             detections["ignored"] = pd.NA
 
     def __init__(self, max_intersection=0.9):
         self.max_intersection = max_intersection
 
-    def mark_ignored(self, detection, image_metadatas):
-        if hasattr(image_metadatas, "ignore_regions_x") and hasattr(
+    def mark_ignored(self, detections, image_metadatas):
+        """Whether each detection is in an ignore region of its image, the ignore regions
+        of each image being rasterized once for all its detections."""
+        ignored = pd.Series(False, index=detections.index)
+        if not (hasattr(image_metadatas, "ignore_regions_x") and hasattr(
             image_metadatas, "ignore_regions_y"
-        ):
-            image_metadata = image_metadatas.loc[detection.image_id]
-            return self.compute_iou(
-                detection.bbox.ltrb(rounded=True),
+        )):
+            return ignored
+        for image_id, image_detections in detections.groupby("image_id", sort=False):
+            image_metadata = image_metadatas.loc[image_id]
+            ignored[image_detections.index] = self.compute_ignored(
+                image_detections.bbox.ltrb(rounded=True),
                 image_metadata.ignore_regions_x,
                 image_metadata.ignore_regions_y,
             )
-        return False
+        return ignored
 
-    def compute_iou(self, bbox_ltrb, ignore_regions_x, ignore_regions_y):
-        """Compute the intersection of a detection and a list of ignore regions and check whether
-        it is higher than a portion of the area or not.
+    def compute_ignored(self, bboxes_ltrb, ignore_regions_x, ignore_regions_y):
+        """Compute the intersection of the detections of an image and each of its ignore regions
+        and check whether it is higher than a portion of their area or not.
+
+        Each ignore region is rasterized once, and the area of its intersection with all the
+        detections is read from its integral image.
 
         Args:
-            bbox_ltrb (np.array): bounding box of the detection [left, top, right, bottom]
+            bboxes_ltrb (np.array): (N, 4) bounding boxes of the detections [left, top, right, bottom]
             ignore_regions_x (tuple): list of ignore regions x coordinates
             ignore_regions_y (tuple): list of ignore regions y coordinates
 
+        Returns:
+            np.array: (N,) True for the detections whose area is higher than a certain threshold in an
+            ignore region, False otherwise
+        """
+        bboxes_ltrb = np.asarray(bboxes_ltrb, dtype=int).reshape(-1, 4)
+        ignored = np.zeros(len(bboxes_ltrb), dtype=bool)
+        if len(bboxes_ltrb) == 0 or not isinstance(ignore_regions_x, (list, tuple, np.ndarray)):
+            return ignored
+        l, t, r, b = bboxes_ltrb.T
+        bbox_area = (r - l) * (b - t)
+        # the intersections are only counted inside the image
+        l, t = np.maximum(l, 0), np.maximum(t, 0)
+        r, b = np.maximum(r, l), np.maximum(b, t)
+
+        polygons = [
+            np.array([ignore_region_x, ignore_region_y]).round().T.astype(np.int32)
+            for ignore_region_x, ignore_region_y in zip(ignore_regions_x, ignore_regions_y)
+            if len(ignore_region_x) > 0
+        ]
+        if len(polygons) == 0:
+            return ignored
+        # large enough for all the detections and regions, so that no region is clipped
+        image_dim_max = (
+            max(b.max(), max(polygon_points[:, 1].max() for polygon_points in polygons) + 1),
+            max(r.max(), max(polygon_points[:, 0].max() for polygon_points in polygons) + 1),
+        )  # height, width
+        ignore_mask = np.zeros(image_dim_max, dtype=np.uint8)
+        for polygon_points in polygons:
+            ignore_mask[:] = 0
+            cv2.fillPoly(ignore_mask, [polygon_points], 1)
+            integral = cv2.integral(ignore_mask)  # (height + 1, width + 1) cumulated sums
+            intersection_area = integral[b, r] - integral[t, r] - integral[b, l] + integral[t, l]
+            ignored |= intersection_area > self.max_intersection * bbox_area
+        return ignored
+
+    def compute_iou(self, bbox_ltrb, ignore_regions_x, ignore_regions_y):
+        """Same as :func:`compute_ignored` for a single detection.
+
         Returns:
             bool: True if the area of the detection is higher than a certain threshold in an ignore region,
             False otherwise
         """
-        l, t, r, b = bbox_ltrb
-
-        for ignore_region_x, ignore_region_y in zip(ignore_regions_x, ignore_regions_y):
-            polygon_points = (
-                np.array([ignore_region_x, ignore_region_y]).round().T.astype(int)
-            )
-            image_dim_max = (
-                max(b, polygon_points[:, 1].max()),
-                max(r, polygon_points[:, 0].max()),
-            )  # height, width
-            bbox_mask = np.zeros(image_dim_max, dtype=np.uint8)
-            bbox_mask[t:b, l:r] = 1
-            ignore_mask = np.zeros(image_dim_max, dtype=np.uint8)
-            ignore_mask = cv2.fillPoly(ignore_mask, [polygon_points], 1)
-            intersection_area = np.logical_and(bbox_mask, ignore_mask).sum()
-            bbox_area = (r - l) * (b - t)
-            if intersection_area > self.max_intersection * bbox_area:
-                return True
-        return False
+        return bool(self.compute_ignored([bbox_ltrb], ignore_regions_x, ignore_regions_y)[0])
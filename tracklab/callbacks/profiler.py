@@ -0,0 +1,265 @@
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from functools import partial
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import DataLoader
+
+from tracklab.callbacks import Callback
+from tracklab.engine import TrackingEngine
+
+log = logging.getLogger(__name__)
+
+STAGES = ["wait", "preprocess", "process", "merge", "callbacks"]
+
+
+def batch_nbytes(batch: Any) -> int:
+    """Size of the tensors and arrays contained in a batch."""
+    if isinstance(batch, torch.Tensor):
+        return batch.element_size() * batch.nelement()
+    if isinstance(batch, np.ndarray):
+        return batch.nbytes
+    if isinstance(batch, dict):
+        return sum(batch_nbytes(value) for value in batch.values())
+    if isinstance(batch, (list, tuple)):
+        return sum(batch_nbytes(value) for value in batch)
+    return 0
+
+
+class _SharedSamples:
+    """Timings recorded in any process, e.g. by the DataLoader workers forked from
+    the main process, as (module, start, duration, pid) rows in shared memory."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._lock = multiprocessing.Lock()
+        self._shm = shared_memory.SharedMemory(create=True, size=8 * (1 + 4 * capacity))
+        self._owner_pid = os.getpid()
+        buffer = np.ndarray((1 + 4 * capacity,), dtype=np.float64, buffer=self._shm.buf)
+        self._count = buffer[:1]
+        self._rows = buffer[1:].reshape(capacity, 4)
+        self._count[0] = 0
+
+    def add(self, module: int, start: float, duration: float):
+        with self._lock:
+            i = int(self._count[0])
+            if i < self.capacity:
+                self._rows[i] = (module, start, duration, os.getpid())
+            self._count[0] = i + 1
+
+    def drain(self):
+        """Returns the rows recorded since the last call and the number of rows lost."""
+        with self._lock:
+            count = int(self._count[0])
+            rows = self._rows[:min(count, self.capacity)].copy()
+            self._count[0] = 0
+        return rows, max(count - self.capacity, 0)
+
+    def close(self):
+        self._rows = self._count = None
+        self._shm.close()
+        if self._owner_pid == os.getpid():
+            self._shm.unlink()
+
+
+class Profiler(Callback):
+    """Breaks down the time spent by each module into stages and dumps a trace of
+    each video.
+
+    The stages of a module are :
+     - wait : waiting for the next batch (from the DataLoader, or from the previous
+       stage with the :class:`tracklab.engine.PipelinedTrackingEngine`)
+     - preprocess : `preprocess` of each sample, in the DataLoader workers or not
+     - process : `process` of each batch
+     - merge : the rest of a step, i.e. selecting the inputs and merging the outputs
+     - callbacks : the callbacks called for the module, including this one
+
+    The latencies of each stage (p50/p95/p99) and the mean size of the batches given
+    to `process` are printed as a table at the end of the tracking and kept in
+    `summary`. With `trace`, a Chrome trace (`{video}.trace.json`, which can also be
+    opened with speedscope or Perfetto) is written in `output_dir` for each video.
+
+    The timings are taken by replacing the `preprocess` and `process` functions of the
+    modules and the `callback` function of the engine for the duration of the
+    tracking, which is not supported when several videos are tracked in parallel.
+
+    Args:
+        output_dir: folder of the traces
+        trace: whether to write the trace of each video
+        capacity: maximum number of `preprocess` calls recorded per module
+    """
+
+    def __init__(self, output_dir: str = "profiling", trace: bool = True, capacity: int = 2**20,
+                 **kwargs):
+        self.output_dir = Path(output_dir)
+        self.trace = trace
+        self.capacity = capacity
+        self.summary = None
+        self._enabled = False
+        self._durations = defaultdict(list)  # (module, stage) -> durations in seconds
+        self._bytes = defaultdict(list)  # module -> size of each batch
+        self._events = []
+        self._step_start = {}
+        self._last_end = {}
+        self._process_time = defaultdict(float)
+        self._lost = 0
+
+    def on_dataset_track_start(self, engine: TrackingEngine):
+        if getattr(engine, "video_workers", 0) > 1:
+            log.warning("The profiler doesn't support tracking videos in parallel, disabled")
+            return
+        self._enabled = True
+        self._modules = list(engine.module_names)
+        self._samples = _SharedSamples(self.capacity)
+        self._pid = os.getpid()
+        self._wrapped = []
+        for index, name in enumerate(self._modules):
+            model = engine.models[name]
+            for function in ["preprocess", "process"]:
+                if not hasattr(model, function):
+                    continue
+                original = model.__dict__.get(function)
+                timed = getattr(self, f"_timed_{function}")
+                setattr(model, function, partial(timed, index, getattr(model, function)))
+                self._wrapped.append((model, function, original))
+        self._engine_callback = engine.callback
+        engine.callback = self._timed_callback
+        if self.trace:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    def on_dataset_track_end(self, engine: TrackingEngine):
+        if not self._enabled:
+            return
+        engine.callback = self._engine_callback
+        for model, function, original in self._wrapped:
+            if original is None:
+                delattr(model, function)
+            else:
+                setattr(model, function, original)
+        self._collect_samples()
+        self._samples.close()
+        self._enabled = False
+        if self._lost:
+            log.warning(f"{self._lost} preprocess timings were lost, increase the capacity")
+        self.summary = self._summarize()
+        log.info(f"Profiling summary :\n{self.summary.to_string(float_format='{:.2f}'.format)}")
+
+    def on_video_loop_start(
+        self, engine: TrackingEngine, video_metadata: pd.Series, video_idx: int, index: int
+    ):
+        self._events = []
+
+    def on_video_loop_end(
+        self,
+        engine: TrackingEngine,
+        video_metadata: pd.Series,
+        video_idx: int,
+        detections: pd.DataFrame,
+        image_pred: pd.DataFrame,
+    ):
+        if not self._enabled:
+            return
+        self._collect_samples()
+        if self.trace:
+            name = video_metadata.get("name", video_idx)
+            path = self.output_dir / f"{name}.trace.json"
+            with open(path, "w") as fp:
+                json.dump({"traceEvents": self._trace_metadata() + self._events,
+                           "displayTimeUnit": "ms"}, fp)
+            log.info(f"Profiling trace of video {name} saved to {path.resolve()}")
+        self._events = []
+
+    def on_module_start(self, engine: TrackingEngine, task: str, dataloader: DataLoader):
+        self._last_end[task] = time.perf_counter()
+
+    def on_module_end(self, engine: TrackingEngine, task: str, detections: pd.DataFrame):
+        self._collect_samples()
+
+    def on_module_step_start(self, engine: TrackingEngine, task: str, batch: Any):
+        self._bytes[task].append(batch_nbytes(batch))
+        self._process_time[task] = 0.
+
+    def _record(self, task: str, stage: str, start: float, duration: float, pid=None):
+        self._durations[(task, stage)].append(duration)
+        if self.trace and self._enabled:
+            tid = self._modules.index(task) + 1 if task in self._modules else 0
+            self._events.append(dict(
+                name=stage, cat=task, ph="X", ts=start * 1e6, dur=duration * 1e6,
+                pid=pid or self._pid, tid=tid,
+            ))
+
+    def _timed_callback(self, hook: str, *args, **kwargs):
+        start = time.perf_counter()
+        task = kwargs.get("task")
+        if hook == "on_module_step_start" and task in self._last_end:
+            self._record(task, "wait", self._last_end[task], start - self._last_end[task])
+        if hook == "on_module_step_end" and task in self._step_start:
+            step = start - self._step_start[task]
+            merge = max(step - self._process_time[task], 0.)
+            self._record(task, "merge", start - merge, merge)
+        self._engine_callback(hook, *args, **kwargs)
+        end = time.perf_counter()
+        self._record(task or "engine", "callbacks", start, end - start)
+        if hook == "on_module_step_start":
+            self._step_start[task] = end
+        elif hook in ("on_module_step_end", "on_module_start"):
+            self._last_end[task] = end
+
+    def _timed_preprocess(self, module: int, function, *args, **kwargs):
+        start = time.perf_counter()
+        output = function(*args, **kwargs)
+        self._samples.add(module, start, time.perf_counter() - start)
+        return output
+
+    def _timed_process(self, module: int, function, *args, **kwargs):
+        start = time.perf_counter()
+        output = function(*args, **kwargs)
+        duration = time.perf_counter() - start
+        task = self._modules[module]
+        self._process_time[task] += duration
+        self._record(task, "process", start, duration)
+        return output
+
+    def _collect_samples(self):
+        rows, lost = self._samples.drain()
+        self._lost += lost
+        for module, start, duration, pid in rows:
+            self._record(self._modules[int(module)], "preprocess", start, duration, int(pid))
+
+    def _trace_metadata(self):
+        pids = {event["pid"] for event in self._events}
+        events = [dict(name="process_name", ph="M", pid=pid, tid=0,
+                       args=dict(name="main" if pid == self._pid else f"worker {pid}"))
+                  for pid in pids]
+        for pid in pids:
+            for tid, task in enumerate(["engine"] + self._modules):
+                events.append(dict(name="thread_name", ph="M", pid=pid, tid=tid,
+                                   args=dict(name=task)))
+        return events
+
+    def _summarize(self) -> pd.DataFrame:
+        rows = []
+        for task in ["engine"] + self._modules:
+            for stage in STAGES:
+                durations = np.array(self._durations.get((task, stage), []))
+                if len(durations) == 0:
+                    continue
+                p50, p95, p99 = np.percentile(durations, [50, 95, 99]) * 1000
+                row = dict(
+                    module=task, stage=stage, count=len(durations),
+                    total_s=durations.sum(), mean_ms=durations.mean() * 1000,
+                    p50_ms=p50, p95_ms=p95, p99_ms=p99, batch_MB=np.nan,
+                )
+                if stage == "process" and self._bytes.get(task):
+                    row["batch_MB"] = np.mean(self._bytes[task]) / 2**20
+                rows.append(row)
+        return pd.DataFrame(rows).set_index(["module", "stage"])
@@ -62,6 +62,8 @@ class TQDMProgressbar(Progressbar):
         desc = task.replace("_", " ").capitalize()
         if hasattr(engine.models[task], "process_video"):
             length = len(engine.img_metadatas[engine.img_metadatas.video_id == self.video_id])
+        elif dataloader is None:
+            length = None  # unknown number of steps, e.g. in the pipelined engine
         else:
             length = len(dataloader)
         self.init_progress_bar(task, desc, length)
@@ -122,6 +124,8 @@ class RichProgressbar(Progressbar):
         desc = task.replace("_", " ").capitalize()
         if hasattr(engine.models[task], "process_video"):
             length = len(engine.img_metadatas[engine.img_metadatas.video_id == self.video_id])
+        elif dataloader is None:
+            length = None  # unknown number of steps, e.g. in the pipelined engine
         else:
             length = len(dataloader)
         self.init_progress_bar(task, desc, length)
@@ -12,6 +12,12 @@ from tracklab.engine import TrackingEngine
 log = logging.getLogger(__name__)
 
 
+def _now(engine: TrackingEngine) -> float:
+    # the callbacks forwarded by the video workers are timed when the worker called them
+    event_time = getattr(engine, "event_time", None)
+    return event_time if event_time is not None else time.perf_counter()
+
+
 class Timer(Callback):
     def __init__(self, **kwargs):
         self.start_times = {}
@@ -26,7 +32,7 @@ class Timer(Callback):
     def on_video_loop_start(
         self, engine: TrackingEngine, video_metadata: pd.Series, video_idx: int, index: int
     ):
-        self.start_times["video"] = time.perf_counter()
+        self.start_times["video"] = _now(engine)
 
     def on_video_loop_end(
         self,
@@ -36,17 +42,17 @@ class Timer(Callback):
         detections: pd.DataFrame,
         image_pred: pd.DataFrame,
     ):
-        end = time.perf_counter()
+        end = _now(engine)
         time_delta = timedelta(seconds=end - self.start_times["video"])
         frames = len(image_pred)
         fps = frames / (end - self.start_times["video"])
         log.info(f"Video time : {time_delta}, FPS : {fps}")
 
     def on_module_start(self, engine: TrackingEngine, task: str, dataloader: DataLoader):
-        self.start_times[task] = time.perf_counter()
+        self.start_times[task] = _now(engine)
 
     def on_module_end(self, engine: TrackingEngine, task: str, detections: pd.DataFrame):
-        end = time.perf_counter()
+        end = _now(engine)
         time_delta = timedelta(seconds=end - self.start_times[task])
         frames = len(detections.image_id.unique())
         fps = frames / (end-self.start_times[task])
@@ -377,12 +377,7 @@ class VisualizationEngine(Callback):
             if hasattr(detection, "matched_with") and is_matched:
                 nt = self.cfg.prediction.display_n_closer_tracklets_costs
                 if "R" in detection.costs:
-                    sorted_reid_costs = sorted(
-                        list(detection.costs["R"].items()), key=lambda x: x[1], reverse=True
-                    )
-                    processed_reid_costs = {
-                        t[0]: np.around(t[1], 2) for t in sorted_reid_costs[:nt]
-                    }
+                    processed_reid_costs = closest_costs(detection.costs["R"], nt)
                     draw_text(
                         patch,
                         f"R({detection.costs['Rt']:.2f}): {processed_reid_costs}",
@@ -394,12 +389,7 @@ class VisualizationEngine(Callback):
                         color_bg=(255, 255, 255),
                     )
                 if "S" in detection.costs:
-                    sorted_st_costs = sorted(
-                        list(detection.costs["S"].items()), key=lambda x: x[1], reverse=True
-                    )
-                    processed_st_costs = {
-                        t[0]: np.around(t[1], 2) for t in sorted_st_costs[:nt]
-                    }
+                    processed_st_costs = closest_costs(detection.costs["S"], nt)
                     draw_text(
                         patch,
                         f"S({detection.costs['St']:.2f}): {processed_st_costs}",
@@ -411,12 +401,7 @@ class VisualizationEngine(Callback):
                         color_bg=(255, 255, 255),
                     )
                 if "K" in detection.costs:
-                    sorted_gated_kf_costs = sorted(
-                        list(detection.costs["K"].items()), key=lambda x: x[1], reverse=True
-                    )
-                    processed_gated_kf_costs = {
-                        t[0]: np.around(t[1], 2) for t in sorted_gated_kf_costs[:nt]
-                    }
+                    processed_gated_kf_costs = closest_costs(detection.costs["K"], nt)
                     draw_text(
                         patch,
                         f"K({detection.costs['Kt']:.2f}): {processed_gated_kf_costs}",
@@ -487,3 +472,12 @@ class VisualizationEngine(Callback):
                 (patch.shape[1], patch.shape[0]),
             )
         self.video_writer.write(patch)
+
+
+def closest_costs(costs, n):
+    """The `n` smallest costs of a detection to the tracks, given as a dict mapping the
+    track ids to the costs, or as a (k, 2) array of track ids and costs."""
+    if isinstance(costs, dict):
+        costs = list(costs.items())
+    costs = sorted(((int(track_id), cost) for track_id, cost in costs), key=lambda x: x[1])
+    return {track_id: np.around(cost, 2) for track_id, cost in costs[:n]}
@@ -3,10 +3,10 @@ from abc import ABC, abstractmethod
 import numpy as np
 import pandas as pd
 import torch
-from scipy.optimize import linear_sum_assignment
 from torchvision.ops import box_iou
 
 from tracklab.core.visualization_engine import prediction_cmap, ground_truth_cmap
+from tracklab.utils.assignment import linear_assignment
 
 
 class Visualizer(ABC):
@@ -32,11 +32,12 @@ class DetectionVisualizer(Visualizer, ABC):
         self.colors = colors
 
     def draw_frame(self, image, detections_pred, detections_gt, image_pred, image_gt):
-        bbox_pred = torch.tensor(np.stack(detections_pred.bbox.ltrb()))
-        bbox_gt = torch.tensor(np.stack(detections_gt.bbox.ltrb()))
+        bbox_pred = torch.tensor(detections_pred.bbox.ltrb())
+        bbox_gt = torch.tensor(detections_gt.bbox.ltrb())
         cost_matrix = box_iou(bbox_pred, bbox_gt)
 
-        row_idxs, col_idxs = linear_sum_assignment(1 - cost_matrix)
+        matches, _, _ = linear_assignment((1 - cost_matrix).numpy())
+        row_idxs, col_idxs = matches[:, 0], matches[:, 1]
         gt_rest = set(range(len(bbox_gt))) - set(col_idxs)
         for i in range(max(len(bbox_pred), len(bbox_gt))):
             if i not in row_idxs:
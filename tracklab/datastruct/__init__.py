@@ -1,3 +1,4 @@
 from .tracker_state import TrackerState
 from .tracking_dataset import TrackingDataset, TrackingSet
-from .datapipe import EngineDatapipe
+from .datapipe import EngineDatapipe, ImageGroupBatchSampler, collate_groups
+from .detection_store import DetectionStore
@@ -0,0 +1,214 @@
+import argparse
+import json
+import logging
+import pickle
+import zipfile
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from tracklab.datastruct.tensor_column import (
+    is_missing, stack_column, tensor_column, tensor_layout
+)
+
+log = logging.getLogger(__name__)
+
+SUFFIX = ".arrow"
+_INDEX = "__index__"
+_ENCODING = b"tracklab.encoding"
+
+
+def _encode_tensor(values: np.ndarray, shape, dtype):
+    size = int(np.prod(shape, dtype=np.int64))
+    valid = np.array([not is_missing(value) for value in values], dtype=bool)
+    if valid.all():
+        # no copy if the column is backed by a single array (see DetectionStore)
+        flat = np.ascontiguousarray(stack_column(values)).reshape(-1)
+    else:
+        flat = np.zeros((len(values), size), dtype=dtype)
+        if valid.any():
+            flat[valid] = stack_column(values[valid]).reshape(int(valid.sum()), size)
+    children = pa.array(flat.reshape(-1))
+    validity = None if valid.all() else pa.py_buffer(np.packbits(valid, bitorder="little"))
+    array = pa.Array.from_buffers(
+        pa.list_(children.type, size), len(values), [validity],
+        null_count=int((~valid).sum()), children=[children],
+    )
+    metadata = {_ENCODING: b"tensor", b"shape": json.dumps(list(shape)).encode()}
+    return array, metadata
+
+
+def _encode_column(series: pd.Series):
+    """Converts a column to an Arrow array and the metadata needed to decode it.
+
+    Columns of numeric arrays with the same shape (bboxes, keypoints, embeddings,
+    masks, ...) are stored as fixed size lists, other object columns which are not
+    plain strings are pickled cell by cell.
+    """
+    if series.dtype != object:
+        return pa.Array.from_pandas(series.to_numpy()), {}
+    values = series.to_numpy()
+    layout = tensor_layout(values)
+    if layout is not None and not all(is_missing(value) for value in values):
+        return _encode_tensor(values, *layout)
+    if all(isinstance(value, str) or is_missing(value) for value in values):
+        return pa.array(values, type=pa.string(), from_pandas=True), {}
+    pickled = [pickle.dumps(value, protocol=pickle.DEFAULT_PROTOCOL) for value in values]
+    return pa.array(pickled, type=pa.binary()), {_ENCODING: b"pickle"}
+
+
+def dataframe_to_table(df: pd.DataFrame) -> pa.Table:
+    fields, arrays = [], []
+    columns = [(_INDEX, df.index.to_series(index=df.index))]
+    columns += [(str(name), df[name]) for name in df.columns]
+    for name, series in columns:
+        array, metadata = _encode_column(series)
+        fields.append(pa.field(name, array.type, metadata=metadata or None))
+        arrays.append(array)
+    metadata = {b"index_name": json.dumps(df.index.name).encode()}
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields, metadata=metadata))
+
+
+def _decode_tensor(column: pa.ChunkedArray, field: pa.Field, copy: bool) -> np.ndarray:
+    shape = tuple(json.loads(field.metadata[b"shape"]))
+    decoded = []
+    for chunk in column.chunks:
+        n = len(chunk)
+        size = chunk.type.list_size
+        flat = chunk.values.to_numpy(zero_copy_only=False)[
+            chunk.offset * size:(chunk.offset + n) * size
+        ]
+        if copy:
+            flat = np.array(flat)
+        valid = chunk.is_valid().to_numpy(zero_copy_only=False)
+        decoded.append(tensor_column(flat.reshape((n, *shape)), valid))
+    return np.concatenate(decoded) if decoded else np.empty(0, dtype=object)
+
+
+def _decode_column(column: pa.ChunkedArray, field: pa.Field, copy_tensors: bool = True):
+    encoding = (field.metadata or {}).get(_ENCODING)
+    if encoding == b"tensor":
+        return _decode_tensor(column, field, copy_tensors)
+    if encoding == b"pickle":
+        decoded = np.empty(len(column), dtype=object)
+        decoded[:] = [pickle.loads(value) for value in column.to_pylist()]
+        return decoded
+    return column.to_pandas()
+
+
+def table_to_dataframe(table: pa.Table, copy_tensors: bool = True) -> pd.DataFrame:
+    """Converts a table written by :func:`dataframe_to_table` back to a DataFrame.
+
+    If `copy_tensors` is False, the arrays of the tensor columns are read-only views
+    of the memory of the table (e.g. of a memory mapped file)."""
+    decoded = {
+        name: _decode_column(table.column(name), table.schema.field(name), copy_tensors)
+        for name in table.column_names
+    }
+    index = pd.Index(decoded.pop(_INDEX), name=json.loads(table.schema.metadata[b"index_name"]))
+    data = {
+        name: (values.to_numpy() if isinstance(values, pd.Series) else values)
+        for name, values in decoded.items()
+    }
+    return pd.DataFrame(data, index=index, columns=list(data.keys()))
+
+
+class ArrowStateFile:
+    """Arrow storage of a :class:`tracklab.datastruct.TrackerState`.
+
+    The state is a directory (`*.arrow`) containing one Arrow IPC file per video and
+    per level (`{video_id}.arrow` for the detections and `{video_id}_image.arrow` for
+    the images), written in record batches of `chunk_size` rows, and the same
+    `summary.json` as the `.pklz` format. The files are memory mapped and only the
+    requested columns are decoded : reloading a state to rerun the tracker doesn't
+    read the heavy columns (embeddings, masks, ...) which are not used anymore.
+    With `mmap_tensors`, the arrays of the tensor columns are not even copied in
+    memory : they are read-only views of the mapped files, which are paged in by
+    the OS when used.
+
+    It mimics the subset of :class:`zipfile.ZipFile` used by the tracker state.
+    """
+
+    suffix = SUFFIX
+
+    def __init__(self, path, mode: str = "r", chunk_size: int = 65536, memory_map: bool = True,
+                 mmap_tensors: bool = False):
+        self.path = Path(path)
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.memory_map = memory_map
+        self.mmap_tensors = memory_map and mmap_tensors
+        if mode == "r" and not self.path.is_dir():
+            raise FileNotFoundError(f"No tracker state found at {self.path}")
+        if mode != "r":
+            self.path.mkdir(parents=True, exist_ok=True)
+
+    def namelist(self) -> List[str]:
+        return sorted(f.name for f in self.path.iterdir() if f.is_file())
+
+    def open(self, name: str, mode: str = "r"):
+        return open(self.path / name, mode + "b")
+
+    def _reader(self, name: str):
+        if self.memory_map:
+            source = pa.memory_map(str(self.path / name), "r")
+        else:
+            source = pa.OSFile(str(self.path / name), "r")
+        return pa.ipc.open_file(source)
+
+    def columns(self, name: str) -> List[str]:
+        return [column for column in self._reader(name).schema.names if column != _INDEX]
+
+    def read_dataframe(self, name: str, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """Reads an entry, decoding only `columns` (all columns if None)."""
+        table = self._reader(name).read_all()
+        if columns is not None:
+            available = set(table.column_names)
+            table = table.select([_INDEX] + [c for c in columns if c in available and c != _INDEX])
+        return table_to_dataframe(table, copy_tensors=not self.mmap_tensors)
+
+    def write_dataframe(self, name: str, df: pd.DataFrame):
+        if self.mode == "r":
+            raise ValueError("Can't write in a tracker state opened in read mode")
+        table = dataframe_to_table(df)
+        with pa.OSFile(str(self.path / name), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=self.chunk_size)
+
+    def close(self):
+        pass
+
+
+def convert_pklz(pklz_file, arrow_path, chunk_size: int = 65536):
+    """Converts a `.pklz` tracker state to the Arrow format."""
+    pklz_file, arrow_path = Path(pklz_file), Path(arrow_path)
+    if arrow_path.suffix != SUFFIX:
+        raise ValueError(f"The Arrow tracker state should end with '{SUFFIX}'")
+    state = ArrowStateFile(arrow_path, mode="a", chunk_size=chunk_size)
+    with zipfile.ZipFile(pklz_file) as zf:
+        for name in zf.namelist():
+            with zf.open(name) as fp:
+                if name.endswith(".pkl"):
+                    state.write_dataframe(name[:-len(".pkl")] + SUFFIX, pickle.load(fp))
+                else:
+                    with state.open(name, "w") as out:
+                        out.write(fp.read())
+            log.info(f"Converted {name}")
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=convert_pklz.__doc__)
+    parser.add_argument("pklz_file")
+    parser.add_argument("arrow_path")
+    parser.add_argument("--chunk-size", type=int, default=65536)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    convert_pklz(args.pklz_file, args.arrow_path, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,39 @@
-from torch.utils.data import Dataset
+from functools import partial
+
+import numpy as np
+from torch.utils.data import Dataset, Sampler
+from tracklab.utils.crops import detection_crops
 from tracklab.utils.cv2 import cv2_load_image
 
 
 class EngineDatapipe(Dataset):
-    def __init__(self, model) -> None:
+    """Dataset giving the inputs of a module for the images or detections of a video.
+
+    :func:`update` builds an index of the detections grouped by image once per video,
+    so that an item is retrieved without scanning the detections of the whole video.
+
+    Args:
+        model: the module
+        group_by_image: for a detection-level module, each item contains all the
+            detections of one image, which is thus only decoded once. Use
+            :func:`collate_groups` and :class:`ImageGroupBatchSampler` to batch them.
+
+    If a detection-level module has a `crop_size` (height, width), the crops of the
+    detections of an image are extracted and resized together (see
+    :func:`tracklab.utils.crops.crop_and_resize`) and given to its `preprocess`
+    as a `crop` argument.
+    """
+    def __init__(self, model, group_by_image: bool = False) -> None:
         self.model = model
+        self.group_by_image = group_by_image
         self.image_filepaths = None
         self.img_metadatas = None
         self.detections = None
+        self._image_positions = {}  # image_id -> position in img_metadatas
+        self._order = None  # positions of the detections, stably sorted by image_id
+        self._sorted_detections = None  # detections, stably sorted by image_id
+        self._image_ranges = {}  # image_id -> (start, stop) in _sorted_detections
+        self._image_ids = []  # images with detections, in the order of _sorted_detections
 
     def update(self, image_filepaths: dict, img_metadatas, detections):
         del self.img_metadatas
@@ -15,9 +41,48 @@ class EngineDatapipe(Dataset):
         self.image_filepaths = image_filepaths
         self.img_metadatas = img_metadatas
         self.detections = detections
+        self._image_positions = {}
+        if img_metadatas is not None:
+            self._image_positions = {idx: pos for pos, idx in enumerate(img_metadatas.index)}
+        self._order = None
+        self._sorted_detections = None
+        self._image_ranges = {}
+        self._image_ids = []
+        if detections is not None and len(detections) > 0:
+            image_ids = detections.image_id.to_numpy()
+            order = np.argsort(image_ids, kind="stable")
+            sorted_ids = image_ids[order]
+            starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+            stops = np.r_[starts[1:], len(sorted_ids)]
+            self._order = order
+            self._sorted_detections = detections.iloc[order]
+            self._image_ids = sorted_ids[starts].tolist()
+            self._image_ranges = dict(zip(self._image_ids, zip(starts.tolist(), stops.tolist())))
+
+    def image_detections(self, image_id):
+        """Detections of an image, in their original order."""
+        if image_id not in self._image_ranges:
+            return self.detections.iloc[0:0]
+        start, stop = self._image_ranges[image_id]
+        return self._sorted_detections.iloc[start:stop]
+
+    def images_detections(self, image_ids):
+        """Detections of several images, in their original order (same as filtering
+        the detections with `np.isin(detections.image_id, image_ids)`)."""
+        ranges = [self._image_ranges[i] for i in image_ids if i in self._image_ranges]
+        if not ranges:
+            return self.detections.iloc[0:0]
+        positions = np.sort(np.concatenate([self._order[start:stop] for start, stop in ranges]))
+        return self.detections.iloc[positions]
+
+    def group_sizes(self):
+        """Number of detections of each item, in `group_by_image` mode."""
+        return [stop - start for start, stop in self._image_ranges.values()]
 
     def __len__(self):
         if self.model.level == "detection":
+            if self.group_by_image:
+                return len(self._image_ids)
             return len(self.detections)
         elif self.model.level == "image":
             return len(self.img_metadatas)
@@ -26,18 +91,30 @@ class EngineDatapipe(Dataset):
 
     def __getitem__(self, idx):
         if self.model.level == "detection":
+            if self.group_by_image:
+                image_id = self._image_ids[idx]
+                metadata = self.img_metadatas.iloc[self._image_positions[image_id]]
+                image = cv2_load_image(self.image_filepaths[image_id])
+                detections = self.image_detections(image_id)
+                crops = detection_crops(self.model, image, detections)
+                return [
+                    (detection.name, self.model.preprocess(
+                        image=image, detection=detection, metadata=metadata, **crop))
+                    for (_, detection), crop in zip(detections.iterrows(), crops)
+                ]
             detection = self.detections.iloc[idx]
-            metadata = self.img_metadatas.loc[detection.image_id]
+            metadata = self.img_metadatas.iloc[self._image_positions[detection.image_id]]
             image = cv2_load_image(self.image_filepaths[metadata.name])
+            crop, = detection_crops(self.model, image, self.detections.iloc[idx:idx + 1])
             sample = (
                 detection.name,
-                self.model.preprocess(image=image, detection=detection, metadata=metadata),
+                self.model.preprocess(image=image, detection=detection, metadata=metadata, **crop),
             )
             return sample
         elif self.model.level == "image":
             metadata = self.img_metadatas.iloc[idx]
             if self.detections is not None and len(self.detections) > 0:
-                detections = self.detections[self.detections.image_id == metadata.name]
+                detections = self.image_detections(metadata.name)
             else:
                 detections = self.detections
             image = cv2_load_image(self.image_filepaths[metadata.name])
@@ -46,3 +123,40 @@ class EngineDatapipe(Dataset):
             return sample
         else:
             raise ValueError("Please provide appropriate level.")
+
+
+class ImageGroupBatchSampler(Sampler):
+    """Batches the images of a `group_by_image` datapipe, in order, so that each batch
+    contains at most `batch_size` detections. An image with more detections than
+    `batch_size` is given in a batch of its own."""
+
+    def __init__(self, datapipe: EngineDatapipe, batch_size: int):
+        self.datapipe = datapipe
+        self.batch_size = batch_size
+
+    def _batches(self):
+        batches, batch, size = [], [], 0
+        for idx, n in enumerate(self.datapipe.group_sizes()):
+            if batch and size + n > self.batch_size:
+                batches.append(batch)
+                batch, size = [], 0
+            batch.append(idx)
+            size += n
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def __iter__(self):
+        return iter(self._batches())
+
+    def __len__(self):
+        return len(self._batches())
+
+
+def _collate_groups(collate_fn, groups):
+    return collate_fn([sample for group in groups for sample in group])
+
+
+def collate_groups(collate_fn):
+    """Collate function flattening the groups of detections of each image."""
+    return partial(_collate_groups, collate_fn)
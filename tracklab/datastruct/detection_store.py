@@ -0,0 +1,261 @@
+from typing import Hashable, Union
+
+import numpy as np
+import pandas as pd
+
+from tracklab.datastruct.tensor_column import (
+    contiguous_view, is_missing, stack_column, tensor_column, tensor_layout
+)
+
+
+def as_dataframe(appended_piece) -> pd.DataFrame:
+    """Converts the output of a module (Series, list of Series/DataFrames or DataFrame)
+    to a single DataFrame, indexed by detection id."""
+    if isinstance(appended_piece, pd.Series):
+        appended_piece = pd.DataFrame(appended_piece).T
+    elif isinstance(appended_piece, list):  # list of Series or DataFrames
+        if len(appended_piece) > 0:
+            appended_piece = pd.concat(
+                [s.to_frame().T if type(s) is pd.Series else s for s in appended_piece]
+            )
+        else:
+            appended_piece = pd.DataFrame()
+    return appended_piece
+
+
+def _filler(dtype: np.dtype):
+    return np.nan if dtype.kind in "fcO" else 0
+
+
+def _nullable_dtype(dtype: np.dtype) -> np.dtype:
+    """dtype to use when a column has to hold missing values (same upcast as pandas)."""
+    if dtype.kind in "iu":
+        return np.dtype(np.float64)
+    if dtype.kind in "fcO":
+        return dtype
+    return np.dtype(object)
+
+
+class DetectionStore:
+    """Append-optimized columnar storage for the detections of a video.
+
+    Every column is kept in a preallocated numpy array which grows geometrically,
+    and rows are addressed by their detection id (the index of the DataFrames
+    returned by the modules). Updating the store with the output of a batch thus
+    only costs a time proportional to the size of the batch, whereas
+    :func:`tracklab.engine.engine.merge_dataframes` grows with the size of the
+    whole video.
+
+    The store follows the same semantics as `merge_dataframes`: new columns and
+    new rows are added (filled with NaN) and the non-NA values of the appended
+    piece override the existing ones. It is converted back to a DataFrame with
+    :func:`to_dataframe` at module or video boundaries.
+
+    Columns holding numeric arrays of the same shape (bboxes, keypoints, embeddings,
+    body masks, ...) are stored as a single contiguous (N, ...) array ("tensor
+    column"). The DataFrame returned by :func:`to_dataframe` holds views of its rows,
+    so that the arrays of consecutive detections can be retrieved without copy with
+    :func:`tracklab.datastruct.tensor_column.stack_column`.
+
+    Args:
+        capacity: initial number of rows allocated for each column
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._capacity = max(int(capacity), 1)
+        self._size = 0
+        self._ids = np.empty(self._capacity, dtype=object)
+        self._positions = {}
+        self._columns = {}
+        self._valid = {}  # rows holding a value, for the tensor columns
+        self._shared = set()  # tensor columns whose array is borrowed from a DataFrame
+        self.index_name = None
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, capacity: int = 1024):
+        store = cls(capacity=max(capacity, 2 * len(df)))
+        store.index_name = df.index.name
+        n = len(df)
+        store._ids[:n] = df.index.to_numpy(dtype=object)
+        store._positions = {idx: pos for pos, idx in enumerate(df.index)}
+        if len(store._positions) != n:
+            raise ValueError("The detections index should not contain duplicates.")
+        store._size = n
+        for column in df.columns:
+            values = df[column].to_numpy()
+            if values.dtype == object and tensor_layout(values) is not None:
+                tensors = contiguous_view(values)
+                if tensors is not None:  # view of a tensor column, don't copy it
+                    store._columns[column] = tensors
+                    store._valid[column] = np.zeros(store._capacity, dtype=bool)
+                    store._valid[column][:n] = True
+                    store._shared.add(column)
+                    continue
+            dtype = values.dtype if values.dtype.kind in "biufcO" else np.dtype(object)
+            array = np.full(store._capacity, _filler(dtype), dtype=dtype)
+            array[:n] = values
+            store._columns[column] = array
+        return store
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, detection_id: Hashable):
+        return detection_id in self._positions
+
+    @property
+    def columns(self):
+        return list(self._columns.keys())
+
+    @property
+    def empty(self):
+        return self._size == 0
+
+    def _reserve(self, size: int):
+        if size <= self._capacity:
+            return
+        capacity = max(2 * self._capacity, size)
+        ids = np.empty(capacity, dtype=object)
+        ids[: self._size] = self._ids[: self._size]
+        self._ids = ids
+        for name, array in self._columns.items():
+            if name in self._valid:
+                valid = np.zeros(capacity, dtype=bool)
+                valid[: self._size] = self._valid[name][: self._size]
+                self._valid[name] = valid
+                continue  # tensor arrays are grown when written
+            grown = np.full(capacity, _filler(array.dtype), dtype=array.dtype)
+            grown[: self._size] = array[: self._size]
+            self._columns[name] = grown
+        self._capacity = capacity
+
+    def _write_tensors(self, name: str, positions: np.ndarray, tensors: np.ndarray):
+        array = self._columns.get(name)
+        if array is None:
+            shape = (self._capacity, *tensors.shape[1:])
+            self._columns[name] = np.zeros(shape, dtype=tensors.dtype)
+            self._valid[name] = np.zeros(self._capacity, dtype=bool)
+        elif (
+            name in self._shared
+            or len(array) <= positions.max()
+            or not np.can_cast(tensors.dtype, array.dtype, casting="safe")
+        ):
+            # the unused rows are left to np.zeros, which doesn't touch their memory
+            dtype = np.result_type(array.dtype, tensors.dtype)
+            grown = np.zeros((self._capacity, *array.shape[1:]), dtype=dtype)
+            grown[: len(array)] = array[: self._capacity]
+            self._columns[name] = grown
+            self._shared.discard(name)
+        self._columns[name][positions] = tensors
+        self._valid[name][positions] = True
+
+    def _tensor_to_object(self, name: str):
+        tensors = self._columns[name]
+        column = np.full(self._capacity, np.nan, dtype=object)
+        column[: len(tensors)] = tensor_column(tensors, self._valid[name][: len(tensors)])
+        self._columns[name] = column
+        del self._valid[name]
+        self._shared.discard(name)
+
+    def _astype(self, name: str, dtype: np.dtype):
+        if name in self._valid:
+            self._tensor_to_object(name)
+        array = self._columns[name]
+        if array.dtype == dtype:
+            return
+        converted = np.full(self._capacity, _filler(dtype), dtype=dtype)
+        converted[: self._size] = array[: self._size]
+        self._columns[name] = converted
+
+    def update(self, appended_piece: Union[pd.DataFrame, pd.Series, list]):
+        """Adds or overrides the detections contained in `appended_piece`.
+
+        Args:
+            appended_piece: the output of a module, either a DataFrame, a Series or a
+                list of Series/DataFrames, named by detection id.
+
+        Returns:
+            self
+        """
+        piece = as_dataframe(appended_piece).infer_objects()
+        if len(piece.columns) == 0:
+            return self
+
+        positions = np.empty(len(piece), dtype=np.int64)
+        new_ids = []
+        for i, detection_id in enumerate(piece.index):
+            position = self._positions.get(detection_id)
+            if position is None:
+                position = self._size + len(new_ids)
+                self._positions[detection_id] = position
+                new_ids.append(detection_id)
+            positions[i] = position
+        n_new = len(new_ids)
+        self._reserve(self._size + n_new)
+        self._ids[self._size: self._size + n_new] = new_ids
+        is_new = positions >= self._size
+
+        for name in self._columns:
+            if n_new == 0 or name in self._valid or self._columns[name].dtype.kind not in "biu":
+                continue
+            # new rows without a value for this column will be NaN
+            if name not in piece.columns or piece[name].isna().to_numpy()[is_new].any():
+                self._astype(name, _nullable_dtype(self._columns[name].dtype))
+
+        for name in piece.columns:
+            values = piece[name].to_numpy()
+            if values.dtype == object and (name in self._valid or name not in self._columns):
+                notna = np.array([not is_missing(value) for value in values], dtype=bool)
+                if name in self._valid and not notna.any():
+                    continue
+                layout = tensor_layout(values[notna])
+                if layout is not None and (
+                    name not in self._valid or layout[0] == self._columns[name].shape[1:]
+                ):
+                    self._write_tensors(name, positions[notna], stack_column(values[notna]))
+                    continue
+            if name in self._valid:
+                self._tensor_to_object(name)
+            if values.dtype.kind not in "biufcO":
+                values = values.astype(object)
+            if name not in self._columns:
+                dtype = values.dtype
+                if self._size > 0 or not is_new.all():
+                    dtype = _nullable_dtype(dtype)
+                self._columns[name] = np.full(self._capacity, _filler(dtype), dtype=dtype)
+            notna = pd.notna(values)
+            if not notna.all():
+                values = values[notna]
+                column_positions = positions[notna]
+                if values.dtype == object and len(values):
+                    values = pd.Series(values).infer_objects().to_numpy()
+            else:
+                column_positions = positions
+            array = self._columns[name]
+            if not np.can_cast(values.dtype, array.dtype, casting="safe"):
+                if array.dtype.kind in "biufc" and values.dtype.kind in "biufc":
+                    dtype = np.result_type(array.dtype, values.dtype)
+                else:
+                    dtype = np.dtype(object)
+                self._astype(name, dtype)
+                array = self._columns[name]
+            array[column_positions] = values
+        self._size += n_new
+        return self
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Builds a DataFrame from the stored detections, indexed by detection id."""
+        n = self._size
+        index = pd.Index(list(self._ids[:n]), name=self.index_name)
+        if len(self._columns) == 0:
+            return pd.DataFrame(index=index)
+        columns = {}
+        for name, array in self._columns.items():
+            if name in self._valid:
+                column = np.full(n, np.nan, dtype=object)
+                rows = min(n, len(array))
+                column[:rows] = tensor_column(array[:rows], self._valid[name][:rows])
+                columns[name] = column
+            else:
+                columns[name] = array[:n].copy()
+        return pd.DataFrame(columns, index=index)
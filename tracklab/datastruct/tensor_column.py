@@ -0,0 +1,83 @@
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def tensor_layout(values: Sequence) -> Optional[Tuple[tuple, np.dtype]]:
+    """Common (shape, dtype) of a column holding numeric arrays, None if the column
+    holds anything else. Missing values (None/NaN) are ignored."""
+    layout = None
+    for value in values:
+        if is_missing(value):
+            continue
+        if not isinstance(value, np.ndarray) or value.dtype.kind not in "biuf":
+            return None
+        if layout is None:
+            layout = (value.shape, value.dtype)
+        elif layout != (value.shape, value.dtype):
+            return None
+    return layout
+
+
+def tensor_column(tensors: np.ndarray, valid: Optional[np.ndarray] = None) -> np.ndarray:
+    """Wraps a (N, ...) array in an object array of N row views, to be used as a
+    DataFrame column without copying the data. Rows which are not `valid` are NaN."""
+    column = np.empty(len(tensors), dtype=object)
+    if valid is None:
+        column[:] = list(tensors)
+    else:
+        column[:] = np.nan
+        for i in np.flatnonzero(valid):
+            column[i] = tensors[i]
+    return column
+
+
+def contiguous_view(values: Sequence) -> Optional[np.ndarray]:
+    """(N, ...) view of a column of N arrays which are consecutive slices of the same
+    array, None if the arrays are not laid out this way."""
+    if len(values) == 0:
+        return None
+    first = values[0]
+    if not isinstance(first, np.ndarray) or not first.flags.c_contiguous or first.nbytes == 0:
+        return None
+    if len(values) == 1:
+        return first[np.newaxis]
+    base, shape, strides, dtype = first.base, first.shape, first.strides, first.dtype
+    if base is None:
+        return None
+    address = first.__array_interface__["data"][0]
+    for i in range(1, len(values)):
+        value = values[i]
+        if (
+            type(value) is not np.ndarray
+            or value.base is not base
+            or value.shape != shape
+            or value.strides != strides
+            or value.dtype != dtype
+            or value.__array_interface__["data"][0] != address + i * first.nbytes
+        ):
+            return None
+    # all the rows are consecutive in the memory of their common base
+    return np.lib.stride_tricks.as_strided(
+        first, shape=(len(values), *first.shape), strides=(first.nbytes, *first.strides)
+    )
+
+
+def stack_column(values) -> np.ndarray:
+    """Same as `np.stack(values)` for a column of arrays, but returns a view without
+    copying anything when the rows are consecutive slices of the same array, which
+    is the case for the detections of an image produced by a
+    :class:`tracklab.datastruct.DetectionStore`. The result may thus share its memory
+    with the column and is read-only if the column comes from a memory mapped file.
+    """
+    if isinstance(values, pd.Series):
+        values = values.to_numpy()
+    view = contiguous_view(values)
+    if view is not None:
+        return view
+    return np.stack(values)
@@ -19,6 +19,46 @@ import logging
 log = logging.getLogger(__name__)
 
 
+def open_state_file(path, mode, compression=zipfile.ZIP_STORED, mmap_tensors=False):
+    """Opens a tracker state, either a `.pklz` zip of pickles or an `.arrow` directory."""
+    if is_arrow_state(path):
+        from tracklab.datastruct.arrow_state import ArrowStateFile
+        return ArrowStateFile(path, mode=mode, mmap_tensors=mmap_tensors)
+    return zipfile.ZipFile(path, mode=mode, compression=compression, allowZip64=True)
+
+
+def entry_suffix(zf) -> str:
+    return getattr(zf, "suffix", ".pkl")
+
+
+def read_columns(zf, name):
+    if hasattr(zf, "columns"):
+        return zf.columns(name)
+    with zf.open(name) as fp:
+        return list(pickle.load(fp).columns)
+
+
+def read_dataframe(zf, name, columns=None) -> pd.DataFrame:
+    """Reads a DataFrame from a tracker state. Only `columns` are decoded when the
+    format supports it, the other formats return all the columns."""
+    if hasattr(zf, "read_dataframe"):
+        return zf.read_dataframe(name, columns)
+    with zf.open(name, "r") as fp:
+        return pickle.load(fp)
+
+
+def write_dataframe(zf, name, df: pd.DataFrame):
+    if hasattr(zf, "write_dataframe"):
+        zf.write_dataframe(name, df)
+        return
+    with zf.open(name, "w") as fp:
+        pickle.dump(df, fp, protocol=pickle.DEFAULT_PROTOCOL)
+
+
+def is_arrow_state(path) -> bool:
+    return path is not None and Path(path).suffix == ".arrow"
+
+
 class TrackerState(AbstractContextManager):
     def __init__(
             self,
@@ -30,6 +70,8 @@ class TrackerState(AbstractContextManager):
             compression=zipfile.ZIP_STORED,
             bbox_format=None,
             pipeline=None,
+            load_only_inputs=False,
+            mmap_tensors=False,
     ):
         self.pipeline = pipeline or {}
         self.video_metadatas = tracking_set.video_metadatas
@@ -44,9 +86,11 @@ class TrackerState(AbstractContextManager):
         if self.save_file is not None:
             log.info(f"Saving TrackerState to {abspath(self.save_file)}")
         self.compression = compression
+        self.mmap_tensors = mmap_tensors
         load_columns = defaultdict(set)
         if self.load_file:
-            with zipfile.ZipFile(self.load_file) as zf:
+            zf = open_state_file(self.load_file, mode="r", compression=compression)
+            try:
                 if "summary.json" in zf.namelist():
                     with zf.open("summary.json") as fp:
                         summary = json.load(fp)
@@ -57,12 +101,10 @@ class TrackerState(AbstractContextManager):
                 else:
                     image_file = next(f for f in zf.namelist() if "image" in f)
                     detection_file = next(f for f in zf.namelist() if "image" not in f)
-                    with zf.open(detection_file) as fp:
-                        dets = pickle.load(fp)
-                        load_columns["detection"] = set(dets.columns)
-                    with zf.open(image_file) as fp:
-                        images = pickle.load(fp)
-                        load_columns["image"] = set(images.columns)
+                    load_columns["detection"] = set(read_columns(zf, detection_file))
+                    load_columns["image"] = set(read_columns(zf, image_file))
+            finally:
+                zf.close()
         elif load_from_groundtruth:
             load_columns["image"] = set(self.image_gt.columns)
             load_columns["detection"] = set(self.detections_gt.columns)
@@ -76,6 +118,14 @@ class TrackerState(AbstractContextManager):
                 self.output_columns[level] |= set(module.get_output_columns(level))
                 self.forget_columns[level] += getattr(module, "forget_columns", [])
 
+        if load_only_inputs:
+            # don't load the columns which are not used by the pipeline, e.g. the
+            # embeddings when only rerunning a tracker which doesn't use them
+            load_columns = {
+                level: set(load_columns.get(level, set())) & self.input_columns[level]
+                for level in ["image", "detection"]
+            }
+
         self.load_columns = {"detection": list(), "image": list()}
         if self.load_file or load_from_groundtruth:
             self.load_columns["detection"] = list(
@@ -190,32 +240,20 @@ class TrackerState(AbstractContextManager):
         if self.load_file is None:
             load_zf = None
         else:
-            load_zf = zipfile.ZipFile(
-                self.load_file,
-                mode="r",
-                compression=self.compression,
-                allowZip64=True,
+            load_zf = open_state_file(
+                self.load_file, mode="r", compression=self.compression,
+                mmap_tensors=self.mmap_tensors,
             )
 
         if self.save_file is None:
             save_zf = None
         else:
             os.makedirs(os.path.dirname(self.save_file), exist_ok=True)
-            save_zf = zipfile.ZipFile(
-                self.save_file,
-                mode="a",
-                compression=self.compression,
-                allowZip64=True,
-            )
+            save_zf = open_state_file(self.save_file, mode="a", compression=self.compression)
 
         if (self.load_file is not None) and (self.load_file == self.save_file):
             # Fix possible bugs when loading and saving from same file
-            zf = zipfile.ZipFile(
-                self.load_file,
-                mode="a",
-                compression=self.compression,
-                allowZip64=True,
-            )
+            zf = open_state_file(self.load_file, mode="a", compression=self.compression)
             self.zf = dict(load=zf, save=zf)
         else:
             self.zf = dict(load=load_zf, save=save_zf)
@@ -233,7 +271,8 @@ class TrackerState(AbstractContextManager):
         self.save()
 
     def update(self, detections: pd.DataFrame, image_metadata):
-        if self.detections_pred is None:
+        if self.detections_pred is None or "video_id" not in self.detections_pred.columns:
+            # nothing was tracked yet (e.g. the state was initialized from empty detections)
             self.detections_pred = detections
             self.image_pred = image_metadata
         else:
@@ -261,7 +300,8 @@ class TrackerState(AbstractContextManager):
         assert (
                 self.detections_pred is not None
         ), "The detections_pred should not be empty when saving"
-        if f"{self.video_id}.pkl" not in self.zf["save"].namelist():
+        suffix = entry_suffix(self.zf["save"])
+        if f"{self.video_id}{suffix}" not in self.zf["save"].namelist():
             if "summary.json" not in self.zf["save"].namelist():
                 with self.zf["save"].open("summary.json", "w") as fp:
                     summary = {"columns": {
@@ -273,17 +313,15 @@ class TrackerState(AbstractContextManager):
                         'utf-8')
                     fp.write(summary_bytes)
             if not self.detections_pred.empty:
-                with self.zf["save"].open(f"{self.video_id}.pkl", "w") as fp:
-                    detections_pred = self.detections_pred[
-                        self.detections_pred.video_id == self.video_id
-                        ]
-                    pickle.dump(detections_pred, fp, protocol=pickle.DEFAULT_PROTOCOL)
-            if not self.image_pred.empty:
-                with self.zf["save"].open(f"{self.video_id}_image.pkl", "w") as fp:
-                    image_pred = self.image_pred[
-                        self.image_pred.video_id == self.video_id
+                detections_pred = self.detections_pred[
+                    self.detections_pred.video_id == self.video_id
                     ]
-                    pickle.dump(image_pred, fp, protocol=pickle.DEFAULT_PROTOCOL)
+                write_dataframe(self.zf["save"], f"{self.video_id}{suffix}", detections_pred)
+            if not self.image_pred.empty:
+                image_pred = self.image_pred[
+                    self.image_pred.video_id == self.video_id
+                ]
+                write_dataframe(self.zf["save"], f"{self.video_id}_image{suffix}", image_pred)
         else:
             log.info(f"{self.video_id} already exists in {self.save_file} file")
 
@@ -305,17 +343,21 @@ class TrackerState(AbstractContextManager):
             video_detections = self.detections_pred_gt[self.detections_pred_gt.video_id == self.video_id]
             video_image_preds = self.image_pred_gt[self.image_pred_gt.video_id == self.video_id]
         if self.load_file is not None:
-            if f"{self.video_id}.pkl" in self.zf["load"].namelist():
-                with self.zf["load"].open(f"{self.video_id}.pkl", "r") as fp:
-                    video_detections = pickle.load(fp)[self.load_columns["detection"]]
+            suffix = entry_suffix(self.zf["load"])
+            if f"{self.video_id}{suffix}" in self.zf["load"].namelist():
+                video_detections = read_dataframe(
+                    self.zf["load"], f"{self.video_id}{suffix}", self.load_columns["detection"]
+                )[self.load_columns["detection"]]
             else:
                 log.info(f"{self.video_id} detections not in pklz file.")
                 video_detections = pd.DataFrame()
-            if f"{self.video_id}_image.pkl" in self.zf["load"].namelist():
-                with self.zf["load"].open(f"{self.video_id}_image.pkl", "r") as fp_image:
-                    video_image_preds = merge_dataframes(
-                        pickle.load(fp_image), video_image_preds
-                    )[self.load_columns["image"]]
+            if f"{self.video_id}_image{suffix}" in self.zf["load"].namelist():
+                video_image_preds = merge_dataframes(
+                    read_dataframe(
+                        self.zf["load"], f"{self.video_id}_image{suffix}", self.load_columns["image"]
+                    ),
+                    video_image_preds,
+                )[self.load_columns["image"]]
             else:
                 video_image_preds = self.image_metadatas[
                     self.image_metadatas.video_id == self.video_id
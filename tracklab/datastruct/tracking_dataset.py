@@ -3,6 +3,7 @@ import os
 from abc import ABC
 from pathlib import Path
 from dataclasses import dataclass
+import numpy as np
 import pandas as pd
 
 
@@ -126,13 +127,46 @@ class TrackingDataset(ABC):
                 "Dropped {} rows with NA values".format(len_before_drop - len(df))
             )
         df["track_id"] = df["track_id"].astype(int)
-        df["bb_left"] = df[bbox_column].apply(lambda x: x[0])
-        df["bb_top"] = df[bbox_column].apply(lambda x: x[1])
-        df["bb_width"] = df[bbox_column].apply(lambda x: x[2])
-        df["bb_height"] = df[bbox_column].apply(lambda x: x[3])
-        df = df.assign(x=-1, y=-1, z=-1)
+        bboxes = np.stack(df[bbox_column].to_numpy()) if len(df) else np.empty((0, 4))
+        df = df.assign(
+            bb_left=bboxes[:, 0], bb_top=bboxes[:, 1], bb_width=bboxes[:, 2], bb_height=bboxes[:, 3],
+            x=-1, y=-1, z=-1,
+        )
         return df
 
+    @staticmethod
+    def _mot_files(mot_df, video_metadatas, save_classes=False):
+        """Rows of the MOT Challenge file of each video, as (video_id, video, DataFrame)."""
+        # MOT Challenge format = <frame>, <id>, <bb_left>, <bb_top>, <bb_width>, <bb_height>, <conf>, <x>, <y>, <z>
+        clazz = "category_id" if save_classes else "x"
+        columns = ["frame", "track_id", "bb_left", "bb_top", "bb_width", "bb_height", "bbox_conf", clazz, "y", "z"]
+        videos_df = dict(list(mot_df.groupby("video_id")))
+        for id, video in video_metadatas.iterrows():
+            file_df = videos_df.get(id, mot_df.iloc[:0]).copy()
+            if file_df["frame"].min() == 0:
+                file_df["frame"] = file_df["frame"] + 1  # MOT Challenge format starts at 1
+            file_df.sort_values(by="frame", inplace=True)
+            yield id, video, file_df[columns]
+
+    @staticmethod
+    def mot_sequences(detections: pd.DataFrame,
+                      image_metadatas: pd.DataFrame,
+                      video_metadatas: pd.DataFrame,
+                      bbox_column_for_eval="bbox_ltwh",
+                      save_classes=False,
+                      ):
+        """Predictions in MOT Challenge format, without writing them on disk.
+
+        Returns:
+            sequences: the rows of the file of each video that :func:`save_for_eval`
+                would write, as a (N, 10) float array for each video name
+        """
+        mot_df = TrackingDataset._mot_encoding(detections, image_metadatas, video_metadatas, bbox_column_for_eval)
+        return {
+            video["name"]: file_df.to_numpy(dtype=float).reshape(-1, 10)
+            for _, video, file_df in TrackingDataset._mot_files(mot_df, video_metadatas, save_classes)
+        }
+
 
     def save_for_eval(self,
                       detections: pd.DataFrame,
@@ -150,30 +184,10 @@ class TrackingDataset(ABC):
         save_path = os.path.join(save_folder)
         os.makedirs(save_path, exist_ok=True)
 
-        # MOT Challenge format = <frame>, <id>, <bb_left>, <bb_top>, <bb_width>, <bb_height>, <conf>, <x>, <y>, <z>
-        # videos_names = mot_df["video_name"].unique()
-        for id, video in video_metadatas.iterrows():
+        for _, video, file_df in self._mot_files(mot_df, video_metadatas, save_classes):
             file_path = os.path.join(save_path, f"{video['name']}.txt")
-            file_df = mot_df[mot_df["video_id"] == id].copy()
-            if file_df["frame"].min() == 0:
-                file_df["frame"] = file_df["frame"] + 1  # MOT Challenge format starts at 1
             if not file_df.empty:
-                file_df.sort_values(by="frame", inplace=True)
-                clazz = "category_id" if save_classes else "x"
-                file_df[
-                    [
-                        "frame",
-                        "track_id",
-                        "bb_left",
-                        "bb_top",
-                        "bb_width",
-                        "bb_height",
-                        "bbox_conf",
-                        clazz,
-                        "y",
-                        "z",
-                    ]
-                ].to_csv(
+                file_df.to_csv(
                     file_path,
                     header=False,
                     index=False,
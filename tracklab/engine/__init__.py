@@ -1,3 +1,4 @@
 from .engine import TrackingEngine
 from .offline import OfflineTrackingEngine
-from .video import VideoOnlineTrackingEngine
\ No newline at end of file
+from .pipelined import PipelinedTrackingEngine
+from .video import VideoOnlineTrackingEngine
@@ -1,5 +1,10 @@
+import copy
+import queue
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 from functools import partial
-from typing import Dict, TYPE_CHECKING, Any
+from typing import Dict, TYPE_CHECKING, Any, Optional
 
 import numpy as np
 import pandas as pd
@@ -13,20 +18,17 @@ from tracklab.pipeline import Pipeline
 if TYPE_CHECKING:
     from tracklab.callbacks import Callback
 
-from tracklab.datastruct import TrackerState
+from tracklab.datastruct import TrackerState, DetectionStore
+from tracklab.datastruct.detection_store import as_dataframe
+from tracklab.utils.feature_cache import get_feature_cache, set_feature_cache
+
+_worker_engine = None  # engine of a video worker process, see TrackingEngine.video_workers
+_worker_events = None  # callbacks of the video worker process forwarded to the main process
 
 
 def merge_dataframes(main_df, appended_piece):
     # Convert appended_piece to a DataFrame if it's not already
-    if isinstance(appended_piece, pd.Series):
-        appended_piece = pd.DataFrame(appended_piece).T
-    elif isinstance(appended_piece, list):  # list of Series or DataFrames
-        if len(appended_piece) > 0:
-            appended_piece = pd.concat(
-                [s.to_frame().T if type(s) is pd.Series else s for s in appended_piece]
-            )
-        else:
-            appended_piece = pd.DataFrame()
+    appended_piece = as_dataframe(appended_piece)
 
     # Append the columns of the df
     new_columns = appended_piece.columns.difference(main_df.columns)
@@ -72,6 +74,8 @@ class TrackingEngine(ABC):
         tracker_state: contains inputs and outputs
         callbacks: called at different steps
         num_workers: number of workers for preprocessing
+        video_workers: number of processes tracking videos in parallel, 0 or 1 to track
+            the videos one after the other
     """
 
     def __init__(
@@ -80,6 +84,7 @@ class TrackingEngine(ABC):
         tracker_state: TrackerState,
         num_workers: int,
         callbacks: "Dict[Callback]" = None,
+        video_workers: int = 0,
     ):
         # super().__init__()
         self.module_names = [module.name for module in modules]
@@ -91,18 +96,48 @@ class TrackingEngine(ABC):
         self.fabric = Fabric(callbacks=callbacks)
         self.callback = partial(self.fabric.call, engine=self)
         self.num_workers = num_workers
+        self.video_workers = video_workers
+        # wall-clock time at which a video worker called the callback being replayed,
+        # None for the callbacks of the main process, see track_dataset_parallel
+        self.event_time = None
         self.tracker_state = tracker_state
         self.img_metadatas = tracker_state.image_metadatas
         self.video_metadatas = tracker_state.video_metadatas
         self.models = {model.name: model for model in modules}
+        self._build_dataloaders()
+
+    def _build_dataloaders(self):
         self.datapipes = {}
         self.dataloaders = {}
         for model_name, model in self.models.items():
             self.datapipes[model_name] = getattr(model, "datapipe", None)
             self.dataloaders[model_name] = getattr(model, "dataloader", lambda **kwargs: ...)(engine=self)
 
+    def __getstate__(self):
+        # Sent to the video workers : they get their own copy of the modules, but no
+        # callbacks and a tracker state which doesn't save anything.
+        state = self.__dict__.copy()
+        for key in ["fabric", "callback", "callbacks", "datapipes", "dataloaders"]:
+            state.pop(key, None)
+        tracker_state = copy.copy(self.tracker_state)
+        tracker_state.save_file = None
+        tracker_state.detections_pred = None
+        tracker_state.image_pred = None
+        tracker_state.zf = None
+        state["tracker_state"] = tracker_state
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.callbacks = {}
+        self.fabric = Fabric(callbacks=[])
+        self.callback = partial(self.fabric.call, engine=self)
+        self._build_dataloaders()
+
     def track_dataset(self):
         """Run tracking on complete dataset."""
+        if self.video_workers > 1:
+            return self.track_dataset_parallel()
         self.callback("on_dataset_track_start")
         for i, (video_idx, video_metadata) in enumerate(
             self.video_metadatas.iterrows()
@@ -124,6 +159,59 @@ class TrackingEngine(ABC):
                 )
         self.callback("on_dataset_track_end")
 
+    def track_dataset_parallel(self):
+        """Run tracking on complete dataset, with `video_workers` videos in parallel.
+
+        Each worker process holds a copy of the engine and of its modules and runs
+        :func:`video_loop` on whole videos. The callbacks only run in the main process,
+        one video after the other in the order of `video_metadatas`, so that the pklz
+        file and the callbacks are the same as with a sequential run :
+
+        - `on_video_loop_start` and the module callbacks (`on_module_start`,
+          `on_module_step_end` and `on_module_end`) are forwarded by the workers while
+          they track the video, and replayed as soon as the previous videos are done.
+          The `dataloader` and the `batch` they are given are None, the detections of
+          `on_module_step_end` keep the ids of the worker. The other callbacks of the
+          workers (e.g. `on_image_loop_*`) are ignored.
+        - `on_video_loop_end` is called with the results of the worker.
+
+        While a forwarded callback is replayed, `event_time` is the time (`time.time`)
+        at which the worker called it, e.g. for the timer to measure the time spent in
+        the worker rather than the time of the replay.
+
+        The detection ids created by the modules are only unique within a worker, they
+        are renumbered in the order of the videos.
+        """
+        self.callback("on_dataset_track_start")
+        videos = list(self.video_metadatas.iterrows())
+        # spawn is required by CUDA, the torch context shares the tensors of the
+        # modules with the workers instead of copying them
+        context = torch.multiprocessing.get_context("spawn")
+        events = context.Queue()
+        buffered = defaultdict(deque)  # events of the videos after the current one
+        next_id = 0
+        with ProcessPoolExecutor(
+            max_workers=min(self.video_workers, len(videos)) or 1,
+            mp_context=context,
+            initializer=_init_video_worker,
+            initargs=(self, get_feature_cache(), events),
+        ) as executor:
+            futures = [executor.submit(_track_video, video_idx) for video_idx, _ in videos]
+            for i, ((video_idx, video_metadata), future) in enumerate(zip(videos, futures)):
+                with self.tracker_state(video_idx):
+                    for hook, kwargs, event_time in _video_events(events, buffered, video_idx, future):
+                        self.event_time = event_time
+                        if hook == "on_video_loop_start":
+                            kwargs = dict(video_metadata=video_metadata, video_idx=video_idx, index=i)
+                        elif hook == "on_video_loop_end":
+                            detections, image_pred, loaded_ids = future.result()
+                            detections, next_id = _renumber_detections(detections, loaded_ids, next_id)
+                            kwargs = dict(video_metadata=video_metadata, video_idx=video_idx,
+                                          detections=detections, image_pred=image_pred)
+                        self.callback(hook, **kwargs)
+                    self.event_time = None
+        self.callback("on_dataset_track_end")
+
     @abstractmethod
     def video_loop(
         self, tracker_state: TrackerState, video_metadata: pd.Series, video_id: int
@@ -145,14 +233,31 @@ class TrackingEngine(ABC):
         pass
 
     def default_step(self, batch: Any, task: str, detections: pd.DataFrame,
-                     image_pred: pd.DataFrame, **kwargs):
+                     image_pred: pd.DataFrame, store: Optional[DetectionStore] = None,
+                     **kwargs):
+        """Run one batch of a module.
+
+        If a :class:`DetectionStore` is given, the outputs of the module are written
+        into it and `detections` is left untouched : it is then only used as the input
+        of the module, and the caller is responsible for converting the store back to
+        a DataFrame once the module is done. Otherwise, the outputs are merged into
+        `detections` with :func:`merge_dataframes`. In both cases, the
+        `on_module_step_end` callbacks receive the outputs of the batch.
+
+        Returns:
+            detections, image_pred
+        """
         model = self.models[task]
         self.callback(f"on_module_step_start", task=task, batch=batch)
         idxs, batch = batch
         idxs = idxs.cpu() if isinstance(idxs, torch.Tensor) else idxs
         if model.level == "image":
             batch_metadatas = image_pred.loc[list(idxs)]  # self.img_metadatas.loc[idxs]
-            if len(detections) > 0:
+            datapipe = self.datapipes.get(task)
+            if len(detections) > 0 and getattr(datapipe, "detections", None) is detections:
+                # use the index built by the datapipe instead of scanning the detections
+                batch_input_detections = datapipe.images_detections(batch_metadatas.index)
+            elif len(detections) > 0:
                 batch_input_detections = detections.loc[
                     np.isin(detections.image_id, batch_metadatas.index)
                 ]
@@ -177,8 +282,99 @@ class TrackingEngine(ABC):
         if isinstance(batch_detections, tuple):
             batch_detections, batch_metadatas = batch_detections
             image_pred = merge_dataframes(image_pred, batch_metadatas)
-        detections = merge_dataframes(detections, batch_detections)
+        batch_detections = as_dataframe(batch_detections)
+        if store is not None:
+            store.update(batch_detections)
+        else:
+            detections = merge_dataframes(detections, batch_detections)
         self.callback(
-            f"on_module_step_end", task=task, batch=batch, detections=detections
+            f"on_module_step_end", task=task, batch=batch, detections=batch_detections
         )
         return detections, image_pred
+
+
+class _CallbackForwarder:
+    """Callback of a video worker sending the module callbacks of the current video
+    to the main process, see TrackingEngine.track_dataset_parallel."""
+
+    def __init__(self, events):
+        self.events = events
+        self.video_idx = None
+
+    def send(self, hook, **kwargs):
+        self.events.put((self.video_idx, hook, kwargs, time.time()))
+
+    def on_module_start(self, engine, task, dataloader):
+        self.send("on_module_start", task=task, dataloader=None)
+
+    def on_module_step_end(self, engine, task, batch, detections):
+        self.send("on_module_step_end", task=task, batch=None, detections=detections)
+
+    def on_module_end(self, engine, task, detections):
+        self.send("on_module_end", task=task, detections=detections)
+
+
+def _init_video_worker(engine: TrackingEngine, feature_cache=None, events=None):
+    global _worker_engine, _worker_events
+    _worker_engine = engine
+    set_feature_cache(feature_cache)
+    if events is not None:
+        _worker_events = _CallbackForwarder(events)
+        engine.fabric = Fabric(callbacks=[_worker_events])
+        engine.callback = partial(engine.fabric.call, engine=engine)
+
+
+def _track_video(video_idx):
+    engine = _worker_engine
+    video_metadata = engine.video_metadatas.loc[video_idx]
+    if _worker_events is not None:
+        _worker_events.video_idx = video_idx
+        _worker_events.send("on_video_loop_start")
+    try:
+        with engine.tracker_state(video_idx) as tracker_state:
+            detections, image_pred = engine.video_loop(tracker_state, video_metadata, video_idx)
+            loaded = tracker_state.detections_pred
+            loaded_ids = loaded.index if loaded is not None else pd.Index([])
+            # the results are kept by the main process only
+            tracker_state.detections_pred = None
+            tracker_state.image_pred = None
+    finally:
+        # also sent on errors, the main process then gets them from the result
+        if _worker_events is not None:
+            _worker_events.send("on_video_loop_end")
+    return detections, image_pred, loaded_ids
+
+
+def _video_events(events, buffered, video_idx, future):
+    """Yields the `(hook, kwargs, time)` callbacks forwarded by the worker tracking
+    `video_idx`, up to its `on_video_loop_end`, and buffers the ones of the other
+    videos."""
+    while True:
+        if buffered[video_idx]:
+            event = buffered[video_idx].popleft()
+        else:
+            try:
+                video, *event = events.get(timeout=1)
+            except queue.Empty:
+                if future.done() and future.exception() is not None:
+                    future.result()  # e.g. the worker died, raises its error
+                continue
+            if video != video_idx:
+                buffered[video].append(event)
+                continue
+        yield event
+        if event[0] == "on_video_loop_end":
+            return
+
+
+def _renumber_detections(detections: pd.DataFrame, loaded_ids: pd.Index, next_id: int):
+    """Gives the detections created in a video worker the ids they would have got in a
+    sequential run, starting at `next_id`."""
+    is_new = ~detections.index.isin(loaded_ids)
+    n_new = int(is_new.sum())
+    if n_new == 0:
+        return detections, next_id
+    ids = detections.index.to_numpy(dtype=object).copy()
+    ids[is_new] = np.arange(next_id, next_id + n_new)
+    detections = detections.set_axis(pd.Index(list(ids), name=detections.index.name))
+    return detections, next_id + n_new
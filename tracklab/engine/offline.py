@@ -1,5 +1,6 @@
 import logging
 
+from tracklab.datastruct import DetectionStore
 from tracklab.engine import TrackingEngine
 from tracklab.utils.cv2 import cv2_load_image
 
@@ -27,8 +28,10 @@ class OfflineTrackingEngine(TrackingEngine):
                 task=model_name,
                 dataloader=self.dataloaders[model_name],
             )
+            store = DetectionStore.from_dataframe(detections)
             for batch in self.dataloaders[model_name]:
-                detections, image_pred = self.default_step(batch, model_name, detections, image_pred)
+                _, image_pred = self.default_step(batch, model_name, detections, image_pred, store)
+            detections = store.to_dataframe()
             self.callback("on_module_end", task=model_name, detections=detections)
             if detections.empty:
                 return detections, image_pred
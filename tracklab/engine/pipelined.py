@@ -1,15 +1,368 @@
+import logging
+import queue
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
 import pandas as pd
 
+from tracklab.datastruct import DetectionStore
+from tracklab.datastruct.detection_store import as_dataframe
 from tracklab.engine import TrackingEngine
+from tracklab.engine.engine import merge_dataframes
+from tracklab.utils.crops import detection_crops
+from tracklab.utils.cv2 import cv2_load_image
+
+log = logging.getLogger(__name__)
+
+_END = object()  # end of stream marker sent through the queues
+
+
+class _Frame:
+    """Detections and metadata of one image, flowing from one stage to the next."""
+
+    __slots__ = ("image_id", "metadata", "detections", "store")
+
+    def __init__(self, image_id, metadata: pd.DataFrame, detections: pd.DataFrame):
+        self.image_id = image_id
+        self.metadata = metadata  # single row DataFrame, to keep the dtypes of image_pred
+        self.detections = detections
+        self.store = None
+
+    def update(self, output: pd.DataFrame):
+        """Writes outputs of the current stage, `detections` being left untouched as the
+        input of the stage until the frame is closed."""
+        if self.store is None:
+            self.store = DetectionStore.from_dataframe(self.detections, capacity=16)
+        self.store.update(output)
+
+    def close(self):
+        """Makes the outputs of the stage the detections of the frame."""
+        if self.store is not None:
+            self.detections = self.store.to_dataframe()
+            self.store = None
+
+
+class _PipelineError(Exception):
+    pass
 
 
 class PipelinedTrackingEngine(TrackingEngine):
-    """ Pipelined implementation of an online tracking engine."""
-    def __init__(self, **kwargs):
+    """Pipelined implementation of an online tracking engine.
+
+    Every image-level or detection-level module runs in its own thread ("stage") and
+    the stages are connected by bounded queues carrying the detections of one image at
+    a time. The bounding box detector can thus work on frame N+k while the reid model
+    and the tracker are handling frame N. Images are always forwarded in the order of
+    the video, which is required by the stateful trackers, and the batches given to
+    each module are the same as in the :class:`OfflineTrackingEngine` (whole images
+    for the detection-level modules with `group_by_image`), so that both engines
+    produce identical outputs.
+
+    Video-level modules need all the detections of the video : they split the pipeline
+    in independent segments which are run one after the other.
+
+    Args:
+        queue_size: maximum number of images waiting between two stages
+        num_workers: number of threads used by each stage to load and preprocess images
+    """
+
+    def __init__(self, queue_size: int = 8, **kwargs):
         super().__init__(**kwargs)
+        self.queue_size = queue_size
+        self._callback_lock = threading.RLock()
+        self._stop = threading.Event()
+        self._errors = []
+        self.callback = self._locked_callback
 
+    def __getstate__(self):
+        state = super().__getstate__()
+        for key in ["_callback_lock", "_stop", "_errors"]:
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._callback_lock = threading.RLock()
+        self._stop = threading.Event()
+        self._errors = []
+        self.callback = self._locked_callback
+
+    def _locked_callback(self, *args, **kwargs):
+        # callbacks are called concurrently from the threads of the stages
+        with self._callback_lock:
+            self.fabric.call(*args, engine=self, **kwargs)
+
+    def video_loop(self, tracker_state, video, video_id):
         for name, model in self.models.items():
+            if hasattr(model, "reset"):
+                model.reset()
+
+        detections, image_pred = tracker_state.load()
+        if len(self.module_names) == 0:
+            return detections, image_pred
+
+        segment = []
+        for model_name in self.module_names:
+            if self.models[model_name].level != "video":
+                segment.append(model_name)
+                continue
+            if segment:
+                detections, image_pred = self.run_stages(segment, detections, image_pred)
+                segment = []
+                if detections.empty:
+                    return detections, image_pred
+            detections = self.models[model_name].process(detections, image_pred)
+        if segment:
+            detections, image_pred = self.run_stages(segment, detections, image_pred)
+        return detections, image_pred
+
+    def run_stages(self, model_names: List[str], detections: pd.DataFrame,
+                   image_pred: pd.DataFrame):
+        """Run a sequence of image/detection-level modules concurrently on a video."""
+        self._stop.clear()
+        self._errors = []
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(model_names) + 1)]
+        frames = self._split_frames(detections, image_pred)
+        threads = [threading.Thread(target=self._source, args=(frames, queues[0]), daemon=True)]
+        for model_name, inbox, outbox in zip(model_names, queues[:-1], queues[1:]):
+            model = self.models[model_name]
+            steps = None
+            if model.level == "image":
+                steps = range(-(-len(frames) // model.batch_size))
+            self.callback("on_module_start", task=model_name, dataloader=steps)
+            threads.append(threading.Thread(
+                target=self._run_stage, args=(model_name, inbox, outbox), daemon=True
+            ))
+        for thread in threads:
+            thread.start()
+        outputs = list(self._consume(queues[-1]))
+        for thread in threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+        return self._join_frames(outputs, detections, image_pred)
+
+    @staticmethod
+    def _split_frames(detections, image_pred):
+        if "image_id" in detections.columns and len(detections) > 0:
+            detections_by_image = detections.groupby("image_id", sort=False).indices
+        else:
+            detections_by_image = {}
+        no_detections = detections.iloc[0:0]
+        frames = []
+        for i, image_id in enumerate(image_pred.index):
+            positions = detections_by_image.get(image_id)
+            frame_detections = no_detections if positions is None else detections.iloc[positions]
+            frames.append(_Frame(image_id, image_pred.iloc[[i]], frame_detections))
+        return frames
+
+    @staticmethod
+    def _join_frames(frames, detections, image_pred):
+        image_pred = pd.concat([frame.metadata for frame in frames])
+        frame_detections = [frame.detections for frame in frames if len(frame.detections) > 0]
+        if frame_detections:
+            detections = pd.concat(frame_detections)
+        else:
+            columns = set().union(*[frame.detections.columns for frame in frames])
+            detections = detections.iloc[0:0].reindex(
+                columns=detections.columns.union(columns, sort=False)
+            )
+        return detections, image_pred
+
+    def _put(self, outbox: queue.Queue, item):
+        while not self._stop.is_set():
+            try:
+                outbox.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise _PipelineError()
+
+    def _consume(self, inbox: queue.Queue):
+        while True:
+            try:
+                item = inbox.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            if item is _END:
+                return
+            yield item
+
+    def _source(self, frames, outbox):
+        try:
+            for frame in frames:
+                self._put(outbox, frame)
+            self._put(outbox, _END)
+        except _PipelineError:
+            pass
+
+    def _run_stage(self, model_name: str, inbox: queue.Queue, outbox: queue.Queue):
+        model = self.models[model_name]
+        executor = ThreadPoolExecutor(self.num_workers) if self.num_workers > 0 else None
+        emitted = []
+        try:
+            if model.level == "image":
+                stage = self._image_stage(model_name, inbox, executor)
+            else:
+                stage = self._detection_stage(model_name, inbox, executor)
+            for frame in stage:
+                frame.close()
+                emitted.append(frame.detections)
+                self._put(outbox, frame)
+            self._put(outbox, _END)
+            non_empty = [dets for dets in emitted if len(dets) > 0]
+            self.callback(
+                "on_module_end",
+                task=model_name,
+                detections=pd.concat(non_empty) if non_empty else pd.DataFrame(columns=["image_id"]),
+            )
+        except _PipelineError:
             pass
+        except Exception as e:
+            log.error(f"Stage '{model_name}' of the pipelined engine failed.")
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def _preprocess(self, executor: Optional[ThreadPoolExecutor], function, items):
+        if executor is None:
+            return [function(item) for item in items]
+        return list(executor.map(function, items))
+
+    def _image_stage(self, model_name, inbox, executor):
+        model = self.models[model_name]
+        pending = []
+        for frame in self._consume(inbox):
+            pending.append(frame)
+            if len(pending) == model.batch_size:
+                self._image_step(model_name, pending, executor)
+                yield from pending
+                pending = []
+        if pending:
+            self._image_step(model_name, pending, executor)
+            yield from pending
+
+    def _image_step(self, model_name, frames: List[_Frame], executor):
+        model = self.models[model_name]
+
+        def preprocess(frame):
+            metadata = frame.metadata.iloc[0]
+            image = cv2_load_image(metadata.file_path)
+            return frame.image_id, model.preprocess(
+                image=image, detections=frame.detections, metadata=metadata
+            )
+
+        batch = type(model).collate_fn(self._preprocess(executor, preprocess, frames))
+        self.callback("on_module_step_start", task=model_name, batch=batch)
+        _, batch = batch
+        metadatas = pd.concat([frame.metadata for frame in frames])
+        batch_detections = pd.concat([frame.detections for frame in frames])
+        output = model.process(batch, batch_detections, metadatas)
+        if isinstance(output, tuple):
+            output, output_metadatas = output
+            output_metadatas = as_dataframe(output_metadatas)
+            for frame in frames:
+                if frame.image_id in output_metadatas.index:
+                    frame.metadata = merge_dataframes(
+                        frame.metadata.copy(), output_metadatas.loc[[frame.image_id]]
+                    )
+        output = as_dataframe(output)
+        self._dispatch(output, frames)
+        self.callback("on_module_step_end", task=model_name, batch=batch, detections=output)
+
+    def _detection_stage(self, model_name, inbox, executor):
+        model = self.models[model_name]
+        waiting = deque()  # frames whose detections are not all processed yet
+        remaining = {}
+        todo = []  # (frame, detection position), in the order of the video
+        for frame in self._consume(inbox):
+            waiting.append(frame)
+            remaining[id(frame)] = len(frame.detections)
+            if model.group_by_image:
+                # whole frames, batched like ImageGroupBatchSampler
+                if todo and len(todo) + len(frame.detections) > model.batch_size:
+                    self._detection_step(model_name, todo, remaining, executor)
+                    todo = []
+                todo.extend((frame, i) for i in range(len(frame.detections)))
+                if len(todo) >= model.batch_size:
+                    self._detection_step(model_name, todo, remaining, executor)
+                    todo = []
+            else:
+                todo.extend((frame, i) for i in range(len(frame.detections)))
+                while len(todo) >= model.batch_size:
+                    self._detection_step(model_name, todo[:model.batch_size], remaining, executor)
+                    todo = todo[model.batch_size:]
+            while waiting and remaining[id(waiting[0])] == 0:
+                del remaining[id(waiting[0])]
+                yield waiting.popleft()
+        if todo:
+            self._detection_step(model_name, todo, remaining, executor)
+        yield from waiting
+
+    def _detection_step(self, model_name, todo, remaining, executor):
+        model = self.models[model_name]
+        positions = defaultdict(list)
+        frames = {}
+        for frame, i in todo:
+            positions[id(frame)].append(i)
+            frames[id(frame)] = frame
+
+        def preprocess(key):
+            # the image is decoded and its crops extracted once for all its detections
+            frame = frames[key]
+            metadata = frame.metadata.iloc[0]
+            image = cv2_load_image(metadata.file_path)
+            detections = frame.detections.iloc[positions[key]]
+            crops = detection_crops(model, image, detections)
+            return [
+                (detection.name, model.preprocess(
+                    image=image, detection=detection, metadata=metadata, **crop))
+                for (_, detection), crop in zip(detections.iterrows(), crops)
+            ]
+
+        samples = self._preprocess(executor, preprocess, list(frames))
+        batch = type(model).collate_fn([sample for group in samples for sample in group])
+        self.callback("on_module_step_start", task=model_name, batch=batch)
+        _, batch = batch
+        batch_detections = pd.concat(
+            [frames[key].detections.iloc[pos] for key, pos in positions.items()]
+        )
+        metadatas = pd.concat([frame.metadata for frame in frames.values()])
+        output = as_dataframe(
+            model.process(batch=batch, detections=batch_detections, metadatas=metadatas)
+        )
+        self._dispatch(output, list(frames.values()))
+        for key, pos in positions.items():
+            remaining[key] -= len(pos)
+        self.callback("on_module_step_end", task=model_name, batch=batch, detections=output)
 
-    def video_loop(self, video, video_id) -> pd.DataFrame:
-        pass
\ No newline at end of file
+    @staticmethod
+    def _dispatch(output: pd.DataFrame, frames: List[_Frame]):
+        """Write the output of a module into the frames it belongs to."""
+        if len(output.columns) == 0 or len(output) == 0:
+            return
+        owners = {}
+        for frame in frames:
+            owners.update(dict.fromkeys(frame.detections.index, frame))
+        by_image = {frame.image_id: frame for frame in frames}
+        image_ids = output["image_id"].to_numpy() if "image_id" in output else None
+        rows = defaultdict(list)
+        for position, detection_id in enumerate(output.index):
+            frame = owners.get(detection_id)
+            if frame is None:
+                if image_ids is None or image_ids[position] not in by_image:
+                    raise ValueError(
+                        f"Detection {detection_id} returned by the module doesn't belong "
+                        f"to any image of the batch."
+                    )
+                frame = by_image[image_ids[position]]
+            rows[id(frame)].append(position)
+        for frame in frames:
+            if id(frame) in rows:
+                frame.update(output.iloc[rows[id(frame)]])
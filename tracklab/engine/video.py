@@ -8,9 +8,11 @@ import pandas as pd
 import torch
 from lightning import Fabric
 
+from tracklab.datastruct.detection_store import as_dataframe
 from tracklab.engine import TrackingEngine
 from tracklab.engine.engine import merge_dataframes
 from tracklab.pipeline import Pipeline
+from tracklab.utils.crops import detection_crops
 
 import logging
 
@@ -106,8 +108,9 @@ class VideoOnlineTrackingEngine:
                     batch = type(model).collate_fn([(frame_idx, batch)])
                     detections = self.default_step(batch, model_name, detections, metadata)
                 elif model.level == "detection":
-                    for idx, detection in dets.iterrows():
-                        batch = model.preprocess(image=image, detection=detection, metadata=metadata)
+                    crops = detection_crops(model, image, dets)
+                    for (idx, detection), crop in zip(dets.iterrows(), crops):
+                        batch = model.preprocess(image=image, detection=detection, metadata=metadata, **crop)
                         batch = type(model).collate_fn([(detection.name, batch)])
                         detections = self.default_step(batch, model_name, detections, metadata)
 
@@ -143,9 +146,10 @@ class VideoOnlineTrackingEngine:
                 metadatas=None,
                 **kwargs,
             )
+        batch_detections = as_dataframe(batch_detections)
         detections = merge_dataframes(detections, batch_detections)
         self.callback(
-            f"on_module_step_end", task=task, batch=batch, detections=detections
+            f"on_module_step_end", task=task, batch=batch, detections=batch_detections
         )
         return detections
 
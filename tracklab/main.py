@@ -12,6 +12,7 @@ from omegaconf import OmegaConf
 from tracklab.datastruct import TrackerState
 from tracklab.pipeline import Pipeline
 from tracklab.utils import wandb
+from tracklab.utils.assignment import set_assignment_solver
 
 
 os.environ["HYDRA_FULL_ERROR"] = "1"
@@ -79,6 +80,7 @@ def set_sharing_strategy():
 def init_environment(cfg):
     # For Hydra and Slurm compatibility
     progress.use_rich = cfg.use_rich
+    set_assignment_solver(cfg.get("assignment_solver", "auto"))
     set_sharing_strategy()  # Do not touch
     device = "cuda" if torch.cuda.is_available() else "cpu"
     log.info(f"Using device: '{device}'.")
@@ -105,7 +107,7 @@ def close_enviroment():
 def evaluate(cfg, evaluator, tracker_state):
     if cfg.get("eval_tracking", True) and cfg.dataset.nframes == -1:
         log.info("Starting evaluation.")
-        evaluator.run(tracker_state)
+        return evaluator.run(tracker_state)
     elif cfg.get("eval_tracking", True) == False:
         log.warning("Skipping evaluation because 'eval_tracking' was set to False.")
     else:
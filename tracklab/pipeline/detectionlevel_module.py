@@ -3,7 +3,7 @@ from typing import Any
 
 import pandas as pd
 
-from tracklab.datastruct import EngineDatapipe
+from tracklab.datastruct import EngineDatapipe, ImageGroupBatchSampler, collate_groups
 from tracklab.pipeline import Module
 
 from torch.utils.data.dataloader import default_collate, DataLoader
@@ -27,6 +27,15 @@ class DetectionLevelModule(Module):
       - output_columns : what info you will provide when called
       - collate_fn (optional) : the function that will be used for collating the inputs
                                 in a batch. (Default : pytorch collate function)
+      - group_by_image (optional) : if True, the detections of an image are
+                                preprocessed together and the image is only decoded
+                                once. Batches then contain whole images, with at most
+                                `batch_size` detections. (Default : False)
+      - crop_size (optional) : (height, width) of the crops of the detections. If
+                                set, the crops of all the detections of an image are
+                                extracted and resized at once, and given to
+                                `preprocess` as a (3, height, width) uint8 tensor in
+                                a `crop` argument. (Default : None)
 
      A description of the expected behavior is provided below.
     """
@@ -34,6 +43,8 @@ class DetectionLevelModule(Module):
     collate_fn = default_collate
     input_columns = None
     output_columns = None
+    group_by_image = False
+    crop_size = None
 
     @abstractmethod
     def __init__(self, batch_size: int):
@@ -86,11 +97,19 @@ class DetectionLevelModule(Module):
     @property
     def datapipe(self):
         if self._datapipe is None:
-            self._datapipe = EngineDatapipe(self)
+            self._datapipe = EngineDatapipe(self, group_by_image=self.group_by_image)
         return self._datapipe
 
     def dataloader(self, engine: "TrackingEngine"):
         datapipe = self.datapipe
+        if self.group_by_image:
+            return DataLoader(
+                dataset=datapipe,
+                batch_sampler=ImageGroupBatchSampler(datapipe, self.batch_size),
+                collate_fn=collate_groups(type(self).collate_fn),
+                num_workers=engine.num_workers,
+                persistent_workers=False,
+            )
         return DataLoader(
             dataset=datapipe,
             batch_size=self.batch_size,
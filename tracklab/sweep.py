@@ -0,0 +1,231 @@
+import copy
+import itertools
+import logging
+import time
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import hydra
+import numpy as np
+import pandas as pd
+import torch
+from hydra.utils import instantiate
+from omegaconf import OmegaConf, open_dict
+from tabulate import tabulate
+
+from tracklab.datastruct import TrackerState
+from tracklab.main import close_enviroment, evaluate, init_environment
+from tracklab.pipeline import Pipeline
+from tracklab.utils import wandb
+from tracklab.utils.shared_object import SharedObject
+
+log = logging.getLogger(__name__)
+
+_MISSING = object()
+_worker = None  # config and upstream state of a sweep worker process, see _init_sweep_worker
+
+
+class SharedTrackerState(TrackerState):
+    """Tracker state whose videos are all loaded at once from its `load_file` by
+    :func:`preload`, and then read from memory. Used by the sweeps, where the state is
+    loaded once and shared by all the runs.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.videos = None
+
+    def preload(self):
+        """Loads the detections and image predictions of all the videos."""
+        videos = {}
+        for video_id in self.video_metadatas.index:
+            with self(video_id):
+                videos[video_id] = super().load()
+            self.detections_pred = None
+            self.image_pred = None
+        self.videos = videos
+
+    def __enter__(self):
+        if self.videos is None:
+            return super().__enter__()
+        self.zf = dict(load=None, save=None)
+        return self
+
+    def load(self):
+        if self.videos is None:
+            return super().load()
+        assert self.video_id is not None, "Load can only be called in a contextmanager"
+        # copies of the DataFrames, the arrays in their cells are shared and read-only
+        detections, image_pred = (df.copy() for df in self.videos[self.video_id])
+        self.update(detections, image_pred)
+        return detections, image_pred
+
+
+def sweep_points(params: Mapping, samples=None, seed=0):
+    """Points of the grid of hyperparameters `params`, mapping the path of each
+    hyperparameter to its values, or `samples` points drawn at random from it."""
+    names = list(params)
+    grid = list(itertools.product(*(params[name] for name in names)))
+    if samples is not None and samples < len(grid):
+        indices = np.random.default_rng(seed).choice(len(grid), samples, replace=False)
+        grid = [grid[i] for i in sorted(indices)]
+    return [dict(zip(names, values)) for values in grid]
+
+
+def summarize_results(results) -> dict:
+    """Flattens the results of an evaluator into `{metric: value}`. The metrics given
+    for each threshold (e.g. the HOTA at each alpha) are averaged."""
+    if not isinstance(results, Mapping):
+        return {}
+    if "COMBINED_SEQ" in results:  # raw TrackEval results
+        results = results["COMBINED_SEQ"]
+        results = results.get("cls_comb_det_av", next(iter(results.values())))
+    summary = {}
+    for metrics in results.values():
+        if not isinstance(metrics, Mapping):
+            continue
+        for name, value in metrics.items():
+            value = np.asarray(value)
+            if value.dtype.kind in "biuf":
+                summary[name] = float(value.mean())
+    return summary
+
+
+@hydra.main(version_base=None, config_path="pkg://tracklab.configs", config_name="sweep")
+def main(cfg):
+    init_environment(cfg)
+    sweep_cfg = cfg.sweep
+
+    pipeline_names = list(cfg.pipeline)
+    if sweep_cfg.module not in pipeline_names:
+        raise ValueError(f"The swept module {sweep_cfg.module} is not in the pipeline {pipeline_names}")
+    # the modules before the swept one are loaded from the state
+    names = pipeline_names[pipeline_names.index(sweep_cfg.module):]
+    params = OmegaConf.to_container(sweep_cfg.params, resolve=True)
+    for key in params:
+        if key.split(".")[0] not in names or OmegaConf.select(cfg.modules, key, default=_MISSING) is _MISSING:
+            raise ValueError(f"Unknown hyperparameter {key}, should be '<module>.<path>' with "
+                             f"<module> in {names} and <path> in its config")
+    points = sweep_points(params, sweep_cfg.samples, sweep_cfg.seed)
+
+    # Load the upstream state once
+    tracking_dataset = instantiate(cfg.dataset)
+    tracking_set = tracking_dataset.sets[cfg.dataset.eval_set]
+    modules = [
+        instantiate(cfg.modules[name], device=sweep_cfg.device, tracking_dataset=tracking_dataset)
+        for name in names
+    ]
+    tracker_state = SharedTrackerState(tracking_set, pipeline=Pipeline(models=modules), **cfg.state)
+    if tracker_state.save_file is not None:
+        raise ValueError("The runs of a sweep can't save their tracker state, set 'state.save_file' to null")
+    log.info(f"Loading the upstream state from {tracker_state.load_file}")
+    tracker_state.preload()
+    tracker_state.pipeline = None
+    shared = SharedObject(dict(tracking_dataset=tracking_dataset, tracker_state=tracker_state))
+    del modules, tracker_state
+    log.info(f"Shared {shared.nbytes / 2**20:.1f} MiB of upstream state with the sweep workers")
+
+    # Configs of the runs, resolved here since the workers have no Hydra context
+    with open_dict(cfg):
+        cfg.engine.callbacks = {
+            name: callback for name, callback in (cfg.engine.callbacks or {}).items()
+            if name in sweep_cfg.callbacks
+        }
+    worker_cfg = dict(
+        names=names,
+        device=sweep_cfg.device,
+        output_dir=str(Path(sweep_cfg.output_dir).resolve()),
+        modules={name: OmegaConf.to_container(cfg.modules[name], resolve=True) for name in names},
+        engine=OmegaConf.to_container(cfg.engine, resolve=True),
+        eval=OmegaConf.to_container(cfg.eval, resolve=True),
+        eval_tracking=cfg.get("eval_tracking", True),
+        dataset=dict(nframes=cfg.dataset.nframes),
+    )
+
+    # Run the points in parallel
+    rows = []
+    context = torch.multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(
+            max_workers=min(sweep_cfg.workers, len(points)) or 1,
+            mp_context=context,
+            initializer=_init_sweep_worker,
+            initargs=(worker_cfg, shared),
+        ) as executor:
+            futures = {executor.submit(_run_point, i, point): i for i, point in enumerate(points)}
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                try:
+                    metrics, duration = future.result()
+                except Exception as error:
+                    log.error(f"Sweep point {i} {points[i]} failed: {error!r}")
+                    metrics, duration = {}, np.nan
+                rows.append(dict(point=i, **points[i], **metrics, time=duration))
+                log.info(f"[{done}/{len(points)}] point {i} {points[i]}: "
+                         f"{sweep_cfg.metric}={metrics.get(sweep_cfg.metric, np.nan):.4f} ({duration:.1f}s)")
+    finally:
+        shared.close()
+
+    # Results table
+    results = pd.DataFrame(rows).set_index("point").sort_index()
+    if sweep_cfg.metric in results:
+        results = results.sort_values(sweep_cfg.metric, ascending=False)
+    results_file = Path(sweep_cfg.output_dir) / "results.csv"
+    results_file.parent.mkdir(parents=True, exist_ok=True)
+    results.to_csv(results_file)
+    columns = list(params) + [c for c in sweep_cfg.columns if c in results] + ["time"]
+    log.info("Sweep results\n" + tabulate(results[columns], headers=["point"] + columns,
+                                          tablefmt="plain", floatfmt=".4g"))
+    log.info(f"Saved the sweep results at : {results_file.resolve()}")
+
+    close_enviroment()
+
+    return 0
+
+
+def _init_sweep_worker(worker_cfg: dict, shared: SharedObject):
+    global _worker
+    wandb.init(OmegaConf.create(dict(use_wandb=False)))
+    _worker = dict(cfg=worker_cfg, shared=shared)
+
+
+def _run_point(index: int, point: dict):
+    """Runs the downstream modules with the hyperparameters of `point` on all the videos,
+    and evaluates them."""
+    start = time.perf_counter()
+    cfg = OmegaConf.create(copy.deepcopy(_worker["cfg"]))
+    for key, value in point.items():
+        OmegaConf.update(cfg.modules, key, value, merge=False)
+    upstream = _worker["shared"].get()
+    tracking_dataset = upstream["tracking_dataset"]
+
+    modules = [
+        instantiate(cfg.modules[name], device=cfg.device, tracking_dataset=tracking_dataset)
+        for name in cfg.names
+    ]
+    pipeline = Pipeline(models=modules)
+    tracker_state = copy.copy(upstream["tracker_state"])
+    tracker_state.pipeline = pipeline
+    tracking_engine = instantiate(
+        cfg.engine,
+        modules=pipeline,
+        tracker_state=tracker_state,
+        num_workers=0,
+        video_workers=0,
+    )
+    tracking_engine.track_dataset()
+
+    # each point writes its predictions and TrackEval outputs in its own folder
+    output_dir = Path(cfg.output_dir) / f"{index:04d}"
+    with open_dict(cfg):
+        cfg.eval.cfg.dataset.TRACKERS_FOLDER = str(output_dir / "pred")
+        if cfg.eval.cfg.dataset.get("OUTPUT_FOLDER") is not None:
+            cfg.eval.cfg.dataset.OUTPUT_FOLDER = str(output_dir / "results")
+    evaluator = instantiate(cfg.eval, tracking_dataset=tracking_dataset)
+    results = evaluate(cfg, evaluator, tracker_state)
+    return summarize_results(results), time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,17 @@ import pandas as pd
 from tracklab.utils.coordinates import *
 
 
+def stack_arrays(column: pd.Series, empty_shape) -> np.ndarray:
+    """Copies a column of N arrays with the same shape in a single (N, ...) array,
+    of shape (0, *empty_shape) if the column is empty."""
+    if len(column) == 0:
+        return np.empty((0, *empty_shape))
+    return np.stack(column.to_numpy())
+
+
 @pd.api.extensions.register_dataframe_accessor("bbox")
 class BBoxDataFrameAccessor:
+    """Bounding boxes of the detections of a DataFrame, as (N, 4) arrays."""
     def __init__(self, pandas_obj):
         self._validate(pandas_obj)
         self._obj = pandas_obj
@@ -14,21 +23,19 @@ class BBoxDataFrameAccessor:
             raise AttributeError("Must have 'bbox_ltwh'.")
 
     def ltwh(self, image_shape=None, rounded=False):
-        return self._obj.bbox_ltwh.map(
-            lambda x: sanitize_bbox_ltwh(x, image_shape, rounded)
-        )
+        return sanitize_bbox_ltwh(stack_arrays(self._obj.bbox_ltwh, (4,)), image_shape, rounded)
 
     def ltrb(self, image_shape=None, rounded=False):
-        return self._obj.bbox_ltwh.map(lambda x: ltwh_to_ltrb(x, image_shape, rounded))
+        return ltwh_to_ltrb(stack_arrays(self._obj.bbox_ltwh, (4,)), image_shape, rounded)
 
     def xywh(self, image_shape=None, rounded=False):
-        return self._obj.bbox_ltwh.map(lambda x: ltwh_to_xywh(x, image_shape, rounded))
+        return ltwh_to_xywh(stack_arrays(self._obj.bbox_ltwh, (4,)), image_shape, rounded)
 
     def conf(self):
         if "bbox_conf" in self._obj:
-            return self._obj.bbox_conf
+            return self._obj.bbox_conf.to_numpy()
         else:
-            return self._obj.bbox_ltwh.map(lambda x: 1.)
+            return np.ones(len(self._obj))
 
 @pd.api.extensions.register_series_accessor("bbox")
 class BBoxSeriesAccessor:
@@ -58,6 +65,7 @@ class BBoxSeriesAccessor:
 
 @pd.api.extensions.register_dataframe_accessor("keypoints")
 class KeypointsDataFrameAccessor:
+    """Keypoints of the detections of a DataFrame, as (N, K, 3) arrays."""
     def __init__(self, pandas_obj):
         self._validate(pandas_obj)
         self._obj = pandas_obj
@@ -69,26 +77,24 @@ class KeypointsDataFrameAccessor:
         if "keypoints_conf" not in obj.columns:
             raise AttributeError("Must have 'keypoints_conf'.")
 
+    def _stacked(self):
+        return stack_arrays(self._obj.keypoints_xyc, (0, 3))
+
     def xyc(self, image_shape=None, rounded=False):
-        return self._obj.keypoints_xyc.map(
-            lambda x: sanitize_keypoints(x, image_shape, rounded)
-        )
+        return sanitize_keypoints(self._stacked(), image_shape, rounded)
 
     def xy(self, image_shape=None, rounded=False):
-        return self._obj.keypoints_xyc.map(
-            lambda x: sanitize_keypoints(x, image_shape, rounded)[:, :2]
-        )
+        return sanitize_keypoints(self._stacked(), image_shape, rounded)[..., :2]
 
     def c(self):
-        return self._obj.keypoints_xyc.map(lambda x: x[:, 2])
+        return self._stacked()[..., 2]
 
     def conf(self):
-        return self._obj.keypoints_conf
+        return self._obj.keypoints_conf.to_numpy()
 
     def in_bbox_coord(self, bbox_ltwh):
-        return self._obj.keypoints_xyc.map(
-            lambda x: keypoints_in_bbox_coord(x, bbox_ltwh)
-        )
+        """`bbox_ltwh` is a single bbox (4,) or a bbox per detection (N, 4)."""
+        return keypoints_in_bbox_coord(self._stacked(), bbox_ltwh)
 
 
 @pd.api.extensions.register_series_accessor("keypoints")
@@ -0,0 +1,167 @@
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import csr_matrix, issparse
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+try:
+    import lap
+except ImportError:
+    lap = None
+
+SOLVERS = ("auto", "lapjv", "scipy", "greedy", "sparse")
+
+_SOLVER_VARIABLE = "TRACKLAB_ASSIGNMENT_SOLVER"
+_SPARSE_MIN_SIZE = 400  # smallest side of the matrices solved with the sparse solver
+_SPARSE_MAX_DENSITY = 0.1  # largest fraction of feasible pairs of these matrices
+
+Assignment = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def set_assignment_solver(solver: str):
+    """Sets the solver used by default by :func:`linear_assignment`, in this process
+    and in the processes it starts (e.g. the video workers)."""
+    if solver not in SOLVERS:
+        raise ValueError(f"Unknown assignment solver {solver}, should be one of {SOLVERS}")
+    os.environ[_SOLVER_VARIABLE] = solver
+
+
+def get_assignment_solver() -> str:
+    return os.environ.get(_SOLVER_VARIABLE, "auto")
+
+
+def linear_assignment(
+    cost_matrix,
+    cost_limit: Optional[float] = None,
+    solver: Optional[str] = None,
+) -> Assignment:
+    """Assigns the rows of a cost matrix (e.g. the tracks) to its columns (e.g. the
+    detections), minimizing the total cost.
+
+    The pairs with an infinite or NaN cost, or a cost above `cost_limit`, are
+    infeasible and never assigned. As with the `cost_limit` of LAPJV, the other pairs
+    are assigned if this lowers the total cost, leaving a row or a column unassigned
+    costing `cost_limit / 2`. Without `cost_limit`, as many feasible pairs as possible
+    are assigned.
+
+    The cost matrix can be a scipy sparse matrix, whose stored entries are the only
+    feasible pairs, e.g. the pairs within the motion gate found by
+    :class:`tracklab.utils.spatial_grid.SpatialGrid`.
+
+    Args:
+        cost_matrix: (N, M) costs of the pairs, dense or sparse
+        cost_limit: largest cost of an assigned pair
+        solver: "lapjv" (requires the `lap` package), "scipy", "greedy" (approximate,
+            the pairs are assigned by increasing cost), "sparse" (only the feasible
+            pairs are given to the solver), or "auto" to pick one from the size and
+            the density of the matrix. Defaults to the solver set by
+            :func:`set_assignment_solver`.
+
+    Returns:
+        matches: (K, 2) indices of the assigned rows and columns, by increasing row
+        unmatched_rows: indices of the unassigned rows
+        unmatched_cols: indices of the unassigned columns
+    """
+    solver = solver or get_assignment_solver()
+    if solver not in SOLVERS:
+        raise ValueError(f"Unknown assignment solver {solver}, should be one of {SOLVERS}")
+    n_rows, n_cols = cost_matrix.shape
+    if issparse(cost_matrix):
+        pairs = cost_matrix.tocoo()
+        pair_rows, pair_cols, costs = pairs.row, pairs.col, pairs.data.astype(float)
+        feasible = np.isfinite(costs)
+        if cost_limit is not None:
+            feasible &= costs <= cost_limit
+        pair_rows, pair_cols, costs = pair_rows[feasible], pair_cols[feasible], costs[feasible]
+    else:
+        cost_matrix = np.asarray(cost_matrix, dtype=float)
+        feasible = np.isfinite(cost_matrix)
+        if cost_limit is not None:
+            feasible &= cost_matrix <= cost_limit
+        pair_rows, pair_cols = np.nonzero(feasible)
+        costs = cost_matrix[pair_rows, pair_cols]
+    if len(costs) == 0:
+        return _assignment(np.empty(0, dtype=int), np.empty(0, dtype=int), n_rows, n_cols)
+
+    if cost_limit is None:
+        # larger than the cost of any assignment : as many pairs as possible are assigned
+        cost_limit = 2 * (np.abs(costs).max() * min(n_rows, n_cols) + 1)
+    if solver == "auto":
+        solver = _auto_solver(n_rows, n_cols, len(costs))
+
+    if solver == "greedy":
+        rows, cols = _greedy(pair_rows, pair_cols, costs)
+    elif solver == "sparse":
+        rows, cols = _sparse(pair_rows, pair_cols, costs, n_rows, n_cols, cost_limit)
+    else:
+        # the infeasible pairs cost as much as leaving their row and column unassigned
+        clamped = np.full((n_rows, n_cols), float(cost_limit))
+        clamped[pair_rows, pair_cols] = costs
+        if solver == "lapjv":
+            if lap is None:
+                raise ImportError("The lapjv solver requires the 'lap' package")
+            _, x, _ = lap.lapjv(clamped, extend_cost=True)
+            rows = np.flatnonzero(x >= 0)
+            cols = x[rows]
+        else:
+            rows, cols = linear_sum_assignment(clamped)
+        feasible = np.zeros((n_rows, n_cols), dtype=bool)
+        feasible[pair_rows, pair_cols] = True
+        kept = feasible[rows, cols]
+        rows, cols = rows[kept], cols[kept]
+    return _assignment(rows, cols, n_rows, n_cols)
+
+
+def _auto_solver(n_rows, n_cols, n_feasible):
+    if min(n_rows, n_cols) >= _SPARSE_MIN_SIZE and n_feasible <= _SPARSE_MAX_DENSITY * n_rows * n_cols:
+        return "sparse"
+    return "lapjv" if lap is not None else "scipy"
+
+
+def _assignment(rows, cols, n_rows, n_cols) -> Assignment:
+    order = np.argsort(rows, kind="stable")
+    matches = np.stack([rows[order], cols[order]], axis=1).astype(int).reshape(-1, 2)
+    unmatched_rows = np.setdiff1d(np.arange(n_rows), rows)
+    unmatched_cols = np.setdiff1d(np.arange(n_cols), cols)
+    return matches, unmatched_rows, unmatched_cols
+
+
+def _greedy(pair_rows, pair_cols, costs):
+    """Assigns the feasible pairs by increasing cost."""
+    order = np.argsort(costs, kind="stable")
+    used_rows = np.zeros(pair_rows.max() + 1, dtype=bool)
+    used_cols = np.zeros(pair_cols.max() + 1, dtype=bool)
+    rows, cols = [], []
+    for row, col in zip(pair_rows[order], pair_cols[order]):
+        if used_rows[row] or used_cols[col]:
+            continue
+        used_rows[row] = used_cols[col] = True
+        rows.append(row)
+        cols.append(col)
+        if len(rows) == len(used_rows) or len(rows) == len(used_cols):
+            break
+    return np.array(rows, dtype=int), np.array(cols, dtype=int)
+
+
+def _sparse(pair_rows, pair_cols, costs, n_rows, n_cols, cost_limit):
+    """Solves the assignment on the graph of the feasible pairs only.
+
+    As LAPJV does for `cost_limit`, the (N, M) problem is extended to a perfect
+    matching of N + M rows and columns : each row i can be left unassigned through a
+    dummy column i, each column j through a dummy row j, both costing `cost_limit / 2`,
+    and the dummy row j is matched to the dummy column i at no cost when the pair
+    (i, j) is assigned.
+    """
+    rows = np.concatenate([pair_rows, np.arange(n_rows), n_rows + np.arange(n_cols), n_rows + pair_cols])
+    cols = np.concatenate([pair_cols, n_cols + np.arange(n_rows), np.arange(n_cols), n_cols + pair_rows])
+    weights = np.concatenate([costs, np.full(n_rows + n_cols, cost_limit / 2), np.zeros(len(costs))])
+    # all the perfect matchings have N + M pairs, a constant offset doesn't change the best one,
+    # and keeps the weights positive since the zeros are not edges of the graph
+    weights = weights - weights.min() + 1
+    size = n_rows + n_cols
+    graph = csr_matrix((weights, (rows, cols)), shape=(size, size))
+    rows, cols = min_weight_full_bipartite_matching(graph)
+    assigned = (rows < n_rows) & (cols < n_cols)
+    return rows[assigned], cols[assigned]
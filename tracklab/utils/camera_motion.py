@@ -0,0 +1,170 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from tracklab.utils.gmc import GMC
+from tracklab.utils.feature_cache import content_hash, get_feature_cache
+
+log = logging.getLogger(__name__)
+
+CAMERA_MOTION_METHODS = ["ecc", "orb", "sift", "sparseOptFlow", "none"]
+
+
+class CameraMotion:
+    """Estimates the global motion of the camera between consecutive frames of a video.
+
+    The motion is a (2, 3) affine warp of the image from the previous frame to the
+    current one, estimated once per frame with one of the methods of BoT-SORT's GMC
+    (`tracklab.utils.gmc.GMC`: "ecc", "orb", "sift" or "sparseOptFlow") on frames
+    downscaled by `downscale`. The trackers apply it to the states of all their tracks at once, e.g. with
+    `tracklab.utils.kalman.KalmanStates.warp`.
+
+    `submit` starts the estimation for a frame and `warp` returns its result. With
+    `threaded`, the estimation runs on a worker thread in between, so that the tracker
+    can do other work meanwhile (e.g. extract the appearance features of the
+    detections). The frames must be submitted in order and each warp retrieved before
+    submitting the next frame.
+
+    If the feature cache is set (see `tracklab.utils.feature_cache`), the warps are
+    read from it when the video, up to the current frame, was already seen.
+
+    Args:
+        method: estimation method
+        downscale: integer downscaling factor of the frames
+        threaded: whether to run the estimation on a worker thread
+        ecc_iterations: maximum number of iterations of "ecc"
+        ecc_eps: convergence threshold of "ecc"
+    """
+
+    def __init__(
+        self,
+        method: str = "sparseOptFlow",
+        downscale: int = 2,
+        threaded: bool = False,
+        ecc_iterations: int = 100,
+        ecc_eps: float = 1e-5,
+    ):
+        if method not in CAMERA_MOTION_METHODS:
+            raise ValueError(f"Unknown camera motion method {method}, "
+                             f"should be one of {CAMERA_MOTION_METHODS}")
+        self.method = method
+        self.downscale = downscale
+        self.threaded = threaded
+        self.ecc_iterations = ecc_iterations
+        self.ecc_eps = ecc_eps
+        self._executor = ThreadPoolExecutor(max_workers=1) if threaded else None
+        self.reset()
+
+    @classmethod
+    def from_config(cls, cfg, default: Optional[dict] = None) -> Optional["CameraMotion"]:
+        """The camera motion configured by the `camera_motion` entry of the config of a
+        tracker, or by `default` if it is missing. None if empty (no compensation)."""
+        camera_motion = cfg.get("camera_motion", default)
+        return cls(**camera_motion) if camera_motion else None
+
+    def reset(self):
+        """Forgets the previous frame, to start a new video."""
+        self._gmc = GMC(method=self.method, downscale=self.downscale,
+                        ecc_iterations=self.ecc_iterations, ecc_eps=self.ecc_eps)
+        self._pending = None
+        self._key = None  # key of the frames seen so far in the feature cache
+        self._skipped = None  # last frame read from the cache, unseen by the GMC
+
+    def submit(self, image: np.ndarray, detections: Optional[np.ndarray] = None):
+        """Starts estimating the motion from the previous frame to `image`.
+
+        Args:
+            image: (H, W, 3) BGR frame
+            detections: (N, 4) `[l, t, r, b]` boxes of the frame, masked out by the
+                feature-based methods
+        """
+        if self._pending is not None:
+            self.warp()
+        if self._executor is not None:
+            self._pending = self._executor.submit(self._estimate, image, detections)
+        else:
+            self._pending = self._estimate(image, detections)
+
+    def warp(self) -> np.ndarray:
+        """(2, 3) affine warp of the last submitted frame, the identity if none."""
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return np.eye(2, 3)
+        return pending.result() if self._executor is not None else pending
+
+    def apply(self, image: np.ndarray, detections: Optional[np.ndarray] = None) -> np.ndarray:
+        """Estimates the motion from the previous frame to `image` and returns its warp."""
+        self.submit(image, detections)
+        return self.warp()
+
+    def _estimate(self, image, detections):
+        cache = get_feature_cache()
+        if cache is None or self.method == "none":
+            return self._compute(image, detections)
+        # the GMC compares the frame with the previous one, keyed by all the previous frames
+        self._key = content_hash(
+            type(self).__name__, self.method, self.downscale, self.ecc_iterations,
+            self.ecc_eps, self._key, image, detections,
+        )
+        cached = cache.get(self._key)
+        if cached is not None:
+            self._skipped = (image, detections)
+            return cached["warp"]
+        if self._skipped is not None:  # the GMC needs the previous frame
+            self._compute(*self._skipped)
+            self._skipped = None
+        warp = self._compute(image, detections)
+        cache.put(self._key, {"warp": warp})
+        return warp
+
+    def _compute(self, image, detections):
+        try:
+            warp = self._gmc.apply(image, detections)
+        except cv2.error:
+            warp = None
+        if warp is None or not np.isfinite(warp).all():
+            log.warning("Camera motion estimation failed, the camera is considered static")
+            return np.eye(2, 3)
+        return np.asarray(warp, dtype=float)
+
+
+class CameraMotionMixin:
+    """Camera motion compensation of the tracker wrappers, enabled by the `camera_motion`
+    entry of their config (see `CameraMotion.from_config`).
+
+    The wrapper sets `self.camera_motion`, resets it with `reset_camera_motion` at each
+    new video and adds the image to its batch with `camera_motion_input`. For each
+    frame, it starts the estimation with `estimate_camera_motion`, then applies it to
+    its tracker with `compensate_camera_motion`, possibly from within the update of the
+    tracker (e.g. after extracting the appearance features, to overlap both with a
+    threaded `CameraMotion`). It must come after the module level in the bases of the
+    wrapper, e.g. `(ImageLevelModule, CameraMotionMixin)`.
+    """
+
+    camera_motion = None
+
+    def reset_camera_motion(self):
+        if self.camera_motion is not None:
+            self.camera_motion.reset()
+
+    def camera_motion_input(self, batch: dict, image) -> dict:
+        """The `batch` of the preprocessing, with the `image` if the motion is estimated."""
+        if self.camera_motion is not None:
+            batch["image"] = image
+        return batch
+
+    def estimate_camera_motion(self, batch, bboxes_ltrb: Optional[np.ndarray]):
+        """Starts estimating the motion of the camera since the previous frame, the
+        `bboxes_ltrb` of the detections being masked out of the estimation."""
+        if self.camera_motion is not None:
+            # estimated for every frame, to keep the tracks in the coordinates of the frame
+            self.camera_motion.submit(batch["image"][0].numpy(), bboxes_ltrb)
+
+    def compensate_camera_motion(self, tracker):
+        """Applies the estimated motion to the tracks of the `tracker`, with its
+        `camera_update`."""
+        if self.camera_motion is not None:
+            tracker.camera_update(self.camera_motion.warp())
@@ -1,18 +1,50 @@
 import numpy as np
 import torch
 
+# All the functions below work on a single bbox (4,) or keypoints (K, 3) array, as well
+# as on arrays of N stacked bboxes (N, 4) or keypoints (N, K, 3), with the same results.
+# The single bbox case is kept on scalars, which is several times faster than numpy
+# operations on 0-d arrays.
+
+
+def _unstack(bbox):
+    if bbox.ndim == 1:
+        return bbox.tolist()
+    return bbox[..., 0], bbox[..., 1], bbox[..., 2], bbox[..., 3]
+
+
+def _stack(*coordinates):
+    if not isinstance(coordinates[0], np.ndarray):
+        return np.array(coordinates)
+    return np.stack(coordinates, axis=-1)
+
+
+def _columns(bbox):
+    """Indexes of the 4 coordinates in `bbox`."""
+    if bbox.ndim == 1:
+        return 0, 1, 2, 3
+    return (..., 0), (..., 1), (..., 2), (..., 3)
+
+
+def _clamp(x, low, high):
+    # same as max(low, min(x, high)) : `low` wins if high < low, unlike np.clip
+    if not isinstance(x, np.ndarray):
+        return max(low, min(x, high))
+    return np.maximum(low, np.minimum(x, high))
+
 
 def keypoints_in_bbox_coord(kp_xyc_img, bbox_ltwh):
     """
     Convert keypoints in image coordinates to bounding box coordinates and filter out keypoints that are outside the
     bounding box.
     Args:
-        kp_xyc_img (np.ndarray): keypoints in image coordinates, shape (K, 2)
-        bbox_tlwh (np.ndarray): bounding box, shape (4,)
+        kp_xyc_img (np.ndarray): keypoints in image coordinates, shape (K, 3) or (N, K, 3)
+        bbox_tlwh (np.ndarray): bounding box, shape (4,) or (N, 4)
     Returns:
-        kp_xyc_bbox (np.ndarray): keypoints in bounding box coordinates, shape (K, 2)
+        kp_xyc_bbox (np.ndarray): keypoints in bounding box coordinates, shape (K, 3) or (N, K, 3)
     """
-    l, t, w, h = bbox_ltwh
+    bbox_ltwh = np.asarray(bbox_ltwh)
+    l, t, w, h = (bbox_ltwh[..., i, None] for i in range(4))
     kp_xyc_bbox = kp_xyc_img.copy()
 
     # put keypoints in bbox coord space
@@ -36,14 +68,15 @@ def rescale_keypoints(rf_keypoints, size, new_size):
     """
     Rescale keypoints to new size.
     Args:
-        rf_keypoints (np.ndarray): keypoints in relative coordinates, shape (K, 2)
-        size (tuple): original size, (w, h)
-        new_size (tuple): new size, (w, h)
+        rf_keypoints (np.ndarray): keypoints in relative coordinates, shape (K, 2) or (N, K, 2)
+        size (tuple): original size, (w, h), or (N, 2) array of sizes
+        new_size (tuple): new size, (w, h), or (N, 2) array of sizes
     Returns:
-        rf_keypoints (np.ndarray): rescaled keypoints in relative coordinates, shape (K, 2)
+        rf_keypoints (np.ndarray): rescaled keypoints in relative coordinates, shape (K, 2) or (N, K, 2)
     """
-    w, h = size
-    new_w, new_h = new_size
+    size, new_size = np.asarray(size), np.asarray(new_size)
+    w, h = size[..., 0, None], size[..., 1, None]
+    new_w, new_h = new_size[..., 0, None], new_size[..., 1, None]
     rf_keypoints = rf_keypoints.copy()
     rf_keypoints[..., 0] = rf_keypoints[..., 0] * new_w / w
     rf_keypoints[..., 1] = rf_keypoints[..., 1] * new_h / h
@@ -89,21 +122,21 @@ def clip_bbox_ltwh_to_img_dim(bbox_ltwh, img_w, img_h):
     """
     Clip bounding box to image dimensions.
     Args:
-        bbox_ltwh (np.ndarray): bounding box, shape (4,)
+        bbox_ltwh (np.ndarray): bounding box, shape (4,) or (N, 4)
         img_w (int): image width
         img_h (int): image height
     Returns:
-        bbox_ltwh (np.ndarray): clipped bounding box, shape (4,)
+        bbox_ltwh (np.ndarray): clipped bounding box, shape (4,) or (N, 4)
     """
-    l, t, w, h = bbox_ltwh
+    l, t, w, h = _unstack(np.asarray(bbox_ltwh))
     l = np.clip(l, 0, img_w - 1)
     t = np.clip(t, 0, img_h - 1)
     w = np.clip(w, 0, img_w - 1 - l)
     h = np.clip(h, 0, img_h - 1 - t)
     assert np.equal(
-        np.array([l, t, w, h]), clip_bbox_ltwh_to_img_dim_old(bbox_ltwh, img_w, img_h)
+        _stack(l, t, w, h), clip_bbox_ltwh_to_img_dim_old(bbox_ltwh, img_w, img_h)
     ).all()
-    return np.array([l, t, w, h])
+    return _stack(l, t, w, h)
 
 
 def clip_bbox_ltwh_to_img_dim_old(bbox_ltwh, img_w, img_h):
@@ -117,30 +150,30 @@ def clip_bbox_ltwh_to_img_dim_old(bbox_ltwh, img_w, img_h):
     Returns:
         bbox_ltwh (np.ndarray): clipped bounding box, shape (4,)
     """
-    l, t, w, h = bbox_ltwh.copy()
-    l = max(l, 0)
-    t = max(t, 0)
-    w = min(l + w, img_w - 1) - l
-    h = min(t + h, img_h - 1) - t
-    return np.array([l, t, w, h])
+    l, t, w, h = _unstack(np.array(bbox_ltwh))
+    l = np.maximum(l, 0)
+    t = np.maximum(t, 0)
+    w = np.minimum(l + w, img_w - 1) - l
+    h = np.minimum(t + h, img_h - 1) - t
+    return _stack(l, t, w, h)
 
 
 def clip_bbox_ltrb_to_img_dim(bbox_ltrb, img_w, img_h):
     """
     Clip bounding box to image dimensions.
     Args:
-        bbox_ltrb (np.ndarray): bounding box, shape (4,)
+        bbox_ltrb (np.ndarray): bounding box, shape (4,) or (N, 4)
         img_w (int): image width
         img_h (int): image height
     Returns:
-        bbox_ltrb (np.ndarray): clipped bounding box, shape (4,)
+        bbox_ltrb (np.ndarray): clipped bounding box, shape (4,) or (N, 4)
     """
-    l, t, r, b = bbox_ltrb
+    l, t, r, b = _unstack(np.asarray(bbox_ltrb))
     l = np.clip(l, 0, img_w - 1)
     t = np.clip(t, 0, img_h - 1)
     r = np.clip(r, 0, img_w - 1)
     b = np.clip(b, 0, img_h - 1)
-    return np.array([l, t, r, b])
+    return _stack(l, t, r, b)
 
 
 # FIXME to be removed (duplicated in KeypointsSeriesAccessor and KeypointsFrameAccessor)
@@ -156,12 +189,12 @@ def round_bbox_coordinates(bbox):
         bbox (np.ndarray): rounded bounding box, shape (4,)
     """
 
-    return np.concatenate([np.floor(bbox[:2]), np.ceil(bbox[2:])]).astype(int)
+    return np.concatenate([np.floor(bbox[..., :2]), np.ceil(bbox[..., 2:])], axis=-1).astype(int)
 
 
 # FIXME to be removed (duplicate with detection.bbox.ltrb(rounded=False))
 def bbox_ltwh2ltrb(ltwh):
-    return np.concatenate((ltwh[:2], ltwh[:2] + ltwh[2:]))
+    return np.concatenate((ltwh[..., :2], ltwh[..., :2] + ltwh[..., 2:]), axis=-1)
 
 
 def generate_bbox_from_keypoints(keypoints, extension_factor, image_shape=None):
@@ -193,23 +226,24 @@ def sanitize_keypoints(keypoints, image_shape=None, rounded=False):
     Sanitizes keypoints by clipping them to the image dimensions and ensuring that their confidence values are valid.
 
     Args:
-        keypoints (np.ndarray): A numpy array of shape (K, 2 or 3) representing the keypoints in the format (x, y, (c)).
+        keypoints (np.ndarray): A numpy array of shape (K, 2 or 3) or (N, K, 2 or 3) representing the keypoints in
+        the format (x, y, (c)).
         image_shape (tuple): A tuple of two integers representing the image dimensions `(width, height)`.
         rounded (bool): Whether to round the keypoints to integers.
 
     Returns:
-        np.ndarray: A numpy array of shape (K, 3) representing the sanitized keypoints in the format (x, y, (c)).
+        np.ndarray: A numpy array of the same shape representing the sanitized keypoints in the format (x, y, (c)).
     """
     assert isinstance(keypoints, np.ndarray), "Keypoints must be a numpy array."
-    assert keypoints.ndim == 2 and keypoints.shape[1] in (
+    assert keypoints.ndim >= 2 and keypoints.shape[-1] in (
         2,
         3,
-    ), "Keypoints must be a numpy array of shape (K, 2 or 3)."
+    ), "Keypoints must be a numpy array of shape (K, 2 or 3) or (N, K, 2 or 3)."
     if image_shape is not None:
-        keypoints[:, 0] = np.clip(keypoints[:, 0], 0, image_shape[0] - 1)
-        keypoints[:, 1] = np.clip(keypoints[:, 1], 0, image_shape[1] - 1)
+        keypoints[..., 0] = np.clip(keypoints[..., 0], 0, image_shape[0] - 1)
+        keypoints[..., 1] = np.clip(keypoints[..., 1], 0, image_shape[1] - 1)
     if rounded:
-        keypoints[:, :2] = np.round(keypoints[:, :2]).astype(int)
+        keypoints[..., :2] = np.round(keypoints[..., :2]).astype(int)
     return keypoints
 
 
@@ -218,24 +252,25 @@ def sanitize_bbox_ltwh(bbox: np.array, image_shape=None, rounded=False):
     Sanitizes a bounding box by clipping it to the image dimensions and ensuring that its dimensions are valid.
 
     Args:
-        bbox (np.ndarray): A numpy array of shape (4,) representing the bounding box in the format
-        `[left, top, width, height]`.
+        bbox (np.ndarray): A numpy array of shape (4,) or (N, 4) representing the bounding box(es) in the format
+        `[left, top, width, height]`. It is sanitized in place.
         image_shape (tuple): A tuple of two integers representing the image dimensions `(width, height)`.
         rounded (bool): Whether to round the bounding box coordinates, type becomes int.
 
     Returns:
-        np.ndarray: A numpy array of shape (4,) representing the sanitized bounding box in the format
+        np.ndarray: A numpy array of shape (4,) or (N, 4) representing the sanitized bounding box(es) in the format
         `[left, top, width, height]`.
     """
     assert isinstance(
         bbox, np.ndarray
     ), f"Expected bbox to be of type np.ndarray, got {type(bbox)}"
-    assert bbox.shape == (4,), f"Expected bbox to be of shape (4,), got {bbox.shape}"
+    assert bbox.shape[-1:] == (4,), f"Expected bbox to be of shape (4,) or (N, 4), got {bbox.shape}"
     if image_shape is not None:
-        bbox[0] = max(0, min(bbox[0], image_shape[0] - 2))
-        bbox[1] = max(0, min(bbox[1], image_shape[1] - 2))
-        bbox[2] = max(1, min(bbox[2], image_shape[0] - 1 - bbox[0]))
-        bbox[3] = max(1, min(bbox[3], image_shape[1] - 1 - bbox[1]))
+        c = _columns(bbox)
+        bbox[c[0]] = _clamp(bbox[c[0]], 0, image_shape[0] - 2)
+        bbox[c[1]] = _clamp(bbox[c[1]], 0, image_shape[1] - 2)
+        bbox[c[2]] = _clamp(bbox[c[2]], 1, image_shape[0] - 1 - bbox[c[0]])
+        bbox[c[3]] = _clamp(bbox[c[3]], 1, image_shape[1] - 1 - bbox[c[1]])
     if rounded:
         bbox = bbox.round().astype(int)
     return bbox
@@ -246,9 +281,11 @@ def ltwh_to_xywh(bbox, image_shape=None, rounded=False):
     Converts coordinates `[left, top, w, h]` to `[center_x, center_y, w, h]`.
     If image_shape is provided, the bbox is clipped to the image dimensions and its dimensions are ensured to be valid.
     """
-    if image_shape:
+    bbox = np.asarray(bbox)
+    if image_shape is not None:
         bbox = sanitize_bbox_ltwh(bbox, image_shape)
-    bbox = np.array([bbox[0] + bbox[2] / 2, bbox[1] + bbox[3] / 2, bbox[2], bbox[3]])
+    l, t, w, h = _unstack(bbox)
+    bbox = _stack(l + w / 2, t + h / 2, w, h)
     if rounded:
         bbox = bbox.round().astype(int)
     return bbox
@@ -259,9 +296,11 @@ def ltwh_to_ltrb(bbox, image_shape=None, rounded=False):
     Converts coordinates `[left, top, w, h]` to `[left, top, right, bottom]`.
     If image_shape is provided, the bbox is clipped to the image dimensions and its dimensions are ensured to be valid.
     """
-    if image_shape:
+    bbox = np.asarray(bbox)
+    if image_shape is not None:
         bbox = sanitize_bbox_ltwh(bbox, image_shape)
-    bbox = np.array([bbox[0], bbox[1], bbox[0] + bbox[2], bbox[1] + bbox[3]])
+    l, t, w, h = _unstack(bbox)
+    bbox = _stack(l, t, l + w, t + h)
     if rounded:
         bbox = bbox.round().astype(int)
     return bbox
@@ -272,24 +311,25 @@ def sanitize_bbox_ltrb(bbox, image_shape=None, rounded=False):
     Sanitizes a bounding box by clipping it to the image dimensions and ensuring that its dimensions are valid.
 
     Args:
-        bbox (np.ndarray): A numpy array of shape (4,) representing the bounding box in the format
-        `[left, top, right, bottom]`.
+        bbox (np.ndarray): A numpy array of shape (4,) or (N, 4) representing the bounding box(es) in the format
+        `[left, top, right, bottom]`. It is sanitized in place.
         image_shape (tuple): A tuple of two integers representing the image dimensions `(width, height)`.
         round (bool): Whether to round the bounding box coordinates, type becomes int.
 
     Returns:
-        np.ndarray: A numpy array of shape (4,) representing the sanitized bounding box in the format
+        np.ndarray: A numpy array of shape (4,) or (N, 4) representing the sanitized bounding box(es) in the format
         `[left, top, right, bottom]`.
     """
     assert isinstance(
         bbox, np.ndarray
     ), f"Expected bbox to be of type np.ndarray, got {type(bbox)}"
-    assert bbox.shape == (4,), f"Expected bbox to be of shape (4,), got {bbox.shape}"
-    if image_shape:
-        bbox[0] = max(0, min(bbox[0], image_shape[0] - 2))  # ensure width > 0
-        bbox[1] = max(0, min(bbox[1], image_shape[1] - 2))  # ensure height > 0
-        bbox[2] = max(1, min(bbox[2], image_shape[0] - 1))  # ensure width > 0
-        bbox[3] = max(1, min(bbox[3], image_shape[1] - 1))  # ensure height > 0
+    assert bbox.shape[-1:] == (4,), f"Expected bbox to be of shape (4,) or (N, 4), got {bbox.shape}"
+    if image_shape is not None:
+        c = _columns(bbox)
+        bbox[c[0]] = _clamp(bbox[c[0]], 0, image_shape[0] - 2)  # ensure width > 0
+        bbox[c[1]] = _clamp(bbox[c[1]], 0, image_shape[1] - 2)  # ensure height > 0
+        bbox[c[2]] = _clamp(bbox[c[2]], 1, image_shape[0] - 1)  # ensure width > 0
+        bbox[c[3]] = _clamp(bbox[c[3]], 1, image_shape[1] - 1)  # ensure height > 0
     if rounded:
         bbox = bbox.round().astype(int)
     return bbox
@@ -300,16 +340,11 @@ def ltrb_to_xywh(bbox, image_shape=None, rounded=False):
     Converts coordinates `[left, top, right, bottom]` to `[center_x, center_y, w, h]`.
     If image_shape is provided, the bbox is clipped to the image dimensions and its dimensions are ensured to be valid.
     """
-    if image_shape:
+    bbox = np.asarray(bbox)
+    if image_shape is not None:
         bbox = sanitize_bbox_ltrb(bbox, image_shape)
-    bbox = np.array(
-        [
-            (bbox[0] + bbox[2]) / 2,
-            (bbox[1] + bbox[3]) / 2,
-            (bbox[2] - bbox[0]),
-            (bbox[3] - bbox[1]),
-        ]
-    )
+    l, t, r, b = _unstack(bbox)
+    bbox = _stack((l + r) / 2, (t + b) / 2, r - l, b - t)
     if rounded:
         bbox = bbox.round().astype(int)
     return bbox
@@ -320,9 +355,11 @@ def ltrb_to_ltwh(bbox, image_shape=None, rounded=False):
     Converts coordinates `[left, top, right, bottom]` to `[left, top, w, h]`.
     If image_shape is provided, the bbox is clipped to the image dimensions and its dimensions are ensured to be valid.
     """
-    if image_shape:
+    bbox = np.asarray(bbox)
+    if image_shape is not None:
         bbox = sanitize_bbox_ltrb(bbox, image_shape)
-    bbox = np.array([bbox[0], bbox[1], bbox[2] - bbox[0], bbox[3] - bbox[1]])
+    l, t, r, b = _unstack(bbox)
+    bbox = _stack(l, t, r - l, b - t)
     if rounded:
         bbox = bbox.round().astype(int)
     return bbox
@@ -350,16 +387,11 @@ def xywh_to_ltrb(bbox, image_shape=None, rounded=False):
     Converts coordinates `[center_x, center_y, w, h]` to `[left, top, right, bottom]`.
     If image_shape is provided, the bbox is clipped to the image dimensions and its dimensions are ensured to be valid.
     """
-    if image_shape:
+    bbox = np.asarray(bbox)
+    if image_shape is not None:
         bbox = sanitize_bbox_xywh(bbox, image_shape)
-    bbox = np.array(
-        [
-            bbox[0] - bbox[2] / 2,
-            bbox[1] - bbox[3] / 2,
-            bbox[0] + bbox[2] / 2,
-            bbox[1] + bbox[3] / 2,
-        ]
-    )
+    x, y, w, h = _unstack(bbox)
+    bbox = _stack(x - w / 2, y - h / 2, x + w / 2, y + h / 2)
     if rounded:
         bbox = bbox.round().astype(int)
     return bbox
@@ -370,9 +402,11 @@ def xywh_to_ltwh(bbox, image_shape=None, rounded=False):
     Converts coordinates `[center_x, center_y, w, h]` to `[left, top, w, h]`.
     If image_shape is provided, the bbox is clipped to the image dimensions and its dimensions are ensured to be valid.
     """
-    if image_shape:
+    bbox = np.asarray(bbox)
+    if image_shape is not None:
         bbox = sanitize_bbox_xywh(bbox, image_shape)
-    bbox = np.array([bbox[0] - bbox[2] / 2, bbox[1] - bbox[3] / 2, bbox[2], bbox[3]])
+    x, y, w, h = _unstack(bbox)
+    bbox = _stack(x - w / 2, y - h / 2, w, h)
     if rounded:
         bbox = bbox.round().astype(int)
     return bbox
@@ -0,0 +1,43 @@
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+import torch
+
+
+def crop_and_resize(image: np.ndarray, bboxes_ltrb: np.ndarray, size: Tuple[int, int]) -> torch.Tensor:
+    """Crops the boxes of an image and resizes them to the same size, in a single
+    contiguous batch.
+
+    Each box (`image[t:b, l:r]`) is resized with a bilinear interpolation directly
+    into its slot of the batch, which avoids allocating a crop per box and collating
+    crops of different sizes afterwards. The crops are kept as uint8 to be cheap to
+    transfer from the DataLoader workers, normalization is left to the model.
+
+    Args:
+        image: (H, W, C) uint8 image
+        bboxes_ltrb: (N, 4) integer boxes `[left, top, right, bottom]`, inside the image
+        size: (height, width) of the crops
+
+    Returns:
+        crops: (N, C, height, width) uint8 tensor (channels last in memory)
+    """
+    height, width = size
+    bboxes_ltrb = np.asarray(bboxes_ltrb, dtype=int).reshape(-1, 4)
+    crops = np.empty((len(bboxes_ltrb), height, width, image.shape[2]), dtype=np.uint8)
+    for crop, (left, top, right, bottom) in zip(crops, bboxes_ltrb):
+        cv2.resize(image[top:bottom, left:right], (width, height), dst=crop,
+                   interpolation=cv2.INTER_LINEAR)
+    return torch.from_numpy(crops).permute(0, 3, 1, 2)
+
+
+def detection_crops(model, image: np.ndarray, detections) -> List[dict]:
+    """Extra arguments of `model.preprocess` for each of the `detections` of an image :
+    the crop of the detection if the model has a `crop_size`, nothing otherwise."""
+    crop_size = getattr(model, "crop_size", None)
+    if crop_size is None:
+        return [{}] * len(detections)
+    image_shape = (image.shape[1], image.shape[0])
+    bboxes = detections.bbox.ltrb(image_shape=image_shape, rounded=True)
+    crops = crop_and_resize(image, bboxes, crop_size)
+    return [dict(crop=crop) for crop in crops]
@@ -1,6 +1,8 @@
 import cv2
 from functools import lru_cache
 from .coordinates import *
+from .frame_cache import get_frame_cache
+from .video import VIDEO_SCHEME, load_video_frame
 
 
 import logging
@@ -28,41 +30,28 @@ posetrack_human_skeleton = [
 ]
 
 
-class VideoReader:
-    def __init__(self):
-        self.filename = None
-        self.cap = None  # cv2.VideoCapture(filename)
+def cv2_load_image(file_path):
+    """Loads an image (RGB) from a file path or a `vid://{video_file}:{frame}` path.
 
-    def set_filename(self, filename):
-        self.filename = filename
-        if self.cap is not None:
-            self.cap.release()
-        self.cap = cv2.VideoCapture(self.filename)
-        assert self.cap.isOpened(), "Error opening video stream or file"
+    Images are served by the shared frame cache if one is set (see
+    :class:`tracklab.callbacks.FrameCache`), by a small cache of the process otherwise.
+    """
+    frame_cache = get_frame_cache()
+    if frame_cache is not None:
+        return frame_cache.load(str(file_path), _cv2_decode_image)
+    return _cv2_load_image_lru(file_path)
 
-    def __getitem__(self, idx):
-        assert self.filename is not None, "You should first set the filename"
-        cap = cv2.VideoCapture(self.filename)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, idx-1)
-        ret, image = cap.read()
-        cap.release()
-        assert ret, "Read past the end of the video file"
-        return image
 
+@lru_cache(maxsize=32)
+def _cv2_load_image_lru(file_path):
+    return _cv2_decode_image(file_path)
 
-video_reader = VideoReader()
 
-@lru_cache(maxsize=32)
-def cv2_load_image(file_path):
+def _cv2_decode_image(file_path):
     file_path = str(file_path)
-    if file_path.startswith("vid://"):
-        file_path = file_path.removeprefix("vid://")
-        video_file, frame_id = file_path.split(":")
-        if video_reader.filename != video_file:
-            video_reader.set_filename(video_file)
-        image = video_reader[int(frame_id)]
-    else:
-        image = cv2.imread(str(file_path))
+    if file_path.startswith(VIDEO_SCHEME):
+        return load_video_frame(file_path)
+    image = cv2.imread(file_path)
     image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
     return image
 
@@ -0,0 +1,324 @@
+import functools
+import hashlib
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+
+log = logging.getLogger(__name__)
+
+Features = Dict[str, np.ndarray]
+
+_ALIGNMENT = 8
+_MAX_VARIABLES = 500  # maximum number of keys per sqlite query
+
+
+def content_hash(*parts) -> bytes:
+    """Key of a content, from its `parts` : arrays and tensors (their dtype, shape and
+    data), bytes (e.g. other keys), or any object with a stable `repr` (strings,
+    numbers, tuples, None...).
+
+    Returns:
+        key: 16 bytes digest
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, torch.Tensor):
+            part = part.detach().cpu().numpy()
+        if isinstance(part, np.ndarray):
+            digest.update(f"{part.dtype.str}{part.shape}".encode())
+            digest.update(np.ascontiguousarray(part))
+        elif isinstance(part, (bytes, bytearray, memoryview)):
+            digest.update(part)
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.digest()[:16]
+
+
+def file_hash(path) -> bytes:
+    """Key of the content of the file at `path`, e.g. the weights of a model, or of
+    `path` itself if there is no such file."""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return content_hash(str(path))
+    return _file_hash(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=64)
+def _file_hash(path, size, mtime_ns):
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(2**24), b""):
+            digest.update(chunk)
+    return digest.digest()[:16]
+
+
+class FeatureStore:
+    """On-disk key-value store of the features computed by the modules, addressed by
+    the content they are computed from (see :func:`content_hash`).
+
+    The values are dicts of numpy arrays. They are appended to segment files of about
+    `segment_bytes` bytes and read back through memory maps, while their location is
+    kept in a sqlite index. Each process appends to its own segment, so that a store
+    can be shared by the DataLoader workers and the video workers, and by concurrent
+    runs (e.g. a sweep over the hyperparameters of a tracker). When the segments exceed
+    `max_bytes`, the oldest ones are evicted.
+
+    Args:
+        path: directory of the store, created if needed
+        max_bytes: maximum size of the stored features
+        segment_bytes: size of the segment files
+    """
+
+    def __init__(self, path, max_bytes: int = 16 * 2**30, segment_bytes: int = 256 * 2**20):
+        self.path = Path(path)
+        self.max_bytes = int(max_bytes)
+        self.segment_bytes = int(segment_bytes)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._open()
+
+    def __getstate__(self):
+        # sent to the video workers, which open the store again
+        return dict(path=self.path, max_bytes=self.max_bytes, segment_bytes=self.segment_bytes)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        self._pid = os.getpid()
+        self._db = sqlite3.connect(
+            self.path / "index.sqlite", timeout=60, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS segments ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, size INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, segment INTEGER NOT NULL, "
+            "offset INTEGER NOT NULL, size INTEGER NOT NULL, layout TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_segment ON entries (segment)")
+        self._maps = {}
+        self._segment = None
+        self._file = None
+        self.reset_stats()
+
+    def _check_process(self):
+        if self._pid != os.getpid():  # forked, the connection and files can't be shared
+            self._open()
+
+    def reset_stats(self):
+        """Resets the counters of `stats` of this process."""
+        self.hits = self.misses = self.writes = self.evictions = 0
+
+    @property
+    def stats(self):
+        total = self.hits + self.misses
+        return dict(
+            hits=self.hits, misses=self.misses, writes=self.writes, evictions=self.evictions,
+            hit_rate=self.hits / total if total else 0.,
+        )
+
+    def __len__(self):
+        with self._lock:
+            self._check_process()
+            return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            self._check_process()
+            query = "SELECT 1 FROM entries WHERE key = ?"
+            return self._db.execute(query, (bytes(key),)).fetchone() is not None
+
+    def get(self, key: bytes) -> Optional[Features]:
+        """Features stored at `key`, or None."""
+        return self.get_many([key])[0]
+
+    def put(self, key: bytes, features: Features):
+        self.put_many([key], [features])
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[Features]]:
+        """Features stored at each of the `keys`, or None for the missing ones."""
+        keys = [bytes(key) for key in keys]
+        with self._lock:
+            self._check_process()
+            rows = {}
+            for start in range(0, len(keys), _MAX_VARIABLES):
+                chunk = keys[start:start + _MAX_VARIABLES]
+                query = ("SELECT key, segment, offset, size, layout FROM entries "
+                         f"WHERE key IN ({','.join('?' * len(chunk))})")
+                rows.update((row[0], row[1:]) for row in self._db.execute(query, chunk))
+            values = [self._read(*rows[key]) if key in rows else None for key in keys]
+        hits = sum(value is not None for value in values)
+        self.hits += hits
+        self.misses += len(values) - hits
+        return values
+
+    def put_many(self, keys: Sequence[bytes], values: Sequence[Features]):
+        """Stores the features `values` at the `keys`, the existing keys are kept."""
+        if len(keys) == 0:
+            return
+        data, records = bytearray(), []
+        for key, features in zip(keys, values):
+            start, layout = len(data), []
+            for name, array in features.items():
+                array = np.asarray(array)
+                if array.dtype.hasobject:
+                    raise ValueError(f"Can't store the {array.dtype} array {name}")
+                data.extend(bytes(-len(data) % _ALIGNMENT))
+                layout.append([name, array.dtype.str, list(array.shape), len(data) - start])
+                data.extend(array.tobytes())
+            records.append((bytes(key), start, len(data) - start, json.dumps(layout)))
+        with self._lock:
+            self._check_process()
+            for _ in range(2):
+                segment, offset = self._append(data)
+                self._db.execute("BEGIN IMMEDIATE")
+                updated = self._db.execute(
+                    "UPDATE segments SET size = size + ? WHERE id = ?", (len(data), segment)
+                ).rowcount
+                if updated:
+                    self._db.executemany(
+                        "INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?, ?)",
+                        [(key, segment, offset + start, size, layout)
+                         for key, start, size, layout in records],
+                    )
+                self._db.execute("COMMIT")
+                if updated:
+                    break
+                self._close_segment()  # evicted by another process meanwhile
+            self.writes += len(records)
+            self._evict()
+
+    def _append(self, data: bytes):
+        """Appends `data` to the segment of this process, returns its location."""
+        if self._file is not None and self._file.tell() + len(data) > self.segment_bytes:
+            self._close_segment()
+        if self._file is None:
+            self._segment = self._db.execute("INSERT INTO segments (size) VALUES (0)").lastrowid
+            self._file = open(self._segment_path(self._segment), "ab")
+        offset = self._file.tell()
+        self._file.write(data)
+        self._file.flush()  # visible to the memory maps of the other processes
+        return self._segment, offset
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = self._segment = None
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.path / f"segment-{segment:08d}.bin"
+
+    def _read(self, segment, offset, size, layout) -> Optional[Features]:
+        buffer = self._maps.get(segment)
+        if buffer is None or len(buffer) < offset + size:  # new or grown segment
+            try:
+                with open(self._segment_path(segment), "rb") as file:
+                    buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):  # evicted by another process
+                return None
+            self._maps[segment] = buffer
+        features = {}
+        for name, dtype, shape, start in json.loads(layout):
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape))
+            array = np.frombuffer(buffer, dtype, count=count, offset=offset + start) if count \
+                else np.empty(0, dtype)
+            features[name] = array.reshape(tuple(shape)).copy()
+        return features
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM segments").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        self._db.execute("BEGIN IMMEDIATE")
+        evicted = []
+        for segment, size in self._db.execute("SELECT id, size FROM segments ORDER BY id").fetchall():
+            if total <= self.max_bytes:
+                break
+            if segment == self._segment:
+                continue
+            evicted.append(segment)
+            total -= size
+        for segment in evicted:
+            self.evictions += self._db.execute(
+                "DELETE FROM entries WHERE segment = ?", (segment,)).rowcount
+            self._db.execute("DELETE FROM segments WHERE id = ?", (segment,))
+        self._db.execute("COMMIT")
+        for segment in evicted:
+            buffer = self._maps.pop(segment, None)
+            if buffer is not None:
+                buffer.close()
+            self._segment_path(segment).unlink(missing_ok=True)
+
+    def close(self):
+        """Closes the files of the store, it can't be used anymore afterwards."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._close_segment()
+            for buffer in self._maps.values():
+                buffer.close()
+            self._maps = {}
+            self._db.close()
+
+
+def cached_rows(
+    n: int,
+    key: Callable[[int], bytes],
+    compute: Callable[[np.ndarray], Features],
+) -> Features:
+    """Features of `n` items (e.g. the detections of a batch), read from the feature
+    cache if it is set and computed otherwise.
+
+    Args:
+        n: number of items
+        key: returns the key of the i-th item, only called if the feature cache is set
+        compute: computes the features of the items at the given indices, as a dict of
+            (len(indices), ...) arrays
+
+    Returns:
+        features: dict of (n, ...) arrays
+    """
+    cache = get_feature_cache()
+    if cache is None or n == 0:
+        return compute(np.arange(n))
+    keys = [key(i) for i in range(n)]
+    values = cache.get_many(keys)
+    missing = np.array([i for i, value in enumerate(values) if value is None], dtype=int)
+    if len(missing):
+        computed = compute(missing)
+        rows = [{name: array[j] for name, array in computed.items()} for j in range(len(missing))]
+        cache.put_many([keys[i] for i in missing], rows)
+        for i, row in zip(missing, rows):
+            values[i] = row
+    return {name: np.stack([value[name] for value in values]) for name in values[0]}
+
+
+_feature_cache: Optional[FeatureStore] = None
+
+
+def set_feature_cache(cache: Optional[FeatureStore]):
+    """Makes the modules read and write their features in `cache` (or not cache
+    them if None)."""
+    global _feature_cache
+    _feature_cache = cache
+
+
+def get_feature_cache() -> Optional[FeatureStore]:
+    return _feature_cache
@@ -0,0 +1,139 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+from typing import Callable, Optional
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+_MAX_SLOTS = 4096
+_MAX_DIMS = 3
+# layout of the int64 header
+_HITS, _MISSES, _EVICTIONS, _CLOCK, _SLOT_SIZE, _N_SLOTS = range(6)
+_HEADER = 8
+
+
+def _path_key(file_path) -> int:
+    digest = hashlib.blake2b(str(file_path).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class SharedFrameCache:
+    """Cache of decoded frames in shared memory, with a LRU eviction policy.
+
+    The frames are stored in fixed size slots of a single shared memory block of
+    `byte_budget` bytes, the size of the slots being given by the first frame stored
+    after a :func:`clear`. The index of the cache (path hash, last access and shape of
+    each slot) also lives in shared memory and is protected by a lock : a cache created
+    in the main process is thus shared with the processes forked from it, like the
+    DataLoader workers or the visualization pool.
+
+    Frames are always returned as copies, since callers are free to draw on them.
+
+    Args:
+        byte_budget: maximum size of the decoded frames kept in the cache
+    """
+
+    def __init__(self, byte_budget: int):
+        self.byte_budget = int(byte_budget)
+        self._lock = multiprocessing.Lock()
+        self._data = shared_memory.SharedMemory(create=True, size=max(self.byte_budget, 1))
+        index_size = 8 * (_HEADER + _MAX_SLOTS * (2 + _MAX_DIMS))
+        self._index = shared_memory.SharedMemory(create=True, size=index_size)
+        self._owner_pid = os.getpid()  # forked processes share the memory, but don't own it
+        self._map_index()
+        self.clear()
+
+    def _map_index(self):
+        index = np.ndarray((_HEADER + _MAX_SLOTS * (2 + _MAX_DIMS),), dtype=np.int64,
+                           buffer=self._index.buf)
+        self._header = index[:_HEADER]
+        self._keys = index[_HEADER:_HEADER + _MAX_SLOTS]
+        self._ticks = index[_HEADER + _MAX_SLOTS:_HEADER + 2 * _MAX_SLOTS]  # 0 if empty
+        self._shapes = index[_HEADER + 2 * _MAX_SLOTS:].reshape(_MAX_SLOTS, _MAX_DIMS)
+
+    def clear(self):
+        """Empties the cache and resets its counters."""
+        with self._lock:
+            self._header[:] = 0
+            self._ticks[:] = 0
+
+    @property
+    def stats(self):
+        hits, misses, evictions = (int(x) for x in self._header[[_HITS, _MISSES, _EVICTIONS]])
+        total = hits + misses
+        return dict(
+            hits=hits, misses=misses, evictions=evictions,
+            hit_rate=hits / total if total else 0.,
+        )
+
+    def _find(self, key) -> Optional[int]:
+        n_slots = self._header[_N_SLOTS]
+        slots = np.flatnonzero((self._keys[:n_slots] == key) & (self._ticks[:n_slots] > 0))
+        return int(slots[0]) if len(slots) else None
+
+    def _slot(self, slot: int, shape) -> np.ndarray:
+        offset = slot * int(self._header[_SLOT_SIZE])
+        return np.ndarray(shape, dtype=np.uint8, buffer=self._data.buf, offset=offset)
+
+    def _touch(self, slot: int):
+        self._header[_CLOCK] += 1
+        self._ticks[slot] = self._header[_CLOCK]
+
+    def load(self, file_path, loader: Callable[[str], np.ndarray]) -> np.ndarray:
+        """Returns the frame at `file_path`, decoded with `loader` if it isn't cached."""
+        key = _path_key(file_path)
+        with self._lock:
+            slot = self._find(key)
+            if slot is not None:
+                self._header[_HITS] += 1
+                self._touch(slot)
+                shape = tuple(int(d) for d in self._shapes[slot] if d > 0)
+                return self._slot(slot, shape).copy()
+            self._header[_MISSES] += 1
+        image = loader(file_path)
+        if image.dtype != np.uint8 or not 0 < image.ndim <= _MAX_DIMS:
+            return image
+        with self._lock:
+            if self._header[_N_SLOTS] == 0:  # the first frame gives the size of the slots
+                self._header[_SLOT_SIZE] = image.nbytes
+                self._header[_N_SLOTS] = min(self.byte_budget // max(image.nbytes, 1), _MAX_SLOTS)
+            if image.nbytes > self._header[_SLOT_SIZE] or self._header[_N_SLOTS] == 0:
+                return image
+            if self._find(key) is not None:  # loaded concurrently by another process
+                return image
+            n_slots = self._header[_N_SLOTS]
+            slot = int(np.argmin(self._ticks[:n_slots]))
+            if self._ticks[slot] > 0:
+                self._header[_EVICTIONS] += 1
+            self._keys[slot] = key
+            self._shapes[slot] = 0
+            self._shapes[slot, :image.ndim] = image.shape
+            self._slot(slot, image.shape)[...] = image
+            self._touch(slot)
+        return image
+
+    def close(self):
+        """Releases the shared memory, the cache can't be used anymore afterwards."""
+        self._header = self._keys = self._ticks = self._shapes = None
+        self._data.close()
+        self._index.close()
+        if self._owner_pid == os.getpid():
+            self._data.unlink()
+            self._index.unlink()
+
+
+_frame_cache: Optional[SharedFrameCache] = None
+
+
+def set_frame_cache(cache: Optional[SharedFrameCache]):
+    """Makes `cv2_load_image` use `cache` (or no shared cache if None)."""
+    global _frame_cache
+    _frame_cache = cache
+
+
+def get_frame_cache() -> Optional[SharedFrameCache]:
+    return _frame_cache
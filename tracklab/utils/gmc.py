@@ -1,12 +1,11 @@
 import cv2
-import matplotlib.pyplot as plt
 import numpy as np
 import copy
 import time
 
 
 class GMC:
-    def __init__(self, method='sparseOptFlow', downscale=2, verbose=None):
+    def __init__(self, method='sparseOptFlow', downscale=2, verbose=None, ecc_iterations=5000, ecc_eps=1e-6):
         super(GMC, self).__init__()
 
         self.method = method
@@ -23,8 +22,8 @@ class GMC:
             self.matcher = cv2.BFMatcher(cv2.NORM_L2)
 
         elif self.method == 'ecc':
-            number_of_iterations = 5000
-            termination_eps = 1e-6
+            number_of_iterations = ecc_iterations
+            termination_eps = ecc_eps
             self.warp_mode = cv2.MOTION_EUCLIDEAN
             self.criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, number_of_iterations, termination_eps)
 
@@ -108,6 +107,14 @@ class GMC:
         except:
             print('Warning: find transform failed. Set warp as identity')
 
+        # Handle downscale
+        if self.downscale > 1.0:
+            H[0, 2] *= self.downscale
+            H[1, 2] *= self.downscale
+
+        # Store to next iteration
+        self.prevFrame = frame.copy()
+
         return H
 
     def applyFeaures(self, raw_frame, detections=None):
@@ -198,26 +205,6 @@ class GMC:
         prevPoints = np.array(prevPoints)
         currPoints = np.array(currPoints)
 
-        # Draw the keypoint matches on the output image
-        if 0:
-            matches_img = np.hstack((self.prevFrame, frame))
-            matches_img = cv2.cvtColor(matches_img, cv2.COLOR_GRAY2BGR)
-            W = np.size(self.prevFrame, 1)
-            for m in goodMatches:
-                prev_pt = np.array(self.prevKeyPoints[m.queryIdx].pt, dtype=np.int_)
-                curr_pt = np.array(keypoints[m.trainIdx].pt, dtype=np.int_)
-                curr_pt[0] += W
-                color = np.random.randint(0, 255, (3,))
-                color = (int(color[0]), int(color[1]), int(color[2]))
-
-                matches_img = cv2.line(matches_img, prev_pt, curr_pt, tuple(color), 1, cv2.LINE_AA)
-                matches_img = cv2.circle(matches_img, prev_pt, 2, tuple(color), -1)
-                matches_img = cv2.circle(matches_img, curr_pt, 2, tuple(color), -1)
-
-            plt.figure()
-            plt.imshow(matches_img)
-            plt.show()
-
         # Find rigid matrix
         if (np.size(prevPoints, 0) > 4) and (np.size(prevPoints, 0) == np.size(prevPoints, 0)):
             H, inliesrs = cv2.estimateAffinePartial2D(prevPoints, currPoints, cv2.RANSAC)
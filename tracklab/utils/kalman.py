@@ -0,0 +1,546 @@
+import numpy as np
+
+# 0.95 quantile of the chi-square distribution with N degrees of freedom (N=1, ..., 9),
+# taken from MATLAB/Octave's chi2inv function and used as Mahalanobis gating threshold.
+chi2inv95 = {
+    1: 3.8415,
+    2: 5.9915,
+    3: 7.8147,
+    4: 9.4877,
+    5: 11.070,
+    6: 12.592,
+    7: 14.067,
+    8: 15.507,
+    9: 16.919,
+}
+
+
+def _diag(std: np.ndarray) -> np.ndarray:
+    """(N, D) standard deviations -> (N, D, D) diagonal covariances."""
+    covariance = np.zeros(std.shape + std.shape[-1:])
+    index = np.arange(std.shape[-1])
+    covariance[:, index, index] = np.square(std)
+    return covariance
+
+
+def constant_velocity_model(ndim: int = 4, dt: float = 1.0):
+    """Motion and observation matrices of a state `[p, v]`, with `ndim` observed
+    positions `p` and their velocities `v`."""
+    motion_mat = np.eye(2 * ndim)
+    motion_mat[:ndim, ndim:] = dt * np.eye(ndim)
+    return motion_mat, np.eye(ndim, 2 * ndim)
+
+
+def _similarity(warp: np.ndarray):
+    """Linear part, translation and scale factor of a (2, 3) affine warp of the image."""
+    warp = np.asarray(warp, dtype=float)
+    linear = warp[:, :2]
+    return linear, warp[:, 2], np.sqrt(abs(np.linalg.det(linear)))
+
+
+def batched(function):
+    """Decorator of the batched methods of a filter, which lets them also be called
+    with the state of a single track, as the (dim_x,) mean and (dim_x, dim_x)
+    covariance of the per-track filters."""
+    def wrapper(self, mean, covariance, *args, **kwargs):
+        mean = np.asarray(mean, dtype=float)
+        if mean.ndim == 2:
+            return function(self, mean, covariance, *args, **kwargs)
+        args = [np.asarray(arg)[None] if np.ndim(arg) > 0 else np.asarray([arg]) for arg in args]
+        kwargs = {k: v if v is None or np.ndim(v) == 0 else np.asarray(v)[None]
+                  for k, v in kwargs.items()}
+        outputs = function(self, mean[None], np.asarray(covariance)[None], *args, **kwargs)
+        if isinstance(outputs, tuple):
+            return tuple(output[0] for output in outputs)
+        return outputs[0]
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+
+class KalmanFilter:
+    """Kalman filter with a linear motion and observation model, batched over tracks.
+
+    The methods take the states of T tracks stacked in (T, dim_x) means and
+    (T, dim_x, dim_x) covariances, and run a single step for all of them. They also
+    accept the state of a single track, as (dim_x,) and (dim_x, dim_x) arrays.
+
+    The model is given by the motion and observation matrices, and its noises by the
+    subclasses, either as standard deviations (`initial_std`, `process_std` and
+    `measurement_std`, which can depend on the state, e.g. on the size of the box in
+    DeepSORT-like trackers) or as full covariances (`initial_covariance`,
+    `process_noise` and `measurement_noise`).
+
+    Args:
+        motion_mat: (dim_x, dim_x) state transition matrix
+        update_mat: (dim_z, dim_x) observation matrix
+    """
+
+    # P = (I - KH) P (I - KH)' + KRK' (Joseph form) instead of P = P - KSK'
+    joseph_form = False
+
+    def __init__(self, motion_mat: np.ndarray, update_mat: np.ndarray):
+        self._motion_mat = np.asarray(motion_mat, dtype=float)
+        self._update_mat = np.asarray(update_mat, dtype=float)
+        self.dim_z, self.dim_x = self._update_mat.shape
+
+    def initial_std(self, measurements: np.ndarray) -> np.ndarray:
+        """(N, dim_x) standard deviations of the tracks created from `measurements`."""
+        raise NotImplementedError()
+
+    def process_std(self, mean: np.ndarray) -> np.ndarray:
+        """(T, dim_x) standard deviations of the motion noise."""
+        raise NotImplementedError()
+
+    def measurement_std(self, mean: np.ndarray) -> np.ndarray:
+        """(T, dim_z) standard deviations of the measurement noise."""
+        raise NotImplementedError()
+
+    def initial_covariance(self, measurements: np.ndarray) -> np.ndarray:
+        return _diag(self.initial_std(measurements))
+
+    def process_noise(self, mean: np.ndarray) -> np.ndarray:
+        return _diag(self.process_std(mean))
+
+    def measurement_noise(self, mean: np.ndarray) -> np.ndarray:
+        return _diag(self.measurement_std(mean))
+
+    def camera_transform(self, warp: np.ndarray):
+        """Linear transform `(A, b)` of the states (x -> Ax + b) induced by a camera
+        motion, given as the (2, 3) affine warp of the image from the previous frame to
+        the current one.
+
+        Returns:
+            transform, offset: (dim_x, dim_x) matrix and (dim_x,) offset
+        """
+        raise NotImplementedError()
+
+    def warp(self, mean: np.ndarray, covariance: np.ndarray, warp: np.ndarray):
+        """Applies the camera motion `warp` (see `camera_transform`) to the states of
+        the tracks, all at once.
+
+        Returns:
+            mean, covariance: the states in the coordinates of the current frame
+        """
+        transform, offset = self.camera_transform(warp)
+        return mean @ transform.T + offset, transform @ covariance @ transform.T
+
+    def initiate(self, measurements: np.ndarray):
+        """Creates tracks from unassociated measurements.
+
+        Args:
+            measurements: (N, dim_z) or (dim_z,) measurements
+
+        Returns:
+            mean, covariance: (N, dim_x) means and (N, dim_x, dim_x) covariances of the
+                new tracks, with unobserved dimensions (velocities) at 0
+        """
+        measurements = np.asarray(measurements, dtype=float)
+        if measurements.ndim == 1:
+            mean, covariance = self.initiate(measurements[None])
+            return mean[0], covariance[0]
+        mean = measurements @ self._update_mat
+        return mean, self.initial_covariance(measurements)
+
+    @batched
+    def predict(self, mean: np.ndarray, covariance: np.ndarray, motion_noise=None):
+        """Runs the prediction step.
+
+        Returns:
+            mean, covariance: the predicted states
+        """
+        if motion_noise is None:
+            motion_noise = self.process_noise(mean)
+        mean = mean @ self._motion_mat.T
+        covariance = self._motion_mat @ covariance @ self._motion_mat.T + motion_noise
+        return mean, covariance
+
+    @batched
+    def project(self, mean: np.ndarray, covariance: np.ndarray, measurement_noise=None):
+        """Projects the states in the measurement space.
+
+        Returns:
+            mean, covariance: (T, dim_z) projected means and (T, dim_z, dim_z)
+                covariances (innovation covariances)
+        """
+        if measurement_noise is None:
+            measurement_noise = self.measurement_noise(mean)
+        projected_mean = mean @ self._update_mat.T
+        projected_cov = self._update_mat @ covariance @ self._update_mat.T
+        return projected_mean, projected_cov + measurement_noise
+
+    @batched
+    def update(self, mean: np.ndarray, covariance: np.ndarray, measurements: np.ndarray,
+               measurement_noise=None):
+        """Runs the correction step of each track with its measurement.
+
+        Args:
+            mean, covariance: predicted states of T tracks
+            measurements: (T, dim_z) measurement of each track
+            measurement_noise: (T, dim_z, dim_z) measurement noise, given by
+                `measurement_noise(mean)` if None
+
+        Returns:
+            mean, covariance: the corrected states
+        """
+        if measurement_noise is None:
+            measurement_noise = self.measurement_noise(mean)
+        projected_mean, projected_cov = self.project(mean, covariance, measurement_noise)
+        # K = P H' S^-1, solved as S K' = H P' since S is symmetric
+        pht = covariance @ self._update_mat.T
+        kalman_gain = np.linalg.solve(projected_cov, pht.transpose(0, 2, 1)).transpose(0, 2, 1)
+        innovation = np.asarray(measurements, dtype=float) - projected_mean
+        new_mean = mean + np.einsum("tij,tj->ti", kalman_gain, innovation)
+        if self.joseph_form:
+            i_kh = np.eye(self.dim_x) - kalman_gain @ self._update_mat
+            new_covariance = (i_kh @ covariance @ i_kh.transpose(0, 2, 1)
+                              + kalman_gain @ measurement_noise @ kalman_gain.transpose(0, 2, 1))
+        else:
+            new_covariance = covariance - kalman_gain @ projected_cov @ kalman_gain.transpose(0, 2, 1)
+        return new_mean, new_covariance
+
+    def gating_distance(self, mean: np.ndarray, covariance: np.ndarray, measurements: np.ndarray,
+                        only_position: bool = False, metric: str = "maha") -> np.ndarray:
+        """Distances between the states of the tracks and the measurements.
+
+        A suitable threshold for the squared Mahalanobis distance is given by
+        `chi2inv95`, with `dim_z` degrees of freedom (2 if `only_position`).
+
+        Args:
+            mean, covariance: states of T tracks, or of a single track
+            measurements: (M, dim_z) measurements
+            only_position: if True, only the 2 first dimensions (center position) are
+                compared
+            metric: "maha" for the squared Mahalanobis distance or "gaussian" for the
+                squared euclidean distance
+
+        Returns:
+            distances: (T, M) distances, or (M,) for a single track
+        """
+        mean = np.asarray(mean, dtype=float)
+        if mean.ndim == 1:
+            return self.gating_distance(mean[None], np.asarray(covariance)[None], measurements,
+                                        only_position, metric)[0]
+        projected_mean, projected_cov = self.project(mean, covariance)
+        measurements = np.asarray(measurements, dtype=float).reshape(-1, self.dim_z)
+        if only_position:
+            projected_mean, projected_cov = projected_mean[:, :2], projected_cov[:, :2, :2]
+            measurements = measurements[:, :2]
+        if metric == "gaussian":
+            d = measurements[None] - projected_mean[:, None]  # (T, M, dim_z)
+            return np.sum(d * d, axis=-1)
+        elif metric == "maha":
+            # L^-1 (measurement - mean) with S = LL', inverting the small
+            # (dim_z, dim_z) factors is cheaper than solving for each measurement
+            inv_factor = np.linalg.inv(np.linalg.cholesky(projected_cov))
+            z = inv_factor @ measurements.T  # (T, dim_z, M)
+            z -= inv_factor @ projected_mean[:, :, None]
+            return np.einsum("tim,tim->tm", z, z)
+        else:
+            raise ValueError("invalid distance metric")
+
+
+class XYAHKalmanFilter(KalmanFilter):
+    """Constant velocity filter of DeepSORT on `[x, y, a, h, vx, vy, va, vh]` states :
+    center (x, y), aspect ratio a and height h of the box and their velocities.
+
+    The noises are chosen relative to the height of the box, weighted by
+    `std_weight_position` and `std_weight_velocity`.
+    """
+
+    def __init__(self, std_weight_position: float = 1. / 20, std_weight_velocity: float = 1. / 160):
+        super().__init__(*constant_velocity_model(4))
+        self._std_weight_position = std_weight_position
+        self._std_weight_velocity = std_weight_velocity
+
+    def initial_std(self, measurements):
+        h = measurements[:, 3]
+        pos, vel = 2 * self._std_weight_position * h, 10 * self._std_weight_velocity * h
+        return np.stack([pos, pos, np.full_like(h, 1e-2), pos, vel, vel, np.full_like(h, 1e-5), vel], axis=1)
+
+    def process_std(self, mean):
+        h = mean[:, 3]
+        pos, vel = self._std_weight_position * h, self._std_weight_velocity * h
+        return np.stack([pos, pos, np.full_like(h, 1e-2), pos, vel, vel, np.full_like(h, 1e-5), vel], axis=1)
+
+    def measurement_std(self, mean):
+        h = mean[:, 3]
+        pos = self._std_weight_position * h
+        return np.stack([pos, pos, np.full_like(h, 1e-1), pos], axis=1)
+
+    def camera_transform(self, warp):
+        # the center and its velocity follow the warp, the height is scaled
+        linear, translation, scale = _similarity(warp)
+        transform = np.eye(8)
+        transform[0:2, 0:2] = transform[4:6, 4:6] = linear
+        transform[3, 3] = transform[7, 7] = scale
+        offset = np.zeros(8)
+        offset[:2] = translation
+        return transform, offset
+
+
+class XYSRKalmanFilter(KalmanFilter):
+    """Constant velocity filter of SORT and OC-SORT on `[x, y, s, r, vx, vy, vs]`
+    states : center (x, y), area s and aspect ratio r of the box, the velocities of the
+    center and of the area. The aspect ratio is considered constant.
+
+    The noises don't depend on the state.
+    """
+
+    joseph_form = True
+
+    def __init__(self):
+        motion_mat = np.eye(7)
+        motion_mat[[0, 1, 2], [4, 5, 6]] = 1
+        super().__init__(motion_mat, np.eye(4, 7))
+        self._initial_cov = np.eye(7) * 10.
+        self._initial_cov[4:, 4:] *= 1000.  # high uncertainty of the unobservable initial velocities
+        self._process_cov = np.eye(7)
+        self._process_cov[-1, -1] *= 0.01
+        self._process_cov[4:, 4:] *= 0.01
+        self._measurement_cov = np.eye(4)
+        self._measurement_cov[2:, 2:] *= 10.
+
+    def initial_covariance(self, measurements):
+        return np.broadcast_to(self._initial_cov, (len(measurements), 7, 7)).copy()
+
+    def process_noise(self, mean):
+        return np.broadcast_to(self._process_cov, (len(mean), 7, 7))
+
+    def measurement_noise(self, mean):
+        return np.broadcast_to(self._measurement_cov, (len(mean), 4, 4))
+
+    def camera_transform(self, warp):
+        # the center and its velocity follow the warp, the area is scaled
+        linear, translation, scale = _similarity(warp)
+        transform = np.eye(7)
+        transform[0:2, 0:2] = transform[4:6, 4:6] = linear
+        transform[2, 2] = transform[6, 6] = scale ** 2
+        offset = np.zeros(7)
+        offset[:2] = translation
+        return transform, offset
+
+
+class KalmanStates:
+    """States of the Kalman filters of all the tracks of a tracker.
+
+    The states are rows of (capacity, dim_x) means and (capacity, dim_x, dim_x)
+    covariances, so that the tracks are predicted, updated and gated all at once
+    instead of one filter step per track. Each track keeps the index of its row
+    (its slot), given by `add` and released by `remove`.
+
+    Args:
+        kalman_filter: filter shared by all the tracks
+        capacity: initial number of rows, doubled when they are all used
+    """
+
+    def __init__(self, kalman_filter: KalmanFilter, capacity: int = 64):
+        self.kf = kalman_filter
+        self.mean = np.zeros((capacity, kalman_filter.dim_x))
+        self.covariance = np.zeros((capacity, kalman_filter.dim_x, kalman_filter.dim_x))
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self.mean) - len(self._free)
+
+    def _grow(self):
+        capacity = len(self.mean)
+        self.mean = np.concatenate([self.mean, np.zeros_like(self.mean)])
+        self.covariance = np.concatenate([self.covariance, np.zeros_like(self.covariance)])
+        self._free = list(range(2 * capacity - 1, capacity - 1, -1)) + self._free
+        self._resize(2 * capacity)
+
+    def _resize(self, capacity: int):
+        """Hook to grow the per-slot arrays of subclasses."""
+        pass
+
+    def add(self, mean: np.ndarray, covariance: np.ndarray) -> int:
+        """Stores the state of a new track and returns its slot."""
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        self.mean[slot] = mean
+        self.covariance[slot] = covariance
+        return slot
+
+    def initiate(self, measurement: np.ndarray) -> int:
+        """Creates the state of a new track from its measurement and returns its slot."""
+        return self.add(*self.kf.initiate(measurement))
+
+    def remove(self, slot: int):
+        self._free.append(slot)
+
+    def predict(self, slots, **kwargs):
+        """Runs the prediction step of the tracks in `slots`, the `kwargs` being given
+        to the `predict` of the filter."""
+        slots = np.asarray(slots, dtype=int)
+        if len(slots) == 0:
+            return
+        self.mean[slots], self.covariance[slots] = self.kf.predict(
+            self.mean[slots], self.covariance[slots], **kwargs)
+
+    def update(self, slots, measurements, **kwargs):
+        """Runs the correction step of the tracks in `slots` with their (T, dim_z)
+        `measurements`, the `kwargs` being given to the `update` of the filter."""
+        slots = np.asarray(slots, dtype=int)
+        if len(slots) == 0:
+            return
+        self.mean[slots], self.covariance[slots] = self.kf.update(
+            self.mean[slots], self.covariance[slots], np.asarray(measurements), **kwargs)
+
+    def project(self, slots, **kwargs):
+        slots = np.asarray(slots, dtype=int)
+        return self.kf.project(self.mean[slots], self.covariance[slots], **kwargs)
+
+    def gating_distance(self, slots, measurements, only_position=False, metric="maha"):
+        """(T, M) gating distances between the tracks in `slots` and `measurements`."""
+        slots = np.asarray(slots, dtype=int)
+        return self.kf.gating_distance(
+            self.mean[slots], self.covariance[slots], measurements, only_position, metric)
+
+    def gate_boxes(self, slots, threshold: float) -> np.ndarray:
+        """(T, 4) boxes [left, top, right, bottom] bounding the gates of the tracks in
+        `slots` in the plane of the 2 first dimensions of the measurements (the center
+        position) : the measurements with a squared Mahalanobis distance below
+        `threshold`, also with `only_position`, have their center in these boxes.
+
+        Their pairs with the tracks are found with a
+        :class:`tracklab.utils.spatial_grid.SpatialGrid` of the centers, instead of
+        gating all the pairs.
+        """
+        projected_mean, projected_cov = self.project(slots)
+        # the largest offset along an axis of the ellipsoid d' S^-1 d = threshold is
+        # sqrt(threshold * S_ii), slightly enlarged against rounding errors
+        half_size = np.sqrt(threshold * np.diagonal(projected_cov, axis1=1, axis2=2)[:, :2]) * (1 + 1e-6)
+        return np.concatenate([projected_mean[:, :2] - half_size, projected_mean[:, :2] + half_size], axis=1)
+
+    def warp(self, slots, warp):
+        """Applies the camera motion `warp` to the tracks in `slots`, see
+        `KalmanFilter.camera_transform`."""
+        slots = np.asarray(slots, dtype=int)
+        if len(slots) == 0:
+            return
+        self.mean[slots], self.covariance[slots] = self.kf.warp(
+            self.mean[slots], self.covariance[slots], warp)
+
+
+class ObservationCentricStates(KalmanStates):
+    """Kalman states with the observation-centric re-update (ORU) of OC-SORT.
+
+    When a track isn't observed anymore, its state is saved. When it is observed
+    again, its state is restored and re-updated with virtual observations, linearly
+    interpolated in (x, y, w, h) between its last observation and the new one, instead
+    of the predictions made without observations. The measurements are `[x, y, s, r]`
+    (center, area and aspect ratio of the box).
+
+    The re-updates of all the tracks observed again on a frame run together, one
+    (masked) step per frame of the longest gap.
+    """
+
+    def __init__(self, kalman_filter: KalmanFilter, capacity: int = 64):
+        super().__init__(kalman_filter, capacity)
+        self.observed = np.zeros(capacity, dtype=bool)
+        self.saved_mean = np.zeros_like(self.mean)
+        self.saved_covariance = np.zeros_like(self.covariance)
+        self.has_saved = np.zeros(capacity, dtype=bool)
+        self.history = [None] * capacity  # observations of each track, None if missed
+        self.saved_history = [None] * capacity
+
+    def _resize(self, capacity: int):
+        extra = capacity - len(self.observed)
+        self.observed = np.concatenate([self.observed, np.zeros(extra, dtype=bool)])
+        self.has_saved = np.concatenate([self.has_saved, np.zeros(extra, dtype=bool)])
+        self.saved_mean = np.concatenate([self.saved_mean, np.zeros((extra,) + self.saved_mean.shape[1:])])
+        self.saved_covariance = np.concatenate(
+            [self.saved_covariance, np.zeros((extra,) + self.saved_covariance.shape[1:])])
+        self.history += [None] * extra
+        self.saved_history += [None] * extra
+
+    def add(self, mean: np.ndarray, covariance: np.ndarray) -> int:
+        slot = super().add(mean, covariance)
+        self.observed[slot] = False
+        self.has_saved[slot] = False
+        self.history[slot] = []
+        self.saved_history[slot] = None
+        return slot
+
+    def remove(self, slot: int):
+        self.history[slot] = self.saved_history[slot] = None
+        super().remove(slot)
+
+    def update(self, slots, measurements, **kwargs):
+        """Runs the correction step of the tracks in `slots` with their (T, 4)
+        `measurements`. A row of NaNs marks a track without observation, which keeps its
+        predicted state. The `kwargs` (e.g. a (T, 4, 4) `measurement_noise`) are given
+        to the `update` of the filter for the observed tracks, after their re-update."""
+        slots = np.asarray(slots, dtype=int)
+        measurements = np.asarray(measurements, dtype=float).reshape(len(slots), -1)
+        missed = np.isnan(measurements).any(axis=1)
+        kwargs = {k: v if v is None else np.asarray(v)[~missed] for k, v in kwargs.items()}
+        for slot, measurement, miss in zip(slots, measurements, missed):
+            self.history[slot].append(None if miss else measurement)
+
+        # freeze the tracks losing their observations
+        freeze = slots[missed & self.observed[slots]]
+        self.saved_mean[freeze] = self.mean[freeze]
+        self.saved_covariance[freeze] = self.covariance[freeze]
+        self.has_saved[freeze] = True
+        for slot in freeze:
+            self.saved_history[slot] = list(self.history[slot])
+        self.observed[slots[missed]] = False
+
+        observed = slots[~missed]
+        unfreeze = observed[~self.observed[observed] & self.has_saved[observed]]
+        if len(unfreeze):
+            self._reupdate(unfreeze)
+        self.observed[observed] = True
+        super().update(observed, measurements[~missed], **kwargs)
+
+    def warp(self, slots, warp):
+        """Applies the camera motion `warp` to the tracks in `slots`, including the
+        saved states of the frozen tracks and their last observation."""
+        super().warp(slots, warp)
+        slots = np.asarray(slots, dtype=int)
+        frozen = slots[self.has_saved[slots]]
+        if len(frozen) == 0:
+            return
+        self.saved_mean[frozen], self.saved_covariance[frozen] = self.kf.warp(
+            self.saved_mean[frozen], self.saved_covariance[frozen], warp)
+        # the measurements are the first dimensions of the states
+        transform, offset = self.kf.camera_transform(warp)
+        update_mat = self.kf._update_mat
+        transform, offset = update_mat @ transform @ update_mat.T, update_mat @ offset
+        for slot in frozen:
+            z = next(z for z in reversed(self.history[slot]) if z is not None)
+            z[:] = transform @ z + offset
+
+    def _reupdate(self, slots):
+        boxes, gaps = [], []
+        for slot in slots:
+            new_history = self.history[slot]
+            self.history[slot] = self.saved_history[slot][:-1]
+            indices = [i for i, z in enumerate(new_history) if z is not None]
+            index1, index2 = indices[-2], indices[-1]
+            boxes.append((new_history[index1], new_history[index2]))
+            gaps.append(index2 - index1)
+        self.mean[slots] = self.saved_mean[slots]
+        self.covariance[slots] = self.saved_covariance[slots]
+        self.has_saved[slots] = False
+
+        # linear motion between the two observations, in (x, y, w, h)
+        (x1, y1, s1, r1), (x2, y2, s2, r2) = (np.array(b, dtype=float).reshape(-1, 4).T
+                                              for b in zip(*boxes))
+        w1, h1 = np.sqrt(s1 * r1), np.sqrt(s1 / r1)
+        w2, h2 = np.sqrt(s2 * r2), np.sqrt(s2 / r2)
+        gaps = np.array(gaps)
+        dx, dy, dw, dh = (x2 - x1) / gaps, (y2 - y1) / gaps, (w2 - w1) / gaps, (h2 - h1) / gaps
+        for i in range(gaps.max()):
+            active = i < gaps
+            step = i + 1
+            x, y = x1 + step * dx, y1 + step * dy
+            w, h = w1 + step * dw, h1 + step * dh
+            virtual = np.stack([x, y, w * h, w / h], axis=1)
+            for slot, box in zip(slots[active], virtual[active]):
+                self.history[slot].append(box)
+            KalmanStates.update(self, slots[active], virtual[active])
+            KalmanStates.predict(self, slots[active & (i != gaps - 1)])
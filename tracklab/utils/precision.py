@@ -0,0 +1,111 @@
+import logging
+from contextlib import nullcontext
+from typing import Sequence
+
+import torch
+
+log = logging.getLogger(__name__)
+
+PRECISIONS = ("fp32", "bf16", "fp16", "int8")
+
+
+class InferencePrecision:
+    """Numerical precision and memory format in which a model runs its inference.
+
+    The precisions are:
+
+    - "fp32": the weights and the activations in float32
+    - "bf16", "fp16": mixed precision with `torch.autocast`, the weights are kept in
+      float32 and the numerically sensitive operations (e.g. the normalizations) run
+      in float32
+    - "int8": dynamic quantization of the linear layers (int8 weights, activations
+      quantized on the fly), only available on CPU
+
+    A precision which the device or the model doesn't support falls back to the
+    closest one, with a warning: fp16 runs in bf16 on CPU, bf16 in fp16 on the GPUs
+    without bf16, int8 in fp16 on GPU, and the precisions not in `supported` in fp32.
+
+    With `channels_last`, the weights and the inputs of the convolutions are stored
+    in the NHWC memory format, which is faster for the convolutions in mixed
+    precision on the recent GPUs and on CPU.
+
+    Args:
+        precision: one of `PRECISIONS`
+        device: device of the model
+        channels_last: use the channels last memory format
+        supported: precisions supported by the model
+    """
+
+    def __init__(self, precision: str = "fp32", device="cpu", channels_last: bool = False,
+                 supported: Sequence[str] = PRECISIONS):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision {precision}, should be one of {PRECISIONS}")
+        self.requested = precision
+        self.device_type = torch.device(device).type
+        self.channels_last = channels_last
+        if self.device_type == "cpu" and precision == "fp16":
+            precision = "bf16"
+        elif self.device_type == "cuda" and precision == "bf16" and not torch.cuda.is_bf16_supported():
+            precision = "fp16"
+        elif self.device_type != "cpu" and precision == "int8":
+            precision = "fp16"
+        if precision not in supported:
+            precision = "fp32"
+        if precision != self.requested:
+            log.warning(f"{self.requested} inference is not supported by this model on "
+                        f"{self.device_type}, falling back to {precision}")
+        self.precision = precision
+        self._prepared_predictor = None  # see predict_yolo
+
+    @property
+    def dtype(self) -> torch.dtype:
+        """Floating point type of the activations in mixed precision."""
+        return {"bf16": torch.bfloat16, "fp16": torch.float16}.get(self.precision, torch.float32)
+
+    def key(self) -> tuple:
+        """Parts of the keys of the feature cache identifying the settings, empty with
+        the default ones so that the features computed in fp32 stay valid."""
+        if self.precision == "fp32" and not self.channels_last:
+            return ()
+        return self.precision, self.channels_last
+
+    def prepare(self, model: torch.nn.Module) -> torch.nn.Module:
+        """Converts the `model` (in eval mode) for the inference, the quantized model
+        being a copy."""
+        if self.precision == "int8":
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        if self.channels_last:
+            model = model.to(memory_format=torch.channels_last)
+        return model
+
+    def inputs(self, images: torch.Tensor) -> torch.Tensor:
+        """The (N, C, H, W) `images` in the memory format of the model."""
+        if self.channels_last and images.dim() == 4:
+            return images.contiguous(memory_format=torch.channels_last)
+        return images
+
+    def autocast(self):
+        """Context in which the inference runs, in mixed precision for bf16 and fp16."""
+        if self.precision in ("bf16", "fp16"):
+            return torch.autocast(device_type=self.device_type, dtype=self.dtype)
+        return nullcontext()
+
+    def predict_yolo(self, model, images) -> list:
+        """Results of the ultralytics YOLO `model` on the `images`, in float32."""
+        with self.autocast():
+            results_by_image = model(images)
+        predictor = model.predictor.model
+        if self.channels_last and predictor is not self._prepared_predictor:
+            # the predictor fuses the layers of the model on its first call, into
+            # new weights in the default memory format
+            self.prepare(predictor)
+            self._prepared_predictor = predictor
+        if self.precision != "fp32":
+            results_by_image = [results.to(torch.float32) for results in results_by_image]
+        return results_by_image
+
+
+def to_float32(tensor: torch.Tensor) -> torch.Tensor:
+    """The floating point `tensor` (e.g. an output of the mixed precision inference) in
+    float32, the other tensors being unchanged."""
+    return tensor.float() if tensor.is_floating_point() else tensor
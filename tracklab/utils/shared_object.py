@@ -0,0 +1,70 @@
+import os
+import pickle
+from multiprocessing import shared_memory
+from typing import Any
+
+_ALIGNMENT = 64
+
+
+class SharedObject:
+    """Object pickled once into a shared memory block, to be read by other processes
+    without copying its arrays.
+
+    The object is pickled with the protocol 5, its arrays (the numeric columns of the
+    DataFrames, the embeddings of the detections, ...) being written out-of-band in
+    the block. Pickling a :class:`SharedObject` only sends the name of the block : the
+    processes which receive it unpickle the object on the first call to :func:`get`,
+    and its arrays are then read-only views of the shared memory.
+
+    Args:
+        obj: object to share
+    """
+
+    def __init__(self, obj: Any):
+        buffers = []
+        data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+        buffers = [buffer.raw() for buffer in buffers]
+        layout, size = [], len(data)
+        for buffer in buffers:
+            size += -size % _ALIGNMENT
+            layout.append((size, buffer.nbytes))
+            size += buffer.nbytes
+        self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self._shm.buf[:len(data)] = data
+        for (offset, nbytes), buffer in zip(layout, buffers):
+            self._shm.buf[offset:offset + nbytes] = buffer
+        self._data_size = len(data)
+        self._layout = layout
+        self._owner_pid = os.getpid()
+        self._obj = obj
+        self.nbytes = size
+
+    def __getstate__(self):
+        return dict(name=self._shm.name, data_size=self._data_size, layout=self._layout,
+                    owner_pid=self._owner_pid, nbytes=self.nbytes)
+
+    def __setstate__(self, state):
+        self._shm = shared_memory.SharedMemory(name=state.pop("name"))
+        self._data_size = state.pop("data_size")
+        self._layout = state.pop("layout")
+        self.__dict__.update(state)
+        self._obj = None
+
+    def get(self) -> Any:
+        """The shared object, unpickled from the shared memory on the first call."""
+        if self._obj is None:
+            buffer = self._shm.buf
+            buffers = [buffer[offset:offset + nbytes].toreadonly() for offset, nbytes in self._layout]
+            self._obj = pickle.loads(buffer[:self._data_size], buffers=buffers)
+        return self._obj
+
+    def close(self):
+        """Releases the shared memory, which is freed once the process which created it
+        closed it."""
+        self._obj = None
+        try:
+            self._shm.close()
+        except BufferError:  # arrays still use it, it is unmapped once they are freed
+            pass
+        if self._owner_pid == os.getpid():
+            self._shm.unlink()
@@ -0,0 +1,104 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class SpatialGrid:
+    """Uniform grid over boxes, to find the boxes intersecting other boxes without
+    comparing all the pairs.
+
+    In crowded frames most tracks and detections are far apart, so that only a few
+    pairs can overlap or be within the motion gate of a track. Each box is registered
+    in all the cells it covers, and a query box is only compared with the boxes of the
+    cells it covers.
+
+    Args:
+        boxes_ltrb: (N, 4) boxes [left, top, right, bottom] of the grid
+        cell_size: side of the square cells, the largest of the median width and the
+            median height of the boxes by default, or larger for the boxes which are
+            small relative to their spread (down to points)
+    """
+
+    def __init__(self, boxes_ltrb: np.ndarray, cell_size: Optional[float] = None):
+        self.boxes = np.asarray(boxes_ltrb, dtype=float).reshape(-1, 4)
+        valid = ~np.isnan(self.boxes).any(axis=1)  # boxes with NaNs are never found
+        valid_boxes = self.boxes[np.isfinite(self.boxes).all(axis=1)]
+        if len(valid_boxes) == 0:
+            self.origin = np.zeros(2)
+            self.cell_size = 1.
+            self.shape = (1, 1)  # columns, rows
+        else:
+            # spanning all the corners, also of the inverted boxes
+            corners = valid_boxes.reshape(-1, 2)
+            self.origin = corners.min(axis=0)
+            extent = corners.max(axis=0) - self.origin
+            if cell_size is None:
+                sizes = np.median(valid_boxes[:, 2:] - valid_boxes[:, :2], axis=0)
+                # at most about one cell per box, e.g. for points
+                cell_size = max(sizes.max(), np.sqrt(extent.prod() / len(valid_boxes)))
+            self.cell_size = max(float(cell_size), 1.)
+            self.shape = tuple((extent // self.cell_size).astype(int) + 1)
+
+        boxes, cells = self._covered_cells(np.flatnonzero(valid), self.boxes[valid])
+        order = np.argsort(cells, kind="stable")
+        self._cell_boxes = boxes[order]
+        self._cell_start = np.searchsorted(cells[order], np.arange(self.shape[0] * self.shape[1] + 1))
+
+    def _covered_cells(self, indices, boxes_ltrb) -> Tuple[np.ndarray, np.ndarray]:
+        """(index, cell) pairs of the cells of the grid covered by each box."""
+        # the cells outside the grid are empty, clipping also bounds the huge boxes
+        upper = (np.array(self.shape) - 1) * self.cell_size
+        start = (np.clip(boxes_ltrb[:, :2] - self.origin, 0, upper) // self.cell_size).astype(int)
+        stop = (np.clip(boxes_ltrb[:, 2:] - self.origin, 0, upper) // self.cell_size).astype(int)
+        stop = np.maximum(stop, start)  # inverted boxes intersect nothing, the exact test discards them
+        width, height = (stop - start + 1).T
+        counts = width * height
+        first = np.cumsum(counts) - counts
+        owner = np.repeat(np.arange(len(boxes_ltrb)), counts)
+        offset = np.arange(counts.sum()) - first[owner]
+        x = start[owner, 0] + offset % width[owner]
+        y = start[owner, 1] + offset // width[owner]
+        return indices[owner], y * self.shape[0] + x
+
+    def query(self, boxes_ltrb: np.ndarray, margin=0.) -> Tuple[np.ndarray, np.ndarray]:
+        """Pairs of the query boxes and of the boxes of the grid which intersect (or
+        touch) each other.
+
+        Args:
+            boxes_ltrb: (M, 4) query boxes [left, top, right, bottom]
+            margin: distance by which the query boxes are enlarged on each side, a
+                scalar or one per query box
+
+        Returns:
+            rows: indices of the query boxes
+            cols: indices of the boxes of the grid they intersect, by increasing
+                (row, col)
+        """
+        queries = np.asarray(boxes_ltrb, dtype=float).reshape(-1, 4)
+        margin = np.broadcast_to(np.asarray(margin, dtype=float).reshape(-1, 1), (len(queries), 1))
+        queries = np.c_[queries[:, :2] - margin, queries[:, 2:] + margin]
+        valid = np.flatnonzero(~np.isnan(queries).any(axis=1))
+        rows, cells = self._covered_cells(valid, queries[valid])
+        counts = self._cell_start[cells + 1] - self._cell_start[cells]
+        first = np.cumsum(counts) - counts
+        owner = np.repeat(np.arange(len(cells)), counts)
+        cols = self._cell_boxes[self._cell_start[cells[owner]] + np.arange(counts.sum()) - first[owner]]
+        rows = rows[owner]
+        # a pair is found in every cell covered by both boxes, and some are only close
+        pairs = np.unique(rows * len(self.boxes) + cols)
+        rows, cols = np.divmod(pairs, max(len(self.boxes), 1))
+        query, box = queries[rows], self.boxes[cols]
+        intersect = ((query[:, :2] <= box[:, 2:]) & (box[:, :2] <= query[:, 2:])).all(axis=1)
+        return rows[intersect], cols[intersect]
+
+
+def candidate_pairs(boxes_a: np.ndarray, boxes_b: np.ndarray, margin=0.,
+                    cell_size: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Pairs of intersecting boxes of `boxes_a` (enlarged by `margin`) and `boxes_b`,
+    both (N, 4) [left, top, right, bottom], see :class:`SpatialGrid`.
+
+    Returns:
+        rows: indices in `boxes_a`
+        cols: indices in `boxes_b`, by increasing (row, col)
+    """
+    return SpatialGrid(boxes_b, cell_size).query(boxes_a, margin)
@@ -0,0 +1,72 @@
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from tracklab.utils.coordinates import ltrb_to_ltwh
+
+# Columns of the detections given to the trackers, e.g. OC-SORT, ByteTrack, BoT-SORT
+TRACKER_INPUT_COLUMNS = ["l", "t", "r", "b", "conf", "class", "tracklab_id"]
+
+
+def tracker_input(detections: pd.DataFrame, min_confidence: Optional[float] = None) -> np.ndarray:
+    """Builds the input of the trackers from the detections of a frame.
+
+    Args:
+        detections: detections of a frame, with `bbox_ltwh`, `bbox_conf` (optional) and
+            `category_id` (optional) columns
+        min_confidence: if given, the detections with a lower confidence are filtered out
+
+    Returns:
+        inputs: (N, 7) array `[l, t, r, b, conf, class, tracklab_id]`
+    """
+    inputs = np.empty((len(detections), len(TRACKER_INPUT_COLUMNS)))
+    if len(detections) > 0:
+        inputs[:, :4] = detections.bbox.ltrb()
+        inputs[:, 4] = detections.bbox.conf()
+        inputs[:, 5] = detections.category_id.to_numpy() if "category_id" in detections else 0
+        inputs[:, 6] = detections.index.to_numpy()
+    if min_confidence is not None:
+        inputs = inputs[inputs[:, 4] > min_confidence]
+    return inputs
+
+
+def tracker_output(
+    results,
+    detections: pd.DataFrame,
+    track_id: int = 4,
+    conf: int = 6,
+    idx: int = 7,
+    check_idxs: bool = True,
+) -> Union[pd.DataFrame, list]:
+    """Builds the outputs of a tracker wrapper from the results of the tracker.
+
+    Args:
+        results: (N', M) results of the tracker, with the `[l, t, r, b]` boxes as first
+            columns, e.g. `[l, t, r, b, track_id, class, conf, idx]` for OC-SORT
+        detections: detections given to the tracker
+        track_id: column of the track ids in `results`
+        conf: column of the confidences in `results`
+        idx: column of the tracklab ids of the detections in `results`
+        check_idxs: whether to check that the results match the detections
+
+    Returns:
+        outputs: DataFrame with the `track_id`, `track_bbox_ltwh` and `track_bbox_conf`
+            of the tracked detections, indexed by their tracklab id. Or an empty list
+            if no detection was tracked.
+    """
+    results = np.asarray(results)  # of objects with extra columns, e.g. for StrongSORT
+    if not results.size:
+        return []
+    idxs = results[:, idx].astype(int)
+    if check_idxs:
+        assert np.isin(idxs, detections.index).all(), \
+            "Mismatch of indexes during the tracking. The results should match the detections."
+    return pd.DataFrame(
+        {
+            "track_bbox_ltwh": list(ltrb_to_ltwh(results[:, :4].astype(float))),
+            "track_bbox_conf": results[:, conf].astype(float),
+            "track_id": results[:, track_id].astype(float),
+        },
+        index=pd.Index(idxs, name="idxs"),
+    )
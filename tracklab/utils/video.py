@@ -0,0 +1,197 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import cv2
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+VIDEO_SCHEME = "vid://"
+
+_options = dict(prefetch=8, stride=1, seek_threshold=128, max_open=4)
+
+
+def video_frame_path(video_path, frame: int) -> str:
+    """Path of a frame of a video file, understood by `cv2_load_image`."""
+    return f"{VIDEO_SCHEME}{video_path}:{frame}"
+
+
+def parse_video_frame_path(file_path: str):
+    """(video_path, frame) of a `vid://{video_path}:{frame}` path."""
+    video_path, frame = str(file_path).removeprefix(VIDEO_SCHEME).rsplit(":", 1)
+    return video_path, int(frame)
+
+
+def video_frame_count(video_path) -> int:
+    """Number of frames of a video, counted by grabbing all of them : the count of the
+    container (`CAP_PROP_FRAME_COUNT`) is only an estimate, often too high e.g. for
+    the variable frame rate or remuxed videos, and the frames past the end can't be
+    read. Grabbing skips the conversion of the frames, which is cheaper than reading
+    them."""
+    cap = cv2.VideoCapture(str(video_path))
+    assert cap.isOpened(), f"Error opening video file {video_path}"
+    frames = 0
+    while cap.grab():
+        frames += 1
+    cap.release()
+    return frames
+
+
+class VideoFrameSource:
+    """Random access to the frames of a video file, optimized for the (mostly)
+    forward accesses of the tracking engines.
+
+    A single capture is kept open and decodes the video sequentially : a frame ahead
+    of the current position, by less than `seek_threshold` frames, is reached by
+    skipping the frames in between without converting them, which is cheaper than
+    seeking. Seeking (backwards, or far ahead) lets the decoder restart from the
+    keyframe preceding the frame. A background thread decodes the `prefetch` next
+    frames expected, i.e. every `stride` frames after the last one requested, while
+    the caller processes the current frame.
+
+    Args:
+        video_path: path of the video file
+        prefetch: number of frames decoded ahead, 0 to disable the background thread
+        stride: interval between two frames expected to be read
+        seek_threshold: maximum number of frames skipped by decoding instead of seeking,
+            ideally the distance between two keyframes of the video
+    """
+
+    def __init__(self, video_path, prefetch: int = 8, stride: int = 1, seek_threshold: int = 128):
+        self.video_path = str(video_path)
+        self.prefetch = prefetch
+        self.stride = max(int(stride), 1)
+        self.seek_threshold = seek_threshold
+        self.cap = cv2.VideoCapture(self.video_path)
+        assert self.cap.isOpened(), f"Error opening video file {self.video_path}"
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.position = 0  # index of the next frame given by the capture
+        self.seeks = 0
+        self._capture_lock = threading.Lock()
+        self._frames = OrderedDict()  # frame -> image, decoded ahead
+        self._next = 0  # next frame to decode ahead
+        self._decoding = None  # frame being decoded ahead
+        self._generation = 0  # incremented when the frames decoded ahead are discarded
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = None
+        if prefetch > 0:
+            self._thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+            self._thread.start()
+
+    def _read(self, frame: int) -> Optional[np.ndarray]:
+        """Decodes `frame` with the capture, `_capture_lock` must be held."""
+        if not self.position <= frame < self.position + self.seek_threshold:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame)
+            self.position = frame
+            self.seeks += 1
+        while self.position < frame:
+            if not self.cap.grab():
+                return None
+            self.position += 1
+        ret, image = self.cap.read()
+        if not ret:
+            return None
+        self.position += 1
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    def _prefetch_loop(self):
+        while True:
+            with self._condition:
+                while not self._closed and (
+                    len(self._frames) >= self.prefetch or 0 < self.frame_count <= self._next
+                ):
+                    self._condition.wait()
+                if self._closed:
+                    return
+                frame, generation = self._next, self._generation
+                self._decoding = frame
+            with self._capture_lock:  # decoded without blocking the frames already decoded
+                image = self._read(frame)
+            with self._condition:
+                self._decoding = None
+                self._condition.notify_all()
+                if generation != self._generation:
+                    continue
+                if image is None:
+                    self.frame_count = frame  # end of the video
+                    continue
+                self._frames[frame] = image
+                self._next = frame + self.stride
+
+    def __getitem__(self, frame: int) -> np.ndarray:
+        """Returns `frame` (RGB)."""
+        with self._condition:
+            while self._decoding == frame:
+                self._condition.wait()
+            image = self._frames.pop(frame, None)
+            if image is not None:
+                while self._frames and next(iter(self._frames)) < frame:
+                    self._frames.popitem(last=False)
+                self._condition.notify_all()
+                return image
+            # not decoded ahead : decode it now and restart decoding ahead after it
+            self._frames.clear()
+            self._generation += 1
+            self._next = frame + self.stride
+        with self._capture_lock:
+            image = self._read(frame)
+        with self._condition:
+            self._condition.notify_all()
+        assert image is not None, f"Read past the end of the video file {self.video_path}"
+        return image
+
+    def __len__(self):
+        return self.frame_count
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._frames.clear()
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        self.cap.release()
+
+
+_sources = OrderedDict()  # (pid, video_path) -> VideoFrameSource, most recent last
+
+
+def set_video_options(prefetch: Optional[int] = None, stride: Optional[int] = None,
+                      seek_threshold: Optional[int] = None, max_open: Optional[int] = None):
+    """Sets the options of the video sources opened by `cv2_load_image` for the
+    `vid://` paths. Call it before the DataLoader workers are started to apply them
+    in the workers too."""
+    for name, value in dict(prefetch=prefetch, stride=stride, seek_threshold=seek_threshold,
+                            max_open=max_open).items():
+        if value is not None:
+            _options[name] = value
+
+
+def video_source(video_path) -> VideoFrameSource:
+    """The video source of the current process for `video_path`, the least recently
+    used ones being closed to keep at most `max_open` videos open."""
+    key = (os.getpid(), str(Path(video_path)))  # sources are not shared with forked processes
+    source = _sources.get(key)
+    if source is not None:
+        _sources.move_to_end(key)
+        return source
+    for other in [k for k in _sources if k[0] != key[0]]:
+        del _sources[other]  # inherited from the parent, its thread doesn't exist here
+    while len(_sources) >= _options["max_open"]:
+        _sources.popitem(last=False)[1].close()
+    source = VideoFrameSource(
+        video_path, _options["prefetch"], _options["stride"], _options["seek_threshold"]
+    )
+    _sources[key] = source
+    return source
+
+
+def load_video_frame(file_path: str) -> np.ndarray:
+    """Loads the frame (RGB) of a `vid://{video_path}:{frame}` path."""
+    video_path, frame = parse_video_frame_path(file_path)
+    return video_source(video_path)[frame]
@@ -7,8 +7,8 @@ import pandas as pd
 from rich.progress import track
 
 from tracklab.datastruct import TrackingDataset, TrackingSet
+from tracklab.utils.assignment import linear_assignment
 from posetrack21_mot.motmetrics.distances import iou_matrix
-from posetrack21_mot.motmetrics.lap import linear_sum_assignment
 
 
 class DanceTrack(TrackingDataset):
@@ -81,7 +81,8 @@ def load_keypoints_from_centernet(dataset_path, split, detections_gt):
     for image_id, image_df in track(detections_gt.groupby("image_id"), description=f"Keypoints for {split}..."):
         image_preds = centernet_dets.loc[centernet_dets.image_id == image_id]
         disM = iou_matrix(np.array(image_df.bbox_ltwh.tolist()), np.array(image_preds["bbox"].tolist()), max_iou=0.5)
-        le, ri = linear_sum_assignment(disM)
+        matches, _, _ = linear_assignment(disM)  # the NaN distances are never assigned
+        le, ri = matches[:, 0], matches[:, 1]
         image_df["keypoints_xyc"] = None
         image_df["keypoints_xyc"].iloc[le] = image_preds["keypoints"].iloc[ri]
         image_df["keypoints_xyc"] = image_df["keypoints_xyc"].apply(
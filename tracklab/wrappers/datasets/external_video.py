@@ -1,8 +1,5 @@
-import glob
 import mimetypes
 
-import cv2
-
 from pathlib import Path
 
 import pandas as pd
@@ -13,54 +10,39 @@ from tracklab.datastruct import (
     TrackingDataset,
     TrackingSet,
 )
+from tracklab.utils.video import set_video_options, video_frame_count, video_frame_path
 import logging
 
 log = logging.getLogger(__name__)
 
-def write_video_images_to_disk(video_path):
-    video_name = video_path.stem
-    cap = cv2.VideoCapture(str(video_path))
-    # Check if camera opened successfully
-    assert cap.isOpened(), "Error opening video stream or file"
-
-    tmp_video_folder = Path("tmp", video_name)
-    log.info("Dumping video frames to {}".format(tmp_video_folder.resolve()))
-    tmp_video_folder.mkdir(parents=True, exist_ok=True)
-    frame_idx = 0
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if ret:
-            image_path = tmp_video_folder / "{}_{:06d}.jpg".format(
-                video_name, frame_idx
-            )
-            cv2.imwrite(str(image_path), frame)
-            frame_idx += 1
-        else:
-            break
-    cap.release()
-    return tmp_video_folder
-
-
 class ExternalVideo(TrackingDataset):
     """
-    A class to use PbTrack at inference on any .mp4 video.
-    The .mp4 image frames are first saved individually to disk in 'working_dir/tmp/' dir.
-    A tracking test set is then created based on these images files, with video_metadata and image_metadata, but without
-    detections.
-    TODO dirty/easy implementation, we should refactor the tracking engine to make it load directly the images from the
-        mp4. Each video in video_metadata should specify its type: folder of images or mp4 video or youtube link, etc,
-        and tracking engine should adapt its batch loop accordingly.
+    A class to use PbTrack at inference on any .mp4 video (or on a folder of videos).
+    A tracking test set is created with video_metadata and image_metadata, but without
+    detections. The frames are read directly from the video files (see
+    :class:`tracklab.utils.video.VideoFrameSource`) through their `vid://{video_path}:{frame}`
+    file paths.
+
+    Args:
+        video_path: path of a video file, of a folder of videos or a youtube link
+        frame_stride: only track one frame every `frame_stride` frames
+        prefetch: number of frames decoded ahead by each process reading a video
+        seek_threshold: maximum number of frames decoded to reach a frame instead of
+            seeking, ideally the distance between two keyframes of the videos
     """
 
     annotations_dir = "posetrack_data"
 
-    def __init__(self, dataset_path: str, video_path: str, *args, **kwargs):
+    def __init__(self, dataset_path: str, video_path: str, frame_stride: int = 1,
+                 prefetch: int = 8, seek_threshold: int = 128, *args, **kwargs):
         if video_path.startswith("http"):
             yt_params = {"noplaylist": True, "restrictfilenames": True}
             with yt_dlp.YoutubeDL(yt_params) as ydl:
                 info_dict = ydl.extract_info(video_path)
                 video_path = ydl.prepare_filename(info_dict)
         self.video_path = Path(video_path)
+        self.frame_stride = max(int(frame_stride), 1)
+        set_video_options(prefetch=prefetch, stride=self.frame_stride, seek_threshold=seek_threshold)
         video_name = self.video_path.stem
         assert self.video_path.exists(), "Video does not exist ('{}')".format(
             self.video_path
@@ -72,7 +54,7 @@ class ExternalVideo(TrackingDataset):
             for i, video_path in enumerate(tqdm(list(self.video_path.iterdir()))):
                 if not mimetypes.guess_type(video_path)[0].startswith('video'):
                     continue
-                nframes = self.get_frame_count(video_path)
+                frames = self.get_frames(video_path)
                 video_id = i
                 video_name = video_path.stem
                 image_metadata.extend(
@@ -81,11 +63,11 @@ class ExternalVideo(TrackingDataset):
                             "id": j+1000*i,
                             "name": f"{video_name}_{j}",
                             "frame": j,
-                            "nframes": nframes,
+                            "nframes": len(frames),
                             "video_id": video_id,
-                            "file_path": f"vid://{video_path}:{j}",
+                            "file_path": video_frame_path(video_path, j),
                         }
-                        for j in range(nframes)
+                        for j in frames
                     ]
                 )
                 video_names.append(video_id)
@@ -93,7 +75,7 @@ class ExternalVideo(TrackingDataset):
             image_metadata = pd.DataFrame(image_metadata)
             video_metadata = pd.DataFrame(video_metadata, index=video_names)
         else:
-            nframes = self.get_frame_count(self.video_path)
+            frames = self.get_frames(self.video_path)
             video_id = 0
             image_metadata = pd.DataFrame(
                 [
@@ -101,11 +83,11 @@ class ExternalVideo(TrackingDataset):
                         "id": i,
                         "name": f"{video_name}_{i}",
                         "frame": i,
-                        "nframes": nframes,
+                        "nframes": len(frames),
                         "video_id": video_id,
-                        "file_path": f"vid://{self.video_path}:{i}",
+                        "file_path": video_frame_path(self.video_path, i),
                     }
-                    for i in range(nframes)
+                    for i in frames
                 ]
             )
 
@@ -119,15 +101,10 @@ class ExternalVideo(TrackingDataset):
 
         super().__init__(dataset_path, None, val_set, None, *args, **kwargs)
 
+    def get_frames(self, video_path):
+        return range(0, self.get_frame_count(video_path), self.frame_stride)
+
     @staticmethod
     def get_frame_count(video_path):
-        cap = cv2.VideoCapture(str(video_path))
-        frames = 0
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            frames += 1
-        cap.release()
-        return frames
+        return video_frame_count(video_path)
 
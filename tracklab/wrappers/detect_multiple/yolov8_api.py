@@ -9,6 +9,8 @@ os.environ["YOLO_VERBOSE"] = "False"
 from ultralytics import YOLO
 
 from tracklab.utils.coordinates import ltrb_to_ltwh
+from tracklab.utils.feature_cache import content_hash, file_hash, get_feature_cache
+from tracklab.utils.precision import InferencePrecision
 
 import logging
 
@@ -19,7 +21,8 @@ def collate_fn(batch):
     idxs = [b[0] for b in batch]
     images = [b["image"] for _, b in batch]
     shapes = [b["shape"] for _, b in batch]
-    return idxs, (images, shapes)
+    keys = [b.get("features_key") for _, b in batch]
+    return idxs, (images, shapes, keys)
 
 
 class YOLOv8(ImageLevelModule):
@@ -39,37 +42,56 @@ class YOLOv8(ImageLevelModule):
         self.device = device
         self.model = YOLO(cfg.path_to_checkpoint)
         self.model.to(device)
+        # the dynamic quantization only applies to linear layers, which YOLO doesn't have
+        self.inference = InferencePrecision(cfg.get("precision", "fp32"), device,
+                                            cfg.get("channels_last", False), supported=("fp32", "bf16", "fp16"))
         self.id = 0
+        # identifies the model in the keys of the feature cache
+        self.features_key = content_hash(
+            type(self).__name__, file_hash(cfg.path_to_checkpoint), *self.inference.key())
 
     @torch.no_grad()
     def preprocess(self, image, detections, metadata: pd.Series):
-        return {
+        batch = {
             "image": image,
             "shape": (image.shape[1], image.shape[0]),
         }
+        if get_feature_cache() is not None:
+            batch["features_key"] = content_hash(self.features_key, image)
+        return batch
 
     @torch.no_grad()
     def process(self, batch: Any, detections: pd.DataFrame, metadatas: pd.DataFrame):
-        images, shapes = batch
-        results_by_image = self.model(images)
+        images, shapes, keys = batch
+        cache = get_feature_cache() if None not in keys else None
+        # all the boxes of the model are cached, to filter them with any min_confidence
+        boxes_by_image = cache.get_many(keys) if cache is not None else [None] * len(images)
+        missing = [i for i, boxes in enumerate(boxes_by_image) if boxes is None]
+        if missing:
+            results_by_image = self.inference.predict_yolo(self.model, [images[i] for i in missing])
+            for i, results in zip(missing, results_by_image):
+                boxes = results.boxes.cpu().numpy()
+                boxes_by_image[i] = {"xyxy": boxes.xyxy, "conf": boxes.conf, "cls": boxes.cls}
+            if cache is not None:
+                cache.put_many([keys[i] for i in missing], [boxes_by_image[i] for i in missing])
         detections = []
-        for results, shape, (_, metadata) in zip(
-            results_by_image, shapes, metadatas.iterrows()
+        for boxes, shape, (_, metadata) in zip(
+            boxes_by_image, shapes, metadatas.iterrows()
         ):
-            for bbox in results.boxes.cpu().numpy():
-                # check for `person` class
-                if bbox.cls == 0 and bbox.conf >= self.cfg.min_confidence:
-                    detections.append(
-                        pd.Series(
-                            dict(
-                                image_id=metadata.name,
-                                bbox_ltwh=ltrb_to_ltwh(bbox.xyxy[0], shape),
-                                bbox_conf=bbox.conf[0],
-                                video_id=metadata.video_id,
-                                category_id=1,  # `person` class in posetrack
-                            ),
-                            name=self.id,
-                        )
+            # check for `person` class
+            keep = (boxes["cls"] == 0) & (boxes["conf"] >= self.cfg.min_confidence)
+            for xyxy, conf in zip(boxes["xyxy"][keep], boxes["conf"][keep]):
+                detections.append(
+                    pd.Series(
+                        dict(
+                            image_id=metadata.name,
+                            bbox_ltwh=ltrb_to_ltwh(xyxy, shape),
+                            bbox_conf=conf,
+                            video_id=metadata.video_id,
+                            category_id=1,  # `person` class in posetrack
+                        ),
+                        name=self.id,
                     )
-                    self.id += 1
+                )
+                self.id += 1
         return detections
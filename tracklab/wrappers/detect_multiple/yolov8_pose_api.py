@@ -10,6 +10,7 @@ from ultralytics import YOLO
 
 from tracklab.utils.cv2 import cv2_load_image
 from tracklab.utils.coordinates import ltrb_to_ltwh
+from tracklab.utils.precision import InferencePrecision
 
 import logging
 
@@ -37,8 +38,12 @@ class YOLOv8Pose(ImageLevelModule):
 
     def __init__(self, cfg, device, batch_size):
         super().__init__(batch_size)
+        self.cfg = cfg
         self.model = YOLO(cfg.path_to_checkpoint)
         self.model.to(device)
+        # the dynamic quantization only applies to linear layers, which YOLO doesn't have
+        self.inference = InferencePrecision(cfg.get("precision", "fp32"), device,
+                                            cfg.get("channels_last", False), supported=("fp32", "bf16", "fp16"))
         self.id = 0
 
     @torch.no_grad()
@@ -52,7 +57,7 @@ class YOLOv8Pose(ImageLevelModule):
     @torch.no_grad()
     def process(self, batch, metadatas: pd.DataFrame):
         images, shapes = batch
-        results_by_image = self.model(images)
+        results_by_image = self.inference.predict_yolo(self.model, images)
         detections = []
         for results, shape, (_, metadata) in zip(
             results_by_image, shapes, metadatas.iterrows()
@@ -0,0 +1,172 @@
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import trackeval
+from trackeval import utils
+from trackeval.datasets import MotChallenge2DBox
+from trackeval.eval import eval_sequence
+from trackeval.datasets._base_dataset import _BaseDataset
+from trackeval.utils import TrackEvalException
+
+
+class InMemoryMotChallenge2DBox(MotChallenge2DBox):
+    """TrackEval MOT Challenge dataset reading the predictions, and optionally the
+    ground truth, from memory instead of from the MOT Challenge files.
+
+    The sequences are given as the rows of their files, e.g. by
+    :func:`TrackingDataset.mot_sequences`, and are evaluated exactly as if they were
+    read from the files : only the parsing of the text files is skipped. Without
+    in-memory ground truth, it is read from the files given by the config.
+
+    Args:
+        config: TrackEval config of the dataset, the sequences are given by its
+            'SEQ_INFO'
+        predictions: (N, 10) rows of each sequence, for each tracker
+        gt: (N, 10) rows of each sequence of the ground truth
+    """
+
+    def __init__(self, config, predictions: Dict[str, Dict[str, np.ndarray]],
+                 gt: Optional[Dict[str, np.ndarray]] = None):
+        _BaseDataset.__init__(self)
+        self.config = utils.init_config(config, self.get_default_dataset_config(), self.get_name())
+        self.predictions = predictions
+        self.gt = gt
+
+        self.benchmark = self.config['BENCHMARK']
+        self.gt_set = self.config['BENCHMARK'] + '-' + self.config['SPLIT_TO_EVAL']
+        split_fol = '' if self.config['SKIP_SPLIT_FOL'] else self.gt_set
+        self.gt_fol = os.path.join(self.config['GT_FOLDER'], split_fol)
+        self.tracker_fol = os.path.join(self.config['TRACKERS_FOLDER'], split_fol)
+        self.should_classes_combine = False
+        self.use_super_categories = False
+        self.data_is_zipped = False
+        self.do_preproc = self.config['DO_PREPROC']
+        self.output_fol = self.config['OUTPUT_FOLDER'] or self.tracker_fol
+        self.tracker_sub_fol = self.config['TRACKER_SUB_FOLDER']
+        self.output_sub_fol = self.config['OUTPUT_SUB_FOLDER']
+
+        self.valid_classes = ['pedestrian']
+        self.class_list = [cls.lower() if cls.lower() in self.valid_classes else None
+                           for cls in self.config['CLASSES_TO_EVAL']]
+        if not all(self.class_list):
+            raise TrackEvalException('Attempted to evaluate an invalid class. Only pedestrian class is valid.')
+        self.class_name_to_class_id = {'pedestrian': 1, 'person_on_vehicle': 2, 'car': 3, 'bicycle': 4, 'motorbike': 5,
+                                       'non_mot_vehicle': 6, 'static_person': 7, 'distractor': 8, 'occluder': 9,
+                                       'occluder_on_ground': 10, 'occluder_full': 11, 'reflection': 12, 'crowd': 13}
+        self.valid_class_numbers = list(self.class_name_to_class_id.values())
+
+        self.seq_list, self.seq_lengths = self._get_seq_info()
+        if len(self.seq_list) < 1:
+            raise TrackEvalException('No sequences are selected to be evaluated.')
+        missing = [seq for seq in self.seq_list if gt is not None and seq not in gt]
+        missing += [seq for sequences in predictions.values() for seq in self.seq_list if seq not in sequences]
+        if missing:
+            raise TrackEvalException('Sequences not given to the in-memory dataset: ' + ', '.join(missing))
+
+        self.tracker_list = list(self.config['TRACKERS_TO_EVAL'] or predictions)
+        if self.config['TRACKER_DISPLAY_NAMES'] is None:
+            self.tracker_to_disp = dict(zip(self.tracker_list, self.tracker_list))
+        else:
+            self.tracker_to_disp = dict(zip(self.tracker_list, self.config['TRACKER_DISPLAY_NAMES']))
+
+    @classmethod
+    def get_class_name(cls):
+        # the results are named after the dataset read from the files
+        return MotChallenge2DBox.__name__
+
+    def _load_raw_file(self, tracker, seq, is_gt):
+        """Same as :func:`MotChallenge2DBox._load_raw_file`, with the rows of the
+        sequence split by frame instead of read from its file."""
+        if is_gt and self.gt is None:
+            return super()._load_raw_file(tracker, seq, is_gt)
+        rows = self.gt[seq] if is_gt else self.predictions[tracker][seq]
+        num_timesteps = self.seq_lengths[seq]
+        frames = rows[:, 0].astype(int)
+        invalid = np.unique(frames[(frames < 1) | (frames > num_timesteps)])
+        if len(invalid) > 0:
+            text = 'Ground-truth' if is_gt else 'Tracking'
+            raise TrackEvalException(
+                text + ' data contains the following invalid timesteps in seq %s: ' % seq + ', '.join(
+                    [str(x) + ', ' for x in invalid]))
+        order = np.argsort(frames, kind='stable')
+        rows = rows[order]
+        bounds = np.searchsorted(frames[order], np.arange(1, num_timesteps + 2))
+
+        data_keys = ['ids', 'classes', 'dets']
+        if is_gt:
+            data_keys += ['gt_crowd_ignore_regions', 'gt_extras']
+        else:
+            data_keys += ['tracker_confidences']
+        raw_data = {key: [None] * num_timesteps for key in data_keys}
+        for t in range(num_timesteps):
+            time_data = rows[bounds[t]:bounds[t + 1]]
+            if len(time_data) > 0:
+                raw_data['dets'][t] = time_data[:, 2:6]
+                raw_data['ids'][t] = time_data[:, 1].astype(int)
+                raw_data['classes'][t] = time_data[:, 7].astype(int)
+                if is_gt:
+                    raw_data['gt_extras'][t] = {'zero_marked': time_data[:, 6].astype(int)}
+                else:
+                    raw_data['tracker_confidences'][t] = time_data[:, 6]
+            else:
+                raw_data['dets'][t] = np.empty((0, 4))
+                raw_data['ids'][t] = np.empty(0).astype(int)
+                raw_data['classes'][t] = np.empty(0).astype(int)
+                if is_gt:
+                    raw_data['gt_extras'][t] = {'zero_marked': np.empty(0)}
+                else:
+                    raw_data['tracker_confidences'][t] = np.empty(0)
+            if is_gt:
+                raw_data['gt_crowd_ignore_regions'][t] = np.empty((0, 4))
+
+        prefix = 'gt_' if is_gt else 'tracker_'
+        for key in ['ids', 'classes', 'dets']:
+            raw_data[prefix + key] = raw_data.pop(key)
+        raw_data['num_timesteps'] = num_timesteps
+        raw_data['seq'] = seq
+        return raw_data
+
+
+# TrackEval datasets which can be evaluated from memory
+IN_MEMORY_DATASETS = {
+    MotChallenge2DBox.__name__: InMemoryMotChallenge2DBox,
+}
+
+
+def build_metrics(metric_names, metrics_config):
+    """TrackEval metrics of the given names, the unknown ones are skipped. As in
+    :class:`trackeval.Evaluator`, the detections and identities are also counted."""
+    metrics = [getattr(trackeval.metrics, name)(metrics_config) for name in metric_names
+               if hasattr(trackeval.metrics, name)]
+    return metrics + [trackeval.metrics.Count()]
+
+
+def evaluate_sequence(dataset_config, metrics_config, metric_names, seq, num_timesteps,
+                      predictions: np.ndarray, gt: Optional[np.ndarray] = None, tracker="tracklab"):
+    """TrackEval results of a single MOT Challenge sequence given by the rows of its
+    predictions and ground truth, as `{class: {metric: results}}`. They are the
+    sufficient statistics of the sequence, which are combined with the ones of the
+    other sequences by :func:`combine_sequences`. Without `gt`, the ground truth is
+    read from the file given by the `dataset_config`."""
+    dataset_config = dict(dataset_config, SEQ_INFO={seq: num_timesteps}, TRACKERS_TO_EVAL=[tracker])
+    gt = {seq: gt} if gt is not None else None
+    dataset = InMemoryMotChallenge2DBox(dataset_config, {tracker: {seq: predictions}}, gt)
+    metrics = build_metrics(metric_names, metrics_config)
+    return eval_sequence(seq, dataset, tracker, dataset.class_list, metrics,
+                         [metric.get_name() for metric in metrics])
+
+
+def combine_sequences(metric_names, metrics_config, results: Dict[str, dict]):
+    """Combined TrackEval results of the sequences with the given `results`, as
+    `{class: {metric: results}}`."""
+    metrics = build_metrics(metric_names, metrics_config)
+    classes = next(iter(results.values())).keys()
+    return {
+        cls: {
+            metric.get_name(): metric.combine_sequences(
+                {seq: res[cls][metric.get_name()] for seq, res in results.items()})
+            for metric in metrics
+        }
+        for cls in classes
+    }
@@ -5,7 +5,9 @@ import trackeval
 from pathlib import Path
 from tabulate import tabulate
 from tracklab.core import Evaluator as EvaluatorBase
+from tracklab.datastruct import TrackingDataset
 from tracklab.utils import wandb
+from .trackeval_dataset import IN_MEMORY_DATASETS
 
 log = logging.getLogger(__name__)
 
@@ -14,6 +16,8 @@ class TrackEvalEvaluator(EvaluatorBase):
     """
     Evaluator using the TrackEval library (https://github.com/JonathonLuiten/TrackEval).
     Save on disk the tracking predictions and ground truth in MOT Challenge format and run the evaluation by calling TrackEval.
+    With `in_memory`, the MOT Challenge datasets are instead given to TrackEval from memory, and the files are only
+    written if `save_eval_files` is set.
     """
     def __init__(self, cfg, eval_set, show_progressbar, dataset_path, tracking_dataset, *args, **kwargs):
         self.cfg = cfg
@@ -29,21 +33,24 @@ class TrackEvalEvaluator(EvaluatorBase):
 
         tracker_name = 'tracklab'
         save_classes = self.trackeval_dataset_class.__name__ != 'MotChallenge2DBox'
+        in_memory = self.in_memory()
+        save_files = not in_memory or self.cfg.get("save_eval_files", False)
 
         # Save predictions
         pred_save_path = Path(self.cfg.dataset.TRACKERS_FOLDER) / f"{self.trackeval_dataset_class.__name__}-{self.eval_set}" / tracker_name
-        self.tracking_dataset.save_for_eval(
-            tracker_state.detections_pred,
-            tracker_state.image_pred,
-            tracker_state.video_metadatas,
-            pred_save_path,
-            self.cfg.bbox_column_for_eval,
-            save_classes,  # do not use classes for MOTChallenge2DBox
-            is_ground_truth=False,
-        )
+        if save_files:
+            self.tracking_dataset.save_for_eval(
+                tracker_state.detections_pred,
+                tracker_state.image_pred,
+                tracker_state.video_metadatas,
+                pred_save_path,
+                self.cfg.bbox_column_for_eval,
+                save_classes,  # do not use classes for MOTChallenge2DBox
+                is_ground_truth=False,
+            )
 
-        log.info(
-            f"Tracking predictions saved in {self.trackeval_dataset_name} format in {pred_save_path}")
+            log.info(
+                f"Tracking predictions saved in {self.trackeval_dataset_name} format in {pred_save_path}")
 
         if tracker_state.detections_gt is None or len(tracker_state.detections_gt) == 0:
             log.warning(
@@ -51,7 +58,7 @@ class TrackEvalEvaluator(EvaluatorBase):
             return
 
         # Save ground truth
-        if self.cfg.save_gt:
+        if self.cfg.save_gt and save_files:
             self.tracking_dataset.save_for_eval(
                 tracker_state.detections_gt,
                 tracker_state.image_gt,
@@ -62,20 +69,35 @@ class TrackEvalEvaluator(EvaluatorBase):
                 is_ground_truth=True
             )
 
-        log.info(
-            f"Tracking ground truth saved in {self.trackeval_dataset_name} format in {pred_save_path}")
+            log.info(
+                f"Tracking ground truth saved in {self.trackeval_dataset_name} format in {pred_save_path}")
 
         # Build TrackEval dataset
-        dataset_config = self.trackeval_dataset_class.get_default_dataset_config()
-        dataset_config['SEQ_INFO'] = tracker_state.video_metadatas.set_index('name')['nframes'].to_dict()
-        dataset_config['BENCHMARK'] = self.trackeval_dataset_class.__name__  # required for trackeval.datasets.MotChallenge2DBox
-        for key, value in self.cfg.dataset.items():
-            dataset_config[key] = value
-
-        if not self.cfg.save_gt:
-            dataset_config['GT_FOLDER'] = self.dataset_path  # Location of GT data
-            dataset_config['GT_LOC_FORMAT'] = '{gt_folder}/{seq}/Labels-GameState.json'  # '{gt_folder}/{seq}/gt/gt.txt'
-        dataset = self.trackeval_dataset_class(dataset_config)
+        dataset_config = trackeval_dataset_config(
+            self.cfg,
+            self.dataset_path,
+            tracker_state.video_metadatas.set_index('name')['nframes'].to_dict(),
+        )
+        if in_memory:
+            predictions = {tracker_name: self.tracking_dataset.mot_sequences(
+                tracker_state.detections_pred,
+                tracker_state.image_pred,
+                tracker_state.video_metadatas,
+                self.cfg.bbox_column_for_eval,
+                save_classes,
+            )}
+            gt = None
+            if self.cfg.save_gt:
+                gt = self.tracking_dataset.mot_sequences(
+                    tracker_state.detections_gt,
+                    tracker_state.image_gt,
+                    tracker_state.video_metadatas,
+                    self.cfg.bbox_column_for_eval,
+                    save_classes,
+                )
+            dataset = IN_MEMORY_DATASETS[self.trackeval_dataset_name](dataset_config, predictions, gt)
+        else:
+            dataset = self.trackeval_dataset_class(dataset_config)
 
         # Build metrics
         metrics_config = {'METRICS': set(self.cfg.metrics), 'PRINT_CONFIG': False, 'THRESHOLD': 0.5}
@@ -102,6 +124,38 @@ class TrackEvalEvaluator(EvaluatorBase):
         if hasattr(self.tracking_dataset, 'process_trackeval_results'):
             results = self.tracking_dataset.process_trackeval_results(results, dataset_config, eval_config)
         wandb.log(results)
+        return results
+
+    def in_memory(self):
+        """Whether the predictions can be evaluated without writing them on disk : only the
+        TrackEval datasets reading the files written by `TrackingDataset.save_for_eval` can."""
+        if not self.cfg.get("in_memory", False):
+            return False
+        if self.trackeval_dataset_name not in IN_MEMORY_DATASETS:
+            log.info(f"{self.trackeval_dataset_name} can't be evaluated in memory, the predictions are saved on disk")
+            return False
+        if type(self.tracking_dataset).save_for_eval is not TrackingDataset.save_for_eval:
+            log.info(f"{type(self.tracking_dataset).__name__} saves its own predictions for the evaluation, "
+                     f"they are saved on disk")
+            return False
+        return True
+
+def trackeval_dataset_config(cfg, dataset_path, seq_info: dict) -> dict:
+    """TrackEval config of the dataset evaluated by a `TrackEvalEvaluator` of config `cfg`,
+    for the sequences of `seq_info` (their number of frames by name). Without `save_gt`,
+    the ground truth is read from the files of the dataset at `dataset_path`."""
+    dataset_class = getattr(trackeval.datasets, cfg.dataset.dataset_class)
+    dataset_config = dataset_class.get_default_dataset_config()
+    dataset_config['SEQ_INFO'] = seq_info
+    dataset_config['BENCHMARK'] = dataset_class.__name__  # required for trackeval.datasets.MotChallenge2DBox
+    for key, value in cfg.dataset.items():
+        dataset_config[key] = value
+
+    if not cfg.save_gt:
+        dataset_config['GT_FOLDER'] = dataset_path  # Location of GT data
+        dataset_config['GT_LOC_FORMAT'] = '{gt_folder}/{seq}/Labels-GameState.json'  # '{gt_folder}/{seq}/gt/gt.txt'
+    return dataset_config
+
 
 def _print_results(
     res_combined,
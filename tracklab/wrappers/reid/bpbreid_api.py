@@ -7,15 +7,17 @@ from omegaconf import OmegaConf
 from yacs.config import CfgNode as CN
 from .bpbreid_dataset import ReidDataset
 # FIXME this should be removed and use KeypointsSeriesAccessor and KeypointsFrameAccessor
+from tracklab.datastruct.tensor_column import tensor_column
 from tracklab.utils.coordinates import rescale_keypoints
 from tracklab.utils.collate import default_collate
+from tracklab.utils.feature_cache import cached_rows, content_hash, file_hash, get_feature_cache
+from tracklab.utils.precision import InferencePrecision, to_float32
 
 from torchreid.scripts.main import build_config, build_torchreid_model_engine
 from torchreid.tools.feature_extractor import FeatureExtractor
 from torchreid.utils.imagetools import (
     build_gaussian_heatmaps,
 )
-from tracklab.utils.collate import Unbatchable
 
 import tracklab
 from pathlib import Path
@@ -41,6 +43,7 @@ class BPBReId(DetectionLevelModule):
     """
 
     collate_fn = default_collate
+    group_by_image = True
     input_columns = ["bbox_ltwh"]
     output_columns = ["embeddings", "visibility_scores", "body_masks"]
 
@@ -55,10 +58,13 @@ class BPBReId(DetectionLevelModule):
         use_keypoints_visibility_scores_for_reid,
         training_enabled,
         batch_size,
+        precision="fp32",
+        channels_last=False,
     ):
         super().__init__(batch_size)
         self.cfg = cfg
         self.device = device
+        self.inference = InferencePrecision(precision, device, channels_last)
         tracking_dataset.name = dataset.name
         tracking_dataset.nickname = dataset.nickname
         self.dataset_cfg = dataset
@@ -88,10 +94,21 @@ class BPBReId(DetectionLevelModule):
         self.cfg.use_gpu = torch.cuda.is_available()
         self.cfg = build_config(config=self.cfg)
         self.test_embeddings = self.cfg.model.bpbreid.test_embeddings
+        self.crop_size = (self.cfg.data.height, self.cfg.data.width)
         # Register the PoseTrack21ReID dataset to Torchreid that will be instantiated when building Torchreid engine.
         self.training_enabled = training_enabled
         self.feature_extractor = None
         self.model = None
+        # identifies the model in the keys of the feature cache
+        self.features_key = content_hash(
+            type(self).__name__,
+            file_hash(self.cfg.model.load_weights),
+            self.cfg.model.dump(),
+            self.crop_size,
+            self.cfg.data.norm_mean,
+            self.cfg.data.norm_std,
+            *self.inference.key(),
+        )
 
     def download_models(self, load_weights, pretrained_path, backbone):
         if Path(load_weights).stem == "bpbreid_market1501_hrnet32_10642":
@@ -106,14 +123,9 @@ class BPBReId(DetectionLevelModule):
 
     @torch.no_grad()
     def preprocess(
-        self, image, detection: pd.Series, metadata: pd.Series
-    ):  # Tensor RGB (1, 3, H, W)
+        self, image, detection: pd.Series, metadata: pd.Series, crop=None
+    ):  # Tensor RGB (3, H, W), resized by the datapipe
         mask_w, mask_h = 32, 64
-        l, t, r, b = detection.bbox.ltrb(
-            image_shape=(image.shape[1], image.shape[0]), rounded=True
-        )
-        crop = image[t:b, l:r]
-        crop = Unbatchable([crop])
         batch = {
             "img": crop,
         }
@@ -132,37 +144,29 @@ class BPBReId(DetectionLevelModule):
             else:
                 raise NotImplementedError
             batch["masks"] = pixels_parts_probabilities
+        if get_feature_cache() is not None:
+            # the features of a detection only depend on its crop and masks
+            key = content_hash(self.features_key, crop, batch.get("masks"))
+            batch["features_key"] = np.frombuffer(key, dtype=np.uint8).copy()
 
         return batch
 
     @torch.no_grad()
     def process(self, batch, detections: pd.DataFrame, metadatas: pd.DataFrame):
-        im_crops = batch["img"]
-        im_crops = [im_crop.cpu().detach().numpy() for im_crop in im_crops]
-        if "masks" in batch:
-            external_parts_masks = batch["masks"]
-            external_parts_masks = external_parts_masks.cpu().detach().numpy()
-        else:
-            external_parts_masks = None
-        if self.feature_extractor is None:
-            self.feature_extractor = FeatureExtractor(
-                self.cfg,
-                model_path=self.cfg.model.load_weights,
-                device=self.device,
-                image_size=(self.cfg.data.height, self.cfg.data.width),
-                model=self.model,
-                verbose=False,  # FIXME @Vladimir
-            )
-        reid_result = self.feature_extractor(
-            im_crops, external_parts_masks=external_parts_masks
-        )
-        embeddings, visibility_scores, body_masks, _ = extract_test_embeddings(
-            reid_result, self.test_embeddings
-        )
+        im_crops, masks = batch["img"], batch.get("masks")  # (N, 3, H, W) uint8
+        if "features_key" in batch:
+            keys = batch["features_key"].numpy()
 
-        embeddings = embeddings.cpu().detach().numpy()
-        visibility_scores = visibility_scores.cpu().detach().numpy()
-        body_masks = body_masks.cpu().detach().numpy()
+            def extract_features(idxs):
+                idxs = torch.as_tensor(idxs)
+                return self._extract_features(im_crops[idxs], masks[idxs] if masks is not None else None)
+
+            features = cached_rows(len(keys), lambda i: keys[i].tobytes(), extract_features)
+        else:
+            features = self._extract_features(im_crops, masks)
+        embeddings = features["embeddings"]
+        visibility_scores = features["visibility_scores"]
+        body_masks = features["body_masks"]
 
         if self.use_keypoints_visibility_scores_for_reid:
             kp_visibility_scores = batch["visibility_scores"].numpy()
@@ -175,14 +179,48 @@ class BPBReId(DetectionLevelModule):
 
         reid_df = pd.DataFrame(
             {
-                "embeddings": list(embeddings),
-                "visibility_scores": list(visibility_scores),
-                "body_masks": list(body_masks),
+                "embeddings": tensor_column(embeddings),
+                "visibility_scores": tensor_column(visibility_scores),
+                "body_masks": tensor_column(body_masks),
             },
             index=detections.index,
         )
         return reid_df
 
+    def _extract_features(self, im_crops, external_parts_masks=None):
+        """Embeddings, visibility scores and body masks of the (N, 3, H, W) uint8 crops."""
+        if external_parts_masks is not None:
+            external_parts_masks = external_parts_masks.cpu().detach().numpy()
+            # the masks are transformed together with the images by the feature extractor
+            im_crops = [im_crop.permute(1, 2, 0).numpy() for im_crop in im_crops]
+        else:
+            mean = torch.tensor(self.cfg.data.norm_mean, device=self.device).view(1, 3, 1, 1)
+            std = torch.tensor(self.cfg.data.norm_std, device=self.device).view(1, 3, 1, 1)
+            im_crops = self.inference.inputs((im_crops.to(self.device).float() / 255. - mean) / std)
+        if self.feature_extractor is None:
+            self.feature_extractor = FeatureExtractor(
+                self.cfg,
+                model_path=self.cfg.model.load_weights,
+                device=self.device,
+                image_size=(self.cfg.data.height, self.cfg.data.width),
+                model=self.model,
+                verbose=False,  # FIXME @Vladimir
+            )
+            self.feature_extractor.model = self.inference.prepare(self.feature_extractor.model)
+        with self.inference.autocast():
+            reid_result = self.feature_extractor(
+                im_crops, external_parts_masks=external_parts_masks
+            )
+        embeddings, visibility_scores, body_masks, _ = extract_test_embeddings(
+            reid_result, self.test_embeddings
+        )
+
+        return {
+            "embeddings": to_float32(embeddings).cpu().detach().numpy(),
+            "visibility_scores": to_float32(visibility_scores).cpu().detach().numpy(),
+            "body_masks": to_float32(body_masks).cpu().detach().numpy(),
+        }
+
     def train(self):
         self.engine, self.model = build_torchreid_model_engine(self.cfg)
         self.engine.run(**engine_run_kwargs(self.cfg))
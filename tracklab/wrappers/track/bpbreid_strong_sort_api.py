@@ -6,12 +6,14 @@ import pandas as pd
 import bpbreid_strong_sort.strong_sort as strong_sort
 import logging
 
+from tracklab.datastruct.tensor_column import stack_column
 from tracklab.pipeline import ImageLevelModule
+from tracklab.utils.camera_motion import CameraMotion, CameraMotionMixin
 
 log = logging.getLogger(__name__)
 
 
-class BPBReIDStrongSORT(ImageLevelModule):
+class BPBReIDStrongSORT(ImageLevelModule, CameraMotionMixin):
     input_columns = [
         "bbox_ltwh",
         "embeddings",
@@ -33,6 +35,7 @@ class BPBReIDStrongSORT(ImageLevelModule):
         super().__init__(batch_size=1)
         self.cfg = cfg
         self.device = device
+        self.camera_motion = CameraMotion.from_config(self.cfg)
         self.reset()
 
     def reset(self):
@@ -55,22 +58,16 @@ class BPBReIDStrongSORT(ImageLevelModule):
             w_kfgd=self.cfg.w_kfgd,
             w_reid=self.cfg.w_reid,
             w_st=self.cfg.w_st,
+            diagnostics=self.cfg.get("diagnostics", "full"),
+            diagnostics_top_k=self.cfg.get("diagnostics_top_k", 5),
         )
-        # For camera compensation
-        self.prev_frame = None
-
-    def prepare_next_frame(self, next_frame: np.ndarray):
-        # Propagate the state distribution to the current time step using a Kalman filter prediction step.
-        self.model.tracker.predict()
-
-        # Camera motion compensation
-        if self.cfg.ecc:
-            if self.prev_frame is not None:
-                self.model.tracker.camera_update(self.prev_frame, next_frame)
-            self.prev_frame = next_frame
+        self.reset_camera_motion()
 
     @torch.no_grad()
     def preprocess(self, image, detections: pd.DataFrame, metadata: pd.Series):
+        return self.camera_motion_input(self._input_tuple(detections, metadata), image)
+
+    def _input_tuple(self, detections: pd.DataFrame, metadata: pd.Series):
         if len(detections) == 0:
             return {
             "id": [],
@@ -88,8 +85,8 @@ class BPBReIDStrongSORT(ImageLevelModule):
         input_tuple = {
             "id": detections.index.to_numpy(),
             "bbox_ltwh": np.stack(detections.bbox_ltwh),
-            "reid_features": np.stack(detections.embeddings),
-            "visibility_scores": np.stack(detections.visibility_scores),
+            "reid_features": stack_column(detections.embeddings),
+            "visibility_scores": stack_column(detections.visibility_scores),
             "scores": np.stack(score),
             "classes": np.zeros(len(detections.index)),
             "frame": np.ones(len(detections.index)) * metadata.frame,
@@ -100,6 +97,9 @@ class BPBReIDStrongSORT(ImageLevelModule):
 
     @torch.no_grad()
     def process(self, batch, detections: pd.DataFrame, metadatas: pd.DataFrame):
+        bboxes = detections.bbox.ltrb() if len(detections) > 0 else None
+        self.estimate_camera_motion(batch, bboxes)
+        self.compensate_camera_motion(self.model.tracker)
         if len(detections) == 0:
             return []
         results = self.model.update(
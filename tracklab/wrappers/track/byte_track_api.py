@@ -1,9 +1,9 @@
 import torch
-import numpy as np
 import pandas as pd
 
 from tracklab.pipeline import ImageLevelModule
-from tracklab.utils.coordinates import ltrb_to_ltwh
+from tracklab.utils.camera_motion import CameraMotion, CameraMotionMixin
+from tracklab.utils.tracker_io import tracker_input, tracker_output
 import byte_track.byte_tracker as byte_tracker
 
 import logging
@@ -11,7 +11,7 @@ import logging
 log = logging.getLogger(__name__)
 
 
-class ByteTrack(ImageLevelModule):
+class ByteTrack(ImageLevelModule, CameraMotionMixin):
     input_columns = [
         "bbox_ltwh",
         "bbox_conf",
@@ -19,50 +19,32 @@ class ByteTrack(ImageLevelModule):
     ]
     output_columns = ["track_id", "track_bbox_ltwh", "track_bbox_conf"]
 
-    def __init__(self, cfg, device, batch_size):
-        super().__init__(cfg, device, batch_size)
+    def __init__(self, cfg, device, **kwargs):
+        super().__init__(batch_size=1)  # Fixed batch size of 1 for trackers
         self.cfg = cfg
+        self.device = device
+        self.camera_motion = CameraMotion.from_config(self.cfg)
         self.reset()
 
     def reset(self):
         """Reset the tracker state to start tracking in a new video."""
         self.model = byte_tracker.BYTETracker(**self.cfg.hyperparams)
+        self.reset_camera_motion()
 
     @torch.no_grad()
-    def preprocess(self, detection: pd.Series, metadata: pd.Series):
-        ltrb = detection.bbox.ltrb()
-        conf = detection.bbox.conf()
-        cls = detection.category_id
-        tracklab_id = detection.name
-        return {
-            "input": np.array(
-                [ltrb[0], ltrb[1], ltrb[2], ltrb[3], conf, cls, tracklab_id]
-            ),
+    def preprocess(self, image, detections: pd.DataFrame, metadata: pd.Series):
+        batch = {
+            "input": tracker_input(detections),  # Nx7 [l,t,r,b,conf,class,tracklab_id]
         }
+        return self.camera_motion_input(batch, image)
 
     @torch.no_grad()
-    def process(self, batch, image, detections: pd.DataFrame):
-        inputs = batch["input"]  # Nx7 [l,t,r,b,conf,class,tracklab_id]
+    def process(self, batch, detections: pd.DataFrame, metadatas: pd.DataFrame):
+        inputs = batch["input"][0]  # Nx7 [l,t,r,b,conf,class,tracklab_id]
+        self.estimate_camera_motion(batch, inputs[:, :4].numpy())
+        self.compensate_camera_motion(self.model)
+        if len(detections) == 0:
+            return []
         inputs = inputs[inputs[:, 4] > self.cfg.min_confidence]
         results = self.model.update(inputs, None)
-        results = np.asarray(results)  # N'x8 [l,t,r,b,track_id,class,conf,idx]
-        if results.size:
-            track_bbox_ltwh = [ltrb_to_ltwh(x) for x in results[:, :4]]
-            track_bbox_conf = list(results[:, 6])
-            track_ids = list(results[:, 4])
-            idxs = list(results[:, 7].astype(int))
-            assert set(idxs).issubset(
-                detections.index
-            ), "Mismatch of indexes during the tracking. The results should match the detections."
-            results = pd.DataFrame(
-                {
-                    "track_bbox_ltwh": track_bbox_ltwh,
-                    "track_bbox_conf": track_bbox_conf,
-                    "track_id": track_ids,
-                    "idxs": idxs,
-                }
-            )
-            results.set_index("idxs", inplace=True, drop=True)
-            return results
-        else:
-            return []
+        return tracker_output(results, detections)  # N'x8 [l,t,r,b,track_id,class,conf,idx]
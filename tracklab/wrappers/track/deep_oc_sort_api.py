@@ -1,10 +1,10 @@
 import torch
-import numpy as np
 import pandas as pd
 from pathlib import Path
 
 from tracklab.pipeline import ImageLevelModule
-from tracklab.utils.coordinates import ltrb_to_ltwh
+from tracklab.utils.camera_motion import CameraMotion, CameraMotionMixin
+from tracklab.utils.tracker_io import tracker_input, tracker_output
 from deep_oc_sort import ocsort
 
 import logging
@@ -12,7 +12,7 @@ import logging
 log = logging.getLogger(__name__)
 
 
-class DeepOCSORT(ImageLevelModule):
+class DeepOCSORT(ImageLevelModule, CameraMotionMixin):
     input_columns = [
         "bbox_ltwh",
         "bbox_conf",
@@ -20,9 +20,16 @@ class DeepOCSORT(ImageLevelModule):
     ]
     output_columns = ["track_id", "track_bbox_ltwh", "track_bbox_conf"]
 
-    def __init__(self, cfg, device, batch_size):
-        super().__init__(cfg, device, batch_size)
+    def __init__(self, cfg, device, **kwargs):
+        super().__init__(batch_size=1)  # Fixed batch size of 1 for trackers
         self.cfg = cfg
+        self.device = device
+        # the camera motion compensation is part of Deep OC-SORT, enabled unless disabled
+        # (also with the cmc_off of the original hyperparameters)
+        default = None if self.cfg.hyperparams.get("cmc_off", False) else {
+            "method": "sparseOptFlow", "downscale": 1
+        }
+        self.camera_motion = CameraMotion.from_config(self.cfg, default=default)
         self.reset()
 
     def reset(self):
@@ -31,44 +38,31 @@ class DeepOCSORT(ImageLevelModule):
             Path(self.cfg.model_weights),
             self.device,
             self.cfg.fp16,
+            precision=self.cfg.get("precision"),
+            channels_last=self.cfg.get("channels_last", False),
             **self.cfg.hyperparams
         )
+        self.reset_camera_motion()
 
     @torch.no_grad()
-    def preprocess(self, detection: pd.Series, metadata: pd.Series):
-        ltrb = detection.bbox.ltrb()
-        conf = detection.bbox.conf()
-        cls = detection.category_id
-        tracklab_id = detection.name
+    def preprocess(self, image, detections: pd.DataFrame, metadata: pd.Series):
         return {
-            "input": np.array(
-                [ltrb[0], ltrb[1], ltrb[2], ltrb[3], conf, cls, tracklab_id]
-            ),
+            "input": tracker_input(detections),  # Nx7 [l,t,r,b,conf,class,tracklab_id]
+            "image": image,
         }
 
     @torch.no_grad()
-    def process(self, batch, image, detections: pd.DataFrame):
-        inputs = batch["input"]  # Nx7 [l,t,r,b,conf,class,tracklab_id]
+    def process(self, batch, detections: pd.DataFrame, metadatas: pd.DataFrame):
+        inputs = batch["input"][0]  # Nx7 [l,t,r,b,conf,class,tracklab_id]
+        image = batch["image"][0].numpy()
         inputs = inputs[inputs[:, 4] > self.cfg.min_confidence]
-        results = self.model.update(inputs, image)
-        results = np.asarray(results)  # N'x8 [l,t,r,b,track_id,class,conf,idx]
-        if results.size:
-            track_bbox_ltwh = [ltrb_to_ltwh(x) for x in results[:, :4]]
-            track_bbox_conf = list(results[:, 6])
-            track_ids = list(results[:, 4])
-            idxs = list(results[:, 7].astype(int))
-            assert set(idxs).issubset(
-                detections.index
-            ), "Mismatch of indexes during the tracking. The results should match the detections."
-            results = pd.DataFrame(
-                {
-                    "track_bbox_ltwh": track_bbox_ltwh,
-                    "track_bbox_conf": track_bbox_conf,
-                    "track_id": track_ids,
-                    "idxs": idxs,
-                }
-            )
-            results.set_index("idxs", inplace=True, drop=True)
-            return results
-        else:
+        masked = inputs[inputs[:, 4] > self.model.det_thresh, :4]
+        self.estimate_camera_motion(batch, masked.numpy())
+        if len(detections) == 0:
+            self.compensate_camera_motion(self.model)
             return []
+        # compensated after the reid features extraction, which overlaps with the estimation
+        results = self.model.update(
+            inputs, image, compensate_camera_motion=self.compensate_camera_motion
+        )
+        return tracker_output(results, detections)  # N'x8 [l,t,r,b,track_id,class,conf,idx]
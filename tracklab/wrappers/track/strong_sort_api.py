@@ -1,10 +1,10 @@
 import torch
-import numpy as np
 import pandas as pd
 from pathlib import Path
 
 from tracklab.pipeline import ImageLevelModule
-from tracklab.utils.coordinates import ltrb_to_ltwh
+from tracklab.utils.camera_motion import CameraMotion, CameraMotionMixin
+from tracklab.utils.tracker_io import tracker_input, tracker_output
 import strong_sort.strong_sort as strong_sort
 
 import logging
@@ -12,7 +12,7 @@ import logging
 log = logging.getLogger(__name__)
 
 
-class StrongSORT(ImageLevelModule):
+class StrongSORT(ImageLevelModule, CameraMotionMixin):
     input_columns = [
         "bbox_ltwh",
         "bbox_conf",
@@ -20,9 +20,11 @@ class StrongSORT(ImageLevelModule):
     ]
     output_columns = ["track_id", "track_bbox_ltwh", "track_bbox_conf"]
 
-    def __init__(self, cfg, device, batch_size, **kwargs):
-        super().__init__(cfg, device, batch_size)
+    def __init__(self, cfg, device, **kwargs):
+        super().__init__(batch_size=1)  # Fixed batch size of 1 for trackers
         self.cfg = cfg
+        self.device = device
+        self.camera_motion = CameraMotion.from_config(self.cfg)
         self.reset()
 
     def reset(self):
@@ -33,50 +35,27 @@ class StrongSORT(ImageLevelModule):
             self.cfg.fp16,
             **self.cfg.hyperparams
         )
-        # For camera compensation
-        self.prev_frame = None
+        self.reset_camera_motion()
 
     @torch.no_grad()
-    def preprocess(self, detection: pd.Series, metadata: pd.Series):
-        ltrb = detection.bbox.ltrb()
-        conf = detection.bbox.conf()
-        cls = detection.category_id
-        tracklab_id = detection.name
+    def preprocess(self, image, detections: pd.DataFrame, metadata: pd.Series):
         return {
-            "input": np.array(
-                [ltrb[0], ltrb[1], ltrb[2], ltrb[3], conf, cls, tracklab_id]
-            ),
+            "input": tracker_input(detections),  # Nx7 [l,t,r,b,conf,class,tracklab_id]
+            "image": image,
         }
 
     @torch.no_grad()
-    def process(self, batch, image, detections: pd.DataFrame):
-        if self.cfg.ecc:
-            if self.prev_frame is not None:
-                self.model.tracker.camera_update(self.prev_frame, image)
-            self.prev_frame = image
-        inputs = batch["input"]  # Nx7 [l,t,r,b,conf,class,tracklab_id]
-        inputs = inputs[inputs[:, 4] > self.cfg.min_confidence]
-        results = self.model.update(inputs, image)
-        results = np.asarray(results)  # N'x9 [l,t,r,b,track_id,class,conf,queue,idx]
-        if results.size:
-            track_bbox_ltwh = [ltrb_to_ltwh(x) for x in results[:, :4]]
-            track_bbox_conf = list(results[:, 6])
-            track_ids = list(results[:, 4])
-            idxs = list(results[:, 8].astype(int))
-            # FIXME should be a subset but sometimes returns an idx that was in the previous
-            # batch of detections... For the moment, we let the override happen
-            # assert set(idxs).issubset(
-            #    detections.index
-            # ), "Mismatch of indexes during the tracking. The results should match the detections."
-            results = pd.DataFrame(
-                {
-                    "track_bbox_ltwh": track_bbox_ltwh,
-                    "track_bbox_conf": track_bbox_conf,
-                    "track_id": track_ids,
-                    "idxs": idxs,
-                }
-            )
-            results.set_index("idxs", inplace=True, drop=True)
-            return results
-        else:
+    def process(self, batch, detections: pd.DataFrame, metadatas: pd.DataFrame):
+        image = batch["image"][0].numpy()
+        inputs = batch["input"][0]  # Nx7 [l,t,r,b,conf,class,tracklab_id]
+        self.estimate_camera_motion(batch, inputs[:, :4].numpy())
+        if len(detections) == 0:
+            self.compensate_camera_motion(self.model.tracker)
             return []
+        inputs = inputs[inputs[:, 4] > self.cfg.min_confidence]
+        # compensated after the reid features extraction, which overlaps with the estimation
+        results = self.model.update(inputs, image, self.compensate_camera_motion)
+        # N'x9 [l,t,r,b,track_id,class,conf,queue,idx]
+        # FIXME the idxs should be a subset of the detections but sometimes include an idx
+        # of the previous batch of detections... For the moment, we let the override happen
+        return tracker_output(results, detections, idx=8, check_idxs=False)